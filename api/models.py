@@ -27,6 +27,41 @@ class VideoGenerationResponse(BaseModel):
     video_path: str = Field(..., description="生成的视频文件路径")
     took_ms: float = Field(..., description="处理耗时(毫秒)")
 
+class VideoJobRequest(BaseModel):
+    """视频生成任务请求模型，audio_data和text二选一"""
+    audio_data: Optional[str] = Field(default=None, description="Base64编码的音频数据")
+    audio_format: str = Field(default="mp3", description="音频格式，例如：wav, mp3")
+    text: Optional[str] = Field(default=None, description="待合成文本，提供时先合成语音再生成视频")
+    voice_id: Optional[str] = Field(default=None, description="语音ID，提供text时用于语音合成")
+    ref_image_path: Optional[str] = Field(default=None, description="参考图像路径")
+    pose_dir_path: Optional[str] = Field(default=None, description="姿势数据目录路径")
+    priority: int = Field(default=0, description="优先级，数值大的先执行")
+    stream: bool = Field(default=False, description="流式生成：按句子分段渲染，分片完成即可播放，需要提供text")
+
+class VideoJobResponse(BaseModel):
+    """视频生成任务状态模型"""
+    job_id: str = Field(..., description="任务ID")
+    status: str = Field(..., description="任务状态: queued, running, succeeded, failed, cancelled")
+    priority: int = Field(default=0, description="优先级")
+    progress: float = Field(default=0.0, description="渲染进度(0~1)")
+    stage: Optional[str] = Field(default=None, description="当前阶段")
+    position: Optional[int] = Field(default=None, description="排队位置，0表示下一个执行")
+    video_path: Optional[str] = Field(default=None, description="生成的视频文件路径")
+    error: Optional[str] = Field(default=None, description="失败原因")
+    created_at: float = Field(..., description="提交时间")
+    started_at: Optional[float] = Field(default=None, description="开始时间")
+    finished_at: Optional[float] = Field(default=None, description="结束时间")
+
+class ReferenceRegisterRequest(BaseModel):
+    """数字人形象预注册请求模型"""
+    ref_image_path: str = Field(..., description="参考图像路径")
+
+class ReferenceRegisterResponse(BaseModel):
+    """数字人形象预注册响应模型"""
+    key: str = Field(..., description="缓存键（图像内容哈希和渲染尺寸）")
+    cached: bool = Field(..., description="注册前是否已缓存")
+    bytes: int = Field(..., description="编码结果大小(字节)")
+
 # Agent相关模型
 
 class AgentRequest(BaseModel):
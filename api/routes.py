@@ -1,19 +1,32 @@
 # -*- coding: utf-8 -*-
 '''
-API路由模块，提供HTTP接口
+API路由模块，提供HTTP和WebSocket接口
 '''
 
 import logging
 import base64
 from typing import Dict, Any, Optional, List
-from fastapi import APIRouter, File, UploadFile, Body, HTTPException, Depends, BackgroundTasks
-from fastapi.responses import JSONResponse, Response
+from fastapi import APIRouter, File, UploadFile, Body, HTTPException, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, FileResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel, Field
 from utils.protocol import AudioMessage, TextMessage, AudioFormatType
 from utils.singleton import Singleton
+from utils.pcm import PcmBuffer, PcmRingBuffer
+from pipelines.speech import VoiceActivityDetector
+from pipelines.session import SessionRegistry, TurnCancelled
+from pipelines.video_jobs import create_video_job_queue, VideoJobQueueFull, FINISHED_STATES, SUCCEEDED
+from pipelines.avatar_stream import AvatarStreamer
+from engine.executor import InferenceExecutorBusy
+from utils.context_store import create_context_store
+from utils.metrics import get_metrics
 from api.models import VideoGenerationRequest, TextToVideoRequest, VideoGenerationResponse
+from api.models import VideoJobRequest, VideoJobResponse
+from api.models import ReferenceRegisterRequest, ReferenceRegisterResponse
 from api.models import AgentRequest, AgentResponse  # 导入Agent相关模型
 import asyncio
+import functools
+import json
 import tempfile
 import os
 import time
@@ -96,12 +109,21 @@ class APIService(metaclass=Singleton):
     
     def __init__(self, config=None, pipeline=None, speech_processor=None, echomimic_integration=None):
         """初始化API服务"""
-        self.contexts = {}  # 存储对话上下文
-        self.context_timestamps = {}  # 存储上下文最后访问时间
+        self.contexts = create_context_store()  # 对话上下文存储（LRU+TTL淘汰，消息预算）
+        self.sessions = SessionRegistry()  # 会话取消作用域，新一轮回复或插话时取消上一轮
+        self.video_jobs = create_video_job_queue(self.run_video_job)  # 视频生成任务队列
         self.pipeline = pipeline  # 对话流水线实例
         self.speech_processor = speech_processor  # 语音处理器实例
         self.echomimic_integration = echomimic_integration  # EchoMimicV2集成实例
         self.config = config  # 配置
+        get_metrics().add_collector(self.collect_metrics)
+        
+    def collect_metrics(self, metrics):
+        """导出指标前刷新任务队列和会话的瞬时值"""
+        stats = self.video_jobs.stats()
+        for state in ("queued", "running", "succeeded", "failed", "cancelled"):
+            metrics.set_gauge("video_jobs", stats["jobs"].get(state, 0), state=state)
+        metrics.set_gauge("active_turns", self.sessions.stats()["active_turns"])
         
     def set_pipeline(self, pipeline):
         """设置对话流水线实例"""
@@ -115,41 +137,111 @@ class APIService(metaclass=Singleton):
         """设置EchoMimicV2集成实例"""
         self.echomimic_integration = echomimic_integration
         
+    def set_context_store(self, options: Optional[Dict[str, Any]] = None):
+        """根据配置替换对话上下文存储"""
+        if self.contexts is not None:
+            self.contexts.close()
+        self.contexts = create_context_store(options)
+        
+    def set_video_jobs(self, options: Optional[Dict[str, Any]] = None):
+        """根据配置替换视频生成任务队列"""
+        if self.video_jobs is not None:
+            self.video_jobs.store.close()
+        self.video_jobs = create_video_job_queue(self.run_video_job, options)
+        
+    async def run_video_job(self, job: Dict[str, Any], progress) -> str:
+        """执行视频生成任务：文本任务先合成语音，再由EchoMimic渲染视频"""
+        request = job["request"]
+        integration = self.echomimic_integration
+        if integration is None:
+            raise RuntimeError("EchoMimic集成未初始化")
+        
+        if request.get("stream"):
+            return await self.run_video_stream(job, progress)
+        
+        audio_path = request.get("audio_path")
+        if request.get("text"):
+            progress(0.0, "tts")
+            audio_output = (await self.pipeline.tts_only(request["text"], voice_id=request.get("voice_id"))
+                            if self.pipeline else None)
+            if not audio_output:
+                raise RuntimeError("语音合成失败")
+            audio_path = await integration.save_audio_to_file(audio_output.data, audio_output.format.value)
+        
+        progress(0.0, "rendering")
+        return await integration.generate_video_from_audio(
+            audio_path, request.get("ref_image_path"), request.get("pose_dir_path"), progress
+        )
+        
+    async def run_video_stream(self, job: Dict[str, Any], progress) -> str:
+        """流式视频任务：按句子分段合成和渲染，每段完成后即可通过分片接口播放"""
+        integration = self.echomimic_integration
+        if self.pipeline is None:
+            raise RuntimeError("对话流水线未初始化")
+        request = job["request"]
+        tts = functools.partial(self.pipeline.tts_only, voice_id=request.get("voice_id"))
+        streamer = AvatarStreamer(integration, tts, integration.config.get("stream"))
+        progress(0.0, "segment:0")
+        last_segment = None
+        async for segment in streamer.stream(job["id"], request["text"],
+                                             request.get("ref_image_path"), request.get("pose_dir_path")):
+            last_segment = segment
+            progress((segment["index"] + 1) / segment["total"], f"segment:{segment['index'] + 1}")
+        if last_segment is None:
+            raise RuntimeError("没有可播报的文本")
+        return last_segment["playlist"] or str(integration.stream_dir(job["id"]))
+        
+    async def submit_video_job(self, request: VideoJobRequest) -> Dict[str, Any]:
+        """提交视频生成任务，音频数据先保存到文件，任务参数中只保留路径"""
+        if not request.audio_data and not request.text:
+            raise HTTPException(status_code=400, detail="audio_data和text必须提供一个")
+        if request.stream and not request.text:
+            raise HTTPException(status_code=400, detail="流式生成需要提供text")
+        job_request = {
+            "text": request.text,
+            "voice_id": request.voice_id,
+            "stream": request.stream,
+            "ref_image_path": request.ref_image_path,
+            "pose_dir_path": request.pose_dir_path,
+        }
+        if not request.text:
+            job_request["audio_path"] = await self.echomimic_integration.save_audio_to_file(
+                base64.b64decode(request.audio_data), request.audio_format
+            )
+        try:
+            return self.video_jobs.submit(job_request, request.priority)
+        except VideoJobQueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        
+    async def generate_video_and_wait(self, request: VideoJobRequest) -> str:
+        """经任务队列生成视频并等待完成，客户端断开时取消任务"""
+        job = await self.submit_video_job(request)
+        try:
+            job = await self.video_jobs.wait(job["id"])
+        except asyncio.CancelledError:
+            self.video_jobs.cancel(job["id"])
+            raise
+        if job["status"] != SUCCEEDED:
+            raise RuntimeError(job.get("error") or f"任务{job['status']}")
+        return job["result"]
+        
+    async def run_turn(self, context_id: Optional[str], coro):
+        """以会话的一轮回复运行协程；请求未指定上下文ID时不登记会话，直接运行"""
+        if not context_id:
+            return await coro
+        return await self.sessions.get(context_id).run_turn(coro)
+        
     def get_context(self, context_id: str) -> Dict[str, Any]:
         """获取对话上下文"""
-        if not context_id or context_id not in self.contexts:
-            # 创建新的上下文
-            context_id = context_id or str(uuid.uuid4())
-            self.contexts[context_id] = {
-                "messages": [],
-                "created_at": time.time(),
-                "last_access": time.time()
-            }
-        else:
-            # 更新访问时间
-            self.contexts[context_id]["last_access"] = time.time()
-            
-        return self.contexts[context_id]
+        return self.contexts.get_context(context_id)
     
     def update_context(self, context_id: str, message: Dict[str, Any]):
         """更新对话上下文"""
-        context = self.get_context(context_id)
-        context["messages"].append(message)
+        self.contexts.update_context(context_id, message)
         
     def clear_old_contexts(self, max_age_hours: int = 24):
         """清理旧的上下文"""
-        now = time.time()
-        old_contexts = []
-        
-        for context_id, context in self.contexts.items():
-            age_hours = (now - context["last_access"]) / 3600
-            if age_hours > max_age_hours:
-                old_contexts.append(context_id)
-                
-        for context_id in old_contexts:
-            del self.contexts[context_id]
-            
-        return len(old_contexts)
+        return self.contexts.expire(max_age_hours * 3600)
 
 # 创建全局API服务实例
 api_service = APIService()
@@ -184,14 +276,14 @@ async def audio_chat(request: AudioChatRequest, api_service: APIService = Depend
         context_id = request.context_id or str(uuid.uuid4())
         context = api_service.get_context(context_id)["messages"]
         
-        # 处理对话
-        result = await api_service.pipeline.process(
+        # 处理对话，同一会话的新请求会取消本请求
+        result = await api_service.run_turn(request.context_id, api_service.pipeline.process(
             audio_input=audio_message,
             conversation_context=context,
             skip_asr=request.skip_asr,
             skip_llm=request.skip_llm,
             skip_tts=request.skip_tts
-        )
+        ))
         
         # 检查处理是否出错
         if "error" in result:
@@ -225,6 +317,11 @@ async def audio_chat(request: AudioChatRequest, api_service: APIService = Depend
         
         return response
     
+    except TurnCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except InferenceExecutorBusy:
+        # 推理队列已满，由全局异常处理返回503
+        raise
     except Exception as e:
         logger.error(f"音频对话处理错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -243,11 +340,17 @@ async def text_chat(request: TextChatRequest, api_service: APIService = Depends(
         context_id = request.context_id or str(uuid.uuid4())
         context = api_service.get_context(context_id)["messages"]
         
-        # 处理文本对话
-        llm_result = await api_service.pipeline.llm_only(
-            text_input=request.text,
-            conversation_context=context
-        )
+        async def respond():
+            llm_result = await api_service.pipeline.llm_only(
+                text_input=request.text,
+                conversation_context=context
+            )
+            if not llm_result or request.skip_tts:
+                return llm_result, None
+            return llm_result, await api_service.pipeline.tts_only(llm_result.data)
+        
+        # 处理文本对话，同一会话的新请求会取消本请求
+        llm_result, audio_output = await api_service.run_turn(request.context_id, respond())
         
         if not llm_result:
             raise HTTPException(status_code=500, detail="语言模型处理失败")
@@ -261,10 +364,8 @@ async def text_chat(request: TextChatRequest, api_service: APIService = Depends(
             "took_ms": (time.time() - start_time) * 1000
         }
         
-        # 如果不跳过TTS，生成语音
+        # 如果不跳过TTS，附带语音
         if not request.skip_tts:
-            audio_output = await api_service.pipeline.tts_only(response_text)
-            
             if audio_output:
                 response["audio_data"] = base64.b64encode(audio_output.data).decode("utf-8")
                 response["audio_format"] = audio_output.format.value
@@ -283,10 +384,20 @@ async def text_chat(request: TextChatRequest, api_service: APIService = Depends(
         
         return response
     
+    except TurnCancelled as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except InferenceExecutorBusy:
+        # 推理队列已满，由全局异常处理返回503
+        raise
     except Exception as e:
         logger.error(f"文本对话处理错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/conversation/{context_id}/cancel")
+async def cancel_conversation(context_id: str, api_service: APIService = Depends(get_api_service)):
+    """取消会话正在进行的回复（用户插话），停止上游LLM、TTS和视频渲染"""
+    return {"context_id": context_id, "cancelled": api_service.sessions.cancel(context_id, "client")}
+
 @router.post("/asr", response_model=ASRResponse)
 async def speech_recognition(request: ASRRequest, api_service: APIService = Depends(get_api_service)):
     """语音识别接口"""
@@ -323,6 +434,9 @@ async def speech_recognition(request: ASRRequest, api_service: APIService = Depe
         
         return response
     
+    except InferenceExecutorBusy:
+        # 推理队列已满，由全局异常处理返回503
+        raise
     except Exception as e:
         logger.error(f"语音识别处理错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -354,6 +468,9 @@ async def text_to_speech(request: TTSRequest, api_service: APIService = Depends(
         
         return response
     
+    except InferenceExecutorBusy:
+        # 推理队列已满，由全局异常处理返回503
+        raise
     except Exception as e:
         logger.error(f"语音合成处理错误: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -368,14 +485,13 @@ async def generate_video(request: VideoGenerationRequest, api_service: APIServic
         raise HTTPException(status_code=500, detail="EchoMimic集成未初始化")
     
     try:
-        # 处理视频生成
-        ref_image_path = request.ref_image_path
-        pose_dir_path = request.pose_dir_path
-        
-        video_path = await api_service.echomimic_integration.process_base64_audio(
-            request.audio_data,
-            request.audio_format,
-        )
+        # 经任务队列处理视频生成，与异步任务共享渲染槽位
+        video_path = await api_service.generate_video_and_wait(VideoJobRequest(
+            audio_data=request.audio_data,
+            audio_format=request.audio_format,
+            ref_image_path=request.ref_image_path,
+            pose_dir_path=request.pose_dir_path,
+        ))
         
         # 构建响应
         response = VideoGenerationResponse(
@@ -385,6 +501,8 @@ async def generate_video(request: VideoGenerationRequest, api_service: APIServic
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"视频生成异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"视频生成失败: {str(e)}")
@@ -395,25 +513,17 @@ async def text_to_video(request: TextToVideoRequest, api_service: APIService = D
     start_time = time.time()
     
     # 检查是否初始化
-    if not api_service.speech_processor or not api_service.echomimic_integration:
-        raise HTTPException(status_code=500, detail="语音处理器或EchoMimic集成未初始化")
+    if not api_service.pipeline or not api_service.echomimic_integration:
+        raise HTTPException(status_code=500, detail="对话流水线或EchoMimic集成未初始化")
     
     try:
-        # 构建文本消息并合成语音
-        text_message = TextMessage(text=request.text)
-        audio_output = await api_service.speech_processor.text_to_speech(
-            text_message, voice_id=request.voice_id
-        )
-        
-        # 获取参考图像和姿势数据路径
-        ref_image_path = request.ref_image_path
-        pose_dir_path = request.pose_dir_path
-        
-        # 处理视频生成
-        video_path = await api_service.echomimic_integration.process_tts_output(
-            audio_output.data,
-            audio_output.format.value
-        )
+        # 经任务队列合成语音并生成视频
+        video_path = await api_service.generate_video_and_wait(VideoJobRequest(
+            text=request.text,
+            voice_id=request.voice_id,
+            ref_image_path=request.ref_image_path,
+            pose_dir_path=request.pose_dir_path,
+        ))
         
         # 构建响应
         response = VideoGenerationResponse(
@@ -423,10 +533,118 @@ async def text_to_video(request: TextToVideoRequest, api_service: APIService = D
         
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"文本到视频生成异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"文本到视频生成失败: {str(e)}")
 
+def _video_job_response(job: Dict[str, Any]) -> VideoJobResponse:
+    """将任务信息转换为响应模型"""
+    return VideoJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        priority=job["priority"],
+        progress=job["progress"],
+        stage=job["stage"],
+        position=job.get("position"),
+        video_path=job["result"],
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+    )
+
+def _get_video_job(api_service: APIService, job_id: str) -> Dict[str, Any]:
+    job = api_service.video_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return job
+
+@router.post("/video/jobs", response_model=VideoJobResponse, status_code=202)
+async def submit_video_job(request: VideoJobRequest, api_service: APIService = Depends(get_api_service)):
+    """提交视频生成任务，立即返回任务ID，渲染在后台执行"""
+    if not api_service.echomimic_integration:
+        raise HTTPException(status_code=500, detail="EchoMimic集成未初始化")
+    if request.text and not api_service.pipeline:
+        raise HTTPException(status_code=500, detail="对话流水线未初始化")
+    job = await api_service.submit_video_job(request)
+    return _video_job_response(api_service.video_jobs.get(job["id"]))
+
+@router.get("/video/jobs/{job_id}", response_model=VideoJobResponse)
+async def get_video_job(job_id: str, api_service: APIService = Depends(get_api_service)):
+    """查询视频生成任务状态"""
+    return _video_job_response(_get_video_job(api_service, job_id))
+
+@router.get("/video/jobs/{job_id}/result")
+async def get_video_job_result(job_id: str, api_service: APIService = Depends(get_api_service)):
+    """下载生成的视频，任务未完成时返回409"""
+    job = _get_video_job(api_service, job_id)
+    if job["request"].get("stream"):
+        raise HTTPException(status_code=400, detail=f"流式视频任务请通过/api/video/jobs/{job_id}/stream/获取分片")
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"任务未完成: {job['status']}")
+    if not job["result"] or not os.path.exists(job["result"]):
+        raise HTTPException(status_code=410, detail="视频文件已不存在")
+    return FileResponse(job["result"], media_type="video/mp4", filename=f"{job_id}.mp4")
+
+@router.get("/video/jobs/{job_id}/events")
+async def video_job_events(job_id: str, api_service: APIService = Depends(get_api_service)):
+    """以Server-Sent Events推送任务状态和渲染进度，任务结束后关闭"""
+    job = _get_video_job(api_service, job_id)
+    
+    async def events():
+        queue = api_service.video_jobs.subscribe(job_id)
+        try:
+            current = api_service.video_jobs.get(job_id)
+            while True:
+                payload = json.dumps(jsonable_encoder(_video_job_response(current)), ensure_ascii=False)
+                yield f"data: {payload}\n\n"
+                if current["status"] in FINISHED_STATES:
+                    break
+                current = await queue.get()
+        finally:
+            api_service.video_jobs.unsubscribe(job_id, queue)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+# 流式分片的媒体类型
+STREAM_MEDIA_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".mp4": "video/mp4",
+}
+
+@router.get("/video/jobs/{job_id}/stream/{filename}")
+async def get_video_stream_file(job_id: str, filename: str, api_service: APIService = Depends(get_api_service)):
+    """获取流式视频任务的播放列表(index.m3u8)或分片，任务运行中即可边生成边播放"""
+    job = _get_video_job(api_service, job_id)
+    if not job["request"].get("stream"):
+        raise HTTPException(status_code=400, detail="不是流式视频任务")
+    media_type = STREAM_MEDIA_TYPES.get(os.path.splitext(filename)[1])
+    if media_type is None or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail=f"无效的文件名: {filename}")
+    path = api_service.echomimic_integration.stream_dir(job_id) / filename
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"分片尚未生成: {filename}")
+    # 播放列表在生成过程中不断更新，不允许缓存
+    headers = {"Cache-Control": "no-cache"} if filename.endswith(".m3u8") else None
+    return FileResponse(str(path), media_type=media_type, headers=headers)
+
+@router.delete("/video/jobs/{job_id}", response_model=VideoJobResponse)
+async def cancel_video_job(job_id: str, api_service: APIService = Depends(get_api_service)):
+    """
+    取消视频生成任务并立即释放渲染槽位
+
+    排队中的任务直接取消；运行中的任务在子进程模式下终止infer.py进程，
+    在常驻渲染进程模式下只丢弃尚未开始的渲染，已开始的渲染在渲染进程中继续执行到结束（结果被丢弃）
+    """
+    _get_video_job(api_service, job_id)
+    api_service.video_jobs.cancel(job_id)
+    # 运行中的任务在处理协程退出后才变为cancelled
+    await asyncio.sleep(0)
+    return _video_job_response(api_service.video_jobs.get(job_id))
+
 @router.get("/echomimic/pose_dirs")
 async def get_pose_dirs(api_service: APIService = Depends(get_api_service)):
     """获取可用的姿势数据目录"""
@@ -463,10 +681,37 @@ async def get_ref_images(api_service: APIService = Depends(get_api_service)):
         logger.error(f"获取参考图像异常: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取参考图像失败: {str(e)}")
 
+@router.post("/echomimic/ref_images/register", response_model=ReferenceRegisterResponse)
+async def register_ref_image(request: ReferenceRegisterRequest, api_service: APIService = Depends(get_api_service)):
+    """预先注册数字人形象：编码参考图像并缓存，之后使用该形象的渲染跳过编码"""
+    # 检查是否初始化
+    if not api_service.echomimic_integration:
+        raise HTTPException(status_code=500, detail="EchoMimic集成未初始化")
+
+    try:
+        result = await api_service.echomimic_integration.register_reference(request.ref_image_path)
+        return ReferenceRegisterResponse(**result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except (RuntimeError, ConnectionError) as e:
+        logger.error(f"注册参考图像异常: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"注册参考图像失败: {str(e)}")
+
 @router.get("/health")
-async def health_check():
-    """健康检查接口"""
-    return {"status": "ok", "timestamp": time.time()}
+async def health_check(api_service: APIService = Depends(get_api_service)):
+    """健康检查接口，包含引擎预热状态"""
+    result = {"status": "ok", "timestamp": time.time(), "sessions": api_service.sessions.stats(),
+              "video_jobs": api_service.video_jobs.stats()}
+    if api_service.pipeline is not None and hasattr(api_service.pipeline, "engine_pool"):
+        readiness = api_service.pipeline.engine_pool.readiness()
+        result.update(readiness)
+        if readiness["warming"]:
+            result["status"] = "warming"
+        elif not readiness["ready"]:
+            result["status"] = "degraded"
+    return result
 
 @router.post("/agent", response_model=AgentResponse)
 async def agent_query(request: AgentRequest, api_service: APIService = Depends(get_api_service)):
@@ -535,3 +780,283 @@ async def agent_query(request: AgentRequest, api_service: APIService = Depends(g
     except Exception as e:
         logger.error(f"Agent处理出错: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Agent处理失败: {str(e)}")
+
+# WebSocket对话单次缓存的最长音频时长(秒)
+WS_MAX_UTTERANCE_SECONDS = 60
+
+@router.websocket("/ws/conversation")
+async def conversation_websocket(websocket: WebSocket):
+    """
+    全双工语音对话接口
+    
+    客户端 -> 服务端:
+        二进制帧: 原始16位PCM音频（小端序、单声道），按start中声明的采样率
+        文本帧(JSON):
+            {"type": "start", "context_id": "...", "sample_rate": 16000, "sample_width": 2, "vad": false}  开始会话/更新音频参数
+            {"type": "end"}                 当前语句结束，开始识别和回复（启用vad时由服务端自动判断）
+            {"type": "text", "text": "..."} 直接以文本发起一轮对话
+            {"type": "cancel"}              取消正在进行的回复
+    
+    服务端 -> 客户端:
+        文本帧(JSON): ready / speech_start / speech_end / transcript / text / audio / timing / done / error 事件
+        二进制帧: 紧跟在audio事件之后的音频数据
+    """
+    await websocket.accept()
+    
+    if not api_service.pipeline:
+        await websocket.send_json({"type": "error", "error": "对话流水线未初始化"})
+        await websocket.close()
+        return
+    
+    context_id = websocket.query_params.get("context_id") or str(uuid.uuid4())
+    try:
+        sample_rate = int(websocket.query_params.get("sample_rate", 16000))
+        sample_width = int(websocket.query_params.get("sample_width", 2))
+    except ValueError:
+        sample_rate = sample_width = 0
+    if sample_rate <= 0:
+        await websocket.send_json({"type": "error", "error": "无效的音频参数: sample_rate/sample_width必须是正整数"})
+        await websocket.close()
+        return
+    # 预分配的语音缓冲区，容量为单次语音的最长时长
+    pcm_buffer = PcmRingBuffer(WS_MAX_UTTERANCE_SECONDS * sample_rate, sample_rate)
+    send_lock = asyncio.Lock()
+    # 会话取消作用域：新一轮回复、用户插话或客户端取消时取消正在进行的回复
+    session = api_service.sessions.get(context_id)
+    # 本连接发起的最近一轮回复，断开时只取消它，同一上下文上其他连接或HTTP请求的回复不受影响
+    own_turn: Optional[asyncio.Task] = None
+    # 流式识别会话：ASR引擎支持时，边接收音频边识别并推送中间结果
+    asr_stream = None
+    # 服务端VAD：自动检测说话开始和结束，只把语音段送入识别
+    vad: Optional[VoiceActivityDetector] = None
+    
+    def create_vad() -> VoiceActivityDetector:
+        if api_service.speech_processor:
+            return api_service.speech_processor.create_vad(sample_rate)
+        return VoiceActivityDetector(sample_rate=sample_rate)
+    
+    if websocket.query_params.get("vad", "").lower() in ("1", "true"):
+        vad = create_vad()
+    
+    async def send_json(message: Dict[str, Any]):
+        async with send_lock:
+            await websocket.send_json(message)
+    
+    async def send_transcripts(messages: List[TextMessage]) -> Optional[str]:
+        """推送识别结果，返回最终识别文本"""
+        final_text = None
+        for transcript in messages:
+            is_final = transcript.desc == "final"
+            if is_final:
+                final_text = transcript.data
+            await send_json({"type": "transcript", "text": transcript.data, "final": is_final})
+        return final_text
+    
+    async def run_turn(audio_message: Optional[AudioMessage], text: Optional[str]):
+        """执行一轮对话，并将流式事件转发给客户端"""
+        context = api_service.get_context(context_id)["messages"]
+        asr_text = text
+        response_text = ""
+        stream = api_service.pipeline.process_stream(
+            audio_input=audio_message,
+            conversation_context=context,
+            text_input=text
+        )
+        try:
+            async for event in stream:
+                # 文本输入（客户端文本或已推送的最终识别结果）无需再次回传
+                if not (text and event["type"] == "asr"):
+                    await forward_event(event)
+                if event["type"] == "asr":
+                    asr_text = event["text"]
+                elif event["type"] == "done":
+                    response_text = event["response_text"]
+        finally:
+            # 被取消时立即关闭流水线，停止上游LLM/TTS任务
+            await stream.aclose()
+        
+        if asr_text and response_text:
+            api_service.update_context(context_id, {"role": "user", "content": asr_text})
+            api_service.update_context(context_id, {"role": "assistant", "content": response_text})
+    
+    async def forward_event(event: Dict[str, Any]):
+        """将流水线事件转发给客户端"""
+        event_type = event["type"]
+        if event_type == "asr":
+            await send_json({"type": "transcript", "text": event["text"], "final": True})
+        elif event_type == "audio":
+            audio = event["audio"]
+            # 音频元数据和音频数据在同一把锁内连续发送，保证顺序
+            async with send_lock:
+                await websocket.send_json({
+                    "type": "audio",
+                    "index": event["index"],
+                    "text": event["text"],
+                    "audio_format": audio.format.value,
+                    "sample_rate": audio.sampleRate,
+                    "sample_width": audio.sampleWidth,
+                    "size": len(audio.data)
+                })
+                await websocket.send_bytes(audio.data)
+        elif event_type == "done":
+            await send_json({
+                "type": "done",
+                "response_text": event["response_text"],
+                "timings": event["timings"]
+            })
+        else:
+            await send_json(event)
+    
+    def log_turn_error(task: asyncio.Task):
+        """记录回复任务的异常，避免后台任务的异常被静默丢弃"""
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"WebSocket对话回复失败: {task.exception()}", exc_info=task.exception())
+    
+    def start_turn(audio_message: Optional[AudioMessage], text: Optional[str]):
+        nonlocal own_turn
+        own_turn = session.start_turn(run_turn(audio_message, text))
+        own_turn.add_done_callback(log_turn_error)
+    
+    def cancel_own_turn(reason: str):
+        """取消本连接发起且仍在进行的回复"""
+        if own_turn is not None and session.turn_task is own_turn:
+            session.cancel(reason)
+    
+    async def append_audio(frames: PcmBuffer):
+        """累积语音并送入流式识别"""
+        nonlocal asr_stream
+        if len(frames) > pcm_buffer.free:
+            await send_json({"type": "error", "error": f"单次语音超过{WS_MAX_UTTERANCE_SECONDS}秒"})
+            pcm_buffer.clear()
+            if asr_stream:
+                await asr_stream.close()
+                asr_stream = None
+            return
+        if not pcm_buffer:
+            asr_stream = api_service.pipeline.create_asr_stream(sample_rate, sample_width)
+        pcm_buffer.write(frames)
+        if asr_stream:
+            await send_transcripts(await asr_stream.feed(frames.tobytes()))
+    
+    async def end_utterance():
+        """当前语句结束，识别并开始回复"""
+        nonlocal asr_stream
+        if not pcm_buffer:
+            await send_json({"type": "error", "error": "没有收到音频数据"})
+            return
+        if asr_stream:
+            # 识别已与说话过程重叠进行，只需取回最终结果
+            stream, asr_stream = asr_stream, None
+            pcm_buffer.clear()
+            final_text = await send_transcripts(await stream.finish())
+            if final_text:
+                start_turn(None, final_text)
+            else:
+                await send_json({"type": "error", "error": "语音识别未返回文本"})
+            return
+        # 只在交给流水线时编码为WAV
+        audio_message = pcm_buffer.read().to_audio_message()
+        start_turn(audio_message, None)
+    
+    if sample_width != 2:
+        await send_json({"type": "error", "error": f"仅支持16位PCM音频: sample_width={sample_width}"})
+        await websocket.close()
+        return
+    
+    await send_json({"type": "ready", "context_id": context_id})
+    
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            # 二进制帧：累积PCM音频，并送入流式识别
+            if message.get("bytes") is not None:
+                if len(message["bytes"]) % 2:
+                    await send_json({"type": "error", "error": "音频帧长度必须是2的整数倍"})
+                    continue
+                frames = PcmBuffer.from_bytes(message["bytes"], sample_rate)
+                if vad is None:
+                    await append_audio(frames)
+                    continue
+                # 静音不进入识别，检测到说话结束时自动开始回复
+                for event in vad.feed(frames):
+                    if event["type"] == "speech_start":
+                        # 用户插话：立即停止正在播报的回复
+                        if session.cancel("barge_in"):
+                            await send_json({"type": "interrupted", "reason": "barge_in"})
+                        await send_json({"type": "speech_start", "timestamp": event["timestamp"]})
+                        await append_audio(event["audio"])
+                    elif event["type"] == "speech":
+                        await append_audio(event["audio"])
+                    elif event["type"] == "speech_end":
+                        await send_json({"type": "speech_end", "timestamp": event["timestamp"]})
+                        await end_utterance()
+                continue
+            
+            # 文本帧：控制消息
+            try:
+                control = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                await send_json({"type": "error", "error": "无法解析的控制消息"})
+                continue
+            
+            control_type = control.get("type")
+            if control_type == "start":
+                try:
+                    new_sample_width = int(control.get("sample_width", sample_width))
+                    new_sample_rate = int(control.get("sample_rate", sample_rate))
+                except (TypeError, ValueError):
+                    new_sample_rate = 0
+                if new_sample_rate <= 0:
+                    await send_json({"type": "error", "error": "无效的音频参数: sample_rate/sample_width必须是正整数"})
+                    continue
+                if new_sample_width != 2:
+                    await send_json({"type": "error", "error": "仅支持16位PCM音频"})
+                    continue
+                if control.get("context_id") and control["context_id"] != context_id:
+                    cancel_own_turn("disconnect")
+                    context_id = control["context_id"]
+                    session = api_service.sessions.get(context_id)
+                if new_sample_rate != sample_rate:
+                    sample_rate = new_sample_rate
+                    pcm_buffer = PcmRingBuffer(WS_MAX_UTTERANCE_SECONDS * sample_rate, sample_rate)
+                pcm_buffer.clear()
+                if "vad" in control:
+                    vad = create_vad() if control["vad"] else None
+                elif vad is not None:
+                    vad = create_vad()
+                if asr_stream:
+                    await asr_stream.close()
+                    asr_stream = None
+                await send_json({"type": "ready", "context_id": context_id})
+            elif control_type == "end":
+                if vad is not None:
+                    for event in vad.flush():
+                        await send_json({"type": "speech_end", "timestamp": event["timestamp"]})
+                    if not pcm_buffer:
+                        # 服务端VAD已自动结束语句
+                        continue
+                await end_utterance()
+            elif control_type == "text":
+                if not control.get("text"):
+                    await send_json({"type": "error", "error": "文本为空"})
+                    continue
+                start_turn(None, control["text"])
+            elif control_type == "cancel":
+                if session.cancel("client"):
+                    await send_json({"type": "cancelled"})
+            else:
+                await send_json({"type": "error", "error": f"未知的控制消息类型: {control_type}"})
+                
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"WebSocket对话处理错误: {str(e)}", exc_info=True)
+    finally:
+        # 会话按上下文ID与HTTP接口共享，不整体移除，空闲会话由注册表按时清理
+        cancel_own_turn("disconnect")
+        if asr_stream:
+            await asr_stream.close()
+        logger.info(f"WebSocket对话连接关闭: {context_id}")
@@ -5,6 +5,7 @@
 
 import os
 import sys
+import time
 import logging
 import argparse
 import asyncio
@@ -13,7 +14,7 @@ from pathlib import Path
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse
 from yacs.config import CfgNode as CN
 
 # 导入自定义模块
@@ -23,6 +24,10 @@ from pipelines.conversation import ConversationPipeline
 from pipelines.speech import SpeechProcessor
 from integrations.echomimic import EchoMimicIntegration
 from utils.protocol import AudioMessage, TextMessage, AudioFormatType
+from utils.http_client import get_http_pool
+from utils.tts_cache import get_tts_cache
+from utils.metrics import get_metrics
+from engine.executor import configure_executors, shutdown_executors, InferenceExecutorBusy
 
 # 配置日志
 logging.basicConfig(
@@ -50,11 +55,70 @@ app.add_middleware(
 # 添加API路由
 app.include_router(api_router)
 
+# 引擎预热期间拒绝业务请求，健康检查和文档不受限制
+WARMUP_EXEMPT_PATHS = ("/api/health", "/docs", "/openapi.json", "/redoc")
+
+class WarmupGate:
+    """
+    引擎预热期间拒绝业务请求的ASGI中间件：HTTP请求返回503，WebSocket连接以1013(Try Again Later)关闭
+    
+    @app.middleware("http")只处理HTTP请求，WebSocket连接需要在ASGI层拦截
+    """
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self._blocked(scope["path"]):
+            if scope["type"] == "http":
+                response = JSONResponse(status_code=503, content={"detail": "引擎预热中，请稍后重试"},
+                                        headers={"Retry-After": "5"})
+                await response(scope, receive, send)
+                return
+            # 先接受再关闭，客户端才能收到关闭码（握手阶段关闭只会得到HTTP 403）
+            message = await receive()
+            if message["type"] == "websocket.connect":
+                await send({"type": "websocket.accept"})
+                await send({"type": "websocket.close", "code": 1013, "reason": "engines warming up"})
+            return
+        await self.app(scope, receive, send)
+    
+    @staticmethod
+    def _blocked(path: str) -> bool:
+        warmup_config = config.get("WARMUP", {}) if config else {}
+        return (warmup_config.get("ENABLED", False) and warmup_config.get("BLOCK_TRAFFIC", True)
+                and pipeline is not None and pipeline.engine_pool.isWarming()
+                and path.startswith("/api") and not path.startswith(WARMUP_EXEMPT_PATHS))
+
+app.add_middleware(WarmupGate)
+
+# 记录每个接口的处理耗时（流式响应为返回响应头的时间），按路由模板区分，避免路径参数使标签数量无限增长
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return await call_next(request)
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe("http_request_seconds", time.perf_counter() - start_time, method=request.method,
+                    route=getattr(route, "path", "unmatched"), status=f"{response.status_code // 100}xx")
+    return response
+
+# 推理执行器排队已满时返回503，提示客户端稍后重试
+@app.exception_handler(InferenceExecutorBusy)
+async def inference_busy_handler(request: Request, exc: InferenceExecutorBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # 访问根路径时重定向到文档
 @app.get("/", include_in_schema=False)
 async def root():
     return RedirectResponse(url="/docs")
 
+# Prometheus指标
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(get_metrics().render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # 全局实例
 api_service = None
 pipeline = None
@@ -75,6 +139,22 @@ async def startup_event():
         logger.info(f"加载配置文件: {args.config}")
         config = load_config(args.config)
         
+        # 配置共享HTTP连接池
+        if "HTTP_POOL" in config:
+            get_http_pool().configure(config.HTTP_POOL)
+        
+        # 配置本地模型推理执行器，需在创建引擎之前完成
+        if "INFERENCE_EXECUTORS" in config:
+            configure_executors(config.INFERENCE_EXECUTORS)
+        
+        # 配置延迟指标
+        if "METRICS" in config:
+            get_metrics().configure(config.METRICS)
+        
+        # 配置TTS音频缓存
+        if "TTS_CACHE" in config:
+            get_tts_cache().configure(config.TTS_CACHE)
+        
         # 初始化语音处理器
         logger.info("初始化语音处理器...")
         speech_processor = SpeechProcessor(config)
@@ -84,6 +164,15 @@ async def startup_event():
         pipeline = ConversationPipeline(config)
         await pipeline.setup()
         
+        # 后台预热引擎，预热完成前由中间件拒绝业务请求
+        warmup_config = config.get("WARMUP", {})
+        if warmup_config.get("ENABLED", False):
+            asyncio.create_task(pipeline.warmup(
+                preload=list(warmup_config.get("PRELOAD", [])),
+                inference=warmup_config.get("INFERENCE", True),
+                timeout=warmup_config.get("TIMEOUT", 120)
+            ))
+        
         # 初始化EchoMimicV2集成
         logger.info("初始化EchoMimicV2集成...")
         echomimic_config = config.get("echomimic", {})
@@ -104,6 +193,10 @@ async def startup_event():
         # 初始化API服务
         logger.info("初始化API服务...")
         api_service = APIService()
+        if "CONTEXT_STORE" in config:
+            api_service.set_context_store(config.CONTEXT_STORE)
+        if "VIDEO_JOBS" in config:
+            api_service.set_video_jobs(config.VIDEO_JOBS)
         api_service.set_pipeline(pipeline)
         api_service.set_speech_processor(speech_processor)
         if echomimic_integration:
@@ -122,9 +215,25 @@ async def shutdown_event():
     logger.info("应用正在关闭...")
     
     # 清理资源
-    global pipeline
+    global pipeline, api_service, echomimic_integration
     if pipeline:
         await pipeline.cleanup()
+    if api_service:
+        api_service.contexts.close()
+        await api_service.video_jobs.close()
+    
+    # 停止EchoMimic渲染进程
+    if echomimic_integration:
+        await echomimic_integration.close()
+    
+    # 关闭共享HTTP连接池
+    await get_http_pool().close()
+    
+    # 写回TTS缓存索引
+    await get_tts_cache().close()
+    
+    # 关闭推理执行器
+    shutdown_executors()
     
     logger.info("应用已关闭!")
 
@@ -135,6 +244,8 @@ def parse_args():
                       help="配置文件路径")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="监听主机")
     parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--reload", action="store_true",
+                      help="开发模式，代码变更时自动重载（启用引擎工作进程池时每次重载都会重新加载模型）")
     return parser.parse_args()
 
 # 主函数
@@ -150,7 +261,7 @@ def main():
         "app:app",
         host=args.host,
         port=args.port,
-        reload=True,  # 开发模式下自动重载
+        reload=args.reload,
         log_level="info"
     )
 
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+'''
+离线基准测试：使用本地模拟引擎测量对话流水线和API的延迟、吞吐量和内存占用
+'''
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+对比两个基准测试结果文件（bench/run_bench.py的输出），按测试对象和并发度逐项列出变化
+
+变差超过阈值的指标标记为"!"，存在这样的指标时以退出码1结束，可在发布流程中作为回归检查
+
+用法:
+    python bench/compare.py bench/results/baseline.json bench/results/current.json --threshold 10
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# 对比的指标: (字段路径, 数值越大越好)
+COMPARED_METRICS = [
+    (("ttfa_ms", "p50"), False),
+    (("ttfa_ms", "p95"), False),
+    (("ttfa_ms", "p99"), False),
+    (("turn_ms", "p50"), False),
+    (("turn_ms", "p99"), False),
+    (("turns_per_second",), True),
+    (("peak_rss_mb",), False),
+    (("errors",), False),
+]
+
+
+def load_results(path: str) -> Tuple[Dict[str, Any], Dict[Tuple[str, int], Dict[str, Any]]]:
+    """
+    读取结果文件，返回(元数据, {(测试对象, 并发度): 结果})
+    """
+    data = json.loads(Path(path).read_text())
+    return data["meta"], {(record["target"], record["concurrency"]): record for record in data["results"]}
+
+
+def lookup(record: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = record
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> Tuple[List[str], int]:
+    """
+    对比两个结果文件
+
+    返回:
+        (输出行, 变差超过阈值的指标数)
+    """
+    base_meta, base_records = load_results(baseline_path)
+    current_meta, current_records = load_results(current_path)
+    lines = [f"基线: {base_meta['git'].get('describe')} ({base_meta['created_at']})",
+             f"当前: {current_meta['git'].get('describe')} ({current_meta['created_at']})"]
+    if base_meta.get("engines") != current_meta.get("engines"):
+        lines.append("警告: 两次测试的模拟引擎参数不同，结果不可直接比较")
+    if base_meta.get("cpu_count") != current_meta.get("cpu_count") or base_meta.get("platform") != current_meta.get("platform"):
+        lines.append("警告: 两次测试的运行环境不同")
+
+    regressions = 0
+    for key in sorted(set(base_records) | set(current_records)):
+        target, concurrency = key
+        if key not in base_records or key not in current_records:
+            lines.append(f"\n[{target} c={concurrency}] 仅存在于{'当前' if key in current_records else '基线'}结果中")
+            continue
+        lines.append(f"\n[{target} c={concurrency}]")
+        for path, higher_is_better in COMPARED_METRICS:
+            before = lookup(base_records[key], path)
+            after = lookup(current_records[key], path)
+            name = ".".join(path)
+            if before is None or after is None:
+                lines.append(f"  {name:<22} {before!s:>10} -> {after!s:<10}")
+                continue
+            change = (after - before) / before * 100 if before else (0.0 if after == before else float("inf"))
+            worse = change < -threshold if higher_is_better else change > threshold
+            regressions += worse
+            lines.append(f"  {name:<22} {before:>10} -> {after:<10} {change:+7.1f}% {'!' if worse else ''}")
+    return lines, regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="对比两个基准测试结果文件")
+    parser.add_argument("baseline", type=str, help="基线结果文件")
+    parser.add_argument("current", type=str, help="当前结果文件")
+    parser.add_argument("--threshold", type=float, default=10.0, help="判定为变差的变化幅度(%%)")
+    args = parser.parse_args(argv)
+    lines, regressions = compare(args.baseline, args.current, args.threshold)
+    print("\n".join(lines))
+    if regressions:
+        print(f"\n{regressions} 项指标变差超过 {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+API负载生成器：按泊松过程（开环）发起请求，逐级提高到达率，测量各到达率下的吞吐量和延迟曲线，找出饱和点
+
+开环: 请求按预先生成的到达时间发出，不等待之前的请求完成；延迟从计划到达时间开始计算，
+服务变慢时请求在服务端排队的时间全部计入延迟，避免闭环压测的协调遗漏(coordinated omission)掩盖排队
+
+目标接口:
+    audio_chat: POST /api/audio_chat，回放音频文件
+    text_chat:  POST /api/text_chat
+    tts:        POST /api/tts
+    ws:         /api/ws/conversation，每个请求新建连接并完成一轮语音对话，同时记录首音频时间(ttfa)
+
+用法:
+    # 启动使用模拟引擎的本地服务（bench/configs/stub.yaml，不需要任何云端密钥）并压测
+    python bench/loadgen.py --target audio_chat --rates 2,4,8,16,32 --duration 20
+    # 压测已运行的服务，回放录音（16位PCM的WAV文件或目录）
+    python bench/loadgen.py --url http://10.0.0.5:8000 --target ws --audio recordings/ --rates 1,2,4
+"""
+
+import sys
+import json
+import time
+import uuid
+import wave
+import base64
+import random
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiohttp
+import numpy as np
+
+# 添加项目根目录到导入路径
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from utils.audio_utils import pcm_to_wav
+from bench.run_bench import (SAMPLE_RATE, LocalServer, open_conversation, conversation_turn,
+                             make_utterance, summarize, read_rss, git_revision)
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 支持的目标接口
+TARGETS = ("audio_chat", "text_chat", "tts", "ws")
+
+# 未提供文本文件时使用的请求文本
+DEFAULT_TEXTS = [
+    "你好，请介绍一下你自己。",
+    "今天天气怎么样？",
+    "帮我推荐几本适合周末读的书。",
+    "用三句话解释一下什么是人工智能。",
+    "明天上午提醒我开会。",
+]
+
+# 未提供音频文件时生成的模拟语音时长(秒)
+DEFAULT_UTTERANCE_SECONDS = (1.0, 1.5, 2.5)
+
+
+class RequestFailed(Exception):
+    """
+    请求失败，kind用于按原因统计错误数
+    """
+    def __init__(self, kind: str, message: str = ""):
+        super().__init__(message or kind)
+        self.kind = kind
+
+
+def load_audio_fixtures(paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    读取要回放的录音（16位PCM的WAV文件，目录中的所有.wav文件），多声道只取第一个声道；
+    未提供时生成确定性的模拟语音
+    """
+    files: List[Path] = []
+    for path in map(Path, paths):
+        files.extend(sorted(path.glob("*.wav")) if path.is_dir() else [path])
+    fixtures = []
+    for file in files:
+        with wave.open(str(file), "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"仅支持16位PCM音频: {file}")
+            pcm = wav.readframes(wav.getnframes())
+            channels = wav.getnchannels()
+            sample_rate = wav.getframerate()
+        if channels > 1:
+            pcm = np.frombuffer(pcm, dtype="<i2")[::channels].tobytes()
+        fixtures.append({"name": file.name, "pcm": pcm, "sample_rate": sample_rate})
+    if paths and not fixtures:
+        raise ValueError(f"没有找到WAV文件: {paths}")
+    if not fixtures:
+        fixtures = [{"name": f"synthetic-{seconds:g}s", "pcm": make_utterance(seconds), "sample_rate": SAMPLE_RATE}
+                    for seconds in DEFAULT_UTTERANCE_SECONDS]
+    for fixture in fixtures:
+        fixture["wav_base64"] = base64.b64encode(pcm_to_wav(fixture["pcm"], fixture["sample_rate"])).decode("ascii")
+        fixture["seconds"] = round(len(fixture["pcm"]) / 2 / fixture["sample_rate"], 3)
+    return fixtures
+
+
+def load_texts(path: Optional[str]) -> List[str]:
+    """
+    读取请求文本（每行一条），未提供时使用内置文本
+    """
+    if not path:
+        return list(DEFAULT_TEXTS)
+    texts = [line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not texts:
+        raise ValueError(f"文本文件为空: {path}")
+    return texts
+
+
+def poisson_arrivals(rate: float, duration: float, rng: random.Random) -> List[float]:
+    """
+    泊松过程的到达时间（相对于开始时间的秒数）：到达间隔服从均值为1/rate的指数分布
+    """
+    arrivals = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        arrivals.append(t)
+        t += rng.expovariate(rate)
+    return arrivals
+
+
+class LoadGenerator:
+    """
+    向一个目标接口发送请求
+    """
+    def __init__(self, base_url: str, target: str, audio: List[Dict[str, Any]], texts: List[str], timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.target = target
+        self.audio = audio
+        self.texts = texts
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "LoadGenerator":
+        # 不限制客户端连接数，避免连接池排队使到达过程变成闭环
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                             timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def request(self, index: int) -> Dict[str, float]:
+        """
+        发送第index个请求（按序号轮流使用音频和文本），返回请求内各阶段相对于发送时间的耗时(秒)
+        """
+        if self.target == "ws":
+            return await self._conversation(index)
+        if self.target == "audio_chat":
+            fixture = self.audio[index % len(self.audio)]
+            path, payload = "/api/audio_chat", {"audio_data": fixture["wav_base64"], "audio_format": "wav",
+                                                "sample_rate": fixture["sample_rate"], "sample_width": 2}
+        elif self.target == "text_chat":
+            path, payload = "/api/text_chat", {"text": self.texts[index % len(self.texts)]}
+        else:
+            path, payload = "/api/tts", {"text": self.texts[index % len(self.texts)]}
+        try:
+            async with self.session.post(f"{self.base_url}{path}", json=payload) as response:
+                body = await response.read()
+                if response.status != 200:
+                    raise RequestFailed(f"http_{response.status}",
+                                        f"HTTP {response.status}: {body[:200].decode('utf-8', 'replace')}")
+        except aiohttp.ClientError as e:
+            raise RequestFailed("connection", str(e))
+        return {}
+
+    async def _conversation(self, index: int) -> Dict[str, float]:
+        fixture = self.audio[index % len(self.audio)]
+        try:
+            ws = await open_conversation(self.session, self.base_url, f"loadgen-{uuid.uuid4().hex[:12]}",
+                                         fixture["sample_rate"])
+            try:
+                return await conversation_turn(ws, fixture["pcm"], fixture["sample_rate"])
+            finally:
+                await ws.close()
+        except aiohttp.ClientError as e:
+            raise RequestFailed("connection", str(e))
+        except RuntimeError as e:
+            raise RequestFailed("error_event", str(e))
+
+    async def run_rate(self, rate: float, duration: float, max_inflight: int, rng: random.Random) -> Dict[str, Any]:
+        """
+        以平均到达率rate(请求/秒)持续发送duration秒，等待所有请求结束后汇总
+
+        延迟从计划到达时间开始计算；dispatch_lag为实际发出时间晚于计划时间的量，持续偏大说明负载生成器本身已成为瓶颈
+        """
+        arrivals = poisson_arrivals(rate, duration, rng)
+        latencies: List[float] = []
+        ttfa: List[float] = []
+        lags: List[float] = []
+        errors: Dict[str, int] = {}
+        inflight = set()
+
+        async def fire(index: int, scheduled: float):
+            dispatched = time.perf_counter()
+            lags.append(dispatched - scheduled)
+            try:
+                result = await asyncio.wait_for(self.request(index), self.timeout)
+            except asyncio.TimeoutError:
+                errors["timeout"] = errors.get("timeout", 0) + 1
+                return
+            except RequestFailed as e:
+                errors[e.kind] = errors.get(e.kind, 0) + 1
+                logger.debug(f"请求失败: {e}")
+                return
+            latencies.append(time.perf_counter() - scheduled)
+            if "ttfa" in result:
+                ttfa.append(result["ttfa"] + dispatched - scheduled)
+
+        start_time = time.perf_counter()
+        for index, offset in enumerate(arrivals):
+            scheduled = start_time + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(inflight) >= max_inflight:
+                errors["dropped"] = errors.get("dropped", 0) + 1
+                continue
+            task = asyncio.create_task(fire(index, scheduled))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        if inflight:
+            await asyncio.gather(*inflight)
+        elapsed = time.perf_counter() - start_time
+
+        failed = sum(errors.values())
+        level = {
+            "offered_rps": rate,
+            "sent": len(arrivals),
+            "succeeded": len(latencies),
+            "failed": failed,
+            "errors": dict(sorted(errors.items())),
+            "error_rate": round(failed / len(arrivals), 4) if arrivals else 0.0,
+            "elapsed_s": round(elapsed, 3),
+            "achieved_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_ms": summarize(latencies),
+            "dispatch_lag_ms": summarize(lags),
+        }
+        if self.target == "ws":
+            level["ttfa_ms"] = summarize(ttfa)
+        return level
+
+
+def within_slo(level: Dict[str, Any], slo_ms: float, max_error_rate: float) -> bool:
+    p99 = level["latency_ms"]["p99"]
+    return p99 is not None and p99 <= slo_ms and level["error_rate"] <= max_error_rate
+
+
+async def run_loadgen(args) -> Dict[str, Any]:
+    audio = load_audio_fixtures(args.audio)
+    texts = load_texts(args.texts)
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = LocalServer(args.config)
+        await server.start()
+        base_url = server.base_url
+    levels = []
+    try:
+        async with LoadGenerator(base_url, args.target, audio, texts, args.timeout) as generator:
+            # 预热：依次发送几个请求，首个请求的初始化开销不计入结果
+            for index in range(args.warmup):
+                try:
+                    await generator.request(index)
+                except (RequestFailed, asyncio.TimeoutError) as e:
+                    raise RuntimeError(f"预热请求失败，请检查服务和目标接口: {e}")
+            for i, rate in enumerate(args.rates):
+                level = await generator.run_rate(rate, args.duration, args.max_inflight,
+                                                 random.Random(f"{args.seed}-{i}"))
+                if server:
+                    level.update(read_rss(server.pid))
+                level["within_slo"] = within_slo(level, args.slo_ms, args.max_error_rate)
+                print_level(level)
+                levels.append(level)
+                if not level["within_slo"] and not args.full_curve:
+                    break
+    finally:
+        if server:
+            await server.stop()
+
+    passing = [level for level in levels if level["within_slo"]]
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git": git_revision(),
+            "target": args.target,
+            "url": args.url,
+            "config": None if args.url else args.config,
+            "audio": [{"name": fixture["name"], "seconds": fixture["seconds"]} for fixture in audio],
+            "texts": len(texts),
+            "duration_s": args.duration,
+            "seed": args.seed,
+            "slo_ms": args.slo_ms,
+            "max_error_rate": args.max_error_rate,
+        },
+        "summary": {
+            # 所有到达率中实际达到的最大成功吞吐量
+            "saturation_rps": max((level["achieved_rps"] for level in levels), default=0.0),
+            # 满足延迟和错误率目标的最大到达率
+            "max_rps_within_slo": max((level["offered_rps"] for level in passing), default=None),
+        },
+        "levels": levels,
+    }
+
+
+def print_level(level: Dict[str, Any]):
+    latency = level["latency_ms"]
+    line = (f"rate={level['offered_rps']:<7g} sent={level['sent']:<6} ok={level['succeeded']:<6} "
+            f"err={level['error_rate']:<7g} achieved={level['achieved_rps']:<8} "
+            f"p50/p95/p99={latency['p50']}/{latency['p95']}/{latency['p99']}ms")
+    if "ttfa_ms" in level:
+        line += f" ttfa_p99={level['ttfa_ms']['p99']}ms"
+    print(line + ("" if level["within_slo"] else "  [超出SLO]"))
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="数字人框架API负载生成器（泊松到达，开环）")
+    parser.add_argument("--target", choices=TARGETS, default="audio_chat", help="目标接口")
+    parser.add_argument("--url", type=str, default=None,
+                        help="已运行服务的地址，如http://127.0.0.1:8000；不提供时使用--config启动本地服务")
+    parser.add_argument("--config", type=str, default=str(ROOT / "bench" / "configs" / "stub.yaml"),
+                        help="本地服务的配置文件，默认使用模拟引擎")
+    parser.add_argument("--rates", type=lambda value: [float(item) for item in value.split(",")],
+                        default=[1, 2, 4, 8, 16, 32], help="依次测试的平均到达率(请求/秒)，逗号分隔")
+    parser.add_argument("--duration", type=float, default=20, help="每个到达率的发送时长(秒)")
+    parser.add_argument("--audio", type=str, nargs="*", default=[], help="回放的WAV文件或目录")
+    parser.add_argument("--texts", type=str, default=None, help="请求文本文件，每行一条")
+    parser.add_argument("--timeout", type=float, default=60, help="单个请求超时(秒)")
+    parser.add_argument("--max_inflight", type=int, default=2000,
+                        help="同时进行的请求上限，超出的到达记为dropped错误")
+    parser.add_argument("--slo_ms", type=float, default=3000, help="p99延迟目标(毫秒)")
+    parser.add_argument("--max_error_rate", type=float, default=0.01, help="错误率目标")
+    parser.add_argument("--full_curve", action="store_true", help="超出SLO后继续测试更高的到达率")
+    parser.add_argument("--warmup", type=int, default=3, help="开始前依次发送的预热请求数")
+    parser.add_argument("--seed", type=int, default=0, help="到达时间的随机种子")
+    parser.add_argument("--output", type=str, default=None,
+                        help="结果JSON文件路径，默认bench/results/loadgen-<target>.json")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    result = asyncio.run(run_loadgen(args))
+    summary = result["summary"]
+    print(f"饱和吞吐量: {summary['saturation_rps']} 请求/秒, 满足SLO的最大到达率: {summary['max_rps_within_slo']}")
+    output = Path(args.output or ROOT / "bench" / "results" / f"loadgen-{args.target}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
+    print(f"结果已写入: {output}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
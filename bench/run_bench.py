@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+离线基准测试：使用模拟ASR/LLM/TTS引擎（不依赖模型和网络），在指定并发度下驱动对话流水线和FastAPI应用，
+测量首音频延迟(TTFA)、每秒完成的对话轮数和常驻内存(RSS)，结果写入JSON，可用bench/compare.py对比两个版本
+
+- pipeline: 在当前进程中直接调用ConversationPipeline.process_stream，不经过网络和API层
+- api: 在子进程中启动完整应用（uvicorn + app.py），通过WebSocket对话接口/api/ws/conversation发起对话；
+  每个并发度启动一个新的服务进程，各并发度的RSS和服务端阶段耗时互不影响
+
+TTFA: pipeline模式从提交语音开始计时；api模式从发送语句结束消息(end)开始计时，到收到第一段音频为止
+
+用法:
+    python bench/run_bench.py --concurrency 1,4,16 --turns 64 --output bench/results/current.json
+    python bench/compare.py bench/results/baseline.json bench/results/current.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import platform
+import shutil
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import aiohttp
+import numpy as np
+
+# 添加项目根目录到导入路径
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from utils.config import load_config
+from utils.protocol import AudioMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+from utils.metrics import get_metrics
+
+# 配置日志
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 结果文件格式版本，字段含义变化时递增
+RESULT_VERSION = 1
+
+# 报告的延迟分位数
+QUANTILES = (0.5, 0.95, 0.99)
+
+# 汇总到结果中的服务端耗时指标
+STAGE_METRICS = ("stage_seconds", "turn_milestone_seconds", "engine_run_seconds")
+
+# 模拟语音的采样率
+SAMPLE_RATE = 16000
+
+
+def make_utterance(seconds: float, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    生成确定性的模拟语音（-20dBFS的220Hz正弦波，16位PCM）
+    """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (np.sin(2 * np.pi * 220 * t) * 3277).astype("<i2").tobytes()
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    """
+    延迟分布摘要（毫秒），分位数使用最近秩法，不做插值
+    """
+    if not values:
+        return {f"p{q * 100:g}": None for q in QUANTILES}
+    ordered = sorted(values)
+    result = {f"p{q * 100:g}": round(ordered[max(0, math.ceil(q * len(ordered)) - 1)] * 1000, 2) for q in QUANTILES}
+    result["mean"] = round(sum(ordered) / len(ordered) * 1000, 2)
+    result["max"] = round(ordered[-1] * 1000, 2)
+    return result
+
+
+def read_rss(pid: Any = "self") -> Dict[str, Optional[float]]:
+    """
+    进程当前和峰值常驻内存(MB)；没有/proc的平台只能获取当前进程的峰值
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"rss_mb": round(int(fields["VmRSS"].split()[0]) / 1024, 1),
+                "peak_rss_mb": round(int(fields["VmHWM"].split()[0]) / 1024, 1)}
+    except (OSError, KeyError, ValueError):
+        pass
+    if pid != "self":
+        return {"rss_mb": None, "peak_rss_mb": None}
+    try:
+        import resource
+    except ImportError:
+        return {"rss_mb": None, "peak_rss_mb": None}
+    # Linux单位为KB，macOS单位为字节
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return {"rss_mb": None, "peak_rss_mb": round(peak / 1024, 1)}
+
+
+def stage_summary(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    从指标快照中提取各阶段耗时分位数（毫秒）
+    """
+    stages = {}
+    for name in STAGE_METRICS:
+        series = snapshot.get(name)
+        if not series:
+            continue
+        stages[name] = {
+            labels: {key: value if key == "count" else round(value * 1000, 2)
+                     for key, value in values.items() if key == "count" or key.startswith("p")}
+            for labels, values in sorted(series.items())
+        }
+    return stages
+
+
+def parse_prometheus(text: str, namespace: str) -> Dict[str, Any]:
+    """
+    将/metrics导出的分位数和计数解析为与Metrics.snapshot相同的结构（秒）
+    """
+    snapshot: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, _, value = line.rpartition(" ")
+        name, _, labels = series.partition("{")
+        name = name[len(namespace) + 1:] if name.startswith(namespace + "_") else name
+        for suffix in ("_quantile", "_count"):
+            metric = name[:-len(suffix)] if name.endswith(suffix) else None
+            if metric in STAGE_METRICS:
+                break
+        else:
+            continue
+        pairs = [pair for pair in labels.rstrip("}").split(",") if pair]
+        quantile = next((pair for pair in pairs if pair.startswith("quantile=")), None)
+        key = "{" + ",".join(pair for pair in pairs if pair is not quantile) + "}"
+        entry = snapshot.setdefault(metric, {}).setdefault(key, {})
+        if quantile is None:
+            entry["count"] = int(float(value))
+        else:
+            entry[f"p{float(quantile.split('=')[1].strip(chr(34))) * 100:g}"] = float(value)
+    return snapshot
+
+
+class PipelineDriver:
+    """
+    在当前进程中直接驱动ConversationPipeline
+    """
+    target = "pipeline"
+
+    def __init__(self, config_path: str, utterance: bytes):
+        self.config = load_config(config_path)
+        self.audio = AudioMessage(data=pcm_to_wav(utterance, SAMPLE_RATE), format=AudioFormatType.WAV,
+                                  sampleRate=SAMPLE_RATE, sampleWidth=2)
+        self.pipeline = None
+
+    async def setup(self):
+        # 导入流水线时才加载引擎模块
+        from pipelines.conversation import ConversationPipeline
+        get_metrics().configure(self.config.get("METRICS", {}))
+        self.pipeline = ConversationPipeline(self.config)
+        await self.pipeline.setup()
+
+    async def begin_level(self, concurrency: int):
+        get_metrics().reset()
+
+    async def connect(self, client_id: str) -> "PipelineDriver":
+        return self
+
+    async def turn(self) -> Dict[str, float]:
+        """
+        执行一轮对话，返回首音频时间和总耗时(秒)
+        """
+        start_time = time.perf_counter()
+        result = {}
+        async for event in self.pipeline.process_stream(audio_input=self.audio):
+            if event["type"] == "audio" and "ttfa" not in result:
+                result["ttfa"] = time.perf_counter() - start_time
+            elif event["type"] == "error":
+                raise RuntimeError(event["error"])
+        result["total"] = time.perf_counter() - start_time
+        return result
+
+    async def reconnect(self, client, client_id: str) -> "PipelineDriver":
+        return self
+
+    async def end_level(self) -> Dict[str, Any]:
+        return {**read_rss(), "stages": stage_summary(get_metrics().snapshot())}
+
+    async def close(self):
+        if self.pipeline:
+            await self.pipeline.cleanup()
+
+
+class LocalServer:
+    """
+    在子进程中运行的完整应用（uvicorn + app.py），监听本机随机端口
+    """
+    def __init__(self, config_path: str, startup_timeout: float = 60):
+        self.config_path = str(Path(config_path).resolve())
+        self.startup_timeout = startup_timeout
+        self.process: Optional[subprocess.Popen] = None
+        self.port = 0
+        self.workdir: Optional[Path] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    async def start(self):
+        """
+        启动服务进程并等待引擎初始化完成
+        """
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        # 服务进程在临时目录中运行，日志和缓存文件不写入代码目录
+        self.workdir = Path(tempfile.mkdtemp(prefix="bench-server-"))
+        with open(self.workdir / "server.log", "wb") as log_file:
+            self.process = subprocess.Popen(
+                [sys.executable, str(ROOT / "app.py"), "--config", self.config_path,
+                 "--host", "127.0.0.1", "--port", str(self.port)],
+                cwd=self.workdir, stdout=log_file, stderr=subprocess.STDOUT
+            )
+        deadline = time.monotonic() + self.startup_timeout
+        async with aiohttp.ClientSession() as session:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    break
+                try:
+                    async with session.get(f"{self.base_url}/api/health") as response:
+                        # 流水线初始化完成后健康检查才包含引擎就绪状态
+                        health = await response.json()
+                        if health.get("status") == "ok" and "ready" in health:
+                            return
+                except (aiohttp.ClientError, ValueError):
+                    pass
+                await asyncio.sleep(0.2)
+        log_tail = self._log_tail()
+        await self.stop()
+        raise RuntimeError(f"服务启动失败:\n{log_tail}")
+
+    def _log_tail(self, lines: int = 20) -> str:
+        try:
+            return "\n".join((self.workdir / "server.log").read_text(errors="replace").splitlines()[-lines:])
+        except OSError:
+            return ""
+
+    async def stop(self):
+        if self.process is None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.process.wait, 10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+async def open_conversation(session: aiohttp.ClientSession, base_url: str, context_id: str,
+                            sample_rate: int = SAMPLE_RATE) -> aiohttp.ClientWebSocketResponse:
+    """
+    连接WebSocket对话接口并等待ready事件
+    """
+    ws = await session.ws_connect(f"{base_url}/api/ws/conversation?context_id={context_id}"
+                                  f"&sample_rate={sample_rate}", max_msg_size=0)
+    ready = await ws.receive_json()
+    if ready.get("type") != "ready":
+        await ws.close()
+        raise RuntimeError(f"WebSocket连接失败: {ready}")
+    return ws
+
+
+async def conversation_turn(ws: aiohttp.ClientWebSocketResponse, pcm: bytes,
+                            sample_rate: int = SAMPLE_RATE) -> Dict[str, float]:
+    """
+    在WebSocket对话连接上执行一轮对话：按100ms一帧发送语音（不按实时速度等待），发送end后等待回复结束
+
+    返回:
+        从发送end开始到收到第一段音频(ttfa)和回复结束(total)的时间(秒)
+    """
+    frame_bytes = sample_rate // 10 * 2
+    for offset in range(0, len(pcm), frame_bytes):
+        await ws.send_bytes(pcm[offset:offset + frame_bytes])
+    start_time = time.perf_counter()
+    await ws.send_json({"type": "end"})
+    result = {}
+    async for message in ws:
+        if message.type == aiohttp.WSMsgType.BINARY:
+            result.setdefault("ttfa", time.perf_counter() - start_time)
+            continue
+        if message.type != aiohttp.WSMsgType.TEXT:
+            raise RuntimeError(f"连接已关闭: {message.type}")
+        event = json.loads(message.data)
+        if event["type"] == "error":
+            raise RuntimeError(event["error"])
+        if event["type"] == "done":
+            result["total"] = time.perf_counter() - start_time
+            return result
+    raise RuntimeError("连接已关闭")
+
+
+class ApiClient:
+    """
+    WebSocket对话连接，每个并发客户端一个
+    """
+    def __init__(self, session: aiohttp.ClientSession, ws: aiohttp.ClientWebSocketResponse, utterance: bytes):
+        self.session = session
+        self.ws = ws
+        self.utterance = utterance
+
+    async def turn(self) -> Dict[str, float]:
+        return await conversation_turn(self.ws, self.utterance)
+
+    async def close(self):
+        await self.ws.close()
+        await self.session.close()
+
+
+class ApiDriver:
+    """
+    在子进程中启动完整应用，通过WebSocket对话接口驱动
+    """
+    target = "api"
+
+    def __init__(self, config_path: str, utterance: bytes, startup_timeout: float = 60):
+        self.config_path = config_path
+        self.namespace = load_config(config_path).get("METRICS", {}).get("NAMESPACE", "digital_human")
+        self.utterance = utterance
+        self.startup_timeout = startup_timeout
+        self.server: Optional[LocalServer] = None
+        self.clients: List[ApiClient] = []
+
+    async def setup(self):
+        pass
+
+    async def begin_level(self, concurrency: int):
+        self.server = LocalServer(self.config_path, self.startup_timeout)
+        await self.server.start()
+
+    async def connect(self, client_id: str) -> ApiClient:
+        session = aiohttp.ClientSession()
+        try:
+            ws = await open_conversation(session, self.server.base_url, client_id)
+        except BaseException:
+            await session.close()
+            raise
+        client = ApiClient(session, ws, self.utterance)
+        self.clients.append(client)
+        return client
+
+    async def reconnect(self, client: ApiClient, client_id: str) -> ApiClient:
+        """
+        关闭出错的连接（可能还有未读完的事件）并建立新连接
+        """
+        await client.close()
+        self.clients.remove(client)
+        return await self.connect(client_id)
+
+    async def end_level(self) -> Dict[str, Any]:
+        for client in self.clients:
+            await client.close()
+        self.clients = []
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{self.server.base_url}/metrics") as response:
+                text = await response.text()
+        result = {**read_rss(self.server.pid), "stages": stage_summary(parse_prometheus(text, self.namespace))}
+        await self.close()
+        return result
+
+    async def close(self):
+        if self.server:
+            await self.server.stop()
+            self.server = None
+
+
+async def run_level(driver, concurrency: int, turns: int, turn_timeout: float) -> Dict[str, Any]:
+    """
+    以指定并发度执行turns轮对话：concurrency个客户端同时开始，每个客户端完成一轮后立即发起下一轮
+    """
+    await driver.begin_level(concurrency)
+    clients = await asyncio.gather(*[driver.connect(f"bench-{driver.target}-{concurrency}-{i}")
+                                     for i in range(concurrency)])
+    ttfa, totals = [], []
+    errors = 0
+    remaining = turns
+
+    async def client_loop(client):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            try:
+                result = await asyncio.wait_for(client.turn(), turn_timeout)
+            except (asyncio.TimeoutError, RuntimeError, ConnectionError) as e:
+                errors += 1
+                logger.warning(f"[{driver.target}] 对话失败: {e}")
+                client = await driver.reconnect(client, f"bench-{driver.target}-{concurrency}-retry-{remaining}")
+                continue
+            totals.append(result["total"])
+            if "ttfa" in result:
+                ttfa.append(result["ttfa"])
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[client_loop(client) for client in clients])
+    duration = time.perf_counter() - start_time
+    level = await driver.end_level()
+    return {
+        "target": driver.target,
+        "concurrency": concurrency,
+        "turns": len(totals),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "turns_per_second": round(len(totals) / duration, 3) if duration > 0 else 0.0,
+        "ttfa_ms": summarize(ttfa),
+        "turn_ms": summarize(totals),
+        **level,
+    }
+
+
+def git_revision() -> Dict[str, Any]:
+    """
+    当前代码版本，用于标识结果文件
+    """
+    def git(*args) -> Optional[str]:
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                                  timeout=30, check=True).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    status = git("status", "--porcelain", "--untracked-files=no")
+    return {"commit": git("rev-parse", "HEAD"), "describe": git("describe", "--always", "--tags"),
+            "dirty": bool(status) if status is not None else None}
+
+
+def engine_settings(config_path: str) -> Dict[str, Any]:
+    """
+    模拟引擎参数，不同参数下的结果不可比较
+    """
+    config = load_config(config_path)
+    return {section: {key: value for key, value in config[section].items()}
+            for section in ("ASR", "LLM", "TTS") if section in config}
+
+
+async def run_bench(args) -> Dict[str, Any]:
+    utterance = make_utterance(args.utterance_seconds)
+    targets = ["pipeline", "api"] if args.target == "all" else [args.target]
+    results = []
+    for target in targets:
+        driver = PipelineDriver(args.config, utterance) if target == "pipeline" else ApiDriver(args.config, utterance)
+        await driver.setup()
+        try:
+            for concurrency in args.concurrency:
+                record = await run_level(driver, concurrency, args.turns, args.turn_timeout)
+                print_record(record)
+                results.append(record)
+        finally:
+            await driver.close()
+    return {
+        "meta": {
+            "version": RESULT_VERSION,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": os.path.relpath(Path(args.config).resolve(), ROOT),
+            "engines": engine_settings(args.config),
+            "turns": args.turns,
+            "utterance_seconds": args.utterance_seconds,
+        },
+        "results": results,
+    }
+
+
+def print_record(record: Dict[str, Any]):
+    ttfa = record["ttfa_ms"]
+    print(f"{record['target']:<8} c={record['concurrency']:<4} turns={record['turns']:<5} errors={record['errors']:<3} "
+          f"tps={record['turns_per_second']:<8} ttfa p50/p95/p99={ttfa['p50']}/{ttfa['p95']}/{ttfa['p99']}ms "
+          f"rss={record['rss_mb']}MB peak={record['peak_rss_mb']}MB")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="数字人框架离线基准测试")
+    parser.add_argument("--config", type=str, default=str(ROOT / "bench" / "configs" / "stub.yaml"),
+                        help="基准测试配置文件（模拟引擎参数）")
+    parser.add_argument("--target", choices=["pipeline", "api", "all"], default="all", help="测试对象")
+    parser.add_argument("--concurrency", type=lambda value: [int(item) for item in value.split(",")],
+                        default=[1, 4, 16], help="并发度列表，逗号分隔")
+    parser.add_argument("--turns", type=int, default=64, help="每个并发度执行的对话轮数")
+    parser.add_argument("--utterance_seconds", type=float, default=1.5, help="每轮输入语音的时长(秒)")
+    parser.add_argument("--turn_timeout", type=float, default=60, help="单轮对话超时(秒)")
+    parser.add_argument("--output", type=str, default=str(ROOT / "bench" / "results" / "latest.json"),
+                        help="结果JSON文件路径")
+    parser.add_argument("--verbose", action="store_true", help="输出引擎和流水线日志")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.verbose:
+        logging.getLogger().setLevel(logging.INFO)
+    result = asyncio.run(run_bench(args))
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, ensure_ascii=False, indent=2) + "\n")
+    print(f"结果已写入: {output}")
+    return result
+
+
+if __name__ == "__main__":
+    main()
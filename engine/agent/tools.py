@@ -7,7 +7,7 @@ import os
 import json
 from typing import Dict, Any, List, Optional, Union
 from datetime import datetime
-import httpx
+from utils.http_client import get_http_pool
 
 logger = logging.getLogger(__name__)
 
@@ -85,12 +85,12 @@ async def _google_search_raw(query: str, num_results: int = 8, language: str = "
         }
         
         # 发送API请求
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=30.0)
-            response.raise_for_status()  # 确保请求成功
-            
-            search_data = response.json()
-            
+        client = await get_http_pool().get_httpx_client()
+        response = await client.get(url, params=params, timeout=30.0)
+        response.raise_for_status()  # 确保请求成功
+        
+        search_data = response.json()
+        
         # 返回原始搜索结果项
         if "items" not in search_data:
             return []
@@ -142,28 +142,28 @@ async def _firecrawl_specific_url(url: str) -> Optional[Dict[str, Any]]:
         }
         
         # 发送API请求
-        async with httpx.AsyncClient() as client:
-            response = await client.post(api_url, headers=headers, json=payload, timeout=60.0)
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.info(f"Firecrawl API返回数据: {json.dumps(data, ensure_ascii=False)[:500]}...")
-            
-            # 返回结果
-            if data and data.get("success") and data.get("data") and "markdown" in data.get("data", {}):
-                title = url.split("/")[-1].replace("-", " ").title()
-                if "title" in data:
-                    title = data.get("title", title)
-                
-                return {
-                    "url": url,
-                    "title": title,
-                    "content": data.get("data", {}).get("markdown", "")
-                }
-            else:
-                logger.error(f"Firecrawl API返回数据格式不符合预期: {json.dumps(data, ensure_ascii=False)[:200]}...")
-            return None
+        client = await get_http_pool().get_httpx_client()
+        response = await client.post(api_url, headers=headers, json=payload, timeout=60.0)
+        response.raise_for_status()
+        
+        data = response.json()
+        logger.info(f"Firecrawl API返回数据: {json.dumps(data, ensure_ascii=False)[:500]}...")
+        
+        # 返回结果
+        if data and data.get("success") and data.get("data") and "markdown" in data.get("data", {}):
+            title = url.split("/")[-1].replace("-", " ").title()
+            if "title" in data:
+                title = data.get("title", title)
             
+            return {
+                "url": url,
+                "title": title,
+                "content": data.get("data", {}).get("markdown", "")
+            }
+        else:
+            logger.error(f"Firecrawl API返回数据格式不符合预期: {json.dumps(data, ensure_ascii=False)[:200]}...")
+        return None
+        
     except Exception as e:
         logger.error(f"获取URL内容失败 {url}: {str(e)}")
         return None
@@ -223,17 +223,17 @@ async def weather_tool(location: str, unit: str = "celsius") -> str:
     try:
         # 这里使用示例API，实际应用中应使用真实的天气API
         api_key = os.environ.get("WEATHER_API_KEY", "demo_key")
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://api.example.com/weather",
-                params={
-                    "location": location,
-                    "unit": unit,
-                    "api_key": api_key
-                },
-                timeout=10.0
-            )
-            
+        client = await get_http_pool().get_httpx_client()
+        response = await client.get(
+            f"https://api.example.com/weather",
+            params={
+                "location": location,
+                "unit": unit,
+                "api_key": api_key
+            },
+            timeout=10.0
+        )
+        
         # 在示例中，我们模拟API响应
         # 实际应用中应解析实际API返回的数据
         weather_data = {
@@ -4,3 +4,6 @@ ASR 引擎初始化
 '''
 
 from .asrFactory import ASRFactory
+
+# 导入不依赖外部模型的引擎，确保其被注册
+from .fakeASR import FakeASR
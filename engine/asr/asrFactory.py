@@ -5,6 +5,7 @@ ASR 工厂类实现
 
 from ..builder import ASREngines
 from ..engineBase import BaseEngine
+from ..worker_pool import use_worker_pool, ProcessASREngine
 from typing import List
 from yacs.config import CfgNode as CN
 import logging
@@ -28,6 +29,10 @@ class ASRFactory:
             BaseEngine: ASR 引擎实例
         """
         if config.NAME in ASREngines.list():
+            if use_worker_pool(config):
+                # 模型只在工作进程中加载，当前进程使用代理引擎
+                logger.info(f"[ASRFactory] 创建工作进程池引擎: {config.NAME}, 进程数: {config.WORKERS}")
+                return ProcessASREngine(config)
             logger.info(f"[ASRFactory] 创建引擎: {config.NAME}")
             return ASREngines.get(config.NAME)(config)
         else:
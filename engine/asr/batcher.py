@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+'''
+ASR 微批处理调度器：将短时间窗口内到达的识别请求合并为一次批量推理
+'''
+
+import asyncio
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from engine.executor import InferenceExecutorBusy
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["BatchRequest", "BatchMetrics", "MicroBatcher"]
+
+
+@dataclass
+class BatchRequest:
+    """
+    批处理请求
+    """
+    input: Any                      # 推理输入（音频数组或文件路径）
+    options: Dict[str, Any]         # 推理参数，参数相同的请求才能合并
+    duration: float                 # 音频时长(秒)
+    future: asyncio.Future = None
+    enqueued_at: float = field(default_factory=time.time)
+
+    @property
+    def group(self) -> Hashable:
+        return tuple(sorted(self.options.items()))
+
+
+class BatchMetrics:
+    """
+    批处理指标：批大小和排队延迟
+    """
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.max_batch_size = 0
+        self.total_audio_s = 0.0
+        self.total_queue_delay_ms = 0.0
+        self.max_queue_delay_ms = 0.0
+        self.total_inference_ms = 0.0
+        # 因排队已满被拒绝的请求数
+        self.rejected = 0
+        # 批大小分布: 批大小 -> 次数
+        self.batch_size_histogram: Dict[int, int] = {}
+
+    def record(self, batch: List[BatchRequest], started: float, finished: float):
+        """
+        记录一次批量推理
+        """
+        size = len(batch)
+        self.batches += 1
+        self.requests += size
+        self.max_batch_size = max(self.max_batch_size, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+        self.total_audio_s += sum(request.duration for request in batch)
+        self.total_inference_ms += (finished - started) * 1000
+        for request in batch:
+            delay_ms = (started - request.enqueued_at) * 1000
+            self.total_queue_delay_ms += delay_ms
+            self.max_queue_delay_ms = max(self.max_queue_delay_ms, delay_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取指标快照
+        """
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "batch_size_histogram": dict(sorted(self.batch_size_histogram.items())),
+            "avg_queue_delay_ms": round(self.total_queue_delay_ms / self.requests, 2) if self.requests else 0.0,
+            "max_queue_delay_ms": round(self.max_queue_delay_ms, 2),
+            "avg_inference_ms": round(self.total_inference_ms / self.batches, 2) if self.batches else 0.0,
+            "total_audio_s": round(self.total_audio_s, 2),
+            "rejected": self.rejected,
+        }
+
+
+class MicroBatcher:
+    """
+    微批处理调度器
+
+    第一个请求到达后最多等待max_wait_ms，期间到达的请求合并为一批，
+    批内请求数不超过max_batch_size、音频总时长不超过max_batch_audio_s。
+    批量推理函数在推理执行器中执行，结果按顺序分发给各请求的future。
+    等待凑批的请求数达到max_queue时拒绝新请求（InferenceExecutorBusy），由调用方返回背压错误
+    """
+    def __init__(self,
+                 run_batch: Callable[[List[Any], Dict[str, Any]], List[Any]],
+                 max_wait_ms: float = 20,
+                 max_batch_size: int = 8,
+                 max_batch_audio_s: float = 60,
+                 submit: Optional[Callable[..., Awaitable[Any]]] = None,
+                 name: str = "ASR",
+                 max_queue: Optional[int] = None):
+        """
+        初始化调度器
+
+        参数:
+            run_batch: 同步批量推理函数，参数为(输入列表, 推理参数)，返回与输入等长的结果列表
+            max_wait_ms: 凑批的最长等待时间(毫秒)
+            max_batch_size: 单批最大请求数
+            max_batch_audio_s: 单批最大音频总时长(秒)
+            submit: 在推理执行器中运行阻塞函数的协程函数，签名为submit(func, *args)，
+                    None时使用事件循环默认线程池
+            name: 调度器名称，用于日志
+            max_queue: 等待凑批的请求数上限，None表示不限制
+        """
+        self.run_batch = run_batch
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_audio_s = max_batch_audio_s
+        self.submit_blocking = submit
+        self.name = name
+        self.max_queue = None if max_queue is None else max(0, int(max_queue))
+        self.metrics = BatchMetrics()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 上一批中因超出限制而留到下一批的请求
+        self._pending: Optional[BatchRequest] = None
+
+    def _ensure_worker(self):
+        """
+        确保当前事件循环上有调度任务在运行
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = None
+            self._pending = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, input: Any, options: Dict[str, Any], duration: float) -> Any:
+        """
+        提交一个推理请求并等待结果
+
+        参数:
+            input: 推理输入
+            options: 推理参数
+            duration: 音频时长(秒)
+
+        返回:
+            该请求的推理结果
+
+        异常:
+            InferenceExecutorBusy: 等待凑批的请求数已达上限
+        """
+        self._ensure_worker()
+        if self.max_queue is not None and self.waiting >= self.max_queue:
+            self.metrics.rejected += 1
+            raise InferenceExecutorBusy(f"[{self.name}Batcher] 批处理队列已满({self.waiting})，请稍后重试")
+        request = BatchRequest(input=input, options=options, duration=duration,
+                               future=self._loop.create_future())
+        self._queue.put_nowait(request)
+        return await request.future
+
+    @property
+    def waiting(self) -> int:
+        """
+        等待凑批的请求数
+        """
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + (1 if self._pending is not None else 0)
+
+    async def _collect(self) -> List[BatchRequest]:
+        """
+        收集一批参数相同的请求
+        """
+        first = self._pending or await self._queue.get()
+        self._pending = None
+        batch = [first]
+        total = first.duration
+        deadline = time.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if request.group != first.group or total + request.duration > self.max_batch_audio_s:
+                # 无法并入当前批，留给下一批
+                self._pending = request
+                break
+            batch.append(request)
+            total += request.duration
+        return batch
+
+    async def _run(self):
+        """
+        调度循环
+        """
+        while True:
+            batch = await self._collect()
+            # 调用方已取消的请求不再推理
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+
+            started = time.time()
+            try:
+                inputs = [request.input for request in batch]
+                if self.submit_blocking is not None:
+                    results = await self.submit_blocking(self.run_batch, inputs, batch[0].options)
+                else:
+                    results = await self._loop.run_in_executor(None, self.run_batch, inputs, batch[0].options)
+                if results is None or len(results) != len(batch):
+                    raise RuntimeError(f"批量推理结果数量不匹配: {0 if results is None else len(results)} != {len(batch)}")
+            except Exception as e:
+                logger.error(f"[{self.name}Batcher] 批量推理失败: {str(e)}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+
+            finished = time.time()
+            self.metrics.record(batch, started, finished)
+            logger.debug(f"[{self.name}Batcher] 批大小: {len(batch)}, 推理耗时: {(finished - started) * 1000:.1f}ms")
+            for request, result in zip(batch, results):
+                if not request.future.done():
+                    request.future.set_result(result)
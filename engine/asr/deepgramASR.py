@@ -7,7 +7,7 @@ import asyncio
 import json
 from typing import List, Optional, Union
 from yacs.config import CfgNode as CN
-from ..engineBase import BaseEngine
+from ..asrEngine import ASREngine, ASRStream
 from ..builder import ASREngines
 from utils import AudioMessage, TextMessage
 import logging
@@ -16,7 +16,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 @ASREngines.register()
-class DeepgramAPI(BaseEngine):
+class DeepgramAPI(ASREngine):
     """
     Deepgram ASR API 实现
     """
@@ -134,3 +134,128 @@ class DeepgramAPI(BaseEngine):
         except Exception as e:
             logger.error(f"[DeepgramAPI] 识别失败: {str(e)}")
             return None
+    
+    def create_stream(self, sample_rate: int = 16000, sample_width: int = 2, **kwargs) -> ASRStream:
+        """
+        创建 Deepgram 实时识别会话
+        
+        参数:
+            sample_rate: 输入PCM的采样率
+            sample_width: 输入PCM的采样宽度（字节）
+            **kwargs: 额外识别参数，可包括language、model
+            
+        返回:
+            ASRStream: 流式识别会话
+        """
+        if sample_width != 2:
+            raise ValueError(f"[DeepgramAPI] 实时识别仅支持16bit PCM: {sample_width * 8}bit")
+        return DeepgramLiveStream(self, sample_rate=sample_rate, sample_width=sample_width, **kwargs)
+
+
+class DeepgramLiveStream(ASRStream):
+    """
+    Deepgram 实时识别会话，通过 WebSocket 推送音频并接收中间/最终结果
+    """
+    def __init__(self, engine: DeepgramAPI, **kwargs):
+        super().__init__(engine, **kwargs)
+        self.connection = None
+        self.results: asyncio.Queue = asyncio.Queue()
+        # 已确认的文本（is_final结果），中间结果在此基础上拼接
+        self.final_text = ""
+    
+    async def _connect(self):
+        """
+        建立实时识别连接
+        """
+        from deepgram import LiveOptions, LiveTranscriptionEvents
+        
+        self.connection = self.engine.client.listen.asynclive.v("1")
+        self.connection.on(LiveTranscriptionEvents.Transcript, self._on_transcript)
+        self.connection.on(LiveTranscriptionEvents.Error, self._on_error)
+        
+        options = LiveOptions(
+            model=self.kwargs.get("model", self.engine.options["model"]),
+            language=self.kwargs.get("language", self.engine.options["language"]),
+            smart_format=self.engine.options["smart_format"],
+            interim_results=True,
+            encoding="linear16",
+            sample_rate=self.sample_rate,
+            channels=1
+        )
+        await self.connection.start(options)
+        logger.info(f"[DeepgramAPI] 实时识别连接已建立")
+    
+    def _on_transcript(self, client, result, **kwargs):
+        """
+        处理识别结果回调（由SDK同步调用）
+        """
+        try:
+            text = result.channel.alternatives[0].transcript
+        except (AttributeError, IndexError):
+            return
+        if not text:
+            return
+        if result.is_final:
+            # 英文等以空格分词的语言需要补充空格
+            if self.final_text and text[0].isascii():
+                self.final_text += " "
+            self.final_text += text
+            self.results.put_nowait(TextMessage(data=self.final_text, desc="partial"))
+        else:
+            self.results.put_nowait(TextMessage(data=self.final_text + text, desc="partial"))
+    
+    def _on_error(self, client, error=None, **kwargs):
+        """
+        处理错误回调
+        """
+        logger.error(f"[DeepgramAPI] 实时识别错误: {error}")
+    
+    def _drain(self) -> List[TextMessage]:
+        """
+        取出目前已收到的所有结果
+        """
+        messages = []
+        while not self.results.empty():
+            messages.append(self.results.get_nowait())
+        return messages
+    
+    async def feed(self, data: bytes) -> List[TextMessage]:
+        """
+        推送一帧PCM音频，返回目前已收到的中间结果
+        """
+        if self.closed:
+            return []
+        if self.connection is None:
+            await self._connect()
+        await self.connection.send(data)
+        return self._drain()
+    
+    async def finish(self) -> List[TextMessage]:
+        """
+        结束输入，等待服务端返回剩余结果
+        """
+        if self.closed:
+            return []
+        self.closed = True
+        if self.connection is None:
+            return []
+        try:
+            # CloseStream 会让服务端先返回剩余结果再关闭连接
+            await self.connection.finish()
+        except Exception as e:
+            logger.error(f"[DeepgramAPI] 关闭实时识别连接失败: {str(e)}")
+        messages = self._drain()
+        if self.final_text:
+            messages.append(TextMessage(data=self.final_text, desc="final"))
+        return messages
+    
+    async def close(self):
+        """
+        关闭连接，丢弃未返回的结果
+        """
+        if not self.closed and self.connection is not None:
+            try:
+                await self.connection.finish()
+            except Exception:
+                pass
+        self.closed = True
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+'''
+本地模拟 ASR 引擎，不依赖模型和网络，用于测试
+'''
+
+import asyncio
+from typing import List, Optional, Union
+from ..asrEngine import ASREngine, ASRStream
+from ..builder import ASREngines
+from utils import AudioMessage, TextMessage
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["FakeASR"]
+
+@ASREngines.register()
+class FakeASR(ASREngine):
+    """
+    模拟 ASR 引擎，对任意音频返回配置的固定文本
+    """
+    def checkKeys(self) -> List[str]:
+        """
+        检查必要的配置项
+        """
+        return ["NAME"]
+    
+    def setup(self):
+        """
+        读取模拟参数
+        """
+        self.text = self.cfg.get("TEXT", "你好，这是一段测试语音。")
+        # 整段识别的模拟延迟(毫秒)
+        self.latency_ms = self.cfg.get("LATENCY_MS", 0)
+        # 流式识别时每秒音频对应的识别字数
+        self.chars_per_second = self.cfg.get("CHARS_PER_SECOND", 4)
+    
+    async def run(self, input: Union[AudioMessage, List[AudioMessage]], **kwargs) -> Optional[TextMessage]:
+        """
+        返回配置的固定文本
+        
+        参数:
+            input: AudioMessage 或 List[AudioMessage]
+            **kwargs: 忽略
+            
+        返回:
+            TextMessage: 识别结果
+        """
+        if isinstance(input, List):
+            if len(input) == 0:
+                logger.warning(f"[FakeASR] 输入列表为空")
+                return None
+            input = input[0]
+        
+        if not isinstance(input, AudioMessage) or len(input.data) == 0:
+            logger.warning(f"[FakeASR] 音频数据为空")
+            return None
+        
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        return TextMessage(data=self.text)
+    
+    def create_stream(self, sample_rate: int = 16000, sample_width: int = 2, **kwargs) -> ASRStream:
+        """
+        创建模拟流式识别会话
+        """
+        return FakeASRStream(self, sample_rate=sample_rate, sample_width=sample_width, **kwargs)
+
+
+class FakeASRStream(ASRStream):
+    """
+    模拟流式识别会话，中间结果的长度随输入音频时长增长
+    """
+    def __init__(self, engine: FakeASR, **kwargs):
+        super().__init__(engine, **kwargs)
+        self.received_bytes = 0
+        self.emitted_chars = 0
+    
+    async def feed(self, data: bytes) -> List[TextMessage]:
+        """
+        输入一帧PCM音频，识别文本按音频时长逐步增长
+        """
+        if self.closed:
+            return []
+        self.received_bytes += len(data)
+        seconds = self.received_bytes / (self.sample_rate * self.sample_width)
+        chars = min(len(self.engine.text), int(seconds * self.engine.chars_per_second))
+        if chars > self.emitted_chars:
+            self.emitted_chars = chars
+            return [TextMessage(data=self.engine.text[:chars], desc="partial")]
+        return []
+    
+    async def finish(self) -> List[TextMessage]:
+        """
+        结束输入，返回完整文本
+        """
+        if self.closed:
+            return []
+        self.closed = True
+        if self.received_bytes == 0:
+            return []
+        return [TextMessage(data=self.engine.text, desc="final")]
@@ -6,20 +6,25 @@ FunASR 本地模型 ASR 引擎实现
 import asyncio
 from typing import List, Optional, Union
 from yacs.config import CfgNode as CN
-from ..engineBase import BaseEngine
+from ..asrEngine import ASREngine, ASRStream
 from ..builder import ASREngines
+from .batcher import MicroBatcher
+from ..executor import CPUBoundEngine, InferenceExecutorBusy
 from utils import AudioMessage, TextMessage, AudioFormatType
+from utils.audio import decode_wav, convert_channels, resample
+from utils.pcm import PcmBuffer, PcmRingBuffer
 import logging
 import os
 import tempfile
+import numpy as np
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 @ASREngines.register()
-class FunASRLocal(BaseEngine):
+class FunASRLocal(CPUBoundEngine, ASREngine):
     """
-    FunASR 本地模型 ASR 引擎实现
+    FunASR 本地模型 ASR 引擎实现，推理在独立的推理执行器中运行
     """
     def checkKeys(self) -> List[str]:
         """
@@ -77,6 +82,38 @@ class FunASRLocal(BaseEngine):
             # 初始化缓存
             self.cache = {}
             
+            # 微批处理：合并短时间窗口内的并发请求为一次批量推理
+            self.batcher = None
+            if self.cfg.get("BATCH_ENABLED", True):
+                max_batch_size = self.cfg.get("BATCH_MAX_SIZE", 8)
+                # 默认按推理执行器的容量（执行中和排队的批数）限制等待凑批的请求数
+                executor = self.inference_executor
+                default_max_queue = (executor.max_workers + executor.max_queue) * max_batch_size
+                self.batcher = MicroBatcher(
+                    self._recognize_batch,
+                    max_wait_ms=self.cfg.get("BATCH_MAX_WAIT_MS", 20),
+                    max_batch_size=max_batch_size,
+                    max_batch_audio_s=self.cfg.get("BATCH_MAX_AUDIO_S", 60),
+                    submit=self.run_blocking,
+                    name="FunASRLocal",
+                    max_queue=self.cfg.get("BATCH_MAX_QUEUE", default_max_queue),
+                )
+            
+            # 加载流式识别模型（可选），例如 paraformer-zh-streaming
+            self.streaming_model = None
+            self.streaming_options = {
+                "chunk_size": list(self.cfg.get("CHUNK_SIZE", [0, 10, 5])),
+                "encoder_chunk_look_back": self.cfg.get("ENCODER_CHUNK_LOOK_BACK", 4),
+                "decoder_chunk_look_back": self.cfg.get("DECODER_CHUNK_LOOK_BACK", 1),
+            }
+            streaming_model_path = self.cfg.get("STREAMING_MODEL_PATH", "")
+            if streaming_model_path:
+                self.streaming_model = AutoModel(
+                    model=streaming_model_path,
+                    device=self.options["device"],
+                )
+                logger.info(f"[FunASRLocal] 已加载流式识别模型: {streaming_model_path}")
+            
             logger.info(f"[FunASRLocal] 模型加载成功: {model_path}")
             
         except ImportError as e:
@@ -129,27 +166,33 @@ class FunASRLocal(BaseEngine):
             # 设置合并长度
             options["merge_length_s"] = kwargs.get("merge_length_s", self.options["merge_length_s"])
             
-            # 准备音频数据
-            audio_data = input.data
-            
-            # 将音频数据写入临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=self._get_suffix(input.format)) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
+            # 准备音频数据：WAV直接解码为16kHz单声道数组，其他格式交给FunASR按文件读取
+            temp_file_path = None
+            if input.format == AudioFormatType.WAV and input.data[0:4] == b'RIFF':
+                samples, rate = decode_wav(input.data)
+                speech = resample(convert_channels(samples, 1), rate, 16000)[:, 0]
+                duration = len(speech) / 16000
+            else:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=self._get_suffix(input.format)) as temp_file:
+                    temp_file.write(input.data)
+                    temp_file_path = temp_file.name
+                speech = temp_file_path
+                # 压缩格式无法直接得到时长，按约128kbps估算，仅用于限制批内音频总时长
+                duration = len(input.data) / 16000
             
             try:
                 logger.info(f"[FunASRLocal] 开始识别: {options}")
                 
                 # 调用FunASR模型进行识别
-                result = await self._run_recognition(temp_file_path, options)
-                
-                # 删除临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+                if self.batcher is not None:
+                    item = await self.batcher.submit(speech, options, duration)
+                else:
+                    result = await self._run_recognition(speech, options)
+                    item = result[0] if result else None
                 
                 # 处理结果
-                if result and result[0] and "text" in result[0]:
-                    text = result[0]["text"]
+                if item and "text" in item:
+                    text = item["text"]
                     logger.info(f"[FunASRLocal] 识别成功: {text[:50]}...")
                     
                     # 使用工具函数处理结果
@@ -162,29 +205,51 @@ class FunASRLocal(BaseEngine):
                     return None
             finally:
                 # 确保临时文件被删除
-                if os.path.exists(temp_file_path):
+                if temp_file_path and os.path.exists(temp_file_path):
                     os.unlink(temp_file_path)
                     
+        except InferenceExecutorBusy:
+            # 背压错误交给调用方处理
+            raise
         except Exception as e:
             logger.error(f"[FunASRLocal] 识别失败: {str(e)}")
             return None
     
-    async def _run_recognition(self, audio_path, options):
+    def _recognize_batch(self, inputs: List, options: dict) -> List:
         """
-        在事件循环中运行FunASR识别
+        在推理执行器中运行的同步批量识别函数，返回与输入一一对应的结果
         """
-        # 创建一个异步任务在线程池中运行
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None,
-            self._recognize_audio,
-            audio_path,
-            options
+        result = self.model.generate(
+            input=inputs,
+            cache={},
+            language=options["language"],
+            use_itn=options["use_itn"],
+            batch_size_s=options["batch_size_s"],
+            merge_vad=options["merge_vad"],
+            merge_length_s=options["merge_length_s"],
         )
+        if result is not None and len(result) == len(inputs):
+            return result
+        
+        # 结果无法与输入对应时逐条识别
+        logger.warning(f"[FunASRLocal] 批量识别结果数量不匹配，改为逐条识别")
+        return [(self._recognize_audio(speech, options) or [None])[0] for speech in inputs]
+    
+    def batch_metrics(self) -> dict:
+        """
+        获取微批处理指标（批大小、排队延迟等）
+        """
+        return self.batcher.metrics.snapshot() if self.batcher is not None else {}
+    
+    async def _run_recognition(self, audio_path, options):
+        """
+        在推理执行器中运行FunASR识别
+        """
+        return await self.run_blocking(self._recognize_audio, audio_path, options)
     
     def _recognize_audio(self, audio_path, options):
         """
-        在线程池中运行的同步识别函数
+        在推理执行器中运行的同步识别函数
         """
         try:
             # 执行识别
@@ -216,3 +281,102 @@ class FunASRLocal(BaseEngine):
             return ".webm"
         else:
             return ".wav"  # 默认为WAV格式
+    
+    def create_stream(self, sample_rate: int = 16000, sample_width: int = 2, **kwargs) -> ASRStream:
+        """
+        创建流式识别会话，未配置流式模型时退化为整段识别
+        
+        参数:
+            sample_rate: 输入PCM的采样率
+            sample_width: 输入PCM的采样宽度（字节）
+            **kwargs: 额外识别参数
+            
+        返回:
+            ASRStream: 流式识别会话
+        """
+        if self.streaming_model is None:
+            return super().create_stream(sample_rate=sample_rate, sample_width=sample_width, **kwargs)
+        if sample_rate != 16000 or sample_width != 2:
+            raise ValueError(f"[FunASRLocal] 流式识别仅支持16kHz/16bit PCM: {sample_rate}Hz/{sample_width * 8}bit")
+        return FunASRStream(self, sample_rate=sample_rate, sample_width=sample_width, **kwargs)
+
+
+class FunASRStream(ASRStream):
+    """
+    FunASR 流式识别会话，使用流式模型的cache逐块增量识别
+    """
+    def __init__(self, engine: FunASRLocal, **kwargs):
+        super().__init__(engine, **kwargs)
+        # 每个会话独立的模型缓存
+        self.cache = {}
+        self.text = ""
+        # chunk_size[1]个单位，每个单位60ms（960个采样点）
+        self.chunk_samples = engine.streaming_options["chunk_size"][1] * 960
+        # 预分配的环形缓冲区，凑满一个识别块即取出，不再反复拷贝和移动bytearray
+        self.buffer = PcmRingBuffer(self.chunk_samples * 2, self.sample_rate)
+    
+    async def feed(self, data: bytes) -> List[TextMessage]:
+        """
+        输入一帧PCM音频，凑满一个识别块即进行增量识别
+        """
+        if self.closed:
+            return []
+        frames = PcmBuffer.from_bytes(data, self.sample_rate)
+        
+        updated = False
+        offset = 0
+        while offset < len(frames):
+            count = min(self.buffer.free, len(frames) - offset)
+            self.buffer.write(frames[offset:offset + count])
+            offset += count
+            while len(self.buffer) >= self.chunk_samples:
+                chunk = self.buffer.read(self.chunk_samples).as_float32()
+                updated = await self._recognize_chunk(chunk, is_final=False) or updated
+        
+        if updated:
+            return [TextMessage(data=self.text, desc="partial")]
+        return []
+    
+    async def finish(self) -> List[TextMessage]:
+        """
+        结束输入，识别剩余音频并返回最终结果
+        """
+        if self.closed:
+            return []
+        chunk = self.buffer.read().as_float32()
+        await self._recognize_chunk(chunk, is_final=True)
+        self.closed = True
+        
+        if not self.text:
+            return []
+        from funasr.utils.postprocess_utils import rich_transcription_postprocess
+        return [TextMessage(data=rich_transcription_postprocess(self.text), desc="final")]
+    
+    async def _recognize_chunk(self, chunk: PcmBuffer, is_final: bool) -> bool:
+        """
+        识别一个float32音频块，返回识别文本是否有更新
+        """
+        speech = chunk.samples.reshape(-1)
+        result = await self.engine.run_blocking(self._generate, speech, is_final)
+        if result and result[0] and result[0].get("text"):
+            self.text += result[0]["text"]
+            return True
+        return False
+    
+    def _generate(self, speech: np.ndarray, is_final: bool):
+        """
+        在推理执行器中运行的同步增量识别函数
+        """
+        try:
+            options = self.engine.streaming_options
+            return self.engine.streaming_model.generate(
+                input=speech,
+                cache=self.cache,
+                is_final=is_final,
+                chunk_size=options["chunk_size"],
+                encoder_chunk_look_back=options["encoder_chunk_look_back"],
+                decoder_chunk_look_back=options["decoder_chunk_look_back"],
+            )
+        except Exception as e:
+            logger.error(f"[FunASRLocal] 流式识别执行错误: {str(e)}")
+            return None
@@ -5,12 +5,83 @@
 
 from typing import List, Optional, Union
 from .engineBase import BaseEngine
-from utils.protocol import AudioMessage, TextMessage
+from utils.protocol import AudioMessage, TextMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
 import logging
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+class ASRStream:
+    """
+    流式语音识别会话
+
+    调用方持续通过feed输入PCM音频帧，识别结果以TextMessage返回:
+        desc为"partial"的是中间结果（当前语句的完整识别文本，后续可能修正）
+        desc为"final"的是最终结果
+    默认实现缓存全部音频，在finish时调用引擎的run进行整段识别，
+    支持增量识别的引擎应提供自己的ASRStream子类
+    """
+    def __init__(self, engine: "ASREngine", sample_rate: int = 16000, sample_width: int = 2, **kwargs):
+        """
+        初始化流式识别会话
+        
+        参数:
+            engine: 所属的ASR引擎
+            sample_rate: 输入PCM的采样率
+            sample_width: 输入PCM的采样宽度（字节）
+            **kwargs: 传递给引擎的识别参数
+        """
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.kwargs = kwargs
+        self.buffer = bytearray()
+        self.closed = False
+    
+    async def feed(self, data: bytes) -> List[TextMessage]:
+        """
+        输入一帧PCM音频
+        
+        参数:
+            data: 原始PCM音频数据（小端序、单声道）
+            
+        返回:
+            本次产生的识别结果列表（可能为空）
+        """
+        self.buffer.extend(data)
+        return []
+    
+    async def finish(self) -> List[TextMessage]:
+        """
+        结束输入，返回剩余的识别结果
+        
+        返回:
+            识别结果列表，最后一项为最终结果
+        """
+        if self.closed or not self.buffer:
+            return []
+        self.closed = True
+        
+        audio = AudioMessage(
+            data=pcm_to_wav(bytes(self.buffer), self.sample_rate, self.sample_width),
+            format=AudioFormatType.WAV,
+            sampleRate=self.sample_rate,
+            sampleWidth=self.sample_width
+        )
+        self.buffer.clear()
+        result = await self.engine.run(audio, **self.kwargs)
+        if not result or not result.data:
+            return []
+        return [TextMessage(data=result.data, desc="final")]
+    
+    async def close(self):
+        """
+        释放会话资源，不再返回结果
+        """
+        self.closed = True
+        self.buffer.clear()
+
 class ASREngine(BaseEngine):
     """
     语音识别引擎基类
@@ -30,3 +101,17 @@ class ASREngine(BaseEngine):
             TextMessage: 识别结果文本
         """
         raise NotImplementedError("子类必须实现run方法")
+
+    def create_stream(self, sample_rate: int = 16000, sample_width: int = 2, **kwargs) -> ASRStream:
+        """
+        创建流式识别会话
+        
+        参数:
+            sample_rate: 输入PCM的采样率
+            sample_width: 输入PCM的采样宽度（字节）
+            **kwargs: 与run相同的额外参数
+            
+        返回:
+            ASRStream: 流式识别会话
+        """
+        return ASRStream(self, sample_rate=sample_rate, sample_width=sample_width, **kwargs)
@@ -7,6 +7,7 @@ from typing import List, Optional, Union
 from yacs.config import CfgNode as CN
 from abc import ABCMeta, abstractmethod
 from utils import BaseMessage
+from utils.metrics import timed_run
 import logging
 
 # 配置日志
@@ -16,6 +17,15 @@ class BaseEngine(metaclass=ABCMeta):
     """
     所有引擎的基类
     """
+    def __init_subclass__(cls, **kwargs):
+        """
+        子类实现的run方法统一包装计时，记录到engine_run_seconds指标
+        """
+        super().__init_subclass__(**kwargs)
+        run = cls.__dict__.get("run")
+        if run is not None and not getattr(run, "__isabstractmethod__", False):
+            cls.run = timed_run(run)
+
     def __init__(self, config: CN):
         self.cfg = config
         # 检查必要的配置项
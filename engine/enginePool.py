@@ -5,11 +5,17 @@
 
 import logging
 import os
+import time
+import asyncio
 from enum import Enum
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from yacs.config import CfgNode as CN
 from utils import config
+from utils.protocol import AudioMessage, TextMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+from utils.http_client import get_http_pool
 from .engineBase import BaseEngine
+from .executor import executor_stats
 from .asr import ASRFactory
 from .llm import LLMFactory
 from .tts import TTSFactory
@@ -38,6 +44,10 @@ class EnginePool:
             EngineType.TTS: {}
         }
         self.config_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configs/engines")
+        # 引擎预热状态: (引擎类型, 引擎名称) -> 状态字典
+        self.status: Dict[Tuple[EngineType, str], Dict[str, Any]] = {}
+        self.warmup_started: Optional[float] = None
+        self.warmup_finished: Optional[float] = None
         
     def getEngine(self, engine_type: EngineType, engine_name: str) -> Optional[BaseEngine]:
         """
@@ -87,6 +97,148 @@ class EnginePool:
             logger.error(f"获取引擎异常: {engine_type} - {engine_name}, 错误: {e}")
             return None
     
+    def registerEngine(self, engine_type: EngineType, engine_name: str, engine: BaseEngine):
+        """
+        注册已创建的引擎实例，使其参与预热和统一关闭
+        
+        参数:
+            engine_type: 引擎类型
+            engine_name: 引擎名称
+            engine: 引擎实例
+        """
+        self.engines[engine_type][engine_name] = engine
+        self.status.setdefault((engine_type, engine_name), {"state": "loaded"})
+    
+    async def warmup(self, preload: Optional[List[str]] = None, inference: bool = True, timeout: float = 120):
+        """
+        预热引擎：并发加载preload中列出的引擎，并对所有引擎执行一次短小的合成推理
+        
+        参数:
+            preload: 需要预加载的引擎列表，格式为"类型/名称"，如"tts/kokoro"
+            inference: 是否执行合成推理，为False时只加载引擎
+            timeout: 单个引擎预热超时(秒)
+        """
+        self.warmup_started = time.time()
+        self.warmup_finished = None
+        
+        targets = [(engine_type, engine_name)
+                   for engine_type in self.engines for engine_name in self.engines[engine_type]]
+        for spec in preload or []:
+            try:
+                type_name, engine_name = spec.split("/", 1)
+                target = (EngineType(type_name.lower()), engine_name)
+            except ValueError:
+                logger.error(f"无效的预加载引擎: {spec}，格式应为 类型/名称")
+                continue
+            if target not in targets:
+                targets.append(target)
+        
+        logger.info(f"开始预热 {len(targets)} 个引擎")
+        await asyncio.gather(*[self._warmupOne(engine_type, engine_name, inference, timeout)
+                               for engine_type, engine_name in targets])
+        self.warmup_finished = time.time()
+        logger.info(f"引擎预热完成，耗时 {self.warmup_finished - self.warmup_started:.2f} 秒, "
+                    f"{'全部就绪' if self.isReady() else '部分引擎失败'}")
+    
+    async def _warmupOne(self, engine_type: EngineType, engine_name: str, inference: bool, timeout: float):
+        """
+        加载并预热单个引擎，结果记录在status中
+        """
+        status = self.status.setdefault((engine_type, engine_name), {})
+        start = time.time()
+        try:
+            engine = self.engines[engine_type].get(engine_name)
+            if engine is None:
+                # 加载模型属于阻塞操作，放到线程中以便多个引擎并发加载
+                status["state"] = "loading"
+                loop = asyncio.get_running_loop()
+                engine = await loop.run_in_executor(None, self.getEngine, engine_type, engine_name)
+                if engine is None:
+                    raise RuntimeError("引擎创建失败")
+            status["load_ms"] = round((time.time() - start) * 1000, 1)
+            
+            if inference:
+                status["state"] = "warming"
+                warm_start = time.time()
+                await asyncio.wait_for(self._runWarmup(engine_type, engine), timeout)
+                status["warmup_ms"] = round((time.time() - warm_start) * 1000, 1)
+            
+            status["state"] = "ready"
+            status.pop("error", None)
+            logger.info(f"引擎预热完成: {engine_type} - {engine_name}, 状态: {status}")
+        except Exception as e:
+            status["state"] = "failed"
+            status["error"] = str(e) or e.__class__.__name__
+            logger.error(f"引擎预热失败: {engine_type} - {engine_name}, 错误: {status['error']}")
+    
+    async def _runWarmup(self, engine_type: EngineType, engine: Any):
+        """
+        对引擎执行一次合成推理；引擎实现了warmup方法时优先调用
+        """
+        if hasattr(engine, "warmup"):
+            await engine.warmup()
+            return
+        
+        # 延迟初始化的引擎（如Kokoro）先完成初始化
+        if hasattr(engine, "initialize"):
+            await engine.initialize()
+        
+        if engine_type == EngineType.ASR:
+            # 0.5秒静音
+            silence = pcm_to_wav(b"\x00" * 16000)
+            await engine.run(AudioMessage(data=silence, format=AudioFormatType.WAV, sampleRate=16000, sampleWidth=2))
+        elif engine_type == EngineType.TTS:
+            message = TextMessage(data="你好")
+            if hasattr(engine, "run"):
+                await engine.run(message, use_cache=False)
+            elif hasattr(engine, "synthesize"):
+                await engine.synthesize(message, use_cache=False)
+        elif engine_type == EngineType.LLM:
+            # 云端LLM按量计费，只预先建立连接池
+            await get_http_pool().get_session()
+    
+    def isWarming(self) -> bool:
+        """
+        是否正在预热
+        """
+        return self.warmup_started is not None and self.warmup_finished is None
+    
+    def isReady(self) -> bool:
+        """
+        预热已结束且没有失败的引擎；未执行预热时引擎按需加载，视为就绪
+        """
+        return not self.isWarming() and all(status.get("state") != "failed" for status in self.status.values())
+    
+    def readiness(self) -> Dict[str, Any]:
+        """
+        获取预热状态报告（含引擎的批处理指标、工作进程和推理执行器状态），用于健康检查
+        
+        返回:
+            包含ready、warmup_ms和各引擎状态的字典
+        """
+        warmup_ms = None
+        if self.warmup_started is not None:
+            end = self.warmup_finished or time.time()
+            warmup_ms = round((end - self.warmup_started) * 1000, 1)
+        engines = {}
+        for (engine_type, engine_name), status in self.status.items():
+            report = dict(status)
+            # 支持微批处理的引擎附带批处理指标
+            engine = self.engines[engine_type].get(engine_name)
+            if engine is not None and hasattr(engine, "batch_metrics"):
+                report["batching"] = engine.batch_metrics()
+            # 运行在工作进程池中的引擎附带工作进程状态
+            if engine is not None and hasattr(engine, "worker_stats"):
+                report["workers"] = engine.worker_stats()
+            engines[f"{engine_type}/{engine_name}"] = report
+        return {
+            "ready": self.isReady(),
+            "warming": self.isWarming(),
+            "warmup_ms": warmup_ms,
+            "engines": engines,
+            "executors": executor_stats(),
+        }
+    
     def listEngines(self, engine_type: EngineType) -> Dict[str, BaseEngine]:
         """
         列出指定类型的所有引擎
@@ -101,7 +253,7 @@ class EnginePool:
     
     async def closeAll(self):
         """
-        关闭所有引擎
+        关闭所有引擎，并关闭共享HTTP连接池
         """
         for engine_type in self.engines:
             for engine_name, engine in self.engines[engine_type].items():
@@ -111,3 +263,8 @@ class EnginePool:
                     logger.info(f"关闭引擎: {engine_type} - {engine_name}")
                 except Exception as e:
                     logger.error(f"关闭引擎异常: {engine_type} - {engine_name}, 错误: {e}")
+        
+        try:
+            await get_http_pool().close()
+        except Exception as e:
+            logger.error(f"关闭HTTP连接池异常: {e}")
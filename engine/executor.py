@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+'''
+推理执行器：为本地模型提供独立、有界的线程池
+
+- 每个引擎使用独立的执行器，互不争抢默认线程池
+- 可限制torch线程数，避免多个模型同时推理时CPU过度订阅（对整个进程生效）
+- 需要进程隔离时使用引擎工作进程池（engine.worker_pool）
+- 排队数超过上限时立即拒绝（InferenceExecutorBusy），由调用方返回背压错误
+- 引擎继承CPUBoundEngine声明为CPU密集型，阻塞操作统一经run_blocking在执行器中运行
+'''
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "InferenceExecutorBusy",
+    "InferenceExecutor",
+    "CPUBoundEngine",
+    "configure_executors",
+    "get_inference_executor",
+    "executor_stats",
+    "shutdown_executors",
+]
+
+# 默认执行器参数
+DEFAULT_EXECUTOR_OPTIONS = {
+    "max_workers": 1,       # 工作线程数
+    "max_queue": 16,        # 等待执行的任务上限，超出后拒绝新任务
+    "torch_threads": 0,     # torch线程数，0表示不设置；torch的线程数是进程级设置，对进程内所有模型生效
+}
+
+
+class InferenceExecutorBusy(RuntimeError):
+    """
+    推理执行器排队已满
+    """
+    pass
+
+
+def _init_worker(torch_threads: int):
+    """
+    限制torch线程数
+
+    torch.set_num_threads是进程级设置：在主进程中调用会影响进程内所有模型，
+    多个执行器配置不同的值时以最后创建的为准；引擎工作进程中调用则只影响该工作进程
+    """
+    if torch_threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+
+class InferenceExecutor:
+    """
+    有界推理执行器
+    """
+    def __init__(self, name: str, options: Optional[Dict[str, Any]] = None):
+        """
+        初始化执行器
+
+        参数:
+            name: 执行器名称，通常为引擎名称
+            options: 执行器参数，未提供的项使用DEFAULT_EXECUTOR_OPTIONS
+        """
+        self.name = name
+        self.options = dict(DEFAULT_EXECUTOR_OPTIONS)
+        for key, value in dict(options or {}).items():
+            key = key.lower()
+            if key in DEFAULT_EXECUTOR_OPTIONS:
+                self.options[key] = value
+            else:
+                logger.warning(f"[InferenceExecutor] 未知的执行器参数: {key}")
+
+        self.max_workers = max(1, int(self.options["max_workers"]))
+        self.max_queue = max(0, int(self.options["max_queue"]))
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> Executor:
+        """
+        底层执行器，首次使用时创建
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # 进程级设置，创建执行器时设置一次即可，无需在每个工作线程中重复设置
+                    _init_worker(int(self.options["torch_threads"]))
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"infer-{self.name}",
+                    )
+                    logger.info(f"[InferenceExecutor] 创建执行器 {self.name}: {self.options}")
+        return self._executor
+
+    async def submit(self, func: Callable, *args) -> Any:
+        """
+        在执行器中运行阻塞函数
+
+        参数:
+            func: 阻塞函数
+            *args: 函数参数
+
+        返回:
+            函数返回值
+
+        异常:
+            InferenceExecutorBusy: 正在执行和排队的任务数已达上限
+        """
+        if self.inflight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise InferenceExecutorBusy(f"[{self.name}] 推理队列已满({self.inflight})，请稍后重试")
+
+        self.inflight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.inflight -= 1
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取执行器状态
+        """
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "inflight": self.inflight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """
+        关闭执行器
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+# 执行器配置: 引擎名称 -> 参数；DEFAULT为所有引擎的默认参数
+_executor_config: Dict[str, Dict[str, Any]] = {}
+_executors: Dict[str, InferenceExecutor] = {}
+
+
+def configure_executors(config: Dict[str, Any]):
+    """
+    配置推理执行器，已创建的执行器不受影响
+
+    参数:
+        config: 执行器配置，DEFAULT键为默认参数，其余键为引擎名称
+    """
+    _executor_config.clear()
+    for name, options in dict(config).items():
+        _executor_config[name] = dict(options)
+
+
+def get_inference_executor(name: str) -> InferenceExecutor:
+    """
+    获取指定引擎的推理执行器，不存在时按配置创建
+
+    参数:
+        name: 引擎名称
+
+    返回:
+        推理执行器
+    """
+    executor = _executors.get(name)
+    if executor is None:
+        options = dict(_executor_config.get("DEFAULT", {}))
+        options.update(_executor_config.get(name, {}))
+        executor = _executors.setdefault(name, InferenceExecutor(name, options))
+    return executor
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    获取所有执行器状态
+    """
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors(wait: bool = False):
+    """
+    关闭所有推理执行器
+    """
+    for executor in _executors.values():
+        executor.shutdown(wait=wait)
+    _executors.clear()
+
+
+class CPUBoundEngine:
+    """
+    CPU密集型引擎混入类
+
+    继承该类的引擎声明自己为CPU密集型，模型推理等阻塞操作必须通过run_blocking
+    在该引擎独立的推理执行器中运行，不得直接在事件循环线程上执行
+    """
+    CPU_BOUND = True
+    # 执行器名称，默认为引擎类名；多个引擎可指定相同名称共享执行器
+    EXECUTOR_NAME: Optional[str] = None
+
+    @property
+    def inference_executor(self) -> InferenceExecutor:
+        return get_inference_executor(self.EXECUTOR_NAME or self.__class__.__name__)
+
+    async def run_blocking(self, func: Callable, *args) -> Any:
+        """
+        在推理执行器中运行阻塞函数
+
+        异常:
+            InferenceExecutorBusy: 推理队列已满
+        """
+        return await self.inference_executor.submit(func, *args)
@@ -5,4 +5,7 @@ LLM 引擎模块
 
 from .llmFactory import LLMFactory
 
+# 导入不依赖外部模型的引擎，确保其被注册
+from .fakeLLM import FakeLLM
+
 __all__ = ["LLMFactory"]
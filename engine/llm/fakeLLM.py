@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+'''
+本地模拟 LLM 引擎，不依赖模型和网络，用于测试和基准测试
+'''
+
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional
+from ..llmEngine import LLMEngine
+from ..builder import LLMEngines
+from utils import TextMessage
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["FakeLLM"]
+
+@LLMEngines.register()
+class FakeLLM(LLMEngine):
+    """
+    模拟 LLM 引擎，按配置的首token延迟和生成速率逐段输出固定回复
+    """
+    def checkKeys(self) -> List[str]:
+        """
+        检查必要的配置项
+        """
+        return ["NAME"]
+
+    def setup(self):
+        """
+        读取模拟参数
+        """
+        self.reply = self.cfg.get("REPLY", "你好，我是数字人助手。今天有什么可以帮你的吗？我们可以聊聊天气、新闻或者任何你感兴趣的话题。")
+        # 首个token的模拟延迟(毫秒)
+        self.first_token_ms = self.cfg.get("FIRST_TOKEN_MS", 0)
+        # 每秒生成的token数，0表示不限速
+        self.tokens_per_second = self.cfg.get("TOKENS_PER_SECOND", 0)
+        # 每个token对应的字符数
+        self.chars_per_token = max(1, int(self.cfg.get("CHARS_PER_TOKEN", 2)))
+
+    def _tokens(self) -> List[str]:
+        step = self.chars_per_token
+        return [self.reply[i:i + step] for i in range(0, len(self.reply), step)]
+
+    async def run(self, input: TextMessage, **kwargs) -> Optional[TextMessage]:
+        """
+        等待完整回复的生成时间后返回固定回复
+
+        参数:
+            input: 输入文本消息
+            **kwargs: 忽略
+
+        返回:
+            TextMessage: 回复文本
+        """
+        if not isinstance(input, TextMessage) or not input.data:
+            logger.warning(f"[FakeLLM] 输入文本为空")
+            return None
+        delay = self.first_token_ms / 1000
+        if self.tokens_per_second:
+            delay += (len(self._tokens()) - 1) / self.tokens_per_second
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return TextMessage(data=self.reply)
+
+    async def run_stream(self, input: TextMessage, **kwargs) -> AsyncIterator[str]:
+        """
+        按配置的速率逐token输出固定回复
+
+        参数:
+            input: 输入文本消息
+            **kwargs: 忽略
+
+        返回:
+            异步迭代器，产生回复文本增量
+        """
+        if not isinstance(input, TextMessage) or not input.data:
+            logger.warning(f"[FakeLLM] 输入文本为空")
+            return
+        if self.first_token_ms:
+            await asyncio.sleep(self.first_token_ms / 1000)
+        start_time = time.perf_counter()
+        for i, token in enumerate(self._tokens()):
+            if self.tokens_per_second and i:
+                # 按绝对时间对齐，sleep的误差不随token数累积
+                delay = start_time + i / self.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield token
@@ -4,12 +4,13 @@ MiniMax LLM 引擎实现
 '''
 
 from ..builder import LLMEngines
-from ..engineBase import BaseEngine
+from ..llmEngine import LLMEngine
+import asyncio
 import json
 import os
-import aiohttp
-from typing import List, Optional, Union
+from typing import List, Optional, Union, Dict, Any, Tuple, AsyncIterator
 from utils import TextMessage
+from utils.http_client import get_http_pool
 import logging
 
 # 配置日志
@@ -18,7 +19,7 @@ logger = logging.getLogger(__name__)
 __all__ = ["MinimaxAPI"]
 
 @LLMEngines.register("MinimaxAPI")
-class MinimaxAPI(BaseEngine): 
+class MinimaxAPI(LLMEngine): 
     """
     MiniMax LLM 引擎实现
     """
@@ -33,9 +34,8 @@ class MinimaxAPI(BaseEngine):
     
     def setup(self):
         """
-        设置引擎，初始化 aiohttp 会话
+        设置引擎参数
         """
-        self.session = None
         self.group_id = self.cfg.GROUP_ID
         self.api_key = self.cfg.API_KEY
         self.model = self.cfg.MODEL
@@ -47,21 +47,82 @@ class MinimaxAPI(BaseEngine):
     
     async def ensure_session(self):
         """
-        确保 aiohttp 会话已创建
+        获取共享连接池中的 aiohttp 会话
         
         返回:
             aiohttp 会话
         """
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        return await get_http_pool().get_session()
     
     async def close(self):
         """
-        关闭会话
+        关闭引擎，共享会话由连接池统一关闭
         """
-        if self.session and not self.session.closed:
-            await self.session.close()
+        pass
+    
+    def _build_request(self, input: Union[TextMessage, List[TextMessage]], stream: bool, **kwargs) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        构建请求参数和请求头
+        
+        参数:
+            input: 输入文本消息或消息列表
+            stream: 是否使用流式响应
+            **kwargs: 其他参数
+            
+        返回:
+            (请求参数, 请求头)元组
+        """
+        # 处理系统提示词
+        system_prompt = kwargs.get("system_prompt", "你是一个友好的AI数字人助手,名叫小智。请用自然、温暖、亲切的语气回答问题。")
+        
+        # 处理输入消息
+        if isinstance(input, list):
+            messages = [
+                {
+                    "role": "user" if inp.desc == "user" else "assistant",
+                    "content": inp.data
+                }
+                for inp in input
+            ]
+        else:
+            messages = [
+                {
+                    "role": "user",
+                    "content": input.data
+                }
+            ]
+        
+        # 设置请求参数
+        temperature = kwargs.get("temperature", 0.7)
+        max_tokens = kwargs.get("max_tokens", 800)
+        top_p = kwargs.get("top_p", 0.9)
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_tokens": max_tokens,
+            "stream": stream,
+            "reply_constraints": {
+                "sender_type": "BOT",
+                "sender_name": "小智"
+            },
+            "bot_setting": [
+                {
+                    "bot_name": "小智",
+                    "content": system_prompt
+                }
+            ]
+        }
+        
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+            "X-Minimax-Group-Id": self.group_id
+        }
+        
+        return payload, headers
     
     async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[TextMessage]:
         """
@@ -76,56 +137,7 @@ class MinimaxAPI(BaseEngine):
         """
         try:
             session = await self.ensure_session()
-            
-            # 处理系统提示词
-            system_prompt = kwargs.get("system_prompt", "你是一个友好的AI数字人助手,名叫小智。请用自然、温暖、亲切的语气回答问题。")
-            
-            # 处理输入消息
-            if isinstance(input, list):
-                messages = [
-                    {
-                        "role": "user" if inp.desc == "user" else "assistant",
-                        "content": inp.data
-                    }
-                    for inp in input
-                ]
-            else:
-                messages = [
-                    {
-                        "role": "user",
-                        "content": input.data
-                    }
-                ]
-            
-            # 设置请求参数
-            temperature = kwargs.get("temperature", 0.7)
-            max_tokens = kwargs.get("max_tokens", 800)
-            top_p = kwargs.get("top_p", 0.9)
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature,
-                "top_p": top_p,
-                "max_tokens": max_tokens,
-                "stream": False,
-                "reply_constraints": {
-                    "sender_type": "BOT",
-                    "sender_name": "小智"
-                },
-                "bot_setting": [
-                    {
-                        "bot_name": "小智",
-                        "content": system_prompt
-                    }
-                ]
-            }
-            
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}",
-                "X-Minimax-Group-Id": self.group_id
-            }
+            payload, headers = self._build_request(input, stream=False, **kwargs)
             
             logger.debug(f"[LLM] 发送 MiniMax LLM 请求: {json.dumps(payload, ensure_ascii=False)}")
             
@@ -159,3 +171,61 @@ class MinimaxAPI(BaseEngine):
         except Exception as e:
             logger.error(f"[LLM] 引擎运行失败: {e}", exc_info=True)
             return None
+    
+    async def run_stream(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> AsyncIterator[str]:
+        """
+        以流式方式运行 LLM 引擎，逐段产生回复文本
+        
+        参数:
+            input: 输入文本消息或消息列表
+            **kwargs: 其他参数
+            
+        返回:
+            异步迭代器，产生回复文本增量
+        """
+        try:
+            session = await self.ensure_session()
+            payload, headers = self._build_request(input, stream=True, **kwargs)
+            
+            logger.debug(f"[LLM] 发送 MiniMax LLM 流式请求: {json.dumps(payload, ensure_ascii=False)}")
+            
+            async with session.post(self.llm_url,
+                                   headers=headers,
+                                   json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise RuntimeError(f"MiniMax LLM 流式请求失败: {response.status} - {error_text}")
+                
+                try:
+                    async for line in response.content:
+                        line = line.decode('utf-8').strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(data)
+                        except Exception as e:
+                            logger.error(f"[LLM] 解析 MiniMax 流响应错误: {e}")
+                            continue
+                    
+                        # 检查响应中的 base_resp 错误信息
+                        if "base_resp" in chunk and chunk["base_resp"].get("status_code", 0) != 0:
+                            error_msg = chunk["base_resp"].get("status_msg", "未知错误")
+                            raise RuntimeError(f"MiniMax LLM API 返回错误: {error_msg}")
+                    
+                        # 只取增量内容，结束帧中的完整message不重复输出
+                        if "choices" in chunk and len(chunk["choices"]) > 0:
+                            delta = chunk["choices"][0].get("delta") or {}
+                            if delta.get("content"):
+                                yield delta["content"]
+                except (asyncio.CancelledError, GeneratorExit):
+                    # 被取消（如用户插话）时直接关闭连接，上游随即停止生成，连接不放回连接池
+                    response.close()
+                    raise
+                            
+        except Exception as e:
+            logger.error(f"[LLM] 引擎流式运行失败: {e}", exc_info=True)
+            # 向上抛出，由调用方发出错误事件而不是当作正常结束
+            raise
@@ -7,17 +7,18 @@ import asyncio
 import json
 import aiohttp
 import logging
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, Tuple, AsyncIterator
 from yacs.config import CfgNode as CN
 from utils.protocol import TextMessage
-from ..engineBase import BaseEngine
+from utils.http_client import get_http_pool
+from ..llmEngine import LLMEngine
 from ..builder import LLMEngines
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 @LLMEngines.register()
-class OpenAILLM(BaseEngine):
+class OpenAILLM(LLMEngine):
     """
     OpenAI LLM 引擎实现
     """
@@ -45,9 +46,9 @@ class OpenAILLM(BaseEngine):
         
         logger.info(f"[OpenAILLM] 引擎初始化完成，模型: {self.model}")
     
-    async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[TextMessage]:
+    def _build_messages(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> List[Dict[str, Any]]:
         """
-        运行 OpenAI LLM 引擎，生成回复
+        构建请求消息列表
         
         参数:
             input: 输入文本消息或消息列表
@@ -55,85 +56,112 @@ class OpenAILLM(BaseEngine):
                 - context: 对话上下文，包含之前的消息
                 
         返回:
-            生成的回复文本消息
+            OpenAI格式的消息列表
         """
-        try:
-            # 构建消息
-            messages = []
-            
-            # 添加系统提示
-            if self.system_prompt:
-                messages.append({
-                    "role": "system",
-                    "content": self.system_prompt
-                })
-            
-            # 添加上下文消息
-            context = kwargs.get("context", [])
-            if context:
-                for msg in context:
-                    if isinstance(msg, dict) and "role" in msg and "content" in msg:
-                        messages.append(msg)
-            
-            # 添加当前输入消息
-            if isinstance(input, list):
-                for msg in input:
-                    messages.append({
-                        "role": "user",
-                        "content": msg.data
-                    })
-            else:
+        messages = []
+        
+        # 添加系统提示
+        if self.system_prompt:
+            messages.append({
+                "role": "system",
+                "content": self.system_prompt
+            })
+        
+        # 添加上下文消息
+        context = kwargs.get("context", [])
+        if context:
+            for msg in context:
+                if isinstance(msg, dict) and "role" in msg and "content" in msg:
+                    messages.append(msg)
+        
+        # 添加当前输入消息
+        if isinstance(input, list):
+            for msg in input:
                 messages.append({
                     "role": "user",
-                    "content": input.data
+                    "content": msg.data
                 })
+        else:
+            messages.append({
+                "role": "user",
+                "content": input.data
+            })
+        
+        return messages
+    
+    def _build_request(self, input: Union[TextMessage, List[TextMessage]], stream: bool, **kwargs) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        构建请求数据和请求头
+        
+        参数:
+            input: 输入文本消息或消息列表
+            stream: 是否使用流式响应
+            **kwargs: 额外参数
             
-            # 构建请求数据
-            data = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": self.temperature,
-                "max_tokens": self.max_tokens,
-                "stream": self.stream
-            }
-            
-            # 设置请求头
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+        返回:
+            (请求数据, 请求头)元组
+        """
+        data = {
+            "model": self.model,
+            "messages": self._build_messages(input, **kwargs),
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            "stream": stream
+        }
+        
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        return data, headers
+    
+    async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[TextMessage]:
+        """
+        运行 OpenAI LLM 引擎，生成回复
+        
+        参数:
+            input: 输入文本消息或消息列表
+            **kwargs: 额外参数
+                - context: 对话上下文，包含之前的消息
+                
+        返回:
+            生成的回复文本消息
+        """
+        if self.stream:
+            # 流式响应（累积所有的消息片段）
+            response_text = ""
+            try:
+                async for delta in self.run_stream(input, **kwargs):
+                    response_text += delta
+            except Exception:
+                # run_stream已记录错误，非流式接口保持失败返回None的约定
+                return None
+            if not response_text:
+                return None
+            return TextMessage(
+                data=response_text,
+                desc="OpenAI生成的回复"
+            )
+        
+        try:
+            data, headers = self._build_request(input, stream=False, **kwargs)
             
             # 发起请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.api_url,
-                    headers=headers,
-                    json=data,
-                    timeout=aiohttp.ClientTimeout(total=self.timeout)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"[OpenAILLM] API请求失败: {response.status}, {error_text}")
-                        return None
-                    
-                    if not self.stream:
-                        # 非流式响应
-                        result = await response.json()
-                        response_text = result["choices"][0]["message"]["content"].strip()
-                    else:
-                        # 流式响应（累积所有的消息片段）
-                        response_text = ""
-                        async for line in response.content:
-                            line = line.decode('utf-8').strip()
-                            if line.startswith("data: ") and line != "data: [DONE]":
-                                try:
-                                    data = json.loads(line[6:])
-                                    if "choices" in data and len(data["choices"]) > 0:
-                                        delta = data["choices"][0].get("delta", {})
-                                        if "content" in delta:
-                                            response_text += delta["content"]
-                                except Exception as e:
-                                    logger.error(f"[OpenAILLM] 解析流响应错误: {str(e)}")
+            session = await get_http_pool().get_session()
+            async with session.post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"[OpenAILLM] API请求失败: {response.status}, {error_text}")
+                    return None
+                
+                result = await response.json()
+                response_text = result["choices"][0]["message"]["content"].strip()
             
             # 创建回复消息
             response_message = TextMessage(
@@ -149,3 +177,61 @@ class OpenAILLM(BaseEngine):
         except Exception as e:
             logger.error(f"[OpenAILLM] 处理出错: {str(e)}")
             return None
+    
+    async def run_stream(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> AsyncIterator[str]:
+        """
+        以流式方式运行 OpenAI LLM 引擎，逐段产生回复文本
+        
+        参数:
+            input: 输入文本消息或消息列表
+            **kwargs: 额外参数
+                - context: 对话上下文，包含之前的消息
+                
+        返回:
+            异步迭代器，产生回复文本增量
+        """
+        try:
+            data, headers = self._build_request(input, stream=True, **kwargs)
+            
+            # 流式响应只限制连接和两次数据之间的间隔，不限制总时长
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+            
+            session = await get_http_pool().get_session()
+            async with session.post(
+                self.api_url,
+                headers=headers,
+                json=data,
+                timeout=timeout
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise RuntimeError(f"API请求失败: {response.status}, {error_text}")
+                
+                try:
+                    async for line in response.content:
+                        line = line.decode('utf-8').strip()
+                        if not line.startswith("data: "):
+                            continue
+                        if line == "data: [DONE]":
+                            break
+                        try:
+                            chunk = json.loads(line[6:])
+                        except Exception as e:
+                            logger.error(f"[OpenAILLM] 解析流响应错误: {str(e)}")
+                            continue
+                        if "choices" in chunk and len(chunk["choices"]) > 0:
+                            delta = chunk["choices"][0].get("delta", {})
+                            if delta.get("content"):
+                                yield delta["content"]
+                except (asyncio.CancelledError, GeneratorExit):
+                    # 被取消（如用户插话）时直接关闭连接，上游随即停止生成，连接不放回连接池
+                    response.close()
+                    raise
+                            
+        except asyncio.TimeoutError:
+            # 向上抛出，由调用方发出错误事件而不是当作正常结束
+            logger.error(f"[OpenAILLM] API流式请求超时")
+            raise
+        except Exception as e:
+            logger.error(f"[OpenAILLM] 流式处理出错: {str(e)}")
+            raise
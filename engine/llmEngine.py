@@ -3,7 +3,7 @@
 大语言模型引擎基类定义
 '''
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator
 from .engineBase import BaseEngine
 from utils.protocol import TextMessage
 import logging
@@ -32,3 +32,20 @@ class LLMEngine(BaseEngine):
             TextMessage: 生成的回复文本
         """
         raise NotImplementedError("子类必须实现run方法")
+
+    async def run_stream(self, input: TextMessage, **kwargs) -> AsyncIterator[str]:
+        """
+        以流式方式执行文本生成，逐段产生回复文本
+        
+        默认实现调用run并一次性返回完整回复，支持流式接口的子类应重写此方法
+        
+        参数:
+            input: 输入文本消息
+            **kwargs: 与run相同的额外参数
+                
+        返回:
+            异步迭代器，产生回复文本增量
+        """
+        response = await self.run(input, **kwargs)
+        if response and response.data:
+            yield response.data
@@ -9,5 +9,6 @@ from .ttsFactory import TTSFactory
 # EdgeTTS 已经直接在文件中注册
 from .edgeTTS import EdgeAPI
 from .register_kokoro import KokoroTTSWrapper
+from .fakeTTS import FakeTTS
 
 __all__ = ["TTSFactory"]
@@ -8,6 +8,7 @@ from ..engineBase import BaseEngine
 from typing import List, Optional, Union
 from yacs.config import CfgNode as CN
 from utils import logger, TextMessage, AudioMessage, AudioFormatType
+from utils.tts_cache import cached_tts
 import logging
 
 # 配置日志
@@ -49,6 +50,7 @@ class DeepgramAPI(BaseEngine):
             logger.error(f"[DeepgramTTS] 设置失败: {str(e)}")
             raise RuntimeError(f"[DeepgramTTS] 设置失败: {str(e)}")
     
+    @cached_tts
     async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[AudioMessage]:
         """
         运行 Deepgram TTS
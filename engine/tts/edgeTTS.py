@@ -10,6 +10,7 @@ from typing import List, Optional, Union
 import logging
 from utils import TextMessage, AudioMessage, AudioFormatType
 from utils.audio import mp3ToWav
+from utils.tts_cache import cached_tts
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -31,6 +32,7 @@ class EdgeAPI(BaseEngine):
         """
         return ["PER", "RATE", "VOL", "PIT"]
     
+    @cached_tts
     async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[AudioMessage]:
         """
         运行 Edge TTS
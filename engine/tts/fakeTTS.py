@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+'''
+本地模拟 TTS 引擎，不依赖模型和网络，用于测试和基准测试
+'''
+
+import asyncio
+from typing import List, Optional, Union
+from ..ttsEngine import TTSEngine
+from ..builder import TTSEngines
+from utils import TextMessage, AudioMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["FakeTTS"]
+
+@TTSEngines.register()
+class FakeTTS(TTSEngine):
+    """
+    模拟 TTS 引擎，返回与文本长度成正比的静音WAV
+
+    合成耗时 = LATENCY_MS + 音频时长 * REALTIME_FACTOR，不经过TTS音频缓存，每次调用都计入耗时
+    """
+    def checkKeys(self) -> List[str]:
+        """
+        检查必要的配置项
+        """
+        return ["NAME"]
+
+    def setup(self):
+        """
+        读取模拟参数
+        """
+        # 每次合成的固定延迟(毫秒)
+        self.latency_ms = self.cfg.get("LATENCY_MS", 0)
+        # 合成耗时与音频时长之比（实时率）
+        self.realtime_factor = self.cfg.get("REALTIME_FACTOR", 0.0)
+        # 每秒音频对应的字数，决定输出音频时长
+        self.chars_per_second = self.cfg.get("CHARS_PER_SECOND", 4)
+        self.sample_rate = self.cfg.get("SAMPLE_RATE", 16000)
+
+    async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[AudioMessage]:
+        """
+        返回静音音频
+
+        参数:
+            input: TextMessage 或 List[TextMessage]
+            **kwargs: 忽略
+
+        返回:
+            AudioMessage: WAV格式的静音音频
+        """
+        if isinstance(input, List):
+            text = "".join(msg.data for msg in input if isinstance(msg, TextMessage))
+        elif isinstance(input, TextMessage):
+            text = input.data
+        else:
+            text = ""
+        if not text:
+            logger.warning(f"[FakeTTS] 文本数据为空")
+            return None
+
+        duration = len(text) / self.chars_per_second
+        delay = self.latency_ms / 1000 + duration * self.realtime_factor
+        if delay > 0:
+            await asyncio.sleep(delay)
+        pcm = bytes(2 * int(duration * self.sample_rate))
+        return AudioMessage(data=pcm_to_wav(pcm, self.sample_rate), format=AudioFormatType.WAV,
+                            sampleRate=self.sample_rate, sampleWidth=2)
@@ -4,22 +4,29 @@ Kokoro TTS引擎模块
 '''
 
 import logging
-import tempfile
 import os
 import torch
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple
-import soundfile as sf
+from typing import Dict, Any, AsyncGenerator, Iterator, List, Optional, Tuple
 from utils.protocol import TextMessage, AudioMessage, AudioFormatType
 from utils.singleton import Singleton
+from utils.tts_cache import cached_tts
+from utils.audio import array_to_pcm
+from utils.audio_utils import pcm_to_wav
+from engine.executor import CPUBoundEngine, InferenceExecutorBusy
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
-class KokoroTTSEngine(metaclass=Singleton):
+# 流式合成时的分段规则：按换行和句末标点切分，每句合成完立即输出
+STREAM_SPLIT_PATTERN = r'\n+|(?<=[。！？；!?;])'
+
+class KokoroTTSEngine(CPUBoundEngine, metaclass=Singleton):
     """
-    Kokoro TTS引擎
+    Kokoro TTS引擎，模型加载和合成都在独立的推理执行器中运行，不阻塞事件循环
     """
+    EXECUTOR_NAME = "kokoro"
+    
     def __init__(self, config: Dict[str, Any] = None):
         """
         初始化Kokoro TTS引擎
@@ -30,7 +37,6 @@ class KokoroTTSEngine(metaclass=Singleton):
         self.config = config or {}
         self.pipeline = None
         self.is_ready = False
-        self.temp_files = []
         self.voices = {
             # 英语声音
             'en_m1': 'ae_soft',   # 英语-男声1
@@ -51,24 +57,27 @@ class KokoroTTSEngine(metaclass=Singleton):
         self.default_voice = self.config.get('default_voice', 'zh_f1')
         self.sample_rate = 24000  # Kokoro默认采样率
         
-    def __del__(self):
+    def _load_models(self):
         """
-        析构函数，清理临时文件
+        在推理执行器中运行的同步模型加载函数
         """
-        self.cleanup()
+        # 导入Kokoro
+        from kokoro import KPipeline
         
-    def cleanup(self):
-        """
-        清理临时文件
-        """
-        for file_path in self.temp_files:
-            if os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    logger.warning(f"清理临时文件失败: {file_path}, 错误: {str(e)}")
-        self.temp_files = []
-
+        # 获取语言设置
+        lang_code = self.config.get('lang_code', 'z')  # 默认中文
+        
+        # 初始化Kokoro Pipeline
+        self.pipeline = KPipeline(lang_code=lang_code)
+        
+        # 加载自定义声音模型（如果配置了）
+        voice_tensor_path = self.config.get('voice_tensor_path')
+        if voice_tensor_path and os.path.exists(voice_tensor_path):
+            logger.info(f"加载自定义声音模型: {voice_tensor_path}")
+            self.custom_voice = torch.load(voice_tensor_path, weights_only=True)
+        else:
+            self.custom_voice = None
+    
     async def initialize(self):
         """
         初始化Kokoro TTS引擎
@@ -79,22 +88,8 @@ class KokoroTTSEngine(metaclass=Singleton):
         try:
             logger.info("正在初始化Kokoro TTS引擎...")
             
-            # 导入Kokoro
-            from kokoro import KPipeline
-            
-            # 获取语言设置
-            lang_code = self.config.get('lang_code', 'z')  # 默认中文
-            
-            # 初始化Kokoro Pipeline
-            self.pipeline = KPipeline(lang_code=lang_code)
-            
-            # 加载自定义声音模型（如果配置了）
-            voice_tensor_path = self.config.get('voice_tensor_path')
-            if voice_tensor_path and os.path.exists(voice_tensor_path):
-                logger.info(f"加载自定义声音模型: {voice_tensor_path}")
-                self.custom_voice = torch.load(voice_tensor_path, weights_only=True)
-            else:
-                self.custom_voice = None
+            # 模型加载耗时较长，在推理执行器中进行
+            await self.run_blocking(self._load_models)
                 
             self.is_ready = True
             logger.info("Kokoro TTS引擎初始化成功")
@@ -108,6 +103,7 @@ class KokoroTTSEngine(metaclass=Singleton):
             logger.error(f"Kokoro TTS引擎初始化失败: {str(e)}")
             return False
             
+    @cached_tts
     async def synthesize(self, text_message: TextMessage, voice_id: str = None) -> Optional[AudioMessage]:
         """
         使用Kokoro进行语音合成
@@ -134,48 +130,12 @@ class KokoroTTSEngine(metaclass=Singleton):
                 
             logger.info(f"开始Kokoro语音合成: {text[:30]}...")
             
-            # 确定使用的声音
-            voice = self.custom_voice
-            if not voice:
-                voice_id = voice_id or self.default_voice
-                if voice_id in self.voices:
-                    voice = self.voices[voice_id]
-                else:
-                    voice = self.default_voice
-                    if voice in self.voices:
-                        voice = self.voices[voice]
-            
-            # 创建临时文件保存合成结果
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp:
-                output_path = temp.name
-                self.temp_files.append(output_path)
-            
-            # 设置合成参数
+            # 生成音频（在推理执行器中运行，不阻塞事件循环）
+            voice = self._resolve_voice(voice_id)
             speed = self.config.get('speed', 1.0)
+            audio_data = await self.run_blocking(self._synthesize_blocking, text, voice, speed)
             
-            # 生成音频
-            audio_segments = []
-            generator = self.pipeline(
-                text, 
-                voice=voice,
-                speed=speed, 
-                split_pattern=r'\n+'
-            )
-            
-            for _, _, audio in generator:
-                audio_segments.append(audio)
-            
-            # 将所有音频段合并
-            if audio_segments:
-                combined_audio = torch.cat(audio_segments, dim=0).numpy()
-                
-                # 保存到临时文件
-                sf.write(output_path, combined_audio, self.sample_rate)
-                
-                # 读取合成的音频文件
-                with open(output_path, 'rb') as f:
-                    audio_data = f.read()
-                
+            if audio_data:
                 # 创建音频消息
                 audio_message = AudioMessage(
                     data=audio_data,
@@ -191,14 +151,112 @@ class KokoroTTSEngine(metaclass=Singleton):
                 logger.warning("Kokoro没有生成任何音频片段")
                 return None
                 
+        except InferenceExecutorBusy:
+            # 背压错误交给调用方处理
+            raise
         except Exception as e:
             logger.error(f"Kokoro语音合成失败: {str(e)}")
             import traceback
             logger.error(traceback.format_exc())
             return None
+    
+    def _resolve_voice(self, voice_id: Optional[str]):
+        """
+        确定使用的声音：优先使用自定义声音张量，其次是voice_id对应的声音
+        """
+        voice = self.custom_voice
+        if not voice:
+            voice_id = voice_id or self.default_voice
+            if voice_id in self.voices:
+                voice = self.voices[voice_id]
+            else:
+                voice = self.default_voice
+                if voice in self.voices:
+                    voice = self.voices[voice]
+        return voice
+    
+    @staticmethod
+    def _segment_to_pcm(audio) -> bytes:
+        """
+        将Kokoro输出的float音频段直接转换为16位PCM
+        """
+        if isinstance(audio, torch.Tensor):
+            return (audio.clamp(-1.0, 1.0) * 32767).to(torch.int16).numpy().tobytes()
+        return array_to_pcm(audio, sample_width=2)
+    
+    def _segments(self, text: str, voice, speed: float, split_pattern: str) -> Iterator[bytes]:
+        """
+        逐段生成16位PCM音频
+        """
+        generator = self.pipeline(text, voice=voice, speed=speed, split_pattern=split_pattern)
+        try:
+            for _, _, audio in generator:
+                if audio is not None and len(audio) > 0:
+                    yield self._segment_to_pcm(audio)
+        finally:
+            generator.close()
+    
+    def _synthesize_blocking(self, text: str, voice, speed: float) -> Optional[bytes]:
+        """
+        在推理执行器中运行的同步合成函数
+        
+        返回:
+            WAV音频数据，没有生成音频时返回None
+        """
+        # 每段生成后立即转为16位PCM，不保留float张量，也不整体拼接张量
+        pcm = b"".join(self._segments(text, voice, speed, r'\n+'))
+        if not pcm:
+            return None
+        return pcm_to_wav(pcm, self.sample_rate, 2)
+    
+    @staticmethod
+    def _next_segment(segments: Iterator[bytes]) -> Optional[bytes]:
+        """
+        在推理执行器中生成下一段音频，结束时返回None
+        """
+        return next(segments, None)
+    
+    async def synthesize_stream(self, text_message: TextMessage, voice_id: str = None,
+                                split_pattern: str = STREAM_SPLIT_PATTERN) -> AsyncGenerator[bytes, None]:
+        """
+        流式语音合成，每合成完一段（默认一句）立即输出
+        
+        参数:
+            text_message: 文本消息
+            voice_id: 语音ID
+            split_pattern: 分段规则（正则表达式）
+            
+        返回:
+            异步生成器，生成16位单声道PCM音频块，采样率为self.sample_rate
+        """
+        if not self.is_ready:
+            success = await self.initialize()
+            if not success:
+                logger.error("Kokoro TTS引擎未就绪")
+                return
+        
+        text = text_message.data
+        if not text:
+            logger.warning("合成文本为空")
+            return
+        
+        logger.info(f"开始Kokoro流式语音合成: {text[:30]}...")
+        voice = self._resolve_voice(voice_id)
+        speed = self.config.get('speed', 1.0)
+        segments = self._segments(text, voice, speed, split_pattern)
+        try:
+            while True:
+                # 每段单独提交到推理执行器，段与段之间不占用执行器
+                pcm = await self.run_blocking(self._next_segment, segments)
+                if pcm is None:
+                    break
+                yield pcm
         finally:
-            # 清理临时文件
-            self.cleanup()
+            # 调用方提前停止迭代时释放Kokoro生成器；正在执行器中生成的段结束后由垃圾回收释放
+            try:
+                segments.close()
+            except ValueError:
+                pass
             
     def get_available_voices(self) -> Dict[str, str]:
         """
@@ -9,7 +9,8 @@ from typing import List, Optional, Union
 from yacs.config import CfgNode as CN
 import logging
 from utils import TextMessage, AudioMessage, AudioFormatType
-import aiohttp
+from utils.http_client import get_http_pool
+from utils.tts_cache import cached_tts
 import json
 import base64
 
@@ -74,6 +75,7 @@ class MiniMaxAPI(BaseEngine):
             logger.error(f"[MiniMaxTTS] 设置失败: {str(e)}")
             raise RuntimeError(f"[MiniMaxTTS] 设置失败: {str(e)}")
     
+    @cached_tts
     async def run(self, input: Union[TextMessage, List[TextMessage]], **kwargs) -> Optional[AudioMessage]:
         """
         运行 MiniMax TTS
@@ -155,46 +157,46 @@ class MiniMaxAPI(BaseEngine):
                 }
             
             # 发送请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, headers=headers, json=payload) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        logger.error(f"[MiniMaxTTS] API 请求失败: {response.status}, {error_text}")
+            session = await get_http_pool().get_session()
+            async with session.post(url, headers=headers, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"[MiniMaxTTS] API 请求失败: {response.status}, {error_text}")
+                    return None
+                
+                result = await response.json()
+                
+                # 检查API返回
+                audio_data = None
+                # 不同版本API返回的音频字段名不同
+                if self.api_version == "T2A_V2":
+                    if "audio_data" in result:
+                        audio_data = base64.b64decode(result["audio_data"])
+                    else:
+                        logger.error(f"[MiniMaxTTS] 响应中没有 audio_data (T2A_V2): {result}")
+                        return None
+                else:  # T2A版本
+                    if "base64_audio" in result:
+                        audio_data = base64.b64decode(result["base64_audio"])
+                    else:
+                        logger.error(f"[MiniMaxTTS] 响应中没有 base64_audio (T2A): {result}")
                         return None
-                    
-                    result = await response.json()
-                    
-                    # 检查API返回
-                    audio_data = None
-                    # 不同版本API返回的音频字段名不同
-                    if self.api_version == "T2A_V2":
-                        if "audio_data" in result:
-                            audio_data = base64.b64decode(result["audio_data"])
-                        else:
-                            logger.error(f"[MiniMaxTTS] 响应中没有 audio_data (T2A_V2): {result}")
-                            return None
-                    else:  # T2A版本
-                        if "base64_audio" in result:
-                            audio_data = base64.b64decode(result["base64_audio"])
-                        else:
-                            logger.error(f"[MiniMaxTTS] 响应中没有 base64_audio (T2A): {result}")
-                            return None
-                    
-                    # 确定采样率
-                    sample_rate = 16000
-                    if self.api_version == "T2A_V2":
-                        sample_rate = options.get("audio_sample_rate", 24000)
-                    
-                    # 创建音频消息 (MiniMax返回的是mp3格式)
-                    message = AudioMessage(
-                        data=audio_data,
-                        desc=text,
-                        format=AudioFormatType.MP3,  # MiniMax返回MP3格式
-                        sampleRate=sample_rate,
-                        sampleWidth=2      # 默认值
-                    )
-                    return message
                 
+                # 确定采样率
+                sample_rate = 16000
+                if self.api_version == "T2A_V2":
+                    sample_rate = options.get("audio_sample_rate", 24000)
+                
+                # 创建音频消息 (MiniMax返回的是mp3格式)
+                message = AudioMessage(
+                    data=audio_data,
+                    desc=text,
+                    format=AudioFormatType.MP3,  # MiniMax返回MP3格式
+                    sampleRate=sample_rate,
+                    sampleWidth=2      # 默认值
+                )
+                return message
+            
         except Exception as e:
             logger.error(f"[MiniMaxTTS] 运行失败: {str(e)}")
             return None
@@ -5,6 +5,7 @@ TTS 工厂类，用于创建不同的 TTS 引擎实例
 
 from ..builder import TTSEngines
 from ..engineBase import BaseEngine
+from ..worker_pool import use_worker_pool, ProcessTTSEngine
 from typing import List
 from yacs.config import CfgNode as CN
 import logging
@@ -30,6 +31,10 @@ class TTSFactory():
             TTS 引擎实例
         """
         if config.NAME in TTSEngines.list():
+            if use_worker_pool(config):
+                # 模型只在工作进程中加载，当前进程使用代理引擎
+                logger.info(f"[TTSFactory] 创建工作进程池引擎: {config.NAME}, 进程数: {config.WORKERS}")
+                return ProcessTTSEngine(config)
             logger.info(f"[TTSFactory] 创建引擎: {config.NAME}")
             return TTSEngines.get(config.NAME)(config)
         else:
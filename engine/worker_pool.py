@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+'''
+引擎工作进程池：本地模型引擎运行在常驻的工作进程中，绕开GIL，吞吐随CPU核数扩展
+
+- 每个工作进程启动时加载一次模型，API进程只持有代理引擎，不加载模型权重
+- API进程与工作进程通过管道通信，音频以16位PCM原始数据传输（不含WAV头、不转码）
+- 请求分发到排队最少的工作进程；工作进程退出时其未完成的请求立即失败，下次调用时自动重启
+- 在ASR/TTS引擎配置中设置WORKERS大于0即启用，由ASRFactory/TTSFactory创建代理引擎
+'''
+
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Union
+from yacs.config import CfgNode as CN
+from utils.protocol import AudioMessage, TextMessage, AudioFormatType
+from utils.audio import parse_wav_header, decode_wav, convert_channels, resample, array_to_pcm
+from utils.audio_utils import pcm_to_wav
+from utils.tts_cache import cached_tts
+from .asrEngine import ASREngine
+from .ttsEngine import TTSEngine
+from .executor import InferenceExecutorBusy, _init_worker
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "EngineWorkerPool",
+    "ProcessASREngine",
+    "ProcessTTSEngine",
+    "use_worker_pool",
+]
+
+# 工作进程中需要导入的引擎模块，导入时完成引擎注册；缺少依赖的模块跳过
+WORKER_ENGINE_MODULES = {
+    "asr": ["engine.asr", "engine.asr.funasrASR"],
+    "tts": ["engine.tts"],
+}
+
+# ASR输入统一转换的采样率
+ASR_SAMPLE_RATE = 16000
+
+
+def use_worker_pool(config: CN) -> bool:
+    """
+    引擎配置是否启用工作进程池
+    """
+    return int(config.get("WORKERS", 0) or 0) > 0
+
+
+# ---------------------------------------------------------------------------
+# 工作进程
+# ---------------------------------------------------------------------------
+
+def _create_engine(engine_type: str, config_yaml: str):
+    """
+    在工作进程中创建引擎实例
+    """
+    import importlib
+    for module in WORKER_ENGINE_MODULES[engine_type]:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"[EngineWorker] 导入引擎模块失败: {module}, {e}")
+
+    config = CN.load_cfg(config_yaml)
+    # 工作进程内直接运行引擎，不再创建下一级进程池
+    config.WORKERS = 0
+    if engine_type == "asr":
+        from .asr import ASRFactory
+        return ASRFactory.create(config)
+    from .tts import TTSFactory
+    return TTSFactory.create(config)
+
+
+def _audio_to_message(item: Dict[str, Any]) -> AudioMessage:
+    """
+    将管道传输的音频还原为AudioMessage
+    """
+    if "pcm" in item:
+        return AudioMessage(
+            data=pcm_to_wav(item["pcm"], item["sample_rate"], item["sample_width"], item.get("channels", 1)),
+            format=AudioFormatType.WAV,
+            sampleRate=item["sample_rate"],
+            sampleWidth=item["sample_width"]
+        )
+    return AudioMessage(
+        data=item["data"],
+        format=AudioFormatType(item["format"]),
+        sampleRate=item["sample_rate"],
+        sampleWidth=item["sample_width"]
+    )
+
+
+def _message_to_audio(message: AudioMessage) -> Dict[str, Any]:
+    """
+    将AudioMessage转换为管道传输格式：16位PCM的WAV只传输PCM数据，其他格式原样传输
+    """
+    if message.format == AudioFormatType.WAV:
+        try:
+            info = parse_wav_header(message.data)
+        except ValueError:
+            info = None
+        if info is not None and info["format_tag"] != 3 and info["sample_width"] == 2:
+            start = info["data_offset"]
+            return {
+                "pcm": bytes(message.data[start:start + info["data_size"]]),
+                "sample_rate": info["sample_rate"],
+                "sample_width": 2,
+                "channels": info["channels"],
+            }
+    return {
+        "data": message.data,
+        "format": message.format.value,
+        "sample_rate": message.sampleRate,
+        "sample_width": message.sampleWidth,
+    }
+
+
+async def _handle_asr(engine, payload: Dict[str, Any]) -> Optional[str]:
+    """
+    工作进程中执行语音识别，返回识别文本
+    """
+    messages = [_audio_to_message(item) for item in payload["audio"]]
+    input = messages if len(messages) > 1 else messages[0]
+    result = await engine.run(input, **payload["kwargs"])
+    return result.data if result else None
+
+
+async def _handle_tts(engine, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    工作进程中执行语音合成，返回管道传输格式的音频
+    """
+    message = TextMessage(data=payload["text"])
+    # 缓存由API进程中的代理引擎负责
+    kwargs = dict(payload["kwargs"], use_cache=False)
+    if hasattr(engine, "synthesize"):
+        result = await engine.synthesize(message, **kwargs)
+    else:
+        result = await engine.run(message, **kwargs)
+    return _message_to_audio(result) if result else None
+
+
+_WORKER_HANDLERS = {
+    "asr": _handle_asr,
+    "tts": _handle_tts,
+}
+
+
+def _receive_loop(conn, requests: "queue.Queue"):
+    """
+    工作进程的接收线程：持续读取管道，避免API进程发送大块音频时阻塞
+    """
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            message = None
+        requests.put(message)
+        if message is None:
+            return
+
+
+def _worker_main(conn, engine_type: str, config_yaml: str, torch_threads: int):
+    """
+    工作进程入口：加载一次模型后循环处理请求
+
+    管道消息格式:
+        请求: (request_id, payload)，None表示退出
+        响应: (request_id, ok, result)，request_id为0的响应表示模型加载结果
+    """
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    _init_worker(torch_threads)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        engine = _create_engine(engine_type, config_yaml)
+        if hasattr(engine, "initialize"):
+            loop.run_until_complete(engine.initialize())
+    except Exception as e:
+        logger.error(f"[EngineWorker] 引擎加载失败: {str(e)}")
+        conn.send((0, False, f"{type(e).__name__}: {e}"))
+        conn.close()
+        return
+    conn.send((0, True, os.getpid()))
+
+    handler = _WORKER_HANDLERS[engine_type]
+    requests: "queue.Queue" = queue.Queue()
+    threading.Thread(target=_receive_loop, args=(conn, requests), daemon=True).start()
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        request_id, payload = message
+        try:
+            result = loop.run_until_complete(handler(engine, payload))
+            conn.send((request_id, True, result))
+        except Exception as e:
+            logger.error(f"[EngineWorker] 请求处理失败: {str(e)}")
+            conn.send((request_id, False, f"{type(e).__name__}: {e}"))
+    conn.close()
+    loop.close()
+
+
+# ---------------------------------------------------------------------------
+# API进程
+# ---------------------------------------------------------------------------
+
+class _WorkerHandle:
+    """
+    单个工作进程的句柄（API进程侧）
+    """
+    def __init__(self, pool: "EngineWorkerPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.ready: Optional[concurrent.futures.Future] = None
+        self.pending: Dict[int, concurrent.futures.Future] = {}
+        self.completed = 0
+        self.restarts = -1
+        self.waiting = 0
+        self.exited = True
+        self._send_lock = threading.Lock()
+
+    @property
+    def load(self) -> int:
+        """
+        已分配给该工作进程的请求数
+        """
+        return len(self.pending) + self.waiting
+
+    def start(self):
+        """
+        启动工作进程和结果读取线程
+        """
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.pool.engine_type, self.pool.config_yaml, self.pool.torch_threads),
+            name=f"{self.pool.name}-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.ready = concurrent.futures.Future()
+        self.exited = False
+        self.restarts += 1
+        threading.Thread(target=self._read_loop, args=(parent_conn, self.ready),
+                         name=f"{self.pool.name}-reader-{self.index}", daemon=True).start()
+        logger.info(f"[EngineWorkerPool] 启动工作进程 {self.process.name} (pid={self.process.pid})")
+
+    def _read_loop(self, conn, ready: concurrent.futures.Future):
+        """
+        读取工作进程的响应并完成对应的future
+        """
+        while True:
+            try:
+                request_id, ok, result = conn.recv()
+            except (EOFError, OSError):
+                break
+            if request_id == 0:
+                future = ready
+            else:
+                future = self.pending.pop(request_id, None)
+                self.completed += 1
+            if future is None or future.done():
+                continue
+            try:
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(f"[{self.pool.name}] 工作进程错误: {result}"))
+            except concurrent.futures.InvalidStateError:
+                # 调用方已取消
+                pass
+
+        # 工作进程已退出，未完成的请求全部失败
+        error = RuntimeError(f"[{self.pool.name}] 工作进程 {self.index} 已退出")
+        with self._send_lock:
+            self.exited = True
+            pending = [ready] + list(self.pending.values())
+        for future in pending:
+            try:
+                if not future.done():
+                    future.set_exception(error)
+            except concurrent.futures.InvalidStateError:
+                pass
+        self.pending.clear()
+        if not self.pool.closed:
+            logger.error(f"[EngineWorkerPool] {error}")
+
+    def send(self, request_id: int, payload: Dict[str, Any]) -> concurrent.futures.Future:
+        """
+        发送请求，返回结果future
+        """
+        future = concurrent.futures.Future()
+        with self._send_lock:
+            if self.exited:
+                raise RuntimeError(f"[{self.pool.name}] 工作进程 {self.index} 已退出")
+            self.pending[request_id] = future
+            try:
+                self.conn.send((request_id, payload))
+            except (OSError, ValueError) as e:
+                self.pending.pop(request_id, None)
+                raise RuntimeError(f"[{self.pool.name}] 向工作进程发送请求失败: {e}")
+        return future
+
+    def stop(self, timeout: float = 5):
+        """
+        通知工作进程退出
+        """
+        if self.process is None:
+            return
+        try:
+            with self._send_lock:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+
+class EngineWorkerPool:
+    """
+    引擎工作进程池
+    """
+    def __init__(self, engine_type: str, config: CN, num_workers: int,
+                 max_queue: int = 16, torch_threads: int = 0):
+        """
+        初始化工作进程池，工作进程在首次使用或start时启动
+
+        参数:
+            engine_type: 引擎类型，asr或tts
+            config: 引擎配置
+            num_workers: 工作进程数
+            max_queue: 每个工作进程的排队上限，超出后拒绝新请求
+            torch_threads: 每个工作进程的torch线程数，0表示按CPU核数平均分配
+        """
+        if engine_type not in _WORKER_HANDLERS:
+            raise ValueError(f"[EngineWorkerPool] 不支持的引擎类型: {engine_type}")
+        self.engine_type = engine_type
+        self.name = config.NAME
+        self.config_yaml = config.dump()
+        self.num_workers = max(1, int(num_workers))
+        self.max_queue = max(0, int(max_queue))
+        if torch_threads <= 0:
+            torch_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.torch_threads = int(torch_threads)
+        self.workers = [_WorkerHandle(self, index) for index in range(self.num_workers)]
+        self.closed = False
+        self.rejected = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _ensure_started(self, worker: _WorkerHandle):
+        """
+        启动未运行或已退出的工作进程
+        """
+        with self._lock:
+            if self.closed:
+                raise RuntimeError(f"[{self.name}] 工作进程池已关闭")
+            # 读取线程确认旧进程退出后才重启，避免新旧请求混在一起
+            if worker.exited:
+                if worker.conn is not None:
+                    worker.conn.close()
+                worker.start()
+
+    async def start(self):
+        """
+        启动全部工作进程并等待模型加载完成
+
+        异常:
+            RuntimeError: 有工作进程加载模型失败
+        """
+        for worker in self.workers:
+            self._ensure_started(worker)
+        pids = await asyncio.gather(*[asyncio.wrap_future(worker.ready) for worker in self.workers])
+        logger.info(f"[EngineWorkerPool] {self.name} 工作进程就绪: {list(pids)}")
+
+    async def call(self, payload: Dict[str, Any], worker_index: Optional[int] = None) -> Any:
+        """
+        将请求分发给工作进程并等待结果
+
+        参数:
+            payload: 请求数据
+            worker_index: 指定工作进程，None时选择排队最少的工作进程
+
+        返回:
+            工作进程的处理结果
+
+        异常:
+            InferenceExecutorBusy: 所有工作进程的排队均已满
+        """
+        if worker_index is None:
+            worker = min(self.workers, key=lambda w: w.load)
+        else:
+            worker = self.workers[worker_index]
+        if worker.load >= 1 + self.max_queue:
+            self.rejected += 1
+            raise InferenceExecutorBusy(f"[{self.name}] 工作进程排队已满({worker.load})，请稍后重试")
+
+        self._ensure_started(worker)
+        if not worker.ready.done():
+            # 等待模型加载期间也计入负载，使并发请求均匀分配
+            worker.waiting += 1
+            try:
+                await asyncio.wrap_future(worker.ready)
+            finally:
+                worker.waiting -= 1
+        return await asyncio.wrap_future(worker.send(next(self._ids), payload))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取工作进程状态
+        """
+        workers = []
+        for worker in self.workers:
+            process = worker.process
+            workers.append({
+                "pid": process.pid if process is not None else None,
+                "alive": process is not None and process.is_alive(),
+                "ready": worker.ready is not None and worker.ready.done() and worker.ready.exception() is None,
+                "inflight": len(worker.pending),
+                "completed": worker.completed,
+                "restarts": max(0, worker.restarts),
+            })
+        return {
+            "num_workers": self.num_workers,
+            "max_queue": self.max_queue,
+            "torch_threads": self.torch_threads,
+            "rejected": self.rejected,
+            "workers": workers,
+        }
+
+    def close(self):
+        """
+        关闭全部工作进程
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        for worker in self.workers:
+            worker.stop()
+        logger.info(f"[EngineWorkerPool] {self.name} 工作进程已关闭")
+
+
+class _ProcessEngineMixin:
+    """
+    工作进程代理引擎的公共实现
+    """
+    ENGINE_TYPE = ""
+
+    def setup(self):
+        self.pool = EngineWorkerPool(
+            self.ENGINE_TYPE, self.cfg,
+            num_workers=self.cfg.WORKERS,
+            max_queue=self.cfg.get("WORKER_MAX_QUEUE", 16),
+            torch_threads=self.cfg.get("WORKER_TORCH_THREADS", 0)
+        )
+
+    def release(self):
+        pool = getattr(self, "pool", None)
+        if pool is not None:
+            pool.close()
+
+    def worker_stats(self) -> Dict[str, Any]:
+        """
+        获取工作进程状态，用于健康检查
+        """
+        return self.pool.stats()
+
+    async def _warmup_payload(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def warmup(self):
+        """
+        启动全部工作进程，并在每个工作进程上执行一次推理
+        """
+        await self.pool.start()
+        payload = await self._warmup_payload()
+        await asyncio.gather(*[self.pool.call(payload, worker_index=index)
+                               for index in range(self.pool.num_workers)])
+
+    async def close(self):
+        self.pool.close()
+
+
+class ProcessASREngine(_ProcessEngineMixin, ASREngine):
+    """
+    语音识别代理引擎：WAV输入在API进程中转换为16kHz单声道16位PCM后发送给工作进程
+    """
+    ENGINE_TYPE = "asr"
+
+    @staticmethod
+    def _encode_input(message: AudioMessage) -> Dict[str, Any]:
+        """
+        将输入音频转换为管道传输格式
+        """
+        if message.format == AudioFormatType.WAV:
+            samples, sample_rate = decode_wav(message.data)
+            samples = resample(convert_channels(samples, 1), sample_rate, ASR_SAMPLE_RATE)
+            return {"pcm": array_to_pcm(samples, 2), "sample_rate": ASR_SAMPLE_RATE, "sample_width": 2}
+        # 压缩格式体积已足够小，由工作进程中的引擎自行解码
+        return _message_to_audio(message)
+
+    async def run(self, input: Union[AudioMessage, List[AudioMessage]], **kwargs) -> Optional[TextMessage]:
+        messages = input if isinstance(input, list) else [input]
+        payload = {"audio": [self._encode_input(message) for message in messages], "kwargs": kwargs}
+        text = await self.pool.call(payload)
+        return TextMessage(data=text) if text is not None else None
+
+    async def _warmup_payload(self) -> Dict[str, Any]:
+        # 0.5秒静音
+        return {"audio": [{"pcm": b"\x00" * ASR_SAMPLE_RATE, "sample_rate": ASR_SAMPLE_RATE, "sample_width": 2}],
+                "kwargs": {}}
+
+
+class ProcessTTSEngine(_ProcessEngineMixin, TTSEngine):
+    """
+    语音合成代理引擎：合成结果以PCM数据传回，在API进程中补上WAV头；缓存在API进程中完成
+    """
+    ENGINE_TYPE = "tts"
+
+    @cached_tts
+    async def run(self, input: TextMessage, **kwargs) -> Optional[AudioMessage]:
+        if isinstance(input, list):
+            text = " ".join(message.data for message in input if isinstance(message, TextMessage))
+        else:
+            text = input.data
+        result = await self.pool.call({"text": text, "kwargs": kwargs})
+        return _audio_to_message(result) if result else None
+
+    async def _warmup_payload(self) -> Dict[str, Any]:
+        return {"text": "你好", "kwargs": {}}
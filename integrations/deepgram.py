@@ -13,9 +13,10 @@ import asyncio
 import os
 import logging
 import hashlib
-from functools import lru_cache
 from dotenv import load_dotenv
 import time
+from utils.audio_utils import compute_content_hash
+from utils.tts_cache import get_tts_cache
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -24,9 +25,6 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 DEEPGRAM_API_KEY = os.getenv("DEEPGRAM_API_KEY")
 
-# 文本到哈希的映射，用于缓存
-text_hash_map = {}
-
 # 创建Deepgram客户端
 def create_deepgram_client():
     """
@@ -150,7 +148,7 @@ async def transcribe_audio_buffer(audio_data, language="zh-CN", format=None):
                 # 尝试打印响应结构以便调试
                 try:
                     logger.debug(f"响应结构: {response.to_dict()}")
-                except:
+                except Exception:
                     logger.debug("无法序列化响应对象")
         else:
             logger.warning("Deepgram返回的结果格式异常")
@@ -228,18 +226,6 @@ async def setup_live_transcription(callback_function, language="zh-CN"):
         return None
 
 # 为TTS响应添加缓存
-@lru_cache(maxsize=100)
-async def _cached_text_to_speech(text_hash, voice, language):
-    """缓存版本的TTS，使用文本哈希作为键"""
-    # 从哈希中恢复原始文本
-    text = text_hash_map.get(text_hash)
-    if not text:
-        logger.warning(f"缓存中未找到文本哈希: {text_hash}")
-        return None
-    
-    logger.debug(f"缓存未命中，生成语音: {text[:30]}...")
-    return await _text_to_speech_impl(text, voice, language)
-
 # 实际的TTS实现
 async def _text_to_speech_impl(text, voice, language):
     """内部TTS实现，不带缓存"""
@@ -273,16 +259,16 @@ async def _text_to_speech_impl(text, voice, language):
 
 # 带缓存的文本转语音函数
 async def text_to_speech_cached(text, voice="aura-asteria-en", language="zh-CN"):
-    """带缓存的文本转语音版本"""
-    # 计算文本哈希
-    text_hash = hashlib.md5(text.encode()).hexdigest()
+    """带缓存的文本转语音版本，缓存音频数据本身，并发的相同请求只合成一次"""
+    cache_key = compute_content_hash(text, voice, {"engine": "deepgram", "language": language})
+    logger.debug(f"使用缓存版本的TTS，缓存键: {cache_key}")
     
-    # 存储文本和哈希的映射
-    text_hash_map[text_hash] = text
+    async def synthesize():
+        audio_data = await _text_to_speech_impl(text, voice, language)
+        return (audio_data, {"format": "mp3"}) if audio_data else None
     
-    # 调用缓存版本
-    logger.debug(f"使用缓存版本的TTS，文本哈希: {text_hash}")
-    return await _cached_text_to_speech(text_hash, voice, language)
+    entry = await get_tts_cache().get_or_create(cache_key, synthesize)
+    return entry[0] if entry else None
 
 # 保留原始函数以保持向后兼容
 async def text_to_speech(text, voice="aura-asteria-en", language="zh-CN"):
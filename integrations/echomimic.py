@@ -15,8 +15,14 @@ from pathlib import Path
 import numpy as np
 import json
 import base64
-from typing import Dict, List, Optional, Any, Union
+import time
+import uuid
+from typing import Dict, List, Optional, Any, Tuple, Union
 import subprocess
+from .echomimic_worker import RENDERERS, EchoMimicWorkerClient, ProgressCallback, build_infer_args, collect_cli_output
+from .pose_cache import DEFAULT_POSE_CACHE_OPTIONS, get_pose_index
+from .reference_cache import DEFAULT_REFERENCE_CACHE_OPTIONS
+from utils.metrics import span
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -53,6 +59,38 @@ class EchoMimicIntegration:
             "quantization_input": config.get("quantization_input", True),
             "seed": config.get("seed", -1)
         }
+
+        # 常驻渲染进程：模型只加载一次，未启用或不可用时退回命令行方式
+        self.worker_options = {
+            "enabled": False,
+            "socket_path": "/tmp/echomimic_worker.sock",
+            "autostart": True,
+            "renderer": "echomimic",
+            "model_config": "./configs/prompts/infer.yaml",
+            "device": "cuda",
+            "start_timeout": 600,
+            "job_timeout": 0,
+            "max_queue": 16,
+        }
+        self.worker_options.update(dict(config.get("worker", {}) or {}))
+        self.worker_process: Optional[asyncio.subprocess.Process] = None
+        self._worker_lock = asyncio.Lock()
+
+        # 姿势缓存：assets索引在API进程中维护，合并后的姿势序列由渲染进程加载
+        self.pose_cache_options = dict(DEFAULT_POSE_CACHE_OPTIONS)
+        self.pose_cache_options.update(dict(config.get("pose_cache", {}) or {}))
+        self.pose_index = get_pose_index(os.path.join(self.echomimic_path, "assets"),
+                                         float(self.pose_cache_options["watch_interval"]))
+
+        # 参考图像编码缓存：由渲染进程维护，重复渲染已知形象时跳过编码
+        self.reference_cache_options = dict(DEFAULT_REFERENCE_CACHE_OPTIONS)
+        self.reference_cache_options.update(dict(config.get("reference_cache", {}) or {}))
+        renderer = RENDERERS.get(self.worker_options.get("renderer", "echomimic"))
+        if self.reference_cache_options["enabled"] and not getattr(renderer, "supports_reference", False):
+            logger.warning(f"{self.worker_options.get('renderer')}渲染器不支持单独编码参考图像，忽略reference_cache.enabled")
+            self.reference_cache_options["enabled"] = False
+        if not self.reference_cache_options["cache_dir"]:
+            self.reference_cache_options["cache_dir"] = str(self.output_dir / ".reference_cache")
         
         # 验证必要的文件路径
         self._validate_paths()
@@ -91,7 +129,8 @@ class EchoMimicIntegration:
         return str(audio_path)
     
     async def generate_video_from_audio(self, audio_path: str, ref_image_path: Optional[str] = None, 
-                                   pose_dir_path: Optional[str] = None) -> str:
+                                   pose_dir_path: Optional[str] = None,
+                                   progress: Optional[ProgressCallback] = None) -> str:
         """
         使用EchoMimicV2从音频生成视频
         
@@ -99,6 +138,7 @@ class EchoMimicIntegration:
             audio_path: 音频文件路径
             ref_image_path: 可选，参考图像路径，未提供时使用默认值
             pose_dir_path: 可选，姿势数据目录路径，未提供时使用默认值
+            progress: 可选，渲染进度回调(进度0~1, 阶段)，仅常驻渲染进程支持逐步进度
             
         Returns:
             生成的视频文件路径
@@ -113,28 +153,44 @@ class EchoMimicIntegration:
         if not pose_dir or not os.path.exists(pose_dir):
             raise ValueError(f"必须提供有效的姿势数据目录: {pose_dir}")
         
+        job_id = uuid.uuid4().hex
+        output_path = (self.output_dir / f"{job_id}.mp4").resolve()
+
+        if self.worker_options.get("enabled", False):
+            try:
+                client = await self._ensure_worker()
+                job = {
+                    "job_id": job_id,
+                    "audio": os.path.abspath(audio_path),
+                    "ref_image": os.path.abspath(ref_image),
+                    "pose_dir": os.path.abspath(pose_dir),
+                    "output_path": str(output_path),
+                    "params": self.video_params,
+                }
+                with span("video_render", mode="worker"):
+                    video_path = await client.render(job, timeout=self.worker_options.get("job_timeout") or None,
+                                                     progress=progress)
+                logger.info(f"视频生成成功: {video_path}")
+                return video_path
+            except ConnectionError as e:
+                logger.warning(f"EchoMimic渲染进程不可用，改用命令行方式: {str(e)}")
+
+        with span("video_render", mode="cli"):
+            return await self._generate_video_cli(job_id, audio_path, ref_image, pose_dir, output_path)
+
+    async def _generate_video_cli(self, job_id: str, audio_path: str, ref_image: str, pose_dir: str,
+                                  output_path: Path) -> str:
+        """
+        命令行方式：为单个视频启动infer.py子进程，输出到任务独立目录后移动到确定的输出路径
+        """
+        job_dir = self.output_dir / ".jobs" / job_id
+        job_dir.mkdir(parents=True, exist_ok=True)
+
         # 组织调用EchoMimicV2的命令
         cmd = [
             "python", 
             os.path.join(self.echomimic_path, "infer.py"),
-            "--refimg", ref_image,
-            "--audio", audio_path,
-            "--pose", pose_dir,
-            "--width", str(self.video_params["width"]),
-            "--height", str(self.video_params["height"]),
-            "--length", str(self.video_params["length"]),
-            "--steps", str(self.video_params["steps"]),
-            "--sample_rate", str(self.video_params["sample_rate"]),
-            "--cfg", str(self.video_params["cfg"]),
-            "--fps", str(self.video_params["fps"]),
-            "--context_frames", str(self.video_params["context_frames"]),
-            "--context_overlap", str(self.video_params["context_overlap"]),
-            "--seed", str(self.video_params["seed"]),
-            "--output_dir", str(self.output_dir)
-        ]
-        
-        if self.video_params["quantization_input"]:
-            cmd.append("--quantization")
+        ] + build_infer_args(audio_path, ref_image, pose_dir, str(job_dir), self.video_params)
         
         # 创建子进程执行命令
         logger.info(f"开始生成视频，命令: {' '.join(cmd)}")
@@ -147,8 +203,15 @@ class EchoMimicIntegration:
                 stderr=asyncio.subprocess.PIPE
             )
             
-            # 等待进程完成
-            stdout, stderr = await process.communicate()
+            # 等待进程完成；请求被取消（如用户插话）时终止渲染进程，不再占用GPU
+            try:
+                stdout, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                logger.info("视频生成已取消，渲染进程已终止")
+                raise
             
             if process.returncode != 0:
                 logger.error(f"视频生成失败: {stderr.decode()}")
@@ -158,26 +221,196 @@ class EchoMimicIntegration:
             output = stdout.decode()
             logger.info(f"视频生成成功: {output}")
             
-            # 查找生成的视频文件
-            video_files = list(self.output_dir.glob("*_ws.mp4"))
-            if not video_files:
-                raise FileNotFoundError("未找到生成的视频文件")
-            
-            # 返回最新的视频文件
-            latest_video = max(video_files, key=os.path.getctime)
-            return str(latest_video)
+            # 每个任务使用独立的输出目录，并发生成时不会取到其他任务的视频
+            return collect_cli_output(job_dir, output_path)
             
         except Exception as e:
             logger.error(f"视频生成过程中发生错误: {str(e)}")
             raise
+
+    async def _ensure_worker(self) -> EchoMimicWorkerClient:
+        """
+        获取渲染进程客户端，渲染进程未运行且配置了autostart时启动并等待模型加载完成
+
+        异常:
+            ConnectionError: 渲染进程未运行且无法启动
+        """
+        client = EchoMimicWorkerClient(self.worker_options["socket_path"])
+        async with self._worker_lock:
+            try:
+                await client.ping()
+                return client
+            except (ConnectionError, asyncio.TimeoutError):
+                if not self.worker_options.get("autostart", True):
+                    raise
+
+            if self.worker_process is None or self.worker_process.returncode is not None:
+                cmd = [
+                    sys.executable, "-m", "integrations.echomimic_worker",
+                    "--socket", self.worker_options["socket_path"],
+                    "--echomimic_path", self.echomimic_path,
+                    "--renderer", self.worker_options.get("renderer", "echomimic"),
+                    "--params", json.dumps(self.video_params),
+                    "--model_config", self.worker_options.get("model_config", "./configs/prompts/infer.yaml"),
+                    "--device", self.worker_options.get("device", "cuda"),
+                    "--max_queue", str(self.worker_options.get("max_queue", 16)),
+                    "--pose_cache_dir", os.path.abspath(self.pose_cache_options["cache_dir"]),
+                ]
+                if self.pose_cache_options.get("preload", True):
+                    cmd.append("--preload_poses")
+                if self.reference_cache_options["enabled"]:
+                    cmd += [
+                        "--reference_cache_dir", os.path.abspath(self.reference_cache_options["cache_dir"]),
+                        "--reference_cache_max_bytes", str(int(self.reference_cache_options["max_bytes"])),
+                    ]
+                logger.info(f"启动EchoMimic渲染进程: {' '.join(cmd)}")
+                self.worker_process = await asyncio.create_subprocess_exec(
+                    *cmd, cwd=str(Path(__file__).resolve().parent.parent)
+                )
+
+            # 等待模型加载完成、socket可连接
+            deadline = time.time() + float(self.worker_options.get("start_timeout", 600))
+            while time.time() < deadline:
+                if self.worker_process.returncode is not None:
+                    raise ConnectionError(f"EchoMimic渲染进程启动失败，返回码: {self.worker_process.returncode}")
+                try:
+                    stats = await client.ping()
+                    logger.info(f"EchoMimic渲染进程就绪: {stats}")
+                    return client
+                except (ConnectionError, asyncio.TimeoutError):
+                    await asyncio.sleep(0.2)
+            raise ConnectionError("等待EchoMimic渲染进程启动超时")
+
+    def stream_dir(self, stream_id: str) -> Path:
+        """
+        流式渲染的输出目录（分段视频和播放列表）
+        """
+        return self.output_dir / "streams" / stream_id
+
+    async def render_stream_chunk(self, stream_id: str, index: int, audio_path: str, duration: float,
+                                  final: bool = False, ref_image_path: Optional[str] = None,
+                                  pose_dir_path: Optional[str] = None,
+                                  progress: Optional[ProgressCallback] = None) -> Tuple[str, float]:
+        """
+        渲染流式视频的一个分段（通常对应TTS的一个句子）
+
+        常驻渲染进程在同一stream_id的分段之间保留衔接状态；退回命令行方式时每段独立渲染
+        
+        Args:
+            stream_id: 流ID
+            index: 分段序号
+            audio_path: 本段音频文件路径
+            duration: 本段音频时长(秒)
+            final: 是否为最后一段
+            ref_image_path: 可选，参考图像路径
+            pose_dir_path: 可选，姿势数据目录路径
+            progress: 可选，渲染进度回调
+            
+        Returns:
+            (本段视频文件路径, 本段视频实际时长(秒))；常驻渲染进程按实际渲染的帧数计算，
+            命令行方式的帧数不超过length
+        """
+        ref_image = ref_image_path or self.ref_image_path
+        pose_dir = pose_dir_path or self.pose_dir_path
+        output_path = (self.stream_dir(stream_id) / f"chunk_{index:05d}.mp4").resolve()
+        job_id = f"{stream_id}-{index}"
+
+        if self.worker_options.get("enabled", False):
+            try:
+                client = await self._ensure_worker()
+                job = {
+                    "job_id": job_id,
+                    "stream_id": stream_id,
+                    "index": index,
+                    "duration": duration,
+                    "final": final,
+                    "audio": os.path.abspath(audio_path),
+                    "ref_image": os.path.abspath(ref_image),
+                    "pose_dir": os.path.abspath(pose_dir),
+                    "output_path": str(output_path),
+                    "params": self.video_params,
+                }
+                with span("video_chunk", mode="worker"):
+                    video_path, frames = await client.render_chunk(
+                        job, timeout=self.worker_options.get("job_timeout") or None, progress=progress
+                    )
+                return video_path, frames / self.video_params["fps"]
+            except ConnectionError as e:
+                logger.warning(f"EchoMimic渲染进程不可用，分段改用命令行方式独立渲染: {str(e)}")
+
+        with span("video_chunk", mode="cli"):
+            video_path = await self._generate_video_cli(job_id, audio_path, ref_image, pose_dir, output_path)
+        return video_path, min(duration, self.video_params["length"] / self.video_params["fps"])
+
+    async def end_stream(self, stream_id: str):
+        """
+        通知常驻渲染进程释放流的衔接状态（流被取消时调用）
+        """
+        if not self.worker_options.get("enabled", False):
+            return
+        try:
+            await EchoMimicWorkerClient(self.worker_options["socket_path"]).end_stream(stream_id)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+
+    async def register_reference(self, ref_image_path: str) -> Dict[str, Any]:
+        """
+        预先注册数字人形象：在渲染进程中编码参考图像并写入缓存，之后使用该形象的渲染跳过编码
+
+        Args:
+            ref_image_path: 参考图像路径
+
+        Returns:
+            {"key": 缓存键, "cached": 是否已缓存, "bytes": 编码结果大小}
+
+        Raises:
+            ValueError: 参考图像不存在
+            NotImplementedError: 未启用常驻渲染进程或参考图像缓存，或渲染器不支持单独编码参考图像
+            RuntimeError: 编码失败
+        """
+        if not ref_image_path or not os.path.exists(ref_image_path):
+            raise ValueError(f"必须提供有效的参考图像路径: {ref_image_path}")
+        if not self.worker_options.get("enabled", False) or not self.reference_cache_options["enabled"]:
+            raise NotImplementedError("参考图像缓存需要启用常驻渲染进程和reference_cache")
+        client = await self._ensure_worker()
+        return await client.register_reference(os.path.abspath(ref_image_path), self.video_params)
+
+    async def worker_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        获取渲染进程状态，未运行时返回None
+        """
+        if not self.worker_options.get("enabled", False):
+            return None
+        try:
+            return await EchoMimicWorkerClient(self.worker_options["socket_path"]).ping()
+        except (ConnectionError, asyncio.TimeoutError):
+            return None
+
+    async def close(self):
+        """
+        停止由本实例启动的渲染进程
+        """
+        if self.worker_process is not None and self.worker_process.returncode is None:
+            self.worker_process.terminate()
+            try:
+                await asyncio.wait_for(self.worker_process.wait(), 10)
+            except asyncio.TimeoutError:
+                self.worker_process.kill()
+                await self.worker_process.wait()
+        self.worker_process = None
     
-    async def process_tts_output(self, tts_output: bytes, audio_format: str = "mp3") -> str:
+    async def process_tts_output(self, tts_output: bytes, audio_format: str = "mp3",
+                                 ref_image_path: Optional[str] = None, pose_dir_path: Optional[str] = None,
+                                 progress: Optional[ProgressCallback] = None) -> str:
         """
         处理TTS输出生成视频
         
         Args:
             tts_output: TTS生成的音频数据
             audio_format: 音频格式
+            ref_image_path: 可选，参考图像路径
+            pose_dir_path: 可选，姿势数据目录路径
+            progress: 可选，渲染进度回调
             
         Returns:
             生成的视频文件路径
@@ -187,7 +420,7 @@ class EchoMimicIntegration:
             audio_path = await self.save_audio_to_file(tts_output, audio_format)
             
             # 生成视频
-            video_path = await self.generate_video_from_audio(audio_path)
+            video_path = await self.generate_video_from_audio(audio_path, ref_image_path, pose_dir_path, progress)
             
             return video_path
         except Exception as e:
@@ -224,17 +457,9 @@ class EchoMimicIntegration:
             echomimic_path: EchoMimicV2项目路径
             
         Returns:
-            可用姿势数据集的目录名列表
+            可用姿势数据集的目录名列表（读取assets索引，不遍历目录）
         """
-        assets_path = Path(echomimic_path) / "assets"
-        pose_dirs = []
-        
-        if assets_path.exists() and assets_path.is_dir():
-            for item in assets_path.iterdir():
-                if item.is_dir() and (item / "0.npy").exists():
-                    pose_dirs.append(str(item))
-        
-        return pose_dirs
+        return get_pose_index(str(Path(echomimic_path) / "assets")).pose_dirs()
     
     @staticmethod
     async def get_available_reference_images(echomimic_path: str = "/Users/niko/echomimic_v2") -> List[str]:
@@ -245,18 +470,6 @@ class EchoMimicIntegration:
             echomimic_path: EchoMimicV2项目路径
             
         Returns:
-            可用参考图像的文件路径列表
+            可用参考图像的文件路径列表（读取assets索引，不遍历目录）
         """
-        assets_path = Path(echomimic_path) / "assets"
-        ref_images = []
-        
-        if assets_path.exists() and assets_path.is_dir():
-            for item in assets_path.glob("**/*.png"):
-                if item.is_file() and "reference" in item.name.lower():
-                    ref_images.append(str(item))
-            
-            for item in assets_path.glob("**/*.jpg"):
-                if item.is_file() and "reference" in item.name.lower():
-                    ref_images.append(str(item))
-        
-        return ref_images
+        return get_pose_index(str(Path(echomimic_path) / "assets")).reference_images()
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+EchoMimicV2渲染适配层（在常驻渲染进程中使用）
+
+EchoMimicV2的infer.py只有命令行入口：每次运行都重新加载全部权重，姿势帧从逐帧.npy文件读取，并且总是从第0帧开始。
+本模块按infer.py的流程构建一次EchoMimicV2Pipeline，之后每个任务直接用已加载的模型渲染:
+- 姿势帧由调用方传入（PoseCache中按输出尺寸预先绘制并内存映射的姿势图），可以从任意帧偏移开始
+- 可在本段音频之前拼接上一段末尾的音频和对应的姿势帧(lead_in)一起渲染，输出时丢弃这些帧，
+  使流式分段的衔接处有上下文
+- 参考图像可单独编码(encode_reference)：VAE潜变量和参考网络写入各注意力层bank的特征，由调用方按内容哈希缓存；
+  渲染时传入缓存的结果，pipeline编码参考图像时直接取用，不再运行VAE编码和参考网络
+- pipeline支持callback参数时按去噪步骤上报进度；进度回调抛出的异常会中止渲染，渲染进程以此取消客户端已断开的任务
+
+torch、diffusers和EchoMimicV2项目的src包在创建适配器时才导入，API进程不需要这些依赖
+"""
+
+import inspect
+import logging
+from contextlib import contextmanager
+from types import SimpleNamespace
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["EchoMimicV2Adapter", "DEFAULT_ADAPTER_OPTIONS"]
+
+# 默认适配器参数
+DEFAULT_ADAPTER_OPTIONS = {
+    "model_config": "./configs/prompts/infer.yaml",  # 模型权重配置，相对于EchoMimicV2项目路径
+    "device": "cuda",  # 推理设备，不可用时退回cpu
+    "pose_ref_width": 800,  # 绘制姿势图时的参考宽度，与infer.py一致
+}
+
+# 参考潜变量的缩放系数，与EchoMimicV2Pipeline一致
+LATENT_SCALE = 0.18215
+
+
+class EchoMimicV2Adapter:
+    """
+    持有已加载的EchoMimicV2Pipeline，按任务渲染视频
+    """
+
+    def __init__(self, echomimic_path: str, options: Optional[Dict[str, Any]] = None, pipeline: Any = None):
+        """
+        参数:
+            echomimic_path: EchoMimicV2项目路径
+            options: 适配器参数，见DEFAULT_ADAPTER_OPTIONS
+            pipeline: 已构建的pipeline，为None时按model_config加载模型
+        """
+        self.echomimic_path = os.path.abspath(echomimic_path)
+        self.options = dict(DEFAULT_ADAPTER_OPTIONS)
+        self.options.update(options or {})
+        # EchoMimicV2的配置文件使用相对于项目目录的路径
+        os.chdir(self.echomimic_path)
+        if self.echomimic_path not in sys.path:
+            sys.path.insert(0, self.echomimic_path)
+
+        import torch
+        from src.utils.dwpose_util import draw_pose_select_v2
+        from src.utils.util import save_videos_grid
+        self.torch = torch
+        self.draw_pose = draw_pose_select_v2
+        self.save_videos = save_videos_grid
+
+        self.device = self.options["device"]
+        if self.device.startswith("cuda") and not torch.cuda.is_available():
+            logger.warning("[EchoMimicAdapter] CUDA不可用，使用CPU渲染")
+            self.device = "cpu"
+        self.dtype = torch.float32
+        self.pipe = pipeline if pipeline is not None else self._load_pipeline()
+        # 较新的EchoMimicV2 pipeline接受callback参数，用于上报去噪进度
+        self._supports_callback = "callback" in inspect.signature(self.pipe.__call__).parameters
+
+    def _load_pipeline(self):
+        """
+        按infer.py的方式加载各个模型并构建pipeline，只在创建适配器时执行一次
+        """
+        torch = self.torch
+        from omegaconf import OmegaConf
+        from diffusers import AutoencoderKL, DDIMScheduler
+        from src.models.unet_2d_condition import UNet2DConditionModel
+        from src.models.unet_3d_emo import EMOUNet3DConditionModel
+        from src.models.whisper.audio2feature import load_audio_model
+        from src.models.pose_encoder import PoseEncoder
+        from src.pipelines.pipeline_echomimicv2 import EchoMimicV2Pipeline
+
+        config = OmegaConf.load(self.options["model_config"])
+        self.dtype = torch.float16 if config.weight_dtype == "fp16" else torch.float32
+        infer_config = OmegaConf.load(config.inference_config)
+        start_time = time.time()
+
+        vae = AutoencoderKL.from_pretrained(config.pretrained_vae_path).to(self.device, dtype=self.dtype)
+        reference_unet = UNet2DConditionModel.from_pretrained(
+            config.pretrained_base_model_path, subfolder="unet"
+        ).to(dtype=self.dtype, device=self.device)
+        reference_unet.load_state_dict(torch.load(config.reference_unet_path, map_location="cpu"))
+
+        if os.path.exists(config.motion_module_path):
+            denoising_unet = EMOUNet3DConditionModel.from_pretrained_2d(
+                config.pretrained_base_model_path, config.motion_module_path, subfolder="unet",
+                unet_additional_kwargs=infer_config.unet_additional_kwargs,
+            )
+        else:
+            denoising_unet = EMOUNet3DConditionModel.from_pretrained_2d(
+                config.pretrained_base_model_path, "", subfolder="unet",
+                unet_additional_kwargs={
+                    "use_motion_module": False,
+                    "unet_use_temporal_attention": False,
+                    "cross_attention_dim": infer_config.unet_additional_kwargs.cross_attention_dim,
+                },
+            )
+        denoising_unet = denoising_unet.to(dtype=self.dtype, device=self.device)
+        denoising_unet.load_state_dict(torch.load(config.denoising_unet_path, map_location="cpu"), strict=False)
+
+        pose_net = PoseEncoder(320, conditioning_channels=3, block_out_channels=(16, 32, 96, 256))
+        pose_net = pose_net.to(dtype=self.dtype, device=self.device)
+        pose_net.load_state_dict(torch.load(config.pose_encoder_path, map_location="cpu"))
+
+        audio_processor = load_audio_model(model_path=config.audio_model_path, device=self.device)
+        scheduler = DDIMScheduler(**OmegaConf.to_container(infer_config.noise_scheduler_kwargs))
+
+        pipe = EchoMimicV2Pipeline(
+            vae=vae,
+            reference_unet=reference_unet,
+            denoising_unet=denoising_unet,
+            audio_guider=audio_processor,
+            pose_encoder=pose_net,
+            scheduler=scheduler,
+        ).to(self.device, dtype=self.dtype)
+        logger.info(f"[EchoMimicAdapter] EchoMimicV2模型已加载 ({self.device}, {time.time() - start_time:.1f}s)")
+        return pipe
+
+    def draw_pose_map(self, pose: Any, width: int, height: int) -> np.ndarray:
+        """
+        按infer.py的方式将一帧关键点字典绘制为uint8姿势图(高, 宽, 3)；数值型帧视为已绘制的姿势图
+
+        PoseCache按(数据集, 宽, 高)缓存绘制结果，渲染时直接使用内存映射的姿势图
+        """
+        if isinstance(pose, np.ndarray) and pose.dtype != object:
+            return np.asarray(pose, dtype=np.uint8)
+        if isinstance(pose, np.ndarray):
+            pose = pose.item()
+        canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        imh_new, imw_new, rb, re, cb, ce = pose["draw_pose_params"]
+        image = self.draw_pose(pose, imh_new, imw_new, ref_w=self.options["pose_ref_width"])
+        canvas[rb:re, cb:ce, :] = np.transpose(np.array(image), (1, 2, 0))
+        return canvas
+
+    def _pose_tensor(self, poses: Sequence[Any], width: int, height: int):
+        """
+        将姿势帧（已绘制的姿势图或关键点字典）转换为(1, 3, 帧数, 高, 宽)的张量
+        """
+        frames = [self.draw_pose_map(pose, width, height) for pose in poses]
+        array = np.stack(frames).astype(np.float32) / 255.0
+        tensor = self.torch.from_numpy(array).permute(3, 0, 1, 2).unsqueeze(0)
+        return tensor.to(device=self.device, dtype=self.dtype)
+
+    def _bank_modules(self) -> List[Any]:
+        """
+        参考网络中由ReferenceAttentionControl注册了bank的注意力层，编码和渲染时按相同顺序遍历
+        """
+        return [module for module in self.pipe.reference_unet.modules() if hasattr(module, "bank")]
+
+    def encode_reference(self, ref_image: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按EchoMimicV2Pipeline的方式编码参考图像，结果只取决于图像内容和渲染尺寸
+
+        返回:
+            {"ref_latents": VAE潜变量(未缩放), "bank_{层}_{序号}": 参考网络写入各注意力层bank的特征}
+        """
+        from PIL import Image
+        from src.models.mutual_self_attention import ReferenceAttentionControl
+
+        torch = self.torch
+        width, height = int(params["width"]), int(params["height"])
+        image = Image.open(ref_image).convert("RGB").resize((width, height))
+        writer = ReferenceAttentionControl(self.pipe.reference_unet, do_classifier_free_guidance=False,
+                                           mode="write", batch_size=1, fusion_blocks="full")
+        try:
+            with torch.no_grad():
+                tensor = self.pipe.ref_image_processor.preprocess(image, height=height, width=width)
+                tensor = tensor.to(device=self.device, dtype=self.dtype)
+                latents = self.pipe.vae.encode(tensor).latent_dist.mean
+                self.pipe.reference_unet(latents * LATENT_SCALE,
+                                         torch.zeros((), dtype=torch.long, device=latents.device),
+                                         encoder_hidden_states=None, return_dict=False)
+                features = {"ref_latents": latents}
+                for i, module in enumerate(self._bank_modules()):
+                    for j, value in enumerate(module.bank):
+                        features[f"bank_{i}_{j}"] = value
+        finally:
+            writer.clear()
+        return features
+
+    @contextmanager
+    def _cached_reference(self, reference: Optional[Dict[str, Any]]) -> Iterator[None]:
+        """
+        渲染期间使用缓存的参考图像编码结果：VAE编码参考图像时直接返回缓存的潜变量，
+        参考网络前向时把缓存的特征（按批大小复制）写入各注意力层的bank，不再运行参考网络
+        """
+        if not reference:
+            yield
+            return
+        torch = self.torch
+
+        def to_tensor(value):
+            # 缓存条目为只读内存映射数组，复制后再转为张量
+            return torch.from_numpy(np.array(value)).to(device=self.device, dtype=self.dtype)
+
+        latents = to_tensor(reference["ref_latents"])
+        banks: Dict[int, Dict[int, Any]] = {}
+        for name, value in reference.items():
+            if name.startswith("bank_"):
+                i, j = (int(part) for part in name[len("bank_"):].split("_"))
+                banks.setdefault(i, {})[j] = to_tensor(value)
+
+        def encode(sample, *args, **kwargs):
+            return SimpleNamespace(latent_dist=SimpleNamespace(mean=latents))
+
+        def reference_forward(sample, *args, **kwargs):
+            # pipeline在调用参考网络之前注册bank
+            modules = self._bank_modules()
+            if sorted(banks) != list(range(len(modules))):
+                raise ValueError(f"参考图像缓存与参考网络结构不一致: {len(banks)} 层缓存, {len(modules)} 层注意力")
+            batch = sample.shape[0]
+            for i, module in enumerate(modules):
+                module.bank = [value.repeat(batch, *([1] * (value.dim() - 1)))
+                               for _, value in sorted(banks[i].items())]
+            return (sample,)
+
+        patches = [(self.pipe.vae, "encode", encode), (self.pipe.reference_unet, "forward", reference_forward)]
+        for target, name, function in patches:
+            setattr(target, name, function)
+        try:
+            yield
+        finally:
+            # 删除实例属性，恢复类中定义的方法
+            for target, name, _ in patches:
+                delattr(target, name)
+
+    def _mux_audio(self, video_path: str, audio_path: str, duration: float, output_path: str):
+        """
+        为无声视频加上音轨，与infer.py的输出一致
+        """
+        from moviepy.editor import AudioFileClip, VideoFileClip
+        video_clip = VideoFileClip(video_path)
+        audio_clip = AudioFileClip(audio_path).set_duration(duration)
+        video_clip.set_audio(audio_clip).write_videofile(output_path, codec="libx264", audio_codec="aac",
+                                                         logger=None)
+
+    def render(self, audio_path: str, ref_image: str, poses: Sequence[Any], output_path: str,
+               params: Dict[str, Any], progress: Optional[Callable[[float, str], None]] = None,
+               lead_in_audio: Optional[str] = None, lead_in_frames: int = 0, seed: Optional[int] = None,
+               max_frames: Optional[int] = None, reference: Optional[Dict[str, Any]] = None) -> int:
+        """
+        渲染一个视频
+
+        参数:
+            audio_path: 本段音频路径
+            ref_image: 参考图像路径
+            poses: 姿势帧（已绘制的姿势图或关键点字典），从lead_in的第一帧开始，帧数不少于lead_in_frames + 视频帧数
+            output_path: 输出视频路径（带音轨）
+            params: 视频生成参数
+            progress: 进度回调(进度0~1, 阶段)，在每个去噪步骤调用，抛出异常时中止渲染
+            lead_in_audio: 上一段音频，取其末尾lead_in_frames帧的时长拼接在本段音频之前
+            lead_in_frames: 衔接帧数，渲染后丢弃
+            seed: 随机种子，为None时使用params["seed"]（-1表示随机）
+            max_frames: 视频帧数上限（不含衔接帧），为None时使用params["length"]；流式分段按本段音频时长传入
+            reference: 缓存的参考图像编码结果（encode_reference的返回值），为None时由pipeline编码参考图像
+
+        返回:
+            输出视频的帧数（不含衔接帧）
+
+        异常:
+            ValueError: 音频过短或姿势帧不足
+        """
+        from PIL import Image
+        from pydub import AudioSegment
+
+        width, height = int(params["width"]), int(params["height"])
+        fps, steps = int(params["fps"]), int(params["steps"])
+        audio = AudioSegment.from_file(audio_path)
+        lead_in = None
+        if lead_in_audio and lead_in_frames > 0:
+            lead_in = AudioSegment.from_file(lead_in_audio)[-int(lead_in_frames * 1000 / fps):]
+            # 上一段比衔接帧数短时按实际时长衔接
+            lead_in_frames = min(int(lead_in_frames), int(len(lead_in) * fps / 1000))
+            lead_in = lead_in[-int(lead_in_frames * 1000 / fps):] if lead_in_frames else None
+        else:
+            lead_in_frames = 0
+        if max_frames is None:
+            max_frames = int(params["length"])
+        frames = min(int(max_frames), int(len(audio) * fps / 1000), len(poses) - lead_in_frames)
+        if frames <= 0:
+            raise ValueError(f"音频过短或姿势帧不足，无法渲染: {audio_path}")
+        total = lead_in_frames + frames
+
+        if seed is None:
+            seed = int(params.get("seed", -1))
+        if seed < 0:
+            seed = random.randint(100, 1000000)
+        generator = self.torch.manual_seed(seed)
+
+        kwargs = {}
+        if progress is not None and self._supports_callback:
+            kwargs["callback"] = lambda step, timestep, latents: progress((step + 1) / steps, "denoising")
+            kwargs["callback_steps"] = 1
+
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=str(Path(output_path).parent)) as tmp_dir:
+            driving_audio = audio_path
+            if lead_in_frames:
+                driving_audio = os.path.join(tmp_dir, "driving.wav")
+                (lead_in + audio).export(driving_audio, format="wav")
+            ref_image_pil = Image.open(ref_image).convert("RGB").resize((width, height))
+            poses_tensor = self._pose_tensor(poses[:total], width, height)
+
+            with self._cached_reference(reference):
+                video = self.pipe(
+                    ref_image_pil, driving_audio, poses_tensor, width, height, total, steps, float(params["cfg"]),
+                    generator=generator,
+                    audio_sample_rate=int(params["sample_rate"]),
+                    context_frames=int(params["context_frames"]),
+                    fps=fps,
+                    context_overlap=int(params["context_overlap"]),
+                    **kwargs,
+                ).videos
+            # pipeline按音频特征长度可能少生成几帧
+            video = video[:, :, lead_in_frames:total]
+            frames = int(video.shape[2])
+            if frames <= 0:
+                raise ValueError(f"音频过短，无法渲染: {audio_path}")
+
+            silent_path = os.path.join(tmp_dir, "silent.mp4")
+            self.save_videos(video, silent_path, n_rows=1, fps=fps)
+            if progress is not None:
+                progress(1.0, "encoding")
+            self._mux_audio(silent_path, audio_path, frames / fps, output_path)
+        return frames
@@ -0,0 +1,668 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+EchoMimicV2常驻渲染进程
+
+- 渲染进程启动时由EchoMimicV2Adapter加载一次模型，之后通过本地Unix socket接收渲染任务，不再为每个视频启动infer.py
+- 任务按提交顺序串行渲染（一块GPU同一时间只渲染一个视频）。客户端断开时排队中的任务被丢弃，
+  正在渲染的任务在下一次进度回调（每个去噪步骤）时抛出RenderCancelled中止
+- 每个任务的输出路径由任务ID确定，不再按创建时间查找最新的视频文件
+- 流式渲染按句子分段提交(render_chunk)，同一stream_id的分段之间由渲染进程保留衔接状态
+  （姿势帧偏移、上一段末尾的context_overlap帧），最后一段渲染完或收到end_stream后释放
+- 姿势序列经PoseCache合并后加载一次，每个任务只切片所需帧数；EchoMimicV2渲染器按输出尺寸预先绘制为姿势图后缓存
+- 渲染器支持单独编码参考图像时，编码结果按内容哈希缓存(ReferenceCache)，重复渲染已知形象时跳过编码；
+  register_reference预先编码
+- 协议为每行一个JSON:
+    请求: {"op": "render", "job_id", "audio", "ref_image", "pose_dir", "output_path", "params"}
+          {"op": "render_chunk", 同render, "stream_id", "index", "duration", "final"}
+          {"op": "end_stream", "stream_id"}
+          {"op": "register_reference", "ref_image", "params"}
+          {"op": "ping"}
+    进度: {"event": "progress", "job_id", "progress", "stage"}，渲染过程中可能发送多条
+    响应: {"ok": true, "job_id", "video_path", "took_ms"} / {"ok": false, "error"}
+          render_chunk的响应另有"frames"：本段实际渲染的帧数
+
+启动方式:
+    python -m integrations.echomimic_worker --socket /tmp/echomimic_worker.sock --echomimic_path /path/to/echomimic_v2
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .pose_cache import PoseCache, PoseIndex, DEFAULT_POSE_CACHE_OPTIONS
+from .reference_cache import ReferenceCache, DEFAULT_REFERENCE_CACHE_OPTIONS
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "RENDERERS",
+    "RenderCancelled",
+    "EchoMimicV2Renderer",
+    "StubRenderer",
+    "EchoMimicWorkerServer",
+    "EchoMimicWorkerClient",
+    "ProgressCallback",
+    "build_infer_args",
+    "collect_cli_output",
+]
+
+# 单行消息上限，渲染请求只包含路径和参数
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+# 进度回调: (进度0~1, 阶段)
+ProgressCallback = Callable[[float, str], None]
+
+
+def _no_progress(progress: float, stage: str):
+    pass
+
+
+class RenderCancelled(Exception):
+    """
+    渲染中的任务被取消（客户端已断开），由进度回调在渲染线程中抛出
+    """
+
+
+def build_infer_args(audio_path: str, ref_image: str, pose_dir: str, output_dir: str,
+                     params: Dict[str, Any]) -> List[str]:
+    """
+    组织infer.py的命令行参数（不含解释器和脚本路径）
+    """
+    args = [
+        "--refimg", ref_image,
+        "--audio", audio_path,
+        "--pose", pose_dir,
+        "--width", str(params["width"]),
+        "--height", str(params["height"]),
+        "--length", str(params["length"]),
+        "--steps", str(params["steps"]),
+        "--sample_rate", str(params["sample_rate"]),
+        "--cfg", str(params["cfg"]),
+        "--fps", str(params["fps"]),
+        "--context_frames", str(params["context_frames"]),
+        "--context_overlap", str(params["context_overlap"]),
+        "--seed", str(params["seed"]),
+        "--output_dir", str(output_dir)
+    ]
+    if params.get("quantization_input"):
+        args.append("--quantization")
+    return args
+
+
+def collect_cli_output(job_dir: Path, output_path: Path) -> str:
+    """
+    将infer.py在任务独立输出目录中生成的视频移动到确定的输出路径
+
+    异常:
+        FileNotFoundError: 未生成视频文件
+    """
+    video_files = sorted(job_dir.glob("**/*_ws.mp4")) or sorted(job_dir.glob("**/*.mp4"))
+    if not video_files:
+        raise FileNotFoundError(f"未找到生成的视频文件: {job_dir}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    shutil.move(str(video_files[0]), str(output_path))
+    shutil.rmtree(job_dir, ignore_errors=True)
+    return str(output_path)
+
+
+class EchoMimicV2Renderer:
+    """
+    EchoMimicV2渲染器：进程启动时由EchoMimicV2Adapter加载一次模型，
+    每个任务从姿势缓存切片所需的帧后直接用已加载的pipeline渲染。
+    姿势帧按输出尺寸绘制一次后由PoseCache以内存映射方式缓存，渲染时不再逐帧绘制。
+    启用参考图像缓存时，参考图像的VAE潜变量和参考网络特征按内容哈希缓存，渲染已知形象时跳过编码
+    """
+    name = "echomimic"
+    supports_reference = True
+
+    def __init__(self, echomimic_path: str, params: Dict[str, Any], pose_cache: Optional[PoseCache] = None,
+                 reference_cache: Optional[ReferenceCache] = None, adapter=None,
+                 adapter_options: Optional[Dict[str, Any]] = None):
+        """
+        参数:
+            echomimic_path: EchoMimicV2项目路径
+            params: 默认视频生成参数
+            pose_cache: 姿势序列缓存
+            reference_cache: 参考图像编码缓存，为None时每次渲染由pipeline编码参考图像
+            adapter: 已创建的EchoMimicV2Adapter，为None时在此创建（加载模型）
+            adapter_options: 创建适配器的参数，见DEFAULT_ADAPTER_OPTIONS
+        """
+        self.params = params
+        self.pose_cache = pose_cache if pose_cache is not None else PoseCache()
+        self.reference_cache = reference_cache
+        if adapter is None:
+            # 延迟导入，API进程和stub渲染器不需要torch
+            from .echomimic_adapter import EchoMimicV2Adapter
+            adapter = EchoMimicV2Adapter(echomimic_path, adapter_options)
+        self.adapter = adapter
+
+    def _load_poses(self, pose_dir: str, start: int, length: int, params: Dict[str, Any]) -> np.ndarray:
+        """
+        从姿势缓存切片按输出尺寸绘制的姿势图
+        """
+        size = (int(params["width"]), int(params["height"]))
+        return self.pose_cache.load(pose_dir, start, length, size=size, draw=self.adapter.draw_pose_map)
+
+    def preload_poses(self, pose_dirs: List[str]) -> int:
+        """
+        按默认输出尺寸预先绘制并缓存姿势数据集，返回成功加载的数量
+        """
+        size = (int(self.params.get("width", 512)), int(self.params.get("height", 512)))
+        return self.pose_cache.preload(pose_dirs, size=size, draw=self.adapter.draw_pose_map)
+
+    def encode_reference(self, ref_image: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        return self.adapter.encode_reference(ref_image, params)
+
+    def _reference(self, ref_image: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        从参考图像缓存取出编码结果，未命中时编码并写入缓存；未启用缓存时返回None
+        """
+        if self.reference_cache is None:
+            return None
+        _, features, _ = self.reference_cache.get_or_encode(
+            ref_image, params, lambda image: self.encode_reference(image, params)
+        )
+        return features
+
+    def render(self, job: Dict[str, Any], progress: ProgressCallback = _no_progress) -> str:
+        """
+        渲染一个任务，返回视频路径
+        """
+        params = dict(self.params, **job.get("params", {}))
+        poses = self._load_poses(job["pose_dir"], job.get("pose_start", 0), int(params["length"]), params)
+        self.adapter.render(job["audio"], job["ref_image"], poses, job["output_path"], params, progress=progress,
+                            reference=self._reference(job["ref_image"], params))
+        return job["output_path"]
+
+    def render_chunk(self, job: Dict[str, Any], state: Dict[str, Any],
+                     progress: ProgressCallback = _no_progress) -> Tuple[str, Dict[str, Any]]:
+        """
+        渲染流式分段，返回视频路径和传给下一段的衔接状态
+
+        姿势帧从上一段结束处(frame_offset)继续；上一段末尾的context_overlap帧（音频和姿势）
+        拼接在本段之前一起渲染后丢弃，同一个流的所有分段使用相同的随机种子。
+        分段帧数按本段音频时长(job["duration"])确定，不受整段视频的length上限限制，
+        实际渲染的帧数记录在衔接状态的last_frames中
+        """
+        params = dict(self.params, **job.get("params", {}))
+        frame_offset = state.get("frame_offset", 0)
+        last_audio = state.get("last_audio")
+        overlap = 0
+        if last_audio and os.path.exists(last_audio):
+            overlap = min(int(params["context_overlap"]), state.get("last_frames", 0))
+        seed = state.get("seed")
+        if seed is None:
+            seed = int(params.get("seed", -1))
+            seed = seed if seed >= 0 else random.randint(100, 1000000)
+        duration = float(job.get("duration") or 0)
+        chunk_frames = math.ceil(duration * int(params["fps"])) if duration > 0 else int(params["length"])
+        poses = self._load_poses(job["pose_dir"], frame_offset - overlap, overlap + chunk_frames, params)
+        frames = self.adapter.render(job["audio"], job["ref_image"], poses, job["output_path"], params,
+                                     progress=progress, lead_in_audio=last_audio if overlap else None,
+                                     lead_in_frames=overlap, seed=seed, max_frames=chunk_frames,
+                                     reference=self._reference(job["ref_image"], params))
+        return job["output_path"], {"frame_offset": frame_offset + frames, "last_frames": frames,
+                                    "last_audio": job["audio"], "seed": seed}
+
+
+class StubRenderer:
+    """
+    测试用渲染器：不加载模型，等待指定时长后写入占位视频文件
+    """
+    name = "stub"
+    supports_reference = True
+
+    def __init__(self, echomimic_path: str, params: Dict[str, Any], pose_cache: Optional[PoseCache] = None,
+                 reference_cache: Optional[ReferenceCache] = None):
+        self.params = params
+        self.pose_cache = pose_cache
+        self.reference_cache = reference_cache
+        self.delay = float(params.get("stub_delay", 0.2))
+        self.encode_delay = float(params.get("stub_encode_delay", 0.1))
+
+    def preload_poses(self, pose_dirs: List[str]) -> int:
+        return self.pose_cache.preload(pose_dirs) if self.pose_cache is not None else 0
+
+    def encode_reference(self, ref_image: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        # 按图像内容生成确定的占位特征
+        time.sleep(self.encode_delay)
+        seed = int.from_bytes(Path(ref_image).read_bytes()[:4].ljust(4, b"\0"), "little")
+        rng = np.random.default_rng(seed)
+        return {
+            "ref_latents": rng.standard_normal((4, params.get("height", 512) // 8,
+                                                params.get("width", 512) // 8)).astype(np.float16),
+            "ref_features": rng.standard_normal((16, 64)).astype(np.float32),
+        }
+
+    def render(self, job: Dict[str, Any], progress: ProgressCallback = _no_progress) -> str:
+        info = dict(job.get("stub_info", {}))
+        if self.pose_cache is not None:
+            poses = self.pose_cache.load(job["pose_dir"], job.get("pose_start", 0), self.params.get("length", 120))
+            info["pose_frames"] = len(poses)
+            info["pose_mmap"] = isinstance(poses, np.memmap) or isinstance(poses.base, np.memmap)
+        if self.reference_cache is not None:
+            params = dict(self.params, **job.get("params", {}))
+            info["reference_key"], _, info["reference_cached"] = self.reference_cache.get_or_encode(
+                job["ref_image"], params, lambda ref_image: self.encode_reference(ref_image, params)
+            )
+        steps = 4
+        for step in range(steps):
+            time.sleep(self.delay / steps)
+            progress((step + 1) / steps, "denoising")
+        output_path = Path(job["output_path"])
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(json.dumps(dict({
+            "job_id": job["job_id"],
+            "audio": job["audio"],
+            "pid": os.getpid(),
+        }, **info)).encode("utf-8"))
+        return str(output_path)
+
+    def render_chunk(self, job: Dict[str, Any], state: Dict[str, Any],
+                     progress: ProgressCallback = _no_progress) -> Tuple[str, Dict[str, Any]]:
+        # 记录衔接状态，便于测试检查分段之间的连续性
+        fps = self.params.get("fps", 25)
+        frames = int(job.get("duration", 0) * fps)
+        frame_offset = state.get("frame_offset", 0)
+        overlap = min(self.params.get("context_overlap", 4), state.get("last_frames", 0))
+        job = dict(job, pose_start=frame_offset, stub_info={"index": job["index"], "frame_offset": frame_offset,
+                                                            "frames": frames, "overlap": overlap})
+        video_path = self.render(job, progress)
+        return video_path, {"frame_offset": frame_offset + frames, "last_frames": frames}
+
+
+# 渲染器名称 -> 渲染器类
+RENDERERS = {
+    EchoMimicV2Renderer.name: EchoMimicV2Renderer,
+    StubRenderer.name: StubRenderer,
+}
+
+
+class EchoMimicWorkerServer:
+    """
+    渲染进程的socket服务
+    """
+    def __init__(self, renderer, socket_path: str, max_queue: int = 16):
+        """
+        参数:
+            renderer: 已加载模型的渲染器
+            socket_path: Unix socket路径
+            max_queue: 排队任务上限，超出后拒绝新任务
+        """
+        self.renderer = renderer
+        self.socket_path = socket_path
+        self.max_queue = max_queue
+        self.jobs: Optional[asyncio.Queue] = None
+        self.current_job: Optional[str] = None
+        # 流式渲染的衔接状态: stream_id -> 状态，只在事件循环中读写
+        self.streams: Dict[str, Dict[str, Any]] = {}
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        # 渲染在单独的线程中串行执行，事件循环继续接收新任务
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="echomimic-render")
+
+    async def serve_forever(self):
+        """
+        启动服务并处理任务，直到进程退出
+        """
+        self.jobs = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path,
+                                                 limit=MAX_MESSAGE_SIZE)
+        logger.info(f"[EchoMimicWorker] 渲染进程就绪: {self.socket_path} (pid={os.getpid()})")
+        async with server:
+            await self._run_jobs()
+
+    async def _run_jobs(self):
+        """
+        按顺序渲染排队的任务
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            job, future, events, cancel = await self.jobs.get()
+            if cancel.is_set():
+                # 客户端已断开
+                logger.info(f"[EchoMimicWorker] 丢弃已取消的任务: {job['job_id']}")
+                self.cancelled += 1
+                continue
+            self.current_job = job["job_id"]
+            start_time = time.time()
+            job_id = job["job_id"]
+
+            def progress(value: float, stage: str):
+                # 在渲染线程中调用：客户端已断开时中止渲染，否则转交事件循环发送
+                if cancel.is_set():
+                    raise RenderCancelled(f"任务已取消: {job_id}")
+                loop.call_soon_threadsafe(events.put_nowait, {
+                    "event": "progress", "job_id": job_id, "progress": round(float(value), 4), "stage": stage
+                })
+
+            try:
+                result = {}
+                if job.get("op") == "render_chunk":
+                    video_path, result["frames"] = await self._render_chunk(job, progress)
+                else:
+                    video_path = await loop.run_in_executor(self._executor, self.renderer.render, job, progress)
+                self.completed += 1
+                if not future.done():
+                    future.set_result(dict({"ok": True, "job_id": job["job_id"], "video_path": video_path,
+                                            "took_ms": (time.time() - start_time) * 1000}, **result))
+            except RenderCancelled:
+                self.cancelled += 1
+                logger.info(f"[EchoMimicWorker] 任务 {job_id} 已中止，耗时 {time.time() - start_time:.2f}s")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"[EchoMimicWorker] 任务 {job['job_id']} 渲染失败: {str(e)}")
+                if not future.done():
+                    future.set_result({"ok": False, "job_id": job["job_id"], "error": f"{type(e).__name__}: {e}"})
+            finally:
+                self.current_job = None
+
+    async def _render_chunk(self, job: Dict[str, Any], progress: ProgressCallback) -> Tuple[str, int]:
+        """
+        在渲染线程中渲染流式分段，返回视频路径和实际渲染的帧数；衔接状态在事件循环中取出和保存，
+        分段渲染期间收到end_stream时，渲染完成后不再保存该流的状态
+        """
+        stream_id = job["stream_id"]
+        state = self.streams.setdefault(stream_id, {})
+        video_path, state = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.renderer.render_chunk, job, dict(state), progress
+        )
+        if job.get("final"):
+            self.streams.pop(stream_id, None)
+        elif stream_id in self.streams:
+            self.streams[stream_id] = state
+        return video_path, int(state["last_frames"])
+
+    async def _register_reference(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        预先编码参考图像并写入缓存，在渲染线程中执行（与渲染共用GPU），不经过渲染队列
+        """
+        if not self.renderer.supports_reference:
+            return {"ok": False, "unsupported": True, "error": f"{self.renderer.name}渲染器不支持单独编码参考图像"}
+        cache = self.renderer.reference_cache
+        if cache is None:
+            return {"ok": False, "unsupported": True, "error": "渲染进程未启用参考图像缓存"}
+        if not request.get("ref_image"):
+            return {"ok": False, "error": "缺少参数: ref_image"}
+        params = dict(self.renderer.params, **request.get("params", {}))
+
+        def register():
+            return cache.get_or_encode(request["ref_image"], params,
+                                       lambda ref_image: self.renderer.encode_reference(ref_image, params))
+
+        try:
+            key, features, cached = await asyncio.get_running_loop().run_in_executor(self._executor, register)
+        except Exception as e:
+            logger.error(f"[EchoMimicWorker] 注册参考图像失败 {request['ref_image']}: {str(e)}")
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        return {"ok": True, "key": key, "cached": cached,
+                "bytes": sum(feature.nbytes for feature in features.values())}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "renderer": self.renderer.name,
+            "reference_encoding": self.renderer.supports_reference,
+            "streams": len(self.streams),
+            "pose_cache": self.renderer.pose_cache.stats() if self.renderer.pose_cache is not None else None,
+            "reference_cache": (self.renderer.reference_cache.stats()
+                                if self.renderer.reference_cache is not None else None),
+            "queued": self.jobs.qsize() if self.jobs is not None else 0,
+            "current_job": self.current_job,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        处理一个客户端连接：每行一个请求
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    response = {"ok": False, "error": f"无效的请求: {e}"}
+                else:
+                    response = await self._handle_request(request, reader, writer)
+                    if response is None:
+                        # 客户端在渲染完成前断开
+                        break
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, request: Dict[str, Any], reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter) -> Optional[Dict[str, Any]]:
+        op = request.get("op", "render")
+        if op == "ping":
+            return self.stats()
+        if op == "end_stream":
+            # 直接在事件循环中释放，不等待渲染线程中正在执行的任务
+            self.streams.pop(request.get("stream_id"), None)
+            return {"ok": True}
+        if op == "register_reference":
+            return await self._register_reference(request)
+        if op not in ("render", "render_chunk"):
+            return {"ok": False, "error": f"未知的操作: {op}"}
+
+        required = ["job_id", "audio", "ref_image", "pose_dir", "output_path"]
+        if op == "render_chunk":
+            required.append("stream_id")
+        missing = [key for key in required if not request.get(key)]
+        if missing:
+            return {"ok": False, "error": f"缺少参数: {', '.join(missing)}"}
+        if self.jobs.qsize() >= self.max_queue:
+            return {"ok": False, "job_id": request["job_id"], "error": f"渲染队列已满({self.jobs.qsize()})"}
+
+        future = asyncio.get_running_loop().create_future()
+        events: asyncio.Queue = asyncio.Queue()
+        # 取消标记在渲染线程中由进度回调检查
+        cancel = threading.Event()
+        await self.jobs.put((request, future, events, cancel))
+        # 等待渲染完成并转发进度，同时检测客户端断开（读到EOF）
+        disconnected = asyncio.ensure_future(reader.read(1))
+        try:
+            while True:
+                event = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait({future, disconnected, event}, return_when=asyncio.FIRST_COMPLETED)
+                if event in done:
+                    writer.write(json.dumps(event.result()).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    continue
+                event.cancel()
+                if future in done:
+                    return future.result()
+                cancel.set()
+                future.cancel()
+                return None
+        finally:
+            # 等待读取任务真正结束，之后才能继续读取下一个请求
+            disconnected.cancel()
+            await asyncio.gather(disconnected, return_exceptions=True)
+
+
+class EchoMimicWorkerClient:
+    """
+    渲染进程的客户端（API进程侧），每个请求使用一个连接，取消请求时断开连接
+    """
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+
+    async def request(self, message: Dict[str, Any], timeout: Optional[float] = None,
+                      on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        发送一个请求并等待响应
+
+        参数:
+            message: 请求
+            timeout: 等待响应的总超时(秒)，None表示不限
+            on_event: 收到进度事件时的回调
+
+        异常:
+            ConnectionError: 渲染进程未运行
+            asyncio.TimeoutError: 超时
+        """
+        try:
+            reader, writer = await asyncio.open_unix_connection(self.socket_path, limit=MAX_MESSAGE_SIZE)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"EchoMimic渲染进程未运行: {self.socket_path}") from e
+        try:
+            writer.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+            deadline = time.time() + timeout if timeout else None
+            while True:
+                remaining = max(0.0, deadline - time.time()) if deadline else None
+                line = await asyncio.wait_for(reader.readline(), remaining)
+                if not line:
+                    raise ConnectionError("EchoMimic渲染进程已断开连接")
+                response = json.loads(line)
+                if "event" not in response:
+                    return response
+                if on_event is not None:
+                    on_event(response)
+        finally:
+            writer.close()
+
+    async def ping(self, timeout: float = 5) -> Dict[str, Any]:
+        return await self.request({"op": "ping"}, timeout)
+
+    async def _submit(self, job: Dict[str, Any], op: str, timeout: Optional[float],
+                      progress: Optional[ProgressCallback]) -> Dict[str, Any]:
+        """
+        提交渲染任务并等待完成，返回响应
+
+        异常:
+            RuntimeError: 渲染失败
+        """
+        on_event = (lambda event: progress(event["progress"], event["stage"])) if progress else None
+        response = await self.request(dict(job, op=op), timeout, on_event)
+        if not response.get("ok"):
+            raise RuntimeError(f"视频生成失败: {response.get('error')}")
+        return response
+
+    async def render(self, job: Dict[str, Any], timeout: Optional[float] = None,
+                     progress: Optional[ProgressCallback] = None) -> str:
+        """
+        提交完整视频的渲染任务并等待完成，返回视频路径
+
+        参数:
+            job: 渲染任务
+            timeout: 超时(秒)，None表示不限
+            progress: 渲染进度回调
+
+        异常:
+            RuntimeError: 渲染失败
+        """
+        return (await self._submit(job, "render", timeout, progress))["video_path"]
+
+    async def render_chunk(self, job: Dict[str, Any], timeout: Optional[float] = None,
+                           progress: Optional[ProgressCallback] = None) -> Tuple[str, int]:
+        """
+        提交流式分段的渲染任务并等待完成，返回视频路径和实际渲染的帧数
+
+        异常:
+            RuntimeError: 渲染失败
+        """
+        response = await self._submit(job, "render_chunk", timeout, progress)
+        return response["video_path"], int(response["frames"])
+
+    async def end_stream(self, stream_id: str):
+        """
+        释放流式渲染的衔接状态
+        """
+        await self.request({"op": "end_stream", "stream_id": stream_id}, timeout=None)
+
+    async def register_reference(self, ref_image: str, params: Optional[Dict[str, Any]] = None,
+                                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        预先编码参考图像并写入渲染进程的缓存
+
+        返回:
+            {"key", "cached", "bytes"}
+
+        异常:
+            NotImplementedError: 渲染器不支持单独编码参考图像，或渲染进程未启用参考图像缓存
+            RuntimeError: 编码失败
+        """
+        response = await self.request({"op": "register_reference", "ref_image": ref_image,
+                                       "params": params or {}}, timeout)
+        if response.get("unsupported"):
+            raise NotImplementedError(response.get("error"))
+        if not response.get("ok"):
+            raise RuntimeError(f"注册参考图像失败: {response.get('error')}")
+        return {key: response[key] for key in ("key", "cached", "bytes")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EchoMimicV2常驻渲染进程")
+    parser.add_argument("--socket", required=True, help="Unix socket路径")
+    parser.add_argument("--echomimic_path", default=".", help="EchoMimicV2项目路径")
+    parser.add_argument("--renderer", default=EchoMimicV2Renderer.name, choices=sorted(RENDERERS))
+    parser.add_argument("--params", default="{}", help="默认视频生成参数(JSON)")
+    parser.add_argument("--model_config", default="./configs/prompts/infer.yaml",
+                        help="EchoMimicV2模型权重配置，相对于项目路径")
+    parser.add_argument("--device", default="cuda", help="推理设备")
+    parser.add_argument("--max_queue", type=int, default=16, help="排队任务上限")
+    parser.add_argument("--pose_cache_dir", default=DEFAULT_POSE_CACHE_OPTIONS["cache_dir"], help="姿势缓存目录")
+    parser.add_argument("--preload_poses", action="store_true", help="启动时预先加载assets下的所有姿势数据集")
+    parser.add_argument("--reference_cache_dir", default="",
+                        help="参考图像编码缓存目录，为空或渲染器不支持时不缓存")
+    parser.add_argument("--reference_cache_max_bytes", type=int,
+                        default=DEFAULT_REFERENCE_CACHE_OPTIONS["max_bytes"], help="参考图像编码缓存总大小上限(字节)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    socket_path = os.path.abspath(args.socket)
+    pose_cache = PoseCache(os.path.abspath(args.pose_cache_dir))
+    # EchoMimicV2适配器会切换工作目录，先确定assets的绝对路径
+    assets_path = os.path.abspath(os.path.join(args.echomimic_path, "assets"))
+    reference_cache = None
+    if args.reference_cache_dir and not RENDERERS[args.renderer].supports_reference:
+        logger.warning(f"[EchoMimicWorker] {args.renderer}渲染器不支持单独编码参考图像，不启用参考图像缓存")
+    elif args.reference_cache_dir:
+        reference_cache = ReferenceCache(os.path.abspath(args.reference_cache_dir), args.reference_cache_max_bytes)
+    renderer_kwargs = {}
+    if args.renderer == EchoMimicV2Renderer.name:
+        renderer_kwargs["adapter_options"] = {"model_config": args.model_config, "device": args.device}
+    renderer = RENDERERS[args.renderer](args.echomimic_path, json.loads(args.params), pose_cache, reference_cache,
+                                        **renderer_kwargs)
+    if args.preload_poses:
+        # 渲染器创建后再预加载，EchoMimicV2渲染器按输出尺寸绘制姿势图
+        pose_dirs = PoseIndex(assets_path).pose_dirs()
+        logger.info(f"[EchoMimicWorker] 预加载了 {renderer.preload_poses(pose_dirs)}/{len(pose_dirs)} 个姿势数据集")
+    server = EchoMimicWorkerServer(renderer, socket_path, args.max_queue)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,11 +8,11 @@ import os
 import json
 import logging
 import asyncio
-import aiohttp
 import base64
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Union, AsyncGenerator, Callable
 from dotenv import load_dotenv
+from utils.http_client import get_http_pool
 from utils.audio_utils import compute_content_hash, get_cached_audio, save_to_cache, split_text_into_sentences
 
 # 配置日志
@@ -35,6 +35,8 @@ DEFAULT_VOICE = "female-shaonv"  # 默认语音角色
 DEFAULT_VOICE_TYPE = "general"  # 默认语音类型 (general, character, clone)
 DEFAULT_SAMPLE_RATE = 32000  # 默认采样率
 DEFAULT_BITRATE = 128000  # 默认比特率
+DEFAULT_TTS_CONCURRENCY = 3  # 流式合成时同时进行的TTS请求数
+DEFAULT_TTS_LOOKAHEAD = 4  # 流式合成时最多领先当前输出片段的片段数
 
 
 class MinimaxIntegration:
@@ -50,22 +52,18 @@ class MinimaxIntegration:
         """
         self.group_id = group_id
         self.api_key = api_key
-        self.session = None
 
         # 验证必要的配置
         if not self.group_id or not self.api_key:
             logger.warning("MiniMax GroupID或API Key未配置，请设置环境变量MINIMAX_GROUP_ID和MINIMAX_API_KEY")
 
     async def ensure_session(self):
-        """确保aiohttp会话已创建"""
-        if self.session is None or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        return self.session
+        """获取共享连接池中的aiohttp会话"""
+        return await get_http_pool().get_session()
 
     async def close(self):
-        """关闭会话"""
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """关闭集成，共享会话由连接池统一关闭"""
+        pass
 
     async def chat_completion(self,
                               messages: List[Dict[str, str]],
@@ -280,7 +278,7 @@ class MinimaxIntegration:
                             "status_code": status,
                             "error": response_json
                         }
-                    except:
+                    except Exception:
                         error_text = await response.text()
                         logger.error(f"MiniMax TTS请求失败: {status} - {error_text}")
                         return {
@@ -368,7 +366,7 @@ class MinimaxIntegration:
                                     "success": False,
                                     "error": f"API返回错误: {error_json}"
                                 }
-                            except:
+                            except Exception:
                                 # 不是JSON，记录原始数据
                                 logger.error(f"MiniMax TTS返回的数据太小: {len(audio_data)} 字节, 内容: {audio_data}")
                                 return {
@@ -404,10 +402,14 @@ class MinimaxIntegration:
                                      sample_rate: int = DEFAULT_SAMPLE_RATE,
                                      use_cache: bool = True,
                                      max_chunk_size: int = 200,
-                                     callback: Optional[Callable[[bytes, str], None]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+                                     callback: Optional[Callable[[bytes, str], None]] = None,
+                                     max_concurrency: int = DEFAULT_TTS_CONCURRENCY,
+                                     lookahead: int = DEFAULT_TTS_LOOKAHEAD) -> AsyncGenerator[Dict[str, Any], None]:
         """
         流式调用MiniMax TTS API进行语音合成
         
+        各片段并行合成，但按原文顺序输出。调用方提前停止迭代时，未完成的片段合成会被取消
+        
         参数:
             text: 需要合成语音的文本
             voice_id: 语音ID
@@ -417,6 +419,8 @@ class MinimaxIntegration:
             use_cache: 是否使用缓存
             max_chunk_size: 切分文本的最大字符数
             callback: 可选的回调函数，用于接收音频数据和描述
+            max_concurrency: 同时进行的TTS请求数，1为逐句串行合成
+            lookahead: 预先启动合成的片段窗口，从当前待输出片段算起，不小于max_concurrency时才能充分并行
             
         返回:
             异步生成器，生成音频数据块
@@ -425,47 +429,68 @@ class MinimaxIntegration:
         text_chunks = split_text_into_sentences(text, max_chunk_size)
         logger.info(f"文本被切分为 {len(text_chunks)} 个片段")
         
-        for i, chunk in enumerate(text_chunks):
-            if not chunk.strip():
-                continue
+        chunks = [(i, chunk) for i, chunk in enumerate(text_chunks) if chunk.strip()]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        lookahead = max(1, lookahead)
+        tasks: Dict[int, asyncio.Task] = {}
+        
+        async def synthesize(i: int, chunk: str) -> Dict[str, Any]:
+            async with semaphore:
+                logger.info(f"处理第 {i+1}/{len(text_chunks)} 个文本片段: {chunk[:30]}...")
+                return await self.text_to_speech(
+                    text=chunk,
+                    voice_id=voice_id,
+                    voice_type=voice_type,
+                    speed=speed,
+                    sample_rate=sample_rate,
+                    use_cache=use_cache,
+                    api_version="T2A_V2",  # 流式处理总是使用最新版API
+                    style="general"
+                )
+        
+        try:
+            for position, (i, chunk) in enumerate(chunks):
+                # 保持窗口内的片段都已开始合成
+                for ahead, ahead_chunk in chunks[position:position + lookahead]:
+                    if ahead not in tasks:
+                        tasks[ahead] = asyncio.create_task(synthesize(ahead, ahead_chunk))
                 
-            logger.info(f"处理第 {i+1}/{len(text_chunks)} 个文本片段: {chunk[:30]}...")
-            
-            result = await self.text_to_speech(
-                text=chunk,
-                voice_id=voice_id,
-                voice_type=voice_type,
-                speed=speed,
-                sample_rate=sample_rate,
-                use_cache=use_cache,
-                api_version="T2A_V2",  # 流式处理总是使用最新版API
-                style="general"
-            )
-            
-            if result["success"] and "audio_data" in result:
-                # 如果提供了回调函数，调用它
-                if callback:
-                    await callback(result["audio_data"], chunk)
+                try:
+                    result = await tasks.pop(i)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
                 
-                yield {
-                    "success": True,
-                    "audio_data": result["audio_data"],
-                    "format": result.get("format", "mp3"),
-                    "chunk_index": i,
-                    "total_chunks": len(text_chunks),
-                    "text": chunk,
-                    "from_cache": result.get("from_cache", False)
-                }
-            else:
-                error = result.get("error", "未知错误")
-                logger.error(f"片段 {i+1} 处理失败: {error}")
-                yield {
-                    "success": False,
-                    "error": error,
-                    "chunk_index": i,
-                    "total_chunks": len(text_chunks),
-                    "text": chunk
-                }
+                if result["success"] and "audio_data" in result:
+                    # 如果提供了回调函数，调用它
+                    if callback:
+                        await callback(result["audio_data"], chunk)
+                    
+                    yield {
+                        "success": True,
+                        "audio_data": result["audio_data"],
+                        "format": result.get("format", "mp3"),
+                        "chunk_index": i,
+                        "total_chunks": len(text_chunks),
+                        "text": chunk,
+                        "from_cache": result.get("from_cache", False)
+                    }
+                else:
+                    error = result.get("error", "未知错误")
+                    logger.error(f"片段 {i+1} 处理失败: {error}")
+                    yield {
+                        "success": False,
+                        "error": error,
+                        "chunk_index": i,
+                        "total_chunks": len(text_chunks),
+                        "text": chunk
+                    }
+        finally:
+            # 调用方停止迭代或出错时取消尚未完成的片段
+            for task in tasks.values():
+                task.cancel()
+            if tasks:
+                logger.info(f"取消 {len(tasks)} 个未完成的TTS片段")
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
 
 
 # 单例模式，确保只创建一个实例
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+EchoMimic姿势资产索引与姿势序列缓存
+
+- PoseIndex: 启动时扫描一次assets目录，建立姿势数据集和参考图像索引，后台线程定期重新扫描，
+  API请求直接读取索引，不再每次遍历目录
+- PoseCache: 每个姿势数据集的逐帧.npy文件合并为一个文件后加载一次，按需切片所需帧数
+    - 指定size和draw时（EchoMimicV2渲染器），逐帧绘制为uint8姿势图(高, 宽, 3)后合并，按(数据集, 宽, 高)分别缓存，
+      以内存映射方式加载，渲染时不再逐帧绘制
+    - 数值型帧（形状、类型一致）合并为一个.npy并以内存映射方式加载，多个渲染进程共享同一份页缓存
+    - 对象型帧（EchoMimicV2的关键点字典，需allow_pickle）未指定绘制方式时合并为一个文件，每个进程加载一次后常驻内存
+  数据集目录的修改时间变化（增删帧文件）时自动重新合并
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "PoseIndex",
+    "PoseCache",
+    "get_pose_index",
+]
+
+# 默认姿势缓存参数
+DEFAULT_POSE_CACHE_OPTIONS = {
+    "cache_dir": "cache/poses",     # 合并后姿势文件的存放目录
+    "watch_interval": 5.0,          # assets目录重新扫描间隔(秒)，0表示不监视
+    "preload": True,                # 渲染进程启动时预先合并并加载所有姿势数据集
+}
+
+# 参考图像扩展名
+REFERENCE_IMAGE_SUFFIXES = (".png", ".jpg")
+
+# 姿势图尺寸: (宽, 高)
+PoseSize = Tuple[int, int]
+
+# 姿势绘制函数: (姿势帧, 宽, 高) -> uint8姿势图(高, 宽, 3)
+PoseDrawer = Callable[[Any, int, int], np.ndarray]
+
+
+def _frame_files(pose_dir: str) -> List[str]:
+    """
+    按帧序号排序的逐帧姿势文件（0.npy, 1.npy, ...）
+    """
+    frames = []
+    with os.scandir(pose_dir) as entries:
+        for entry in entries:
+            stem, suffix = os.path.splitext(entry.name)
+            if suffix == ".npy" and stem.isdigit() and entry.is_file():
+                frames.append((int(stem), entry.path))
+    return [path for _, path in sorted(frames)]
+
+
+def _load_frame(path: str) -> Any:
+    """
+    读取一帧姿势文件，对象型帧（关键点字典）取出其中的对象
+    """
+    frame = np.load(path, allow_pickle=True)
+    return frame.tolist() if frame.dtype == object and frame.shape == () else frame
+
+
+class PoseIndex:
+    """
+    assets目录下的姿势数据集和参考图像索引
+    """
+    def __init__(self, assets_path: str, watch_interval: float = 0):
+        """
+        参数:
+            assets_path: EchoMimicV2的assets目录
+            watch_interval: 重新扫描间隔(秒)，大于0时启动后台线程监视目录变化
+        """
+        self.assets_path = str(assets_path)
+        self.watch_interval = float(watch_interval)
+        self._pose_dirs: List[str] = []
+        self._reference_images: List[str] = []
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self.scans = 0
+        self.refresh()
+        if self.watch_interval > 0:
+            self.start_watching()
+
+    def refresh(self) -> bool:
+        """
+        重新扫描assets目录
+
+        返回:
+            索引是否发生变化
+        """
+        pose_dirs, reference_images = [], []
+        if os.path.isdir(self.assets_path):
+            for dirpath, _, filenames in os.walk(self.assets_path):
+                if "0.npy" in filenames:
+                    pose_dirs.append(dirpath)
+                for filename in filenames:
+                    if filename.lower().endswith(REFERENCE_IMAGE_SUFFIXES) and "reference" in filename.lower():
+                        reference_images.append(os.path.join(dirpath, filename))
+        pose_dirs.sort()
+        reference_images.sort()
+        self.scans += 1
+
+        changed = pose_dirs != self._pose_dirs or reference_images != self._reference_images
+        # 整体替换列表，读取方无需加锁
+        self._pose_dirs, self._reference_images = pose_dirs, reference_images
+        if changed and self.scans > 1:
+            logger.info(f"[PoseIndex] assets目录已变化: {len(pose_dirs)} 个姿势数据集, "
+                        f"{len(reference_images)} 张参考图像")
+        return changed
+
+    def pose_dirs(self) -> List[str]:
+        return list(self._pose_dirs)
+
+    def reference_images(self) -> List[str]:
+        return list(self._reference_images)
+
+    def start_watching(self):
+        """
+        启动后台监视线程
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch_loop, name="pose-index-watcher", daemon=True)
+        self._watcher.start()
+
+    def _watch_loop(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.refresh()
+            except OSError as e:
+                logger.warning(f"[PoseIndex] 扫描assets目录失败: {e}")
+
+    def stop(self):
+        """
+        停止后台监视线程
+        """
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=1)
+            self._watcher = None
+
+
+# assets目录 -> 索引，同一进程中共享
+_pose_indexes: Dict[str, PoseIndex] = {}
+_pose_indexes_lock = threading.Lock()
+
+
+def get_pose_index(assets_path: str, watch_interval: float = DEFAULT_POSE_CACHE_OPTIONS["watch_interval"]) -> PoseIndex:
+    """
+    获取assets目录的姿势资产索引，不存在时扫描并创建
+    """
+    key = os.path.abspath(assets_path)
+    with _pose_indexes_lock:
+        index = _pose_indexes.get(key)
+        if index is None:
+            index = _pose_indexes[key] = PoseIndex(key, watch_interval)
+    return index
+
+
+class PoseCache:
+    """
+    姿势序列缓存（渲染进程侧）
+    """
+    def __init__(self, cache_dir: str = DEFAULT_POSE_CACHE_OPTIONS["cache_dir"]):
+        """
+        参数:
+            cache_dir: 合并后姿势文件的存放目录，多个渲染进程使用同一目录时共享合并结果
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # (姿势数据集目录, 姿势图尺寸) -> (目录修改时间, 合并后的帧数组)，未绘制的原始帧尺寸为None
+        self._entries: Dict[Tuple[str, Optional[PoseSize]], Tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.packs = 0
+
+    def _pack_path(self, pose_dir: str, mtime_ns: int, count: int, size: Optional[PoseSize] = None) -> Path:
+        digest = hashlib.sha1(pose_dir.encode("utf-8")).hexdigest()[:16]
+        variant = f"-{size[0]}x{size[1]}" if size is not None else ""
+        return self.cache_dir / f"{digest}-{mtime_ns}-{count}{variant}.npy"
+
+    def _pack(self, pose_dir: str, mtime_ns: int, size: Optional[PoseSize] = None,
+              draw: Optional[PoseDrawer] = None) -> np.ndarray:
+        """
+        合并逐帧文件并加载；已有合并文件时直接加载
+        """
+        files = _frame_files(pose_dir)
+        if not files:
+            raise FileNotFoundError(f"姿势数据集中没有帧文件: {pose_dir}")
+        path = self._pack_path(pose_dir, mtime_ns, len(files), size)
+        if not path.exists():
+            tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+            if size is not None:
+                # 逐帧绘制后直接写入内存映射文件，不在内存中保留整个数据集的姿势图
+                width, height = size
+                packed = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.uint8,
+                                                   shape=(len(files), height, width, 3))
+                for i, file in enumerate(files):
+                    packed[i] = draw(_load_frame(file), width, height)
+                packed.flush()
+                del packed
+                self._commit(pose_dir, tmp_path, path, len(files))
+                return np.load(path, mmap_mode="r")
+
+            frames = [np.load(file, allow_pickle=True) for file in files]
+            first = frames[0]
+            numeric = first.dtype != object and all(
+                frame.dtype == first.dtype and frame.shape == first.shape for frame in frames
+            )
+            if numeric:
+                packed = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=first.dtype,
+                                                   shape=(len(frames),) + first.shape)
+                for i, frame in enumerate(frames):
+                    packed[i] = frame
+                packed.flush()
+                del packed
+            else:
+                packed = np.empty(len(frames), dtype=object)
+                for i, frame in enumerate(frames):
+                    packed[i] = frame.tolist() if frame.dtype == object and frame.shape == () else frame
+                np.save(tmp_path, packed, allow_pickle=True)
+            self._commit(pose_dir, tmp_path, path, len(files))
+
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            # 对象数组无法内存映射
+            return np.load(path, allow_pickle=True)
+
+    def _commit(self, pose_dir: str, tmp_path: Path, path: Path, count: int):
+        """
+        原子替换为正式的合并文件，其他渲染进程不会读到写了一半的文件
+        """
+        os.replace(tmp_path, path)
+        self.packs += 1
+        self._remove_stale(path)
+        logger.info(f"[PoseCache] 合并姿势数据集 {pose_dir}: {count} 帧 -> {path.name}")
+
+    def _remove_stale(self, path: Path):
+        """
+        删除同一数据集、同一姿势图尺寸的旧合并文件
+        """
+        def variant(name: str) -> Tuple[str, str]:
+            parts = name[:-len(".npy")].split("-")
+            return parts[0], parts[3] if len(parts) > 3 else ""
+
+        current = variant(path.name)
+        for stale in self.cache_dir.glob(f"{current[0]}-*.npy"):
+            if stale != path and ".tmp." not in stale.name and variant(stale.name) == current:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+    def get(self, pose_dir: str, size: Optional[PoseSize] = None, draw: Optional[PoseDrawer] = None) -> np.ndarray:
+        """
+        获取姿势数据集的全部帧（绘制的姿势图和数值型帧为只读内存映射数组，对象型为对象数组）
+
+        参数:
+            pose_dir: 姿势数据集目录
+            size: 姿势图尺寸(宽, 高)，指定时返回按此尺寸绘制的uint8姿势图
+            draw: 姿势绘制函数，指定size时必须提供
+        """
+        if size is not None and draw is None:
+            raise ValueError("指定姿势图尺寸时需要提供绘制函数")
+        pose_dir = os.path.abspath(pose_dir)
+        key = (pose_dir, tuple(int(value) for value in size) if size is not None else None)
+        mtime_ns = os.stat(pose_dir).st_mtime_ns
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != mtime_ns:
+                entry = self._entries[key] = (mtime_ns, self._pack(pose_dir, mtime_ns, key[1], draw))
+        return entry[1]
+
+    def load(self, pose_dir: str, start: int = 0, length: Optional[int] = None, size: Optional[PoseSize] = None,
+             draw: Optional[PoseDrawer] = None) -> np.ndarray:
+        """
+        读取从start开始的length帧，超出数据集长度时循环使用；不跨越末尾时为零拷贝视图
+
+        参数:
+            pose_dir: 姿势数据集目录
+            start: 起始帧
+            length: 帧数，None表示到末尾
+            size: 姿势图尺寸(宽, 高)，见get
+            draw: 姿势绘制函数，见get
+        """
+        frames = self.get(pose_dir, size, draw)
+        count = len(frames)
+        start = start % count
+        if length is None:
+            return frames[start:]
+        if start + length <= count:
+            return frames[start:start + length]
+        return frames[np.arange(start, start + length) % count]
+
+    def preload(self, pose_dirs: List[str], size: Optional[PoseSize] = None,
+                draw: Optional[PoseDrawer] = None) -> int:
+        """
+        预先合并并加载姿势数据集，返回成功加载的数量
+        """
+        loaded = 0
+        for pose_dir in pose_dirs:
+            try:
+                self.get(pose_dir, size, draw)
+                loaded += 1
+            except (OSError, ValueError) as e:
+                logger.warning(f"[PoseCache] 预加载姿势数据集失败 {pose_dir}: {e}")
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pose_sets": len(self._entries),
+            "packs": self.packs,
+            "mapped_bytes": sum(frames.nbytes for _, frames in self._entries.values() if frames.dtype != object),
+        }
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+EchoMimic参考图像编码缓存（渲染进程侧）
+
+同一个数字人形象的参考图像每次渲染都要经过参考网络和VAE编码，结果只取决于图像内容和渲染尺寸。
+缓存按图像内容哈希和尺寸保存编码结果（参考潜变量、参考特征等），重复渲染已知形象时跳过编码。
+EchoMimicV2渲染器的编码结果为VAE潜变量和参考网络写入各注意力层的特征（见EchoMimicV2Adapter.encode_reference）。
+
+- 每个条目是一个目录，其中每个特征一个.npy文件，加载时以内存映射方式读取
+- 条目先写入临时目录再重命名，多个渲染进程共享同一缓存目录时不会读到写了一半的条目
+- 按总大小做LRU淘汰，命中时更新条目目录的修改时间，重启后仍保留使用顺序
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "ReferenceCache",
+    "reference_key",
+]
+
+# 默认参考图像缓存参数
+DEFAULT_REFERENCE_CACHE_OPTIONS = {
+    "enabled": True,                    # 是否缓存参考图像编码结果（需要渲染器支持）
+    "cache_dir": "",                    # 缓存目录，为空时使用output_dir/.reference_cache
+    "max_bytes": 2 * 1024 ** 3,         # 缓存总大小上限，超出后淘汰最久未使用的条目
+}
+
+# 条目元数据文件名
+META_NAME = "meta.json"
+
+# 编码函数: 参考图像路径 -> {特征名: 数组}
+ReferenceEncoder = Callable[[str], Dict[str, Any]]
+
+# 图像路径 -> (修改时间, 大小, 内容哈希)，避免每次渲染重新读取图像计算哈希
+_digests: Dict[str, Tuple[int, int, str]] = {}
+
+
+def _image_digest(image_path: str) -> str:
+    """
+    参考图像内容的SHA-256（文件未变化时复用上次的结果）
+    """
+    path = os.path.abspath(image_path)
+    stat = os.stat(path)
+    cached = _digests.get(path)
+    if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(block)
+    digest = sha.hexdigest()
+    _digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+    return digest
+
+
+def reference_key(image_path: str, params: Dict[str, Any]) -> str:
+    """
+    缓存键：图像内容哈希 + 渲染尺寸（参考潜变量与输入尺寸有关）
+    """
+    return f"{_image_digest(image_path)[:32]}-{params.get('width', 512)}x{params.get('height', 512)}"
+
+
+def _to_numpy(value: Any) -> np.ndarray:
+    """
+    将编码结果转为numpy数组，支持torch张量（bfloat16先转为float32）
+    """
+    if hasattr(value, "detach"):
+        value = value.detach().cpu()
+        if str(value.dtype) == "torch.bfloat16":
+            value = value.float()
+        value = value.numpy()
+    return np.ascontiguousarray(value)
+
+
+class ReferenceCache:
+    """
+    参考图像编码结果缓存
+    """
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_REFERENCE_CACHE_OPTIONS["max_bytes"]):
+        """
+        参数:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限(字节)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        读取缓存的编码结果，不存在时返回None
+        """
+        entry_dir = self._entry_dir(key)
+        try:
+            meta = json.loads((entry_dir / META_NAME).read_text())
+            features = {name: np.load(entry_dir / f"{name}.npy", mmap_mode="r") for name in meta["features"]}
+            # 更新使用时间，用于LRU淘汰
+            os.utime(entry_dir)
+        except (OSError, ValueError, KeyError):
+            return None
+        return features
+
+    def put(self, key: str, features: Dict[str, Any], source: str = "") -> int:
+        """
+        写入编码结果，返回条目大小(字节)
+        """
+        arrays = {name: _to_numpy(value) for name, value in features.items()}
+        tmp_dir = self.cache_dir / f".{key}.{uuid.uuid4().hex[:8]}.tmp"
+        tmp_dir.mkdir()
+        try:
+            for name, array in arrays.items():
+                np.save(tmp_dir / f"{name}.npy", array, allow_pickle=False)
+            size = sum(array.nbytes for array in arrays.values())
+            (tmp_dir / META_NAME).write_text(json.dumps({
+                "features": list(arrays),
+                "bytes": size,
+                "source": source,
+                "created_at": time.time(),
+            }, ensure_ascii=False))
+            try:
+                os.rename(tmp_dir, self._entry_dir(key))
+            except OSError:
+                # 其他渲染进程已写入同一条目
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        self.evict(keep=key)
+        return size
+
+    def get_or_encode(self, image_path: str, params: Dict[str, Any],
+                      encode: ReferenceEncoder) -> Tuple[str, Dict[str, np.ndarray], bool]:
+        """
+        读取参考图像的编码结果，未缓存时调用encode编码并写入缓存
+
+        返回:
+            (缓存键, 编码结果, 是否命中缓存)
+        """
+        key = reference_key(image_path, params)
+        features = self.get(key)
+        if features is not None:
+            self.hits += 1
+            return key, features, True
+        self.misses += 1
+        start_time = time.time()
+        encoded = encode(image_path)
+        size = self.put(key, encoded, source=os.path.abspath(image_path))
+        logger.info(f"[ReferenceCache] 已缓存参考图像 {image_path} -> {key} "
+                    f"({size / 1024 / 1024:.1f}MB, 编码耗时 {(time.time() - start_time) * 1000:.0f}ms)")
+        features = self.get(key)
+        if features is None:
+            # 条目刚写入就被其他渲染进程淘汰时直接使用编码结果
+            features = {name: _to_numpy(value) for name, value in encoded.items()}
+        return key, features, False
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """
+        所有缓存条目，按最近使用时间从新到旧排列
+        """
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if entry_dir.name.startswith(".") or not entry_dir.is_dir():
+                continue
+            try:
+                meta = json.loads((entry_dir / META_NAME).read_text())
+                last_used = entry_dir.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append({"key": entry_dir.name, "bytes": meta.get("bytes", 0),
+                            "source": meta.get("source", ""), "last_used": last_used})
+        entries.sort(key=lambda entry: entry["last_used"], reverse=True)
+        return entries
+
+    def evict(self, keep: Optional[str] = None) -> int:
+        """
+        淘汰最久未使用的条目，直到总大小不超过上限，返回淘汰的条目数
+
+        参数:
+            keep: 不淘汰的条目（刚写入的条目）
+        """
+        with self._lock:
+            entries = self.entries()
+            total = sum(entry["bytes"] for entry in entries)
+            evicted = 0
+            for entry in reversed(entries):
+                if total <= self.max_bytes:
+                    break
+                if entry["key"] == keep:
+                    continue
+                shutil.rmtree(self._entry_dir(entry["key"]), ignore_errors=True)
+                total -= entry["bytes"]
+                evicted += 1
+            self.evictions += evicted
+        if evicted:
+            logger.info(f"[ReferenceCache] 淘汰了 {evicted} 个参考图像缓存条目")
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(entry["bytes"] for entry in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+'''
+流式数字人视频：按TTS句子分段渲染，每段渲染完成立即输出可播放的分片
+
+- 文本按句切分，TTS提前合成后续句子（prefetch），与当前句子的渲染并行
+- 每个句子作为一个分段提交给EchoMimic渲染进程，同一流的分段之间由渲染进程保留衔接状态
+- hls格式：分段经ffmpeg转封装为MPEG-TS分片并追加到m3u8播放列表（EVENT类型，播放器边生成边播放）
+- mp4格式：直接输出渲染得到的每段mp4，由调用方按事件顺序播放
+'''
+
+import asyncio
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+from utils.protocol import AudioMessage
+from utils.audio import get_audio_data_duration
+from utils.audio_utils import split_text_into_sentences
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "HlsPlaylist",
+    "AvatarStreamer",
+    "remux_segment",
+]
+
+# 默认流式视频参数
+DEFAULT_AVATAR_STREAM_OPTIONS = {
+    "segment_format": "hls",    # 分片格式: hls（MPEG-TS分片+m3u8，需要ffmpeg）/ mp4（直接输出每段渲染结果）
+    "max_chars": 60,            # 单个分段的最大字符数，过长的句子强制切分
+    "prefetch": 2,              # 提前合成的句子数
+}
+
+# 播放列表文件名
+PLAYLIST_NAME = "index.m3u8"
+
+
+class HlsPlaylist:
+    """
+    增量写入的HLS播放列表
+
+    每追加一个分片重写一次播放列表（先写临时文件再替换，播放器不会读到半个文件），结束时写入ENDLIST
+    """
+    def __init__(self, directory: Path, name: str = PLAYLIST_NAME):
+        self.path = Path(directory) / name
+        self.segments: List[Dict[str, Any]] = []
+        self.ended = False
+        self._write()
+
+    def add(self, filename: str, duration: float):
+        """
+        追加一个分片
+        """
+        self.segments.append({"filename": filename, "duration": duration})
+        self._write()
+
+    def end(self):
+        """
+        标记播放列表结束
+        """
+        self.ended = True
+        self._write()
+
+    def render(self) -> str:
+        target = max([int(segment["duration"]) + 1 for segment in self.segments] or [1])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for segment in self.segments:
+            lines.append(f"#EXTINF:{segment['duration']:.3f},")
+            lines.append(segment["filename"])
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def _write(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(self.render())
+        os.replace(tmp_path, self.path)
+
+
+async def remux_segment(src: str, dst: str, offset: float):
+    """
+    用ffmpeg将渲染得到的mp4转封装为MPEG-TS分片（不重新编码），时间戳从offset开始
+
+    异常:
+        RuntimeError: ffmpeg执行失败
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", src,
+        "-c", "copy", "-bsf:v", "h264_mp4toannexb", "-output_ts_offset", f"{offset:.3f}",
+        "-f", "mpegts", dst,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"分片转封装失败: {stderr.decode(errors='ignore').strip()}")
+
+
+class AvatarStreamer:
+    """
+    流式数字人视频生成器
+    """
+    def __init__(self, integration, tts: Callable[[str], Awaitable[Optional[AudioMessage]]],
+                 options: Optional[Dict[str, Any]] = None):
+        """
+        参数:
+            integration: EchoMimicIntegration实例
+            tts: 语音合成函数，输入一句文本，返回音频
+            options: 流式参数，键名不区分大小写，未提供的项使用DEFAULT_AVATAR_STREAM_OPTIONS
+        """
+        self.integration = integration
+        self.tts = tts
+        self.options = dict(DEFAULT_AVATAR_STREAM_OPTIONS)
+        for key, value in dict(options or {}).items():
+            key = key.lower()
+            if key in DEFAULT_AVATAR_STREAM_OPTIONS:
+                self.options[key] = value
+            else:
+                logger.warning(f"[AvatarStreamer] 未知的流式视频参数: {key}")
+        self.segment_format = str(self.options["segment_format"]).lower()
+        if self.segment_format not in ("hls", "mp4"):
+            raise ValueError(f"不支持的分片格式: {self.segment_format}")
+        if self.segment_format == "hls" and shutil.which("ffmpeg") is None:
+            raise RuntimeError("hls分片需要ffmpeg，请安装ffmpeg或将segment_format设为mp4")
+
+    def split(self, text: str) -> List[str]:
+        """
+        将文本切分为分段
+        """
+        sentences = split_text_into_sentences(text, int(self.options["max_chars"]))
+        return [sentence.strip() for sentence in sentences if sentence.strip()]
+
+    async def _synthesize(self, sentences: List[str], queue: asyncio.Queue):
+        """
+        依次合成每个句子并放入队列，队列满时等待渲染跟上；出错时将异常放入队列
+        """
+        try:
+            for index, sentence in enumerate(sentences):
+                audio = await self.tts(sentence)
+                if not audio:
+                    raise RuntimeError(f"语音合成失败: {sentence}")
+                audio_format = audio.format.value
+                audio_path = await self.integration.save_audio_to_file(audio.data, audio_format)
+                duration = await get_audio_data_duration(audio.data, audio_format)
+                await queue.put((index, sentence, audio_path, duration))
+        except Exception as e:
+            await queue.put(e)
+
+    async def stream(self, stream_id: str, text: str, ref_image_path: Optional[str] = None,
+                     pose_dir_path: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式生成视频，每个分段完成时输出一个分段信息
+
+        参数:
+            stream_id: 流ID，决定输出目录
+            text: 要播报的文本
+            ref_image_path: 可选，参考图像路径
+            pose_dir_path: 可选，姿势数据目录路径
+
+        返回:
+            异步生成器，分段信息包含index、text、path（分片文件）、start、duration、total、playlist
+        """
+        sentences = self.split(text)
+        if not sentences:
+            return
+        directory = self.integration.stream_dir(stream_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        playlist = HlsPlaylist(directory) if self.segment_format == "hls" else None
+        logger.info(f"[AvatarStreamer] 开始流式生成 {stream_id}: {len(sentences)} 个分段")
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, int(self.options["prefetch"])))
+        producer = asyncio.ensure_future(self._synthesize(sentences, queue))
+        start = 0.0
+        finished = False
+        try:
+            for _ in sentences:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                index, sentence, audio_path, audio_duration = item
+                final = index == len(sentences) - 1
+                # 分段时长按实际渲染的帧数计算，播放列表和起始时间与视频一致
+                chunk_path, duration = await self.integration.render_stream_chunk(
+                    stream_id, index, audio_path, audio_duration, final, ref_image_path, pose_dir_path
+                )
+                if playlist is not None:
+                    filename = f"segment_{index:05d}.ts"
+                    await remux_segment(chunk_path, str(directory / filename), start)
+                    os.remove(chunk_path)
+                    playlist.add(filename, duration)
+                    segment_path = str(directory / filename)
+                else:
+                    segment_path = chunk_path
+                yield {
+                    "index": index,
+                    "text": sentence,
+                    "path": segment_path,
+                    "start": start,
+                    "duration": duration,
+                    "total": len(sentences),
+                    "playlist": str(playlist.path) if playlist is not None else None,
+                }
+                start += duration
+            finished = True
+            if playlist is not None:
+                playlist.end()
+        finally:
+            producer.cancel()
+            if not finished:
+                # 中途取消或出错，释放渲染进程中的衔接状态
+                await self.integration.end_stream(stream_id)
@@ -5,12 +5,17 @@
 
 import logging
 import asyncio
-from typing import Optional, Dict, Any, List, Union
+import time
+from typing import Optional, Dict, Any, List, Union, AsyncGenerator
 from utils.protocol import AudioMessage, TextMessage
+from utils.audio_utils import SentenceSegmenter
 from engine.asr.asrFactory import ASRFactory
 from engine.llm.llmFactory import LLMFactory
 from engine.tts.ttsFactory import TTSFactory
 from engine.agent.agent_factory import AgentFactory
+from engine.enginePool import EnginePool, EngineType
+from engine.executor import InferenceExecutorBusy
+from utils.metrics import get_metrics, span, observe
 from yacs.config import CfgNode as CN
 
 # 配置日志
@@ -67,7 +72,37 @@ class ConversationPipeline:
         # 是否使用Agent模式
         self.use_agent = hasattr(config, 'AGENT') and config.AGENT.ENABLED and self.agent_engine is not None
         
+        # 引擎池，用于统一预热和关闭流水线中的引擎
+        self.engine_pool = EnginePool()
+        
         logger.info(f"对话流水线初始化完成，{'已启用' if self.use_agent else '未启用'} Agent模式")
+    
+    async def setup(self):
+        """
+        将流水线引擎登记到引擎池，之后可通过engine_pool.warmup统一预热
+        """
+        for engine_type, section, engine in ((EngineType.ASR, "ASR", self.asr_engine),
+                                             (EngineType.LLM, "LLM", self.llm_engine),
+                                             (EngineType.TTS, "TTS", self.tts_engine)):
+            if engine is not None:
+                self.engine_pool.registerEngine(engine_type, self.config[section].NAME, engine)
+    
+    async def warmup(self, preload: Optional[List[str]] = None, inference: bool = True, timeout: float = 120):
+        """
+        预热流水线引擎和额外预加载的引擎
+        
+        参数:
+            preload: 额外预加载的引擎列表，格式为"类型/名称"
+            inference: 是否执行一次合成推理
+            timeout: 单个引擎预热超时(秒)
+        """
+        await self.engine_pool.warmup(preload=preload, inference=inference, timeout=timeout)
+    
+    async def cleanup(self):
+        """
+        关闭流水线中的所有引擎
+        """
+        await self.engine_pool.closeAll()
         
     async def process(self, 
                      audio_input: AudioMessage, 
@@ -90,14 +125,17 @@ class ConversationPipeline:
             skip_tts: 是否跳过TTS步骤
             
         返回:
-            包含处理结果的字典
+            包含处理结果的字典: input_text（识别文本）、response_text（回复文本）、audio_output（回复音频）
+            和各引擎的原始结果；出错时包含error
         """
         result = {
             "asr_result": None,
             "llm_result": None,
             "agent_result": None,  # 新增agent结果
             "tts_result": None,
-            "error": None
+            "input_text": None,
+            "response_text": "",
+            "audio_output": None
         }
         
         # 确定是否使用Agent
@@ -107,48 +145,54 @@ class ConversationPipeline:
             # 步骤1: ASR处理
             if skip_asr or text_input:
                 asr_text = text_input
-                result["asr_result"] = TextMessage(text=asr_text) if asr_text else None
+                result["asr_result"] = TextMessage(data=asr_text) if asr_text else None
             else:
                 if not self.asr_engine:
                     raise ValueError("ASR引擎未初始化")
                 
                 logger.info("执行语音识别...")
-                asr_text_message = await self.asr_engine.transcribe(audio_input)
+                with span("asr"):
+                    asr_text_message = await self.asr_engine.run(audio_input)
                 result["asr_result"] = asr_text_message
-                asr_text = asr_text_message.text if asr_text_message else None
+                asr_text = asr_text_message.data if asr_text_message else None
                 
                 if not asr_text:
                     logger.warning("语音识别未返回文本")
                     return result
+            result["input_text"] = asr_text
             
             # 步骤2: LLM/Agent处理
             if skip_llm:
                 logger.info("跳过LLM/Agent处理")
+                llm_text = None
             else:
                 if use_agent_mode and self.agent_engine:
                     # 使用Agent处理
                     logger.info("使用Agent处理文本...")
-                    agent_response = await self.agent_engine.process(
-                        asr_text,
-                        conversation_context=conversation_context
-                    )
+                    with span("agent"):
+                        agent_response = await self.agent_engine.process(
+                            asr_text,
+                            conversation_context=conversation_context
+                        )
                     result["agent_result"] = agent_response
                     llm_text = agent_response.text if agent_response else None
                 elif self.llm_engine:
                     # 使用传统LLM处理
                     logger.info("使用LLM处理文本...")
-                    llm_response = await self.llm_engine.generate(
-                        asr_text,
-                        conversation_context=conversation_context
-                    )
+                    with span("llm"):
+                        llm_response = await self.llm_engine.run(
+                            TextMessage(data=asr_text),
+                            context=conversation_context
+                        )
                     result["llm_result"] = llm_response
-                    llm_text = llm_response.text if llm_response else None
+                    llm_text = llm_response.data if llm_response else None
                 else:
                     raise ValueError("LLM引擎和Agent引擎均未初始化")
                 
                 if not llm_text:
                     logger.warning("LLM/Agent未返回文本")
                     return result
+                result["response_text"] = llm_text
             
             # 步骤3: TTS处理
             if skip_tts:
@@ -157,26 +201,237 @@ class ConversationPipeline:
                 if not self.tts_engine:
                     raise ValueError("TTS引擎未初始化")
                 
-                # 获取LLM/Agent输出文本
-                text_to_speak = None
-                if result["agent_result"]:
-                    text_to_speak = result["agent_result"].text
-                elif result["llm_result"]:
-                    text_to_speak = result["llm_result"].text
-                
-                if text_to_speak:
+                if llm_text:
                     logger.info("执行语音合成...")
-                    tts_audio = await self.tts_engine.synthesize(text_to_speak)
+                    with span("tts"):
+                        tts_audio = await self.tts_engine.run(TextMessage(data=llm_text))
                     result["tts_result"] = tts_audio
+                    result["audio_output"] = tts_audio
             
             return result
             
+        except InferenceExecutorBusy:
+            # 推理队列已满，交给接口层返回503
+            raise
         except Exception as e:
             error_msg = f"对话流水线处理失败: {str(e)}"
             logger.error(error_msg)
             result["error"] = error_msg
             return result
             
+    async def process_stream(self,
+                             audio_input: Optional[AudioMessage] = None,
+                             conversation_context: Optional[Dict[str, Any]] = None,
+                             text_input: Optional[str] = None,
+                             use_agent: Optional[bool] = None,
+                             skip_tts: bool = False,
+                             max_sentence_chars: int = 200,
+                             max_concurrent_tts: int = 2) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式处理语音输入：LLM边生成边切句，每个完整句子立即提交TTS，音频按句子顺序输出
+        
+        参数:
+            audio_input: 语音输入
+            conversation_context: 对话上下文
+            text_input: 文本输入，如果提供则跳过ASR
+            use_agent: 是否使用Agent，默认根据配置决定
+            skip_tts: 是否跳过TTS步骤（只输出文本片段）
+            max_sentence_chars: 每个句子的最大字符数
+            max_concurrent_tts: 同时进行的TTS任务数上限
+            
+        返回:
+            异步生成器，依次产生以下事件字典（通过"type"字段区分）:
+                asr: 识别文本
+                text: LLM文本增量
+                audio: 按句子顺序输出的音频片段
+                timing: 阶段耗时（相对于请求开始的毫秒数），同时记录到turn_milestone_seconds指标
+                error: 处理错误
+                done: 处理结束，包含完整文本和各阶段耗时
+        """
+        start_time = time.perf_counter()
+        timings = {}
+        metrics = get_metrics()
+        
+        def timing_event(stage: str, at: Optional[float] = None) -> Dict[str, Any]:
+            timings[stage] = ((at or time.perf_counter()) - start_time) * 1000
+            metrics.observe("turn_milestone_seconds", timings[stage] / 1000, milestone=stage)
+            return {"type": "timing", "stage": stage, "elapsed_ms": timings[stage]}
+        
+        use_agent_mode = self.use_agent if use_agent is None else use_agent
+        asr_text = text_input
+        response_text = ""
+        events: asyncio.Queue = asyncio.Queue()
+        tts_tasks: List[asyncio.Task] = []
+        producer = None
+        llm_finished = None
+        
+        try:
+            # 步骤1: ASR处理
+            if not asr_text:
+                if not self.asr_engine:
+                    raise ValueError("ASR引擎未初始化")
+                
+                logger.info("执行语音识别...")
+                with span("asr"):
+                    asr_message = await self.asr_engine.run(audio_input)
+                asr_text = asr_message.data if asr_message else None
+                yield timing_event("asr")
+                
+                if not asr_text:
+                    logger.warning("语音识别未返回文本")
+                    yield {"type": "done", "asr_text": None, "response_text": "", "timings": timings}
+                    return
+            yield {"type": "asr", "text": asr_text}
+            
+            if not skip_tts and not self.tts_engine:
+                raise ValueError("TTS引擎未初始化")
+            
+            # 步骤2: LLM生成与分句TTS并行进行
+            tts_semaphore = asyncio.Semaphore(max(1, max_concurrent_tts))
+            
+            async def synthesize(sentence: str) -> Optional[AudioMessage]:
+                submitted = time.perf_counter()
+                async with tts_semaphore:
+                    observe("tts_queue_wait", time.perf_counter() - submitted)
+                    with span("tts"):
+                        return await self.tts_engine.run(TextMessage(data=sentence))
+            
+            def submit(sentence: str):
+                if skip_tts or not sentence.strip():
+                    return
+                task = asyncio.create_task(synthesize(sentence))
+                tts_tasks.append(task)
+                events.put_nowait(("sentence", sentence, task))
+            
+            async def produce():
+                nonlocal llm_finished
+                segmenter = SentenceSegmenter(max_sentence_chars)
+                try:
+                    with span("agent" if use_agent_mode and self.agent_engine else "llm"):
+                        async for delta in self._generate_text_stream(asr_text, conversation_context, use_agent_mode):
+                            if not delta:
+                                continue
+                            events.put_nowait(("text", delta, None))
+                            for sentence in segmenter.feed(delta):
+                                submit(sentence)
+                        for sentence in segmenter.flush():
+                            submit(sentence)
+                except Exception as e:
+                    events.put_nowait(("error", str(e), None))
+                finally:
+                    # 记录LLM结束时刻，不受后续TTS排空耗时影响
+                    llm_finished = time.perf_counter()
+                    events.put_nowait(("end", None, None))
+            
+            producer = asyncio.create_task(produce())
+            
+            # 按提交顺序输出文本增量和音频片段
+            sentence_index = 0
+            while True:
+                kind, payload, task = await events.get()
+                if kind == "end":
+                    break
+                if kind == "error":
+                    raise RuntimeError(payload)
+                if kind == "text":
+                    if not response_text:
+                        yield timing_event("llm_first_token")
+                    response_text += payload
+                    yield {"type": "text", "delta": payload}
+                    continue
+                
+                audio = await task
+                if audio:
+                    if "tts_first_audio" not in timings:
+                        yield timing_event("tts_first_audio")
+                    yield {
+                        "type": "audio",
+                        "index": sentence_index,
+                        "text": payload,
+                        "audio": audio
+                    }
+                else:
+                    logger.warning(f"句子语音合成失败: {payload[:30]}...")
+                sentence_index += 1
+            
+            yield timing_event("llm", llm_finished)
+            if not response_text:
+                logger.warning("LLM/Agent未返回文本")
+            yield timing_event("total")
+            yield {
+                "type": "done",
+                "asr_text": asr_text,
+                "response_text": response_text,
+                "timings": timings
+            }
+            
+        except Exception as e:
+            error_msg = f"对话流水线流式处理失败: {str(e)}"
+            logger.error(error_msg)
+            yield {"type": "error", "error": error_msg}
+        finally:
+            # 消费方提前停止或出错时，取消尚未完成的任务
+            if producer and not producer.done():
+                producer.cancel()
+            for task in tts_tasks:
+                if not task.done():
+                    task.cancel()
+    
+    async def _generate_text_stream(self, text: str,
+                                    conversation_context: Optional[Dict[str, Any]],
+                                    use_agent_mode: bool) -> AsyncGenerator[str, None]:
+        """
+        以文本增量的形式获取LLM/Agent回复
+        
+        参数:
+            text: 用户输入文本
+            conversation_context: 对话上下文
+            use_agent_mode: 是否使用Agent
+            
+        返回:
+            异步生成器，产生回复文本片段
+        """
+        if use_agent_mode and self.agent_engine:
+            # Agent不支持增量输出，整体返回
+            logger.info("使用Agent处理文本...")
+            agent_response = await self.agent_engine.process(
+                text,
+                conversation_context=conversation_context
+            )
+            if agent_response and agent_response.text:
+                yield agent_response.text
+        elif self.llm_engine:
+            logger.info("使用LLM流式处理文本...")
+            if hasattr(self.llm_engine, "run_stream"):
+                async for delta in self.llm_engine.run_stream(TextMessage(data=text), context=conversation_context):
+                    yield delta
+            else:
+                llm_response = await self.llm_engine.run(TextMessage(data=text), context=conversation_context)
+                if llm_response and llm_response.data:
+                    yield llm_response.data
+        else:
+            raise ValueError("LLM引擎和Agent引擎均未初始化")
+            
+    def create_asr_stream(self, sample_rate: int = 16000, sample_width: int = 2, **kwargs):
+        """
+        创建流式语音识别会话，边接收音频边识别
+        
+        参数:
+            sample_rate: 输入PCM的采样率
+            sample_width: 输入PCM的采样宽度（字节）
+            **kwargs: 额外识别参数
+            
+        返回:
+            ASRStream: 流式识别会话，ASR引擎未初始化或不支持时返回None
+        """
+        if not self.asr_engine or not hasattr(self.asr_engine, "create_stream"):
+            return None
+        try:
+            return self.asr_engine.create_stream(sample_rate=sample_rate, sample_width=sample_width, **kwargs)
+        except Exception as e:
+            logger.error(f"创建流式识别会话失败: {str(e)}")
+            return None
+            
     async def asr_only(self, audio_input: AudioMessage) -> Optional[TextMessage]:
         """
         仅执行语音识别
@@ -193,6 +448,8 @@ class ConversationPipeline:
             
         try:
             return await self.asr_engine.run(audio_input)
+        except InferenceExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"语音识别出错: {str(e)}")
             return None
@@ -219,16 +476,20 @@ class ConversationPipeline:
                 text_input = TextMessage(data=text_input)
                 
             return await self.llm_engine.run(text_input, context=conversation_context)
+        except InferenceExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"语言模型处理出错: {str(e)}")
             return None
             
-    async def tts_only(self, text_input: Union[str, TextMessage]) -> Optional[AudioMessage]:
+    async def tts_only(self, text_input: Union[str, TextMessage],
+                       voice_id: Optional[str] = None) -> Optional[AudioMessage]:
         """
         仅执行语音合成
         
         参数:
             text_input: 输入文本或文本消息
+            voice_id: 语音ID，None时使用引擎配置的默认声音
             
         返回:
             AudioMessage: 合成的音频
@@ -241,8 +502,12 @@ class ConversationPipeline:
             # 如果输入是字符串，转换为TextMessage
             if isinstance(text_input, str):
                 text_input = TextMessage(data=text_input)
-                
-            return await self.tts_engine.run(text_input)
+            
+            # 只在指定时传入，避免改变未指定声音时的缓存键
+            kwargs = {"voice_id": voice_id} if voice_id else {}
+            return await self.tts_engine.run(text_input, **kwargs)
+        except InferenceExecutorBusy:
+            raise
         except Exception as e:
             logger.error(f"语音合成出错: {str(e)}")
             return None
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+'''
+会话级取消：同一会话同一时间只有一轮回复
+
+用户插话（VAD检测到新的语音或客户端发送取消）时取消正在进行的一轮回复。取消沿着await链传播:
+LLM流式请求和TTS合成任务被取消，aiohttp请求随之关闭连接，上游停止生成；视频渲染请求断开与常驻渲染进程的连接，
+排队中的任务被丢弃，正在渲染的任务在下一个去噪步骤中止（命令行方式则结束infer.py子进程）
+'''
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["TurnCancelled", "ConversationSession", "SessionRegistry"]
+
+
+class TurnCancelled(Exception):
+    """
+    本轮回复被新的一轮或用户插话取消
+    """
+    def __init__(self, reason: str):
+        super().__init__(f"本轮回复已取消: {reason}")
+        self.reason = reason
+
+
+class ConversationSession:
+    """
+    会话取消作用域
+    """
+    def __init__(self, session_id: str, registry: Optional["SessionRegistry"] = None):
+        """
+        参数:
+            session_id: 会话ID（即上下文ID）
+            registry: 所属的会话注册表，用于汇总统计
+        """
+        self.session_id = session_id
+        self.registry = registry
+        self.turn_task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.cancelled_turns = 0
+        self.last_active = time.time()
+        # 被本会话主动取消的任务及原因
+        self._cancelled_task: Optional[asyncio.Task] = None
+        self._cancel_reason: Optional[str] = None
+
+    @property
+    def active(self) -> bool:
+        """
+        是否有正在进行的回复
+        """
+        return self.turn_task is not None and not self.turn_task.done()
+
+    def start_turn(self, coro: Awaitable[Any], reason: str = "new_turn") -> asyncio.Task:
+        """
+        开始新的一轮回复，正在进行的回复会被取消
+
+        参数:
+            coro: 本轮回复的协程
+            reason: 取消上一轮的原因
+
+        返回:
+            本轮回复的任务
+        """
+        self.cancel(reason)
+        self.turns += 1
+        self.last_active = time.time()
+        self.turn_task = asyncio.ensure_future(coro)
+        return self.turn_task
+
+    async def run_turn(self, coro: Awaitable[Any]) -> Any:
+        """
+        以新的一轮回复运行协程并等待结果；调用方被取消时本轮回复随之取消
+
+        异常:
+            TurnCancelled: 本轮回复被更新的一轮或插话取消
+        """
+        task = self.start_turn(coro)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if self._cancelled_task is task:
+                raise TurnCancelled(self._cancel_reason)
+            raise
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """
+        取消正在进行的回复
+
+        参数:
+            reason: 取消原因，如barge_in（用户插话）、client（客户端请求）
+
+        返回:
+            是否取消了正在进行的回复
+        """
+        if not self.active:
+            return False
+        self._cancelled_task = self.turn_task
+        self._cancel_reason = reason
+        self.turn_task.cancel()
+        self.cancelled_turns += 1
+        if self.registry is not None:
+            self.registry.cancelled_turns[reason] = self.registry.cancelled_turns.get(reason, 0) + 1
+        logger.info(f"[Session] 取消会话 {self.session_id} 的回复: {reason}")
+        return True
+
+
+class SessionRegistry:
+    """
+    会话注册表：按会话ID查找取消作用域，供WebSocket和HTTP接口共用
+    """
+    def __init__(self, idle_seconds: float = 3600):
+        """
+        参数:
+            idle_seconds: 没有进行中回复的会话空闲超过该时长后被清理
+        """
+        self.idle_seconds = idle_seconds
+        self.sessions: Dict[str, ConversationSession] = {}
+        # 取消原因 -> 次数
+        self.cancelled_turns: Dict[str, int] = {}
+
+    def get(self, session_id: str) -> ConversationSession:
+        """
+        获取会话，不存在时创建
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            self._expire()
+            session = self.sessions[session_id] = ConversationSession(session_id, self)
+        return session
+
+    def cancel(self, session_id: str, reason: str = "client") -> bool:
+        """
+        取消指定会话正在进行的回复
+        """
+        session = self.sessions.get(session_id)
+        return session.cancel(reason) if session is not None else False
+
+    def remove(self, session_id: str, reason: str = "closed"):
+        """
+        移除会话并取消其正在进行的回复
+        """
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.cancel(reason)
+
+    def _expire(self):
+        """
+        清理空闲会话
+        """
+        deadline = time.time() - self.idle_seconds
+        for session_id in [sid for sid, session in self.sessions.items()
+                           if not session.active and session.last_active < deadline]:
+            del self.sessions[session_id]
+
+    def cancel_all(self, reason: str = "shutdown"):
+        """
+        取消所有会话的回复
+        """
+        for session in list(self.sessions.values()):
+            session.cancel(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取会话统计
+        """
+        return {
+            "sessions": len(self.sessions),
+            "active_turns": sum(1 for session in self.sessions.values() if session.active),
+            "cancelled_turns": dict(self.cancelled_turns),
+        }
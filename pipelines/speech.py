@@ -5,18 +5,217 @@
 
 import logging
 import asyncio
-import os
-import tempfile
-from typing import Optional, Dict, Any, Tuple, List
+from typing import Optional, Dict, Any, Tuple, List, Union
+import numpy as np
 from utils.protocol import AudioMessage, AudioFormatType, TextMessage
-from utils.audio import convert_audio_format, get_audio_duration
+from utils.audio import convert_audio_data, parse_wav_header, get_audio_data_duration
+from utils.pcm import PcmBuffer, PcmRingBuffer
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 默认VAD参数
+DEFAULT_VAD_OPTIONS = {
+    "enabled": True,            # process_for_asr时是否裁掉首尾静音
+    "frame_ms": 20,             # 分析帧长(毫秒)
+    "start_ms": 60,             # 连续语音达到该时长才判定为开始说话
+    "end_silence_ms": 300,      # 连续静音达到该时长判定为说话结束
+    "pre_roll_ms": 200,         # 开始说话前保留的音频，避免截掉起始音节
+    "keep_silence_ms": 100,     # 说话结束时保留的尾部静音
+    "min_energy_db": -50.0,     # 语音帧的最低能量(dBFS)
+    "noise_margin_db": 12.0,    # 语音帧能量需高出噪声基底的幅度(dB)
+    "max_zcr": 0.35,            # 能量接近阈值时，过零率超过该值视为噪声
+    "max_utterance_s": 60,      # 单次说话最长时长(秒)，超出时强制结束
+}
+
+
+class VoiceActivityDetector:
+    """
+    增量语音活动检测与端点检测
+
+    输入PCM按固定帧长切分，每次feed对所有完整帧一次性计算能量和过零率（numpy向量化），
+    再逐帧推进状态机。噪声基底在静音段自适应更新。返回的事件:
+        {"type": "speech_start", "timestamp": 秒, "audio": PcmBuffer}  开始说话，audio含预留的起始音频
+        {"type": "speech", "timestamp": 秒, "audio": PcmBuffer}        说话中的音频
+        {"type": "speech_end", "timestamp": 秒, "duration": 秒}        说话结束
+    说话期间的静音先暂存，语音恢复时才输出，判定结束时丢弃（只保留keep_silence_ms），
+    因此只有语音段会送到ASR
+    """
+    def __init__(self, options: Optional[Dict[str, Any]] = None, sample_rate: int = 16000):
+        """
+        初始化检测器
+
+        参数:
+            options: VAD参数，未提供的项使用DEFAULT_VAD_OPTIONS
+            sample_rate: 输入PCM的采样率
+        """
+        self.options = dict(DEFAULT_VAD_OPTIONS)
+        for key, value in dict(options or {}).items():
+            key = key.lower()
+            if key in DEFAULT_VAD_OPTIONS:
+                self.options[key] = value
+            else:
+                logger.warning(f"[VAD] 未知的VAD参数: {key}")
+
+        self.sample_rate = sample_rate
+        self.frame_size = max(1, int(sample_rate * self.options["frame_ms"] / 1000))
+        self.start_frames = max(1, round(self.options["start_ms"] / self.options["frame_ms"]))
+        self.end_frames = max(1, round(self.options["end_silence_ms"] / self.options["frame_ms"]))
+        self.keep_frames = min(self.end_frames, round(self.options["keep_silence_ms"] / self.options["frame_ms"]))
+        self.max_frames = int(self.options["max_utterance_s"] * 1000 / self.options["frame_ms"])
+        pre_roll = int(sample_rate * self.options["pre_roll_ms"] / 1000)
+
+        # 不足一帧的剩余采样
+        self._remainder = PcmRingBuffer(self.frame_size, sample_rate)
+        # 静音状态下最近的音频，开始说话时作为起始音频输出
+        self._pre_roll = PcmRingBuffer(max(1, pre_roll) + self.start_frames * self.frame_size,
+                                       sample_rate, overwrite=True)
+        # 说话期间暂存的静音
+        self._silence = PcmRingBuffer(self.end_frames * self.frame_size, sample_rate)
+        self.reset()
+
+    def reset(self):
+        """
+        重置检测状态（保留噪声基底）
+        """
+        self.in_speech = False
+        self._onset_frames = 0
+        self._silence_frames = 0
+        self._speech_frames = 0
+        self._frame_index = 0
+        self._remainder.clear()
+        self._pre_roll.clear()
+        self._silence.clear()
+        if not hasattr(self, "noise_floor_db"):
+            self.noise_floor_db = float(self.options["min_energy_db"]) - self.options["noise_margin_db"]
+
+    @property
+    def threshold_db(self) -> float:
+        """
+        当前语音能量阈值
+        """
+        return max(float(self.options["min_energy_db"]), self.noise_floor_db + self.options["noise_margin_db"])
+
+    def _frame_features(self, frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算每帧的能量(dBFS)和过零率
+
+        参数:
+            frames: 形状为(帧数, 帧长)的float32数组
+        """
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db = 20.0 * np.log10(rms + 1e-10)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frames.shape[1] - 1)
+        return energy_db, zcr
+
+    def _timestamp(self) -> float:
+        return self._frame_index * self.frame_size / self.sample_rate
+
+    def feed(self, data: Union[bytes, PcmBuffer]) -> List[Dict[str, Any]]:
+        """
+        输入一段PCM音频
+
+        参数:
+            data: 16位单声道PCM数据或PcmBuffer
+
+        返回:
+            本次产生的事件列表
+        """
+        pcm = data if isinstance(data, PcmBuffer) else PcmBuffer.from_bytes(data, self.sample_rate)
+        pcm = pcm.as_int16()
+        if self._remainder:
+            pcm = PcmBuffer.concat([self._remainder.read(), pcm])
+        count = pcm.frames // self.frame_size
+        if count * self.frame_size < pcm.frames:
+            self._remainder.write(pcm[count * self.frame_size:])
+        if count == 0:
+            return []
+
+        frames = pcm.samples[:count * self.frame_size].reshape(count, self.frame_size)
+        energy_db, zcr = self._frame_features(frames.astype(np.float32) / 32768.0)
+
+        events: List[Dict[str, Any]] = []
+        # 当前连续输出的语音帧，状态变化时合并为一个speech事件
+        run: List[np.ndarray] = []
+
+        def flush_run():
+            if run:
+                events.append({"type": "speech", "timestamp": self._timestamp(),
+                               "audio": PcmBuffer(np.concatenate(run), self.sample_rate)})
+                run.clear()
+
+        for index in range(count):
+            frame = frames[index]
+            threshold = self.threshold_db
+            is_speech = energy_db[index] > threshold and (
+                zcr[index] <= self.options["max_zcr"] or energy_db[index] > threshold + 10)
+            self._frame_index += 1
+
+            if not self.in_speech:
+                self._pre_roll.write(frame)
+                if not is_speech:
+                    self._onset_frames = 0
+                    # 静音段更新噪声基底
+                    self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(energy_db[index])
+                    continue
+                self._onset_frames += 1
+                if self._onset_frames >= self.start_frames:
+                    self.in_speech = True
+                    self._speech_frames = self._onset_frames
+                    self._silence_frames = 0
+                    events.append({"type": "speech_start", "timestamp": self._timestamp(),
+                                   "audio": PcmBuffer(self._pre_roll.read().samples.copy(), self.sample_rate)})
+                continue
+
+            self._speech_frames += 1
+            if is_speech:
+                if self._silence:
+                    run.append(self._silence.read().samples.reshape(-1).copy())
+                self._silence_frames = 0
+                run.append(frame)
+            else:
+                self._silence_frames += 1
+                self._silence.write(frame)
+
+            if self._silence_frames >= self.end_frames or self._speech_frames >= self.max_frames:
+                # 只保留少量尾部静音，其余丢弃
+                if self.keep_frames and self._silence:
+                    run.append(self._silence.peek(self.keep_frames * self.frame_size).samples.reshape(-1).copy())
+                flush_run()
+                events.append(self._end_event())
+        flush_run()
+        return events
+
+    def _end_event(self) -> Dict[str, Any]:
+        """
+        结束当前语音段
+        """
+        duration = self._speech_frames * self.frame_size / self.sample_rate
+        self.in_speech = False
+        self._onset_frames = 0
+        self._silence_frames = 0
+        self._speech_frames = 0
+        self._silence.clear()
+        self._pre_roll.clear()
+        return {"type": "speech_end", "timestamp": self._timestamp(), "duration": duration}
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """
+        输入结束，正在说话时输出结束事件
+        """
+        self._remainder.clear()
+        if not self.in_speech:
+            return []
+        return [self._end_event()]
+
+
 class SpeechProcessor:
     """
     语音处理器：处理音频转换、静音检测、音频分段等功能
+    
+    所有处理都在内存中完成：WAV/PCM直接解析并在numpy上转换，
+    压缩格式通过ffmpeg的stdin/stdout管道编解码
     """
     def __init__(self, config=None):
         """
@@ -26,25 +225,38 @@ class SpeechProcessor:
             config: 处理器配置
         """
         self.config = config or {}
-        self.temp_files = []
+        self.vad_options = {key.lower(): value for key, value in dict(self.config.get("VAD", {}) or {}).items()}
+    
+    def create_vad(self, sample_rate: int = 16000) -> VoiceActivityDetector:
+        """
+        创建增量VAD检测器，每个音频流使用独立的检测器
         
-    def __del__(self):
+        参数:
+            sample_rate: 输入PCM的采样率
         """
-        析构函数，清理临时文件
+        return VoiceActivityDetector(self.vad_options, sample_rate=sample_rate)
+    
+    def trim_silence(self, audio_message: AudioMessage) -> Optional[AudioMessage]:
         """
-        self.cleanup()
+        用VAD裁掉16位WAV音频中的静音，只保留语音段
         
-    def cleanup(self):
-        """
-        清理临时文件
+        参数:
+            audio_message: 16位WAV音频消息
+            
+        返回:
+            只包含语音段的音频消息；没有检测到语音时返回None
         """
-        for file_path in self.temp_files:
-            if os.path.exists(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    logger.warning(f"清理临时文件失败: {file_path}, 错误: {str(e)}")
-        self.temp_files = []
+        pcm = PcmBuffer.from_audio_message(audio_message)
+        if pcm.channels != 1:
+            return audio_message
+        vad = self.create_vad(pcm.sample_rate)
+        events = vad.feed(pcm) + vad.flush()
+        segments = [event["audio"] for event in events if event.get("audio") is not None]
+        if not segments:
+            return None
+        speech = PcmBuffer.concat(segments)
+        logger.info(f"VAD裁剪静音: {pcm.duration:.2f}s -> {speech.duration:.2f}s")
+        return speech.to_audio_message()
     
     async def format_conversion(self, audio_message: AudioMessage, 
                                target_format: AudioFormatType,
@@ -72,36 +284,15 @@ class SpeechProcessor:
                 audio_message.sampleWidth == target_sample_width):
                 return audio_message
             
-            # 将音频数据写入临时文件
-            with tempfile.NamedTemporaryFile(delete=False, 
-                                            suffix=f'.{audio_message.format.value}') as temp_in:
-                temp_in.write(audio_message.data)
-                input_path = temp_in.name
-                self.temp_files.append(input_path)
-            
-            # 创建输出临时文件
-            with tempfile.NamedTemporaryFile(delete=False, 
-                                            suffix=f'.{target_format.value}') as temp_out:
-                output_path = temp_out.name
-                self.temp_files.append(output_path)
-            
-            # 执行格式转换
-            converted = await convert_audio_format(
-                input_path=input_path,
-                output_path=output_path,
+            # 在内存中执行格式转换
+            converted_data = await convert_audio_data(
+                audio_data=audio_message.data,
+                source_format=audio_message.format.value,
                 target_format=target_format.value,
                 target_sample_rate=target_sample_rate,
                 target_sample_width=target_sample_width
             )
             
-            if not converted:
-                logger.error("音频格式转换失败")
-                return None
-            
-            # 读取转换后的文件
-            with open(output_path, 'rb') as f:
-                converted_data = f.read()
-            
             # 创建新的音频消息
             converted_message = AudioMessage(
                 data=converted_data,
@@ -117,9 +308,6 @@ class SpeechProcessor:
         except Exception as e:
             logger.error(f"音频格式转换出错: {str(e)}")
             return None
-        finally:
-            # 清理临时文件
-            self.cleanup()
     
     async def get_audio_info(self, audio_message: AudioMessage) -> Dict[str, Any]:
         """
@@ -132,32 +320,28 @@ class SpeechProcessor:
             音频信息字典
         """
         try:
-            # 将音频数据写入临时文件
-            with tempfile.NamedTemporaryFile(delete=False, 
-                                            suffix=f'.{audio_message.format.value}') as temp:
-                temp.write(audio_message.data)
-                file_path = temp.name
-                self.temp_files.append(file_path)
-            
-            # 获取音频时长
-            duration = await get_audio_duration(file_path)
-            
             info = {
                 "format": audio_message.format.value,
                 "sample_rate": audio_message.sampleRate,
                 "sample_width": audio_message.sampleWidth,
-                "duration": duration,
                 "size_bytes": len(audio_message.data)
             }
             
+            # WAV只解析文件头，以文件头中的实际参数为准
+            if audio_message.format == AudioFormatType.WAV and audio_message.data[0:4] == b'RIFF':
+                header = parse_wav_header(audio_message.data)
+                info["sample_rate"] = header["sample_rate"]
+                info["sample_width"] = header["sample_width"]
+                info["channels"] = header["channels"]
+                info["duration"] = header["frames"] / header["sample_rate"]
+            else:
+                info["duration"] = await get_audio_data_duration(audio_message.data, audio_message.format.value)
+            
             return info
             
         except Exception as e:
             logger.error(f"获取音频信息出错: {str(e)}")
             return {"error": str(e)}
-        finally:
-            # 清理临时文件
-            self.cleanup()
     
     async def process_for_asr(self, audio_message: AudioMessage) -> Optional[AudioMessage]:
         """
@@ -170,9 +354,18 @@ class SpeechProcessor:
             处理后的音频消息
         """
         # 转换为16kHz采样率的WAV格式，适合大多数ASR引擎
-        return await self.format_conversion(
+        converted = await self.format_conversion(
             audio_message=audio_message,
             target_format=AudioFormatType.WAV,
             target_sample_rate=16000,
             target_sample_width=2
         )
+        if converted is None or not self.vad_options.get("enabled", True):
+            return converted
+        
+        # 裁掉静音，减少ASR的计算量；没有检测到语音时保留原音频，由ASR判断
+        try:
+            return self.trim_silence(converted) or converted
+        except ValueError as e:
+            logger.warning(f"VAD裁剪静音失败: {str(e)}")
+            return converted
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+'''
+视频生成任务队列：长时间的EchoMimic渲染在后台执行，HTTP请求只提交任务并轮询状态
+
+- 提交任务立即返回任务ID，任务按优先级（数值大的优先）和提交顺序排队
+- slots限制同时渲染的任务数（每个GPU/CPU槽位一个），排队数超过max_queue时拒绝新任务
+- 渲染进度由处理函数回调上报，订阅者可实时接收状态变化
+- 任务元数据可持久化到SQLite，服务重启后仍可查询已完成任务；重启时未完成的任务标记为失败
+'''
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from utils.metrics import span, observe
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "VideoJobQueueFull",
+    "VideoJobStore",
+    "VideoJobQueue",
+    "create_video_job_queue",
+]
+
+# 默认任务队列参数
+DEFAULT_VIDEO_JOB_OPTIONS = {
+    "slots": 1,                             # 同时渲染的任务数（GPU/CPU槽位数）
+    "max_queue": 64,                        # 排队任务上限，超出后拒绝新任务
+    "backend": "memory",                    # 任务元数据存储: memory / sqlite
+    "sqlite_path": "cache/video_jobs.db",   # SQLite存储路径
+    "ttl_seconds": 86400,                   # 已结束任务的元数据保留时长(秒)
+}
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+# 运行中任务的进度写入存储的最小间隔(秒)，状态变化总是立即写入
+PROGRESS_PERSIST_INTERVAL = 1.0
+
+# 任务处理函数: (任务, 进度回调) -> 结果视频路径
+JobHandler = Callable[[Dict[str, Any], Callable[[float, str], None]], Awaitable[str]]
+
+
+class VideoJobQueueFull(RuntimeError):
+    """
+    视频任务排队已满
+    """
+    pass
+
+
+class VideoJobStore:
+    """
+    任务元数据存储：内存字典，配置SQLite路径时同步写入数据库
+    """
+    def __init__(self, sqlite_path: Optional[str] = None):
+        """
+        参数:
+            sqlite_path: SQLite数据库路径，None时只保存在内存中
+        """
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._conn = None
+        self._lock = threading.Lock()
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS video_jobs ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._load()
+
+    def _load(self):
+        """
+        加载已持久化的任务；上次运行中断的任务标记为失败
+        """
+        for job_id, data in self._conn.execute("SELECT id, data FROM video_jobs").fetchall():
+            job = json.loads(data)
+            if job["status"] not in FINISHED_STATES:
+                job.update(status=FAILED, error="服务重启，任务中断", finished_at=time.time())
+                self.save(job)
+            self.jobs[job_id] = job
+        if self.jobs:
+            logger.info(f"[VideoJobStore] 加载了 {len(self.jobs)} 个历史任务")
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.jobs.get(job_id)
+
+    def save(self, job: Dict[str, Any]):
+        self.jobs[job["id"]] = job
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO video_jobs (id, data, updated_at) VALUES (?, ?, ?)",
+                    (job["id"], json.dumps(job, ensure_ascii=False), time.time())
+                )
+
+    def delete(self, job_id: str):
+        self.jobs.pop(job_id, None)
+        if self._conn is not None:
+            with self._lock:
+                self._conn.execute("DELETE FROM video_jobs WHERE id = ?", (job_id,))
+
+    def expire(self, ttl_seconds: float) -> int:
+        """
+        删除结束时间超过ttl_seconds的任务
+        """
+        deadline = time.time() - ttl_seconds
+        expired = [job_id for job_id, job in self.jobs.items()
+                   if job["status"] in FINISHED_STATES and (job.get("finished_at") or 0) < deadline]
+        for job_id in expired:
+            self.delete(job_id)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+
+class VideoJobQueue:
+    """
+    视频生成任务队列
+    """
+    def __init__(self, handler: JobHandler, slots: int = 1, max_queue: int = 64,
+                 store: Optional[VideoJobStore] = None, ttl_seconds: float = 86400):
+        """
+        参数:
+            handler: 任务处理函数，返回生成的视频路径
+            slots: 同时执行的任务数
+            max_queue: 排队任务上限
+            store: 任务元数据存储，None时使用内存存储
+            ttl_seconds: 已结束任务的保留时长(秒)
+        """
+        self.handler = handler
+        self.slots = max(1, int(slots))
+        self.max_queue = max(0, int(max_queue))
+        self.store = store if store is not None else VideoJobStore()
+        self.ttl_seconds = ttl_seconds
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        # 通过cancel取消的运行中任务，用于区分任务被取消和工作协程被取消
+        self._cancel_requested: set = set()
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._finished: Dict[str, asyncio.Event] = {}
+        self._seq = itertools.count()
+        self._closed = False
+
+    def _ensure_workers(self):
+        """
+        首次提交任务时在当前事件循环中启动工作协程
+        """
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._workers = [asyncio.ensure_future(self._worker(index)) for index in range(self.slots)]
+            logger.info(f"[VideoJobQueue] 启动 {self.slots} 个渲染槽位")
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for job in self.store.jobs.values() if job["status"] == QUEUED)
+
+    def submit(self, request: Dict[str, Any], priority: int = 0) -> Dict[str, Any]:
+        """
+        提交任务
+
+        参数:
+            request: 任务参数（可JSON序列化），原样传给处理函数
+            priority: 优先级，数值大的先执行
+
+        返回:
+            任务信息
+
+        异常:
+            VideoJobQueueFull: 排队任务数已达上限
+        """
+        if self._closed:
+            raise RuntimeError("视频任务队列已关闭")
+        self._ensure_workers()
+        queued = self.queued
+        if queued >= self.max_queue:
+            raise VideoJobQueueFull(f"视频任务排队已满({queued})，请稍后重试")
+        self.store.expire(self.ttl_seconds)
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": QUEUED,
+            "priority": int(priority),
+            "request": request,
+            "progress": 0.0,
+            "stage": QUEUED,
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.store.save(job)
+        self._finished[job["id"]] = asyncio.Event()
+        self._queue.put_nowait((-job["priority"], next(self._seq), job["id"]))
+        logger.info(f"[VideoJobQueue] 提交任务 {job['id']} (priority={priority}, 排队={queued + 1})")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取任务信息，不存在时返回None
+        """
+        job = self.store.get(job_id)
+        if job is not None and job["status"] == QUEUED:
+            return dict(job, position=self._position(job))
+        return job
+
+    def _position(self, job: Dict[str, Any]) -> int:
+        """
+        排队任务前面还有多少个任务（按优先级和提交时间）
+        """
+        key = (-job["priority"], job["created_at"])
+        return sum(1 for other in self.store.jobs.values()
+                   if other["status"] == QUEUED and (-other["priority"], other["created_at"]) < key)
+
+    async def wait(self, job_id: str) -> Dict[str, Any]:
+        """
+        等待任务结束并返回任务信息
+
+        异常:
+            KeyError: 任务不存在
+        """
+        job = self.store.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        event = self._finished.get(job_id)
+        if event is not None and job["status"] not in FINISHED_STATES:
+            await event.wait()
+        return self.store.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """
+        订阅任务状态变化，每次状态或进度变化时放入任务信息的副本
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(job_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(job_id, None)
+
+    def _update(self, job: Dict[str, Any], persist: bool = True, **changes):
+        """
+        更新任务并通知订阅者
+        """
+        job.update(changes)
+        if persist:
+            self.store.save(job)
+        for queue in self._subscribers.get(job["id"], []):
+            queue.put_nowait(dict(job))
+        if job["status"] in FINISHED_STATES:
+            event = self._finished.pop(job["id"], None)
+            if event is not None:
+                event.set()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务：排队中的任务直接标记取消，运行中的任务取消其处理协程
+
+        返回:
+            是否取消了任务（已结束的任务返回False）
+        """
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return False
+        if job["status"] == QUEUED:
+            self._update(job, status=CANCELLED, stage=CANCELLED, finished_at=time.time())
+        else:
+            task = self._running.get(job_id)
+            if task is not None:
+                self._cancel_requested.add(job_id)
+                task.cancel()
+        logger.info(f"[VideoJobQueue] 取消任务 {job_id}")
+        return True
+
+    async def _worker(self, index: int):
+        """
+        渲染槽位：依次执行排队的任务
+        """
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self.store.get(job_id)
+            if job is None or job["status"] != QUEUED:
+                continue
+            await self._run_job(job)
+
+    async def _run_job(self, job: Dict[str, Any]):
+        self._update(job, status=RUNNING, stage=RUNNING, started_at=time.time())
+        observe("video_queue_wait", job["started_at"] - job["created_at"])
+        last_persist = time.time()
+
+        def progress(value: float, stage: str):
+            nonlocal last_persist
+            now = time.time()
+            persist = now - last_persist >= PROGRESS_PERSIST_INTERVAL
+            if persist:
+                last_persist = now
+            self._update(job, persist=persist, progress=max(0.0, min(1.0, float(value))), stage=stage)
+
+        task = asyncio.ensure_future(self.handler(dict(job), progress))
+        self._running[job["id"]] = task
+        try:
+            with span("video_job"):
+                result = await task
+            self._update(job, status=SUCCEEDED, stage=SUCCEEDED, progress=1.0, result=result,
+                         finished_at=time.time())
+            logger.info(f"[VideoJobQueue] 任务 {job['id']} 完成，耗时 {time.time() - job['started_at']:.1f}s")
+        except asyncio.CancelledError:
+            self._update(job, status=CANCELLED, stage=CANCELLED, finished_at=time.time())
+            if job["id"] not in self._cancel_requested:
+                raise
+        except Exception as e:
+            logger.error(f"[VideoJobQueue] 任务 {job['id']} 失败: {str(e)}")
+            self._update(job, status=FAILED, stage=FAILED, error=str(e), finished_at=time.time())
+        finally:
+            self._running.pop(job["id"], None)
+            self._cancel_requested.discard(job["id"])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取队列统计
+        """
+        counts: Dict[str, int] = {}
+        for job in self.store.jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {
+            "slots": self.slots,
+            "max_queue": self.max_queue,
+            "running": len(self._running),
+            "jobs": counts,
+        }
+
+    async def close(self):
+        """
+        停止工作协程，运行中的任务标记为取消
+        """
+        self._closed = True
+        for task in list(self._running.values()) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
+
+
+def create_video_job_queue(handler: JobHandler, options: Optional[Dict[str, Any]] = None) -> VideoJobQueue:
+    """
+    根据配置创建视频任务队列
+
+    参数:
+        handler: 任务处理函数
+        options: 队列参数，键名不区分大小写，未提供的项使用DEFAULT_VIDEO_JOB_OPTIONS
+    """
+    merged = dict(DEFAULT_VIDEO_JOB_OPTIONS)
+    for key, value in dict(options or {}).items():
+        key = key.lower()
+        if key in DEFAULT_VIDEO_JOB_OPTIONS:
+            merged[key] = value
+        else:
+            logger.warning(f"[VideoJobQueue] 未知的任务队列参数: {key}")
+
+    backend = str(merged["backend"]).lower()
+    if backend == "sqlite":
+        store = VideoJobStore(merged["sqlite_path"])
+    elif backend == "memory":
+        store = VideoJobStore()
+    else:
+        raise ValueError(f"不支持的任务存储后端: {merged['backend']}")
+    return VideoJobQueue(handler, merged["slots"], merged["max_queue"], store, merged["ttl_seconds"])
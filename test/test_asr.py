@@ -71,7 +71,73 @@ async def test_funasr():
         logger.error(f"测试FunASR时发生错误: {e}")
         raise
 
+async def test_fake_asr_stream():
+    """使用模拟引擎测试流式识别接口（无需模型和网络）"""
+    from engine.asr.fakeASR import FakeASR
+    
+    cfg = CN()
+    cfg.NAME = "FakeASR"
+    cfg.TEXT = "你好，这是一段测试语音。"
+    asr = FakeASR(cfg)
+    
+    stream = asr.create_stream(sample_rate=16000, sample_width=2)
+    results = []
+    # 每帧100ms的静音PCM
+    for _ in range(30):
+        results += await stream.feed(b"\x00" * 3200)
+    results += await stream.finish()
+    
+    for message in results:
+        logger.info(f"[{message.desc}] {message.data}")
+    
+    assert results and results[-1].desc == "final"
+    assert results[-1].data == cfg.TEXT
+    return results[-1].data
+
+async def test_micro_batcher():
+    """测试ASR微批处理调度器：并发请求合并、结果按请求分发"""
+    from engine.asr.batcher import MicroBatcher
+    
+    batch_sizes = []
+    
+    def run_batch(inputs, options):
+        batch_sizes.append(len(inputs))
+        return [{"text": f"{options['language']}:{item}"} for item in inputs]
+    
+    batcher = MicroBatcher(run_batch, max_wait_ms=50, max_batch_size=4, max_batch_audio_s=10)
+    results = await asyncio.gather(*[
+        batcher.submit(i, {"language": "zh"}, duration=2.0) for i in range(10)
+    ])
+    
+    logger.info(f"批大小: {batch_sizes}, 指标: {batcher.metrics.snapshot()}")
+    assert [r["text"] for r in results] == [f"zh:{i}" for i in range(10)]
+    assert max(batch_sizes) == 4 and sum(batch_sizes) == 10
+    
+    # 参数不同的请求不会合并到同一批
+    results = await asyncio.gather(
+        batcher.submit("a", {"language": "zh"}, duration=1.0),
+        batcher.submit("b", {"language": "en"}, duration=1.0),
+    )
+    assert [r["text"] for r in results] == ["zh:a", "en:b"]
+    
+    # 等待凑批的请求数达到上限时立即拒绝，而不是无限排队
+    from engine.executor import InferenceExecutorBusy
+    bounded = MicroBatcher(run_batch, max_wait_ms=50, max_batch_size=2, max_queue=3)
+    results = await asyncio.gather(*[
+        bounded.submit(i, {"language": "zh"}, duration=1.0) for i in range(5)
+    ], return_exceptions=True)
+    rejected = [r for r in results if isinstance(r, InferenceExecutorBusy)]
+    assert len(rejected) == 2 and bounded.metrics.snapshot()["rejected"] == 2
+    assert [r["text"] for r in results[:3]] == ["zh:0", "zh:1", "zh:2"]
+    return batcher.metrics.snapshot()
+
 if __name__ == "__main__":
     # 运行测试
     result = asyncio.run(test_funasr())
     print(f"\n最终识别结果: {result}")
+    
+    stream_result = asyncio.run(test_fake_asr_stream())
+    print(f"\n流式识别结果: {stream_result}")
+    
+    batch_metrics = asyncio.run(test_micro_batcher())
+    print(f"\n微批处理指标: {batch_metrics}")
@@ -15,6 +15,7 @@ from datetime import datetime
 # 导入项目模块
 from integrations.minimax import get_minimax_integration
 from utils.audio_utils import detect_audio_format, compute_content_hash, get_cached_audio, save_to_cache
+from utils.audio import encode_wav, parse_wav_header, convert_audio_data
 
 # 配置日志
 logging.basicConfig(
@@ -258,6 +259,27 @@ async def test_long_text_tts():
         logger.error(f"长文本语音合成失败: {result.get('error', '未知错误')}")
         return None
 
+async def test_in_memory_conversion():
+    """
+    测试内存音频转换（WAV重采样、声道和采样宽度转换，不经过临时文件）
+    """
+    logger.info("==== 测试内存音频转换 ====")
+    
+    import numpy as np
+    
+    # 生成1秒44.1kHz双声道24位正弦波
+    sample_rate = 44100
+    t = np.arange(sample_rate) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+    wav_data = encode_wav(np.stack([tone, tone], axis=1), sample_rate, sample_width=3)
+    
+    converted = await convert_audio_data(wav_data, "wav", "wav", target_sample_rate=16000, target_sample_width=2)
+    header = parse_wav_header(converted)
+    logger.info(f"转换结果: {header}")
+    
+    return (header["sample_rate"] == 16000 and header["channels"] == 1 and
+            header["sample_width"] == 2 and header["frames"] == 16000)
+
 async def run_all_tests():
     """
     运行所有测试
@@ -301,6 +323,13 @@ async def run_all_tests():
         logger.error(f"缓存操作测试出错: {e}")
         test_results["cache_operations"] = f"错误: {e}"
     
+    # 内存音频转换测试
+    try:
+        test_results["in_memory_conversion"] = await test_in_memory_conversion()
+    except Exception as e:
+        logger.error(f"内存音频转换测试出错: {e}")
+        test_results["in_memory_conversion"] = f"错误: {e}"
+    
     # 长文本TTS测试
     try:
         test_results["long_text_tts"] = await test_long_text_tts()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试流式数字人视频：按句子分段渲染（使用stub渲染器，不需要EchoMimicV2模型）
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.echomimic import EchoMimicIntegration
+from pipelines.avatar_stream import AvatarStreamer, HlsPlaylist
+from utils.protocol import AudioMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+from test_echomimic_worker import make_config
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def fake_tts(sentence: str) -> AudioMessage:
+    """模拟TTS：每个字0.1秒静音"""
+    await asyncio.sleep(0.05)
+    return AudioMessage(data=pcm_to_wav(b"\x00\x00" * 1600 * len(sentence), 16000), format=AudioFormatType.WAV,
+                        sampleRate=16000, sampleWidth=2)
+
+async def test_stream_segments():
+    """测试每个句子完成即输出分段，分段之间的帧偏移和重叠状态连续"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        config = make_config(root, {"enabled": True, "renderer": "stub", "start_timeout": 30,
+                                    "socket_path": str(root / "worker.sock")})
+        config["stream"] = {"segment_format": "mp4"}
+        integration = EchoMimicIntegration(config)
+        try:
+            await integration._ensure_worker()
+            streamer = AvatarStreamer(integration, fake_tts, config["stream"])
+            start_time = time.time()
+            segments = []
+            async for segment in streamer.stream("s1", "你好。今天天气不错！我们开始吧？"):
+                segment["elapsed"] = time.time() - start_time
+                segments.append(segment)
+
+            assert [segment["text"] for segment in segments] == ["你好。", "今天天气不错！", "我们开始吧？"]
+            # 第一段在全部渲染完成之前输出
+            assert segments[0]["elapsed"] < segments[-1]["elapsed"] - 0.3
+            infos = [json.loads(Path(segment["path"]).read_text()) for segment in segments]
+            frame_offset = 0
+            for info, segment in zip(infos, segments):
+                assert info["frame_offset"] == frame_offset
+                # 分段时长和起始时间按实际渲染的帧数计算（音频0.3秒的分段渲染7帧，时长0.28秒）
+                assert abs(segment["duration"] - info["frames"] / 25) < 1e-9
+                assert abs(segment["start"] - frame_offset / 25) < 1e-9
+                frame_offset += info["frames"]
+            assert [info["frames"] for info in infos] == [7, 17, 15]
+            assert [info["overlap"] for info in infos] == [0, 4, 4]
+
+            # 最后一段渲染后渲染进程释放衔接状态
+            stats = await integration.worker_stats()
+            assert stats["streams"] == 0
+            return [round(segment["elapsed"], 2) for segment in segments]
+        finally:
+            await integration.close()
+
+def test_hls_playlist():
+    """测试HLS播放列表：结束前为EVENT列表，结束后写入ENDLIST"""
+    with tempfile.TemporaryDirectory() as tmp:
+        playlist = HlsPlaylist(Path(tmp))
+        playlist.add("segment_00000.ts", 1.2)
+        content = playlist.path.read_text()
+        assert "#EXTINF:1.200,\nsegment_00000.ts" in content and "#EXT-X-ENDLIST" not in content
+        playlist.add("segment_00001.ts", 2.5)
+        playlist.end()
+        content = playlist.path.read_text()
+        assert "#EXT-X-TARGETDURATION:3" in content and content.endswith("#EXT-X-ENDLIST\n")
+        return content
+
+if __name__ == "__main__":
+    print(f"HLS播放列表:\n{test_hls_playlist()}")
+    print(f"分段输出时间: {asyncio.run(test_stream_segments())}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试基准测试使用的模拟引擎和结果统计
+"""
+
+import os
+import sys
+import time
+import wave
+import random
+import tempfile
+import asyncio
+import logging
+from yacs.config import CfgNode as CN
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.llm.fakeLLM import FakeLLM
+from engine.tts.fakeTTS import FakeTTS
+from utils.protocol import TextMessage
+from utils.metrics import get_metrics
+from bench.run_bench import summarize, parse_prometheus, stage_summary
+from bench.loadgen import poisson_arrivals, load_audio_fixtures
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def test_fake_llm_rate():
+    """测试模拟LLM按首token延迟和生成速率输出"""
+    llm = FakeLLM(CN({"NAME": "FakeLLM", "REPLY": "一二三四五六七八九十", "FIRST_TOKEN_MS": 100,
+                      "TOKENS_PER_SECOND": 50, "CHARS_PER_TOKEN": 2}))
+    start_time = time.perf_counter()
+    arrivals, tokens = [], []
+    async for token in llm.run_stream(TextMessage(data="你好")):
+        arrivals.append(time.perf_counter() - start_time)
+        tokens.append(token)
+    assert "".join(tokens) == "一二三四五六七八九十" and len(tokens) == 5
+    assert 0.095 <= arrivals[0] < 0.15
+    # 5个token间隔4次，每次20ms
+    assert 0.175 <= arrivals[-1] < 0.25
+    response = await llm.run(TextMessage(data="你好"))
+    assert response.data == "一二三四五六七八九十"
+    return [round(arrival * 1000) for arrival in arrivals]
+
+async def test_fake_tts_duration():
+    """测试模拟TTS的音频时长和合成耗时与文本长度成正比"""
+    tts = FakeTTS(CN({"NAME": "FakeTTS", "LATENCY_MS": 20, "REALTIME_FACTOR": 0.1,
+                      "CHARS_PER_SECOND": 4, "SAMPLE_RATE": 16000}))
+    start_time = time.perf_counter()
+    audio = await tts.run(TextMessage(data="八个字的一句话。"))
+    elapsed = time.perf_counter() - start_time
+    # 8个字为2秒音频，合成耗时20ms + 2秒 * 0.1
+    assert len(audio.data) == 44 + 2 * 16000 * 2
+    assert 0.215 <= elapsed < 0.3
+    assert await tts.run(TextMessage(data="")) is None
+    return round(elapsed * 1000)
+
+def test_summaries():
+    """测试延迟摘要和/metrics解析结果与内存中的指标快照一致"""
+    summary = summarize([i / 1000 for i in range(1, 101)])
+    assert summary["p50"] == 50 and summary["p95"] == 95 and summary["p99"] == 99 and summary["max"] == 100
+    assert summarize([])["p99"] is None
+
+    metrics = get_metrics()
+    metrics.configure({"ENABLED": True, "QUANTILES": [0.5, 0.95, 0.99]})
+    metrics.reset()
+    for i in range(1, 201):
+        metrics.observe("stage_seconds", i / 1000, stage="tts")
+        metrics.observe("turn_milestone_seconds", i / 500, milestone="tts_first_audio")
+    expected = stage_summary(metrics.snapshot())
+    parsed = stage_summary(parse_prometheus(metrics.render_prometheus(), "digital_human"))
+    metrics.reset()
+    assert parsed == expected, (parsed, expected)
+    assert parsed["stage_seconds"]['{stage="tts"}']["count"] == 200
+    return parsed
+
+def test_poisson_arrivals():
+    """测试到达时间可复现，平均到达率和到达间隔的变异系数符合泊松过程"""
+    arrivals = poisson_arrivals(50, 200, random.Random("0-0"))
+    assert arrivals == poisson_arrivals(50, 200, random.Random("0-0"))
+    assert all(0 < t < 200 for t in arrivals) and arrivals == sorted(arrivals)
+    rate = len(arrivals) / 200
+    assert abs(rate - 50) / 50 < 0.05
+    gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+    mean = sum(gaps) / len(gaps)
+    std = (sum((gap - mean) ** 2 for gap in gaps) / len(gaps)) ** 0.5
+    # 指数分布的标准差等于均值
+    assert abs(std / mean - 1) < 0.05
+    return {"rate": round(rate, 2), "cv": round(std / mean, 3)}
+
+def test_audio_fixtures():
+    """测试回放录音：多声道只取第一个声道，未提供录音时生成模拟语音"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stereo.wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(8000)
+            wav.writeframes(b"\x01\x00\x02\x00" * 8000)
+        fixtures = load_audio_fixtures([tmp])
+    assert len(fixtures) == 1 and fixtures[0]["sample_rate"] == 8000 and fixtures[0]["seconds"] == 1.0
+    assert fixtures[0]["pcm"] == b"\x01\x00" * 8000
+    synthetic = load_audio_fixtures([])
+    assert [fixture["seconds"] for fixture in synthetic] == [1.0, 1.5, 2.5]
+    return [fixture["name"] for fixture in fixtures + synthetic]
+
+if __name__ == "__main__":
+    print(f"模拟LLM token到达时间(ms): {asyncio.run(test_fake_llm_rate())}")
+    print(f"模拟TTS合成耗时(ms): {asyncio.run(test_fake_tts_duration())}")
+    print(f"阶段耗时摘要: {test_summaries()}")
+    print(f"泊松到达: {test_poisson_arrivals()}")
+    print(f"回放录音: {test_audio_fixtures()}")
@@ -0,0 +1,74 @@
+import logging
+import os
+import tempfile
+import time
+from utils.context_store import ContextStore, MemoryContextBackend, SQLiteContextBackend, estimate_tokens
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def check_store(store: ContextStore):
+    """检查消息预算、LRU和TTL淘汰"""
+    # 消息预算：只保留system消息和最新的max_messages条
+    store.update_context("a", {"role": "system", "content": "你是数字人助手"})
+    for i in range(20):
+        store.update_context("a", {"role": "user", "content": f"消息{i}"})
+    messages = store.get_context("a")["messages"]
+    logger.info(f"裁剪后的消息数: {len(messages)}")
+    assert messages[0]["role"] == "system"
+    assert len(messages) == store.max_messages
+    assert messages[-1]["content"] == "消息19"
+    
+    # LRU：容量满后淘汰最久未访问的上下文
+    for i in range(10):
+        store.get_context(f"ctx-{i}")
+    store.expire()
+    assert len(store) <= store.backend.max_contexts
+    
+    # TTL：空闲超时的上下文被淘汰
+    removed = store.expire(max_age=0)
+    logger.info(f"TTL淘汰上下文数: {removed}")
+    assert len(store) == 0
+
+def test_memory_store():
+    """测试分片内存上下文存储"""
+    store = ContextStore(MemoryContextBackend(max_contexts=4, ttl_seconds=3600, shards=2), max_messages=6)
+    check_store(store)
+    
+    # 每个分片容量为2，总数不超过4
+    for i in range(100):
+        store.get_context(f"load-{i}")
+    assert len(store) <= 4
+    return True
+
+def test_sqlite_store():
+    """测试SQLite上下文存储"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contexts.db")
+        store = ContextStore(SQLiteContextBackend(path, max_contexts=4, ttl_seconds=3600), max_messages=6)
+        check_store(store)
+        
+        # 另一个连接（模拟其他工作进程）可以读到同一上下文
+        store.update_context("shared", {"role": "user", "content": "你好"})
+        other = ContextStore(SQLiteContextBackend(path, max_contexts=4, ttl_seconds=3600))
+        assert other.get_context("shared")["messages"][0]["content"] == "你好"
+        other.close()
+        store.close()
+    return True
+
+def test_token_budget():
+    """测试token预算裁剪"""
+    store = ContextStore(MemoryContextBackend(), max_messages=100, max_tokens=50)
+    for i in range(10):
+        store.update_context("t", {"role": "user", "content": "这是一条用于测试预算的中文消息"})
+    messages = store.get_context("t")["messages"]
+    total = sum(estimate_tokens(m["content"]) + 4 for m in messages)
+    logger.info(f"裁剪后消息数: {len(messages)}, 估算token数: {total}")
+    assert total <= 50
+    return True
+
+if __name__ == "__main__":
+    print(f"内存存储: {test_memory_store()}")
+    print(f"SQLite存储: {test_sqlite_store()}")
+    print(f"token预算: {test_token_budget()}")
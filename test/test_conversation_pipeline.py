@@ -8,7 +8,8 @@ import logging
 import os
 from pathlib import Path
 from utils import AudioMessage, TextMessage, AudioFormatType
-from utils.config import get_config
+from utils.audio_utils import pcm_to_wav
+from utils.config import load_config
 from pipelines.conversation import ConversationPipeline
 import argparse
 
@@ -16,17 +17,109 @@ import argparse
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-async def test_conversation_pipeline(audio_path: str = None, text_input: str = None):
+# 模拟引擎配置（与基准测试共用），不依赖模型和网络
+STUB_CONFIG = Path(__file__).resolve().parent.parent / "bench" / "configs" / "stub.yaml"
+
+def offline_pipeline(**sections) -> ConversationPipeline:
+    """使用模拟ASR/LLM/TTS引擎创建对话管道，sections按配置段覆盖模拟参数"""
+    cfg = load_config(str(STUB_CONFIG))
+    cfg.defrost()
+    for section, values in sections.items():
+        for key, value in values.items():
+            cfg[section][key] = value
+    return ConversationPipeline(cfg)
+
+async def test_conversation_stream_offline():
+    """离线测试流式对话管道：音频按句子顺序输出，依次记录各阶段耗时"""
+    # 第一句较长，合成比后面的短句慢；TTS并发为2时后面的句子先合成完成
+    reply = "这是比较长的第一句话用来让语音合成变慢。短句。最后一句！"
+    pipeline = offline_pipeline(LLM={"REPLY": reply, "FIRST_TOKEN_MS": 20, "TOKENS_PER_SECOND": 200},
+                                TTS={"LATENCY_MS": 0, "REALTIME_FACTOR": 0.05})
+    finished = []
+    run = pipeline.tts_engine.run
+    async def tracked_run(input, **kwargs):
+        audio = await run(input, **kwargs)
+        finished.append(input.data)
+        return audio
+    pipeline.tts_engine.run = tracked_run
+    
+    audio_input = AudioMessage(data=pcm_to_wav(bytes(3200), 16000), format=AudioFormatType.WAV,
+                               sampleRate=16000, sampleWidth=2)
+    events = [event async for event in pipeline.process_stream(audio_input=audio_input, max_concurrent_tts=2)]
+    assert not [event for event in events if event["type"] == "error"], events
+    
+    audio_events = [event for event in events if event["type"] == "audio"]
+    sentences = [event["text"] for event in audio_events]
+    logger.info(f"合成完成顺序: {finished}, 输出顺序: {sentences}")
+    assert [event["index"] for event in audio_events] == list(range(len(audio_events)))
+    assert "".join(sentences) == reply and len(sentences) == 3
+    assert finished != sentences
+    
+    # 阶段耗时按发生顺序输出，LLM耗时在生成结束时记录，不包含之后的TTS排空时间
+    stages = [event["stage"] for event in events if event["type"] == "timing"]
+    assert stages == ["asr", "llm_first_token", "tts_first_audio", "llm", "total"]
+    timings = events[-1]["timings"]
+    assert events[-1]["type"] == "done" and events[-1]["response_text"] == reply
+    assert timings["asr"] <= timings["llm_first_token"] <= timings["llm"] < timings["total"]
+    assert timings["tts_first_audio"] <= timings["total"]
+    return timings
+
+async def test_conversation_stream_cancel():
+    """测试消费方提前停止时，LLM生成和尚未完成的TTS任务被取消"""
+    pipeline = offline_pipeline(LLM={"REPLY": "第一句。第二句。第三句。第四句。", "FIRST_TOKEN_MS": 0,
+                                     "TOKENS_PER_SECOND": 10},
+                                TTS={"LATENCY_MS": 0, "REALTIME_FACTOR": 0})
+    started, cancelled = [], []
+    run = pipeline.tts_engine.run
+    async def slow_run(input, **kwargs):
+        started.append(input.data)
+        try:
+            # 第一句之后的合成一直挂起，直到被取消
+            if len(started) > 1:
+                await asyncio.sleep(30)
+            return await run(input, **kwargs)
+        except asyncio.CancelledError:
+            cancelled.append(input.data)
+            raise
+    pipeline.tts_engine.run = slow_run
+    
+    llm_cancelled = []
+    run_stream = pipeline.llm_engine.run_stream
+    async def tracked_stream(*args, **kwargs):
+        try:
+            async for delta in run_stream(*args, **kwargs):
+                yield delta
+        except asyncio.CancelledError:
+            llm_cancelled.append(True)
+            raise
+    pipeline.llm_engine.run_stream = tracked_stream
+    
+    stream = pipeline.process_stream(text_input="你好")
+    async for event in stream:
+        if event["type"] == "audio":
+            break
+    while len(started) < 2:
+        await asyncio.sleep(0.01)
+    await stream.aclose()
+    await asyncio.sleep(0.05)
+    logger.info(f"已提交合成: {started}, 已取消: {cancelled}")
+    assert llm_cancelled == [True]
+    assert cancelled == started[1:] and cancelled
+    return {"started": started, "cancelled": cancelled}
+
+async def test_conversation_pipeline(audio_path: str = None, text_input: str = None,
+                                     config_path: str = "configs/default.yaml"):
     """测试完整的对话管道流程
     
     参数:
         audio_path: 音频文件路径，用于ASR测试
         text_input: 文本输入，可以跳过ASR直接测试LLM->TTS流程
+        config_path: 配置文件路径
     """
     try:
         # 加载配置
         logger.info("加载配置...")
-        cfg = get_config()
+        cfg = load_config(config_path)
         
         # 初始化对话管道
         logger.info("初始化对话管道...")
@@ -116,16 +209,69 @@ async def test_conversation_pipeline(audio_path: str = None, text_input: str = N
         traceback.print_exc()
         return None
 
+async def test_conversation_stream(text_input: str, config_path: str = "configs/default.yaml"):
+    """测试流式对话管道：LLM边生成边分句合成（使用配置中的引擎）
+    
+    参数:
+        text_input: 文本输入，跳过ASR
+        config_path: 配置文件路径
+    """
+    try:
+        cfg = load_config(config_path)
+        pipeline = ConversationPipeline(cfg)
+        
+        audio_chunks = []
+        async for event in pipeline.process_stream(text_input=text_input):
+            if event["type"] == "timing":
+                logger.info(f"阶段耗时: {event['stage']} = {event['elapsed_ms']:.1f} ms")
+            elif event["type"] == "audio":
+                logger.info(f"收到第 {event['index'] + 1} 段音频: {event['text'][:30]}")
+                audio_chunks.append(event["audio"])
+            elif event["type"] == "error":
+                logger.error(event["error"])
+                return None
+            elif event["type"] == "done":
+                logger.info(f"回复文本: {event['response_text']}")
+                return {
+                    "chunks": len(audio_chunks),
+                    "timings": event["timings"]
+                }
+        return None
+        
+    except Exception as e:
+        logger.error(f"流式测试过程出错: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
+
 if __name__ == "__main__":
     # 解析命令行参数
     parser = argparse.ArgumentParser(description="测试数字人对话管道")
     parser.add_argument("--audio", type=str, help="音频文件路径，用于ASR->LLM->TTS流程测试")
     parser.add_argument("--text", type=str, help="文本输入，用于直接LLM->TTS流程测试")
+    parser.add_argument("--stream", action="store_true", help="使用流式对话管道测试（需配合--text）")
+    parser.add_argument("--config", type=str, default="configs/default.yaml", help="配置文件路径")
     
     args = parser.parse_args()
     
+    if not args.audio and not args.text:
+        # 未指定输入时只运行使用模拟引擎的离线测试
+        print(f"离线流式对话: {asyncio.run(test_conversation_stream_offline())}")
+        print(f"离线流式对话取消: {asyncio.run(test_conversation_stream_cancel())}")
+        raise SystemExit(0)
+    
+    if args.stream and args.text:
+        stream_result = asyncio.run(test_conversation_stream(args.text, args.config))
+        if stream_result:
+            print(f"\n=== 流式对话测试成功 ===")
+            print(f"音频片段数: {stream_result['chunks']}")
+            print(f"阶段耗时: {stream_result['timings']}")
+        else:
+            print("\n流式测试失败")
+        raise SystemExit(0)
+    
     # 运行测试
-    result = asyncio.run(test_conversation_pipeline(args.audio, args.text))
+    result = asyncio.run(test_conversation_pipeline(args.audio, args.text, args.config))
     
     if result:
         print(f"\n=== 对话测试成功 ===")
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试EchoMimicV2渲染器经适配层渲染：姿势图来自姿势缓存，流式分段之间衔接姿势和音频
+（使用模拟的EchoMimicV2项目和pipeline，不需要模型权重）
+"""
+
+import os
+import sys
+import wave
+import shutil
+import logging
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+import torch
+from PIL import Image
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.echomimic_adapter import EchoMimicV2Adapter
+from integrations.echomimic_worker import EchoMimicV2Renderer
+from integrations.pose_cache import PoseCache
+from integrations.reference_cache import ReferenceCache
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 模拟EchoMimicV2项目的src包：姿势图的像素值为关键点字典中的帧号，视频保存为numpy数组
+FAKE_DWPOSE_UTIL = '''
+import numpy as np
+def draw_pose_select_v2(pose, H, W, ref_w=800):
+    return np.full((3, H, W), pose["frame"], dtype=np.uint8)
+'''
+FAKE_UTIL = '''
+import numpy as np
+def save_videos_grid(videos, path, rescale=False, n_rows=6, fps=8):
+    with open(path, "wb") as f:
+        np.save(f, videos.numpy())
+'''
+# 模拟参考注意力控制：写入模式下为参考网络的各注意力层注册bank
+FAKE_MUTUAL_SELF_ATTENTION = '''
+class ReferenceAttentionControl:
+    def __init__(self, unet, mode="write", do_classifier_free_guidance=False, batch_size=1, fusion_blocks="midup"):
+        self.unet = unet
+        for block in unet.blocks:
+            block.bank = []
+    def clear(self):
+        for block in self.unet.blocks:
+            block.bank.clear()
+'''
+
+SIZE = 8
+FPS = 25
+PARAMS = {"width": SIZE, "height": SIZE, "length": 120, "steps": 2, "sample_rate": 16000, "cfg": 3.5,
+          "fps": FPS, "context_frames": 12, "context_overlap": 4, "seed": -1}
+
+
+class FakeVAE(torch.nn.Module):
+    """模拟VAE：潜变量为图像各通道的均值，记录编码次数"""
+    def __init__(self):
+        super().__init__()
+        self.encodes = 0
+
+    def encode(self, sample):
+        self.encodes += 1
+        return SimpleNamespace(latent_dist=SimpleNamespace(mean=sample.mean(dim=1, keepdim=True) + 1))
+
+
+class FakeBlock(torch.nn.Module):
+    """模拟参考网络的注意力层：写入模式下把输入特征存入bank"""
+    def __init__(self, scale: float):
+        super().__init__()
+        self.scale = scale
+
+    def forward(self, sample):
+        if hasattr(self, "bank"):
+            self.bank.append(sample.flatten(1).unsqueeze(1) * self.scale)
+        return sample
+
+
+class FakeReferenceUNet(torch.nn.Module):
+    """模拟参考网络，记录前向次数"""
+    def __init__(self):
+        super().__init__()
+        self.blocks = torch.nn.ModuleList([FakeBlock(1.0), FakeBlock(2.0)])
+        self.forwards = 0
+
+    def forward(self, sample, timestep, encoder_hidden_states=None, return_dict=False):
+        self.forwards += 1
+        for block in self.blocks:
+            block(sample)
+        return (sample,)
+
+
+class FakeImageProcessor:
+    def preprocess(self, image, height, width):
+        array = np.asarray(image, dtype=np.float32).transpose(2, 0, 1)[None] / 127.5 - 1
+        return torch.from_numpy(array)
+
+
+class FakePipeline:
+    """
+    模拟EchoMimicV2Pipeline：按pipeline的流程编码参考图像并运行参考网络，记录写入注意力层bank的特征；
+    按去噪步数回调进度，输出视频即输入的姿势图
+    """
+    def __init__(self):
+        self.calls = []
+        self.vae = FakeVAE()
+        self.reference_unet = FakeReferenceUNet()
+        self.ref_image_processor = FakeImageProcessor()
+
+    def __call__(self, ref_image, audio_path, poses_tensor, width, height, video_length, num_inference_steps,
+                 guidance_scale, generator=None, audio_sample_rate=16000, context_frames=12, fps=25,
+                 context_overlap=3, callback=None, callback_steps=1):
+        from src.models.mutual_self_attention import ReferenceAttentionControl
+        writer = ReferenceAttentionControl(self.reference_unet, mode="write", do_classifier_free_guidance=True,
+                                           batch_size=1, fusion_blocks="full")
+        ref_image_tensor = self.ref_image_processor.preprocess(ref_image, height=height, width=width)
+        ref_image_latents = self.vae.encode(ref_image_tensor).latent_dist.mean * 0.18215
+        # 无分类器引导时参考网络的输入按2倍批大小复制
+        self.reference_unet(ref_image_latents.repeat(2, 1, 1, 1), torch.zeros(()), encoder_hidden_states=None,
+                            return_dict=False)
+        banks = [[value.clone() for value in block.bank] for block in self.reference_unet.blocks]
+        writer.clear()
+        self.calls.append({"audio_frames": int(wave.open(audio_path).getnframes() * fps / audio_sample_rate),
+                           "video_length": video_length, "seed": generator.initial_seed(), "banks": banks})
+        for step in range(num_inference_steps):
+            callback(step, step, None)
+        return type("Output", (), {"videos": poses_tensor[:, :, :video_length].float().cpu()})()
+
+
+class CopyAdapter(EchoMimicV2Adapter):
+    """不加音轨，直接使用无声视频（测试环境没有ffmpeg）"""
+    def _mux_audio(self, video_path, audio_path, duration, output_path):
+        shutil.copy(video_path, output_path)
+
+
+def write_audio(path: Path, seconds: float, sample_rate: int = 16000):
+    with wave.open(str(path), "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+
+
+def output_frames(video_path: str) -> list:
+    """读取模拟视频中每一帧对应的姿势帧号"""
+    with open(video_path, "rb") as f:
+        video = np.load(f)
+    return [int(round(float(video[0, 0, i, 0, 0]) * 255)) for i in range(video.shape[2])]
+
+
+def make_project(root: Path) -> Path:
+    """在临时目录中创建模拟的EchoMimicV2项目、30帧姿势数据集、两段0.4秒音频和参考图像"""
+    echomimic_path = root / "echomimic_v2"
+    (echomimic_path / "src" / "utils").mkdir(parents=True)
+    (echomimic_path / "src" / "models").mkdir(parents=True)
+    (echomimic_path / "src" / "__init__.py").write_text("")
+    (echomimic_path / "src" / "utils" / "__init__.py").write_text("")
+    (echomimic_path / "src" / "utils" / "dwpose_util.py").write_text(FAKE_DWPOSE_UTIL)
+    (echomimic_path / "src" / "utils" / "util.py").write_text(FAKE_UTIL)
+    (echomimic_path / "src" / "models" / "__init__.py").write_text("")
+    (echomimic_path / "src" / "models" / "mutual_self_attention.py").write_text(FAKE_MUTUAL_SELF_ATTENTION)
+    pose_dir = echomimic_path / "assets" / "pose"
+    pose_dir.mkdir(parents=True)
+    for i in range(30):
+        np.save(pose_dir / f"{i}.npy", {"draw_pose_params": [SIZE, SIZE, 0, SIZE, 0, SIZE], "frame": i},
+                allow_pickle=True)
+    write_audio(root / "a0.wav", 0.4)
+    write_audio(root / "a1.wav", 0.4)
+    image = np.arange(SIZE * SIZE * 3, dtype=np.uint8).reshape(SIZE, SIZE, 3)
+    Image.fromarray(image).save(root / "reference.png")
+    return echomimic_path
+
+
+def test_adapter_render():
+    """测试渲染器把姿势缓存切片传入适配层，流式分段按本段音频时长渲染，从上一段结束处继续并衔接context_overlap帧"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        echomimic_path = make_project(root)
+        pose_dir = echomimic_path / "assets" / "pose"
+
+        # 整段视频的帧数上限为8帧，短于0.4秒音频对应的10帧
+        params = dict(PARAMS, length=8)
+        pipeline = FakePipeline()
+        try:
+            adapter = CopyAdapter(str(echomimic_path), {"device": "cpu"}, pipeline=pipeline)
+            renderer = EchoMimicV2Renderer(str(echomimic_path), params, PoseCache(str(root / "cache")),
+                                           adapter=adapter)
+            job = {"job_id": "j", "audio": str(root / "a0.wav"), "ref_image": str(root / "reference.png"),
+                   "pose_dir": str(pose_dir), "output_path": str(root / "out" / "full.mp4"), "pose_start": 25}
+            progress = []
+            renderer.render(job, lambda value, stage: progress.append((value, stage)))
+            # 关键点字典按输出尺寸绘制为姿势图后以内存映射方式缓存
+            pose_stats = renderer.pose_cache.stats()
+            assert pose_stats["pose_sets"] == 1 and pose_stats["mapped_bytes"] == 30 * SIZE * SIZE * 3
+            # 姿势帧从缓存中第25帧开始，超出数据集长度时循环，帧数不超过length
+            assert output_frames(job["output_path"]) == [25, 26, 27, 28, 29] + list(range(3))
+            assert progress == [(0.5, "denoising"), (1.0, "denoising"), (1.0, "encoding")]
+
+            state = {}
+            chunks = []
+            for i in range(2):
+                chunk = dict(job, job_id=f"c{i}", audio=str(root / f"a{i}.wav"),
+                             output_path=str(root / "out" / f"chunk_{i}.mp4"))
+                chunk.pop("pose_start")
+                chunk["duration"] = 0.4
+                _, state = renderer.render_chunk(chunk, state)
+                # 分段按本段音频时长渲染，不受length限制
+                assert state["last_frames"] == 10
+                chunks.append(output_frames(chunk["output_path"]))
+            logger.info(f"流式分段的姿势帧: {chunks}, 渲染帧数: {[call['video_length'] for call in pipeline.calls[1:]]}")
+            # 第二段从第10帧继续，拼接在前面的4帧衔接帧只参与渲染，不出现在输出中
+            assert chunks == [list(range(10)), list(range(10, 20))]
+            assert [call["video_length"] for call in pipeline.calls[1:]] == [10, 14]
+            assert [call["audio_frames"] for call in pipeline.calls[1:]] == [10, 14]
+            # 同一个流的分段使用相同的随机种子
+            assert pipeline.calls[1]["seed"] == pipeline.calls[2]["seed"]
+            assert state["frame_offset"] == 20
+            return chunks
+        finally:
+            os.chdir(cwd)
+
+
+def test_reference_cache():
+    """测试参考图像编码缓存：首次渲染编码并写入缓存，之后的渲染直接使用缓存的潜变量和参考网络特征"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        echomimic_path = make_project(root)
+        pipeline = FakePipeline()
+        try:
+            adapter = CopyAdapter(str(echomimic_path), {"device": "cpu"}, pipeline=pipeline)
+            reference_cache = ReferenceCache(str(root / "reference_cache"))
+            job = {"job_id": "j", "audio": str(root / "a0.wav"), "ref_image": str(root / "reference.png"),
+                   "pose_dir": str(echomimic_path / "assets" / "pose"), "output_path": str(root / "out" / "j.mp4")}
+
+            # 不使用缓存时由pipeline编码参考图像
+            EchoMimicV2Renderer(str(echomimic_path), PARAMS, PoseCache(str(root / "cache")),
+                                adapter=adapter).render(job)
+            assert pipeline.vae.encodes == 1 and pipeline.reference_unet.forwards == 1
+
+            renderer = EchoMimicV2Renderer(str(echomimic_path), PARAMS, PoseCache(str(root / "cache")),
+                                           reference_cache, adapter=adapter)
+            for i in range(3):
+                renderer.render(dict(job, job_id=f"c{i}"))
+            # 只在第一次渲染时单独编码一次，pipeline内不再运行VAE编码和参考网络
+            assert pipeline.vae.encodes == 2 and pipeline.reference_unet.forwards == 2
+            stats = reference_cache.stats()
+            assert stats["misses"] == 1 and stats["hits"] == 2
+            # 写入注意力层bank的特征与pipeline自行编码时一致（按批大小复制）
+            for call in pipeline.calls[1:]:
+                for expected, cached in zip(pipeline.calls[0]["banks"], call["banks"]):
+                    assert len(expected) == len(cached) == 1
+                    assert cached[0].shape == expected[0].shape and torch.allclose(cached[0], expected[0])
+            # 渲染结束后恢复原来的方法
+            assert "encode" not in vars(pipeline.vae) and "forward" not in vars(pipeline.reference_unet)
+            return stats
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    print(f"适配层渲染: {test_adapter_render()}")
+    print(f"参考图像缓存: {test_reference_cache()}")
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试EchoMimic常驻渲染进程（使用stub渲染器，不需要EchoMimicV2模型）
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.echomimic import EchoMimicIntegration
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 模拟infer.py：写入输出目录下的*_ws.mp4，用于测试命令行方式
+FAKE_INFER = '''
+import argparse, os, time
+parser = argparse.ArgumentParser()
+parser.add_argument("--audio")
+parser.add_argument("--output_dir")
+args, _ = parser.parse_known_args()
+time.sleep(0.2)
+with open(os.path.join(args.output_dir, "result_ws.mp4"), "w") as f:
+    f.write(args.audio)
+'''
+
+
+def make_config(root: Path, worker: dict) -> dict:
+    """
+    在临时目录中创建EchoMimicV2目录结构
+    """
+    echomimic_path = root / "echomimic_v2"
+    (echomimic_path / "assets" / "pose").mkdir(parents=True)
+    for i in range(10):
+        np.save(echomimic_path / "assets" / "pose" / f"{i}.npy", np.full((4, 2), i, dtype=np.float32))
+    (echomimic_path / "assets" / "reference.png").write_bytes(b"")
+    (echomimic_path / "infer.py").write_text(FAKE_INFER)
+    return {
+        "echomimic_path": str(echomimic_path),
+        "ref_image_path": str(echomimic_path / "assets" / "reference.png"),
+        "pose_dir_path": str(echomimic_path / "assets" / "pose"),
+        "output_dir": str(root / "outputs"),
+        "worker": worker,
+        "pose_cache": {"cache_dir": str(root / "pose_cache"), "watch_interval": 0},
+    }
+
+
+async def test_worker():
+    """测试常驻渲染进程：并发任务由同一进程渲染，输出路径由任务ID确定"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        config = make_config(root, {"enabled": True, "renderer": "stub", "start_timeout": 30,
+                                    "socket_path": str(root / "worker.sock")})
+        # 参考图像缓存（stub渲染器按图像内容生成占位特征）
+        config["reference_cache"] = {"enabled": True}
+        integration = EchoMimicIntegration(config)
+        try:
+            videos = await asyncio.gather(*[integration.process_tts_output(f"audio{i}".encode(), "wav")
+                                            for i in range(3)])
+            assert len(set(videos)) == 3
+            pids = set()
+            reference_keys = set()
+            for video in videos:
+                job_id = Path(video).stem
+                content = json.loads(Path(video).read_text())
+                assert content["job_id"] == job_id
+                # 姿势数据集只有10帧，按视频长度循环取帧（跨越末尾时为拷贝而非内存映射视图）
+                assert content["pose_frames"] == 120 and content["pose_mmap"] is False
+                reference_keys.add(content["reference_key"])
+                pids.add(content["pid"])
+            # 所有任务由同一个常驻进程渲染
+            assert len(pids) == 1
+
+            # 渲染进度由常驻进程逐步上报
+            audio_path = await integration.save_audio_to_file(b"audio", "wav")
+            progress = []
+            await integration.generate_video_from_audio(audio_path, progress=lambda value, stage: progress.append(value))
+            assert progress == [0.25, 0.5, 0.75, 1.0]
+
+            stats = await integration.worker_stats()
+            logger.info(f"渲染进程状态: {stats}")
+            assert stats["completed"] == 4 and stats["renderer"] == "stub"
+            assert stats["pose_cache"]["pose_sets"] == 1 and stats["pose_cache"]["packs"] == 1
+            # 参考图像只编码一次，之后的任务命中缓存
+            assert len(reference_keys) == 1
+            assert stats["reference_cache"]["misses"] == 1 and stats["reference_cache"]["hits"] == 3
+
+            # 预先注册新的形象
+            avatar = root / "avatar.png"
+            avatar.write_bytes(b"avatar")
+            registered = await integration.register_reference(str(avatar))
+            assert not registered["cached"] and registered["key"] not in reference_keys
+            assert (await integration.register_reference(str(avatar)))["cached"]
+
+            # 分段渲染期间结束流：立即返回，分段完成后不再保留衔接状态
+            chunk = asyncio.ensure_future(integration.render_stream_chunk("s1", 0, audio_path, 1.0))
+            await asyncio.sleep(0.05)
+            start_time = time.time()
+            await integration.end_stream("s1")
+            assert time.time() - start_time < 0.1 and not chunk.done()
+            # 分段时长按渲染进程返回的实际帧数计算
+            _, duration = await chunk
+            assert duration == 1.0
+            assert (await integration.worker_stats())["streams"] == 0
+            return stats
+        finally:
+            await integration.close()
+
+
+async def test_cancel_running():
+    """测试客户端断开时，正在渲染的任务在下一次进度回调时中止，不再占用渲染线程"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        config = make_config(root, {"enabled": True, "renderer": "stub", "start_timeout": 30,
+                                    "socket_path": str(root / "worker.sock")})
+        integration = EchoMimicIntegration(config)
+        # stub渲染器每个任务渲染2秒，分4步上报进度
+        integration.video_params["stub_delay"] = 2.0
+        try:
+            audio_path = await integration.save_audio_to_file(b"audio", "wav")
+            started = asyncio.Event()
+            task = asyncio.ensure_future(integration.generate_video_from_audio(
+                audio_path, progress=lambda value, stage: started.set()
+            ))
+            await started.wait()
+            task.cancel()
+            start_time = time.time()
+            while (await integration.worker_stats())["cancelled"] == 0:
+                assert time.time() - start_time < 5
+                await asyncio.sleep(0.02)
+            elapsed = time.time() - start_time
+            stats = await integration.worker_stats()
+            logger.info(f"取消后 {elapsed:.2f}s 中止渲染: {stats}")
+            # 在下一个进度步骤（0.5秒内）中止，而不是渲染完剩余的1.5秒
+            assert elapsed < 1.0 and stats["current_job"] is None and stats["completed"] == 0
+            assert not list((root / "outputs").glob("*.mp4"))
+            return stats
+        finally:
+            await integration.close()
+
+
+async def test_reference_disabled():
+    """测试EchoMimicV2渲染器默认启用参考图像缓存；关闭reference_cache时注册形象报告不支持"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        avatar = root / "avatar.png"
+        avatar.write_bytes(b"avatar")
+        config = make_config(root, {"enabled": True, "renderer": "echomimic", "autostart": False,
+                                    "socket_path": str(root / "missing.sock")})
+        assert EchoMimicIntegration(config).reference_cache_options["enabled"]
+        config["reference_cache"] = {"enabled": False}
+        integration = EchoMimicIntegration(config)
+        try:
+            await integration.register_reference(str(avatar))
+            raise AssertionError("关闭参考图像缓存时不应支持注册形象")
+        except NotImplementedError as e:
+            logger.info(f"注册形象: {e}")
+            return str(e)
+
+
+async def test_cli_fallback():
+    """测试命令行方式：渲染进程不可用时退回infer.py，并发任务各自取到自己的视频"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        config = make_config(root, {"enabled": True, "autostart": False,
+                                    "socket_path": str(root / "missing.sock")})
+        integration = EchoMimicIntegration(config)
+        audio_paths = [await integration.save_audio_to_file(f"audio{i}".encode(), "wav") for i in range(2)]
+        videos = await asyncio.gather(*[integration.generate_video_from_audio(path) for path in audio_paths])
+        for audio_path, video in zip(audio_paths, videos):
+            assert Path(video).read_text() == audio_path
+        assert not list((root / "outputs" / ".jobs").iterdir())
+        return videos
+
+
+if __name__ == "__main__":
+    print(f"常驻渲染进程: {asyncio.run(test_worker())}")
+    print(f"中止渲染中的任务: {asyncio.run(test_cancel_running())}")
+    print(f"参考图像缓存关闭: {asyncio.run(test_reference_disabled())}")
+    print(f"命令行方式: {asyncio.run(test_cli_fallback())}")
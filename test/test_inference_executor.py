@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import httpx
+from engine.executor import CPUBoundEngine, InferenceExecutorBusy, configure_executors, get_inference_executor
+from utils.protocol import AudioMessage, AudioFormatType
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class SlowEngine(CPUBoundEngine):
+    """模拟阻塞推理的CPU密集型引擎"""
+    EXECUTOR_NAME = "test-slow"
+    
+    def _infer(self, seconds: float) -> float:
+        time.sleep(seconds)
+        return seconds
+    
+    async def run(self, seconds: float) -> float:
+        return await self.run_blocking(self._infer, seconds)
+
+async def test_inference_executor():
+    """测试推理不阻塞事件循环，以及排队已满时的背压错误"""
+    configure_executors({"test-slow": {"MAX_WORKERS": 1, "MAX_QUEUE": 2}})
+    engine = SlowEngine()
+    
+    # 推理期间事件循环仍能处理其他协程
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        for _ in range(5):
+            await asyncio.sleep(0.02)
+            ticks += 1
+    await asyncio.gather(engine.run(0.2), ticker())
+    logger.info(f"推理期间事件循环计时次数: {ticks}")
+    assert ticks == 5
+    
+    # 1个执行中 + 2个排队，第4个请求被拒绝
+    results = await asyncio.gather(*[engine.run(0.1) for _ in range(4)], return_exceptions=True)
+    rejected = [r for r in results if isinstance(r, InferenceExecutorBusy)]
+    stats = get_inference_executor("test-slow").stats()
+    logger.info(f"执行器状态: {stats}")
+    assert len(rejected) == 1 and stats["rejected"] == 1
+    return stats
+
+class SlowTTS(CPUBoundEngine):
+    """模拟本地TTS模型的CPU密集型引擎"""
+    EXECUTOR_NAME = "test-busy-tts"
+    
+    def _synthesize(self, seconds: float) -> bytes:
+        time.sleep(seconds)
+        return b"\x00\x00" * 160
+    
+    async def run(self, input, seconds: float = 0.3) -> AudioMessage:
+        data = await self.run_blocking(self._synthesize, seconds)
+        return AudioMessage(data=data, format=AudioFormatType.WAV, sampleRate=16000, sampleWidth=2)
+
+def load_app():
+    """导入应用，日志文件写到临时目录"""
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+async def test_busy_http_503():
+    """测试推理执行器排队已满时，HTTP接口返回503和Retry-After"""
+    from api.routes import api_service
+    from pipelines.conversation import ConversationPipeline
+    
+    configure_executors({"test-busy-tts": {"MAX_WORKERS": 1, "MAX_QUEUE": 0}})
+    engine = SlowTTS()
+    pipeline = ConversationPipeline.__new__(ConversationPipeline)
+    pipeline.tts_engine = engine
+    api_service.set_pipeline(pipeline)
+    
+    transport = httpx.ASGITransport(app=load_app().app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # 占满唯一的工作线程，新的合成请求被拒绝
+        running = asyncio.create_task(engine.run(None))
+        await asyncio.sleep(0.05)
+        response = await client.post("/api/tts", json={"text": "你好"})
+        await running
+        logger.info(f"排队已满时的响应: {response.status_code} {response.json()}")
+        assert response.status_code == 503
+        assert response.headers.get("Retry-After") == "1"
+        
+        # 执行器空闲后恢复正常
+        response = await client.post("/api/tts", json={"text": "你好"})
+        assert response.status_code == 200
+    return get_inference_executor("test-busy-tts").stats()
+
+if __name__ == "__main__":
+    print(f"推理执行器: {asyncio.run(test_inference_executor())}")
+    print(f"背压响应: {asyncio.run(test_busy_http_503())}")
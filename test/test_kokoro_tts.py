@@ -7,6 +7,7 @@ import asyncio
 import base64
 import sys
 import os
+import time
 import logging
 
 # 添加项目根目录到路径
@@ -86,6 +87,31 @@ async def test_kokoro_tts():
     
     return True
 
+async def test_kokoro_tts_stream():
+    """测试Kokoro流式语音合成：逐句输出16位PCM"""
+    logger.info("开始测试Kokoro流式语音合成")
+    
+    engine = KokoroTTSEngine({'lang_code': 'z', 'default_voice': 'zh_f1'})
+    if not await engine.initialize():
+        logger.error("Kokoro TTS引擎初始化失败")
+        return False
+    
+    text = "欢迎使用Kokoro语音合成引擎。这是第二句话！流式合成逐句输出音频。"
+    start = time.time()
+    first_chunk_ms = None
+    chunks = []
+    async for pcm in engine.synthesize_stream(TextMessage(data=text), voice_id='zh_f1'):
+        if first_chunk_ms is None:
+            first_chunk_ms = (time.time() - start) * 1000
+        chunks.append(pcm)
+    total_ms = (time.time() - start) * 1000
+    
+    logger.info(f"流式合成: {len(chunks)}段, 首段耗时: {first_chunk_ms:.0f}ms, 总耗时: {total_ms:.0f}ms")
+    assert len(chunks) >= 3
+    assert all(len(pcm) % 2 == 0 for pcm in chunks)
+    return True
+
 if __name__ == "__main__":
     # 运行测试
     asyncio.run(test_kokoro_tts())
+    asyncio.run(test_kokoro_tts_stream())
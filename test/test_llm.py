@@ -60,6 +60,42 @@ async def test_openai_llm():
         logger.error(f"测试过程出错: {str(e)}")
         return None
 
+async def test_openai_llm_stream():
+    """测试OpenAI大语言模型流式输出"""
+    try:
+        logger.info("测试OpenAI LLM流式输出...")
+        
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            logger.error("未设置OPENAI_API_KEY环境变量")
+            return None
+        
+        cfg = CN()
+        cfg.NAME = "OpenAILLM"
+        cfg.API_KEY = api_key
+        cfg.MODEL = "gpt-3.5-turbo"
+        cfg.MAX_TOKENS = 500
+        cfg.TIMEOUT_S = 10
+        cfg.STREAM = True
+        
+        llm = OpenAILLM(cfg)
+        
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        first_token_ms = None
+        response_text = ""
+        async for delta in llm.run_stream(TextMessage(data="请用三句话介绍一下你自己")):
+            if first_token_ms is None:
+                first_token_ms = (loop.time() - start_time) * 1000
+            response_text += delta
+        
+        logger.info(f"首个token耗时: {first_token_ms} ms, 总耗时: {(loop.time() - start_time) * 1000:.1f} ms")
+        return response_text or None
+            
+    except Exception as e:
+        logger.error(f"测试过程出错: {str(e)}")
+        return None
+
 if __name__ == "__main__":
     # 运行测试
     result = asyncio.run(test_openai_llm())
@@ -67,3 +103,9 @@ if __name__ == "__main__":
         print(f"\n最终LLM回复结果:\n{result}")
     else:
         print("\n测试失败，未获得回复")
+    
+    stream_result = asyncio.run(test_openai_llm_stream())
+    if stream_result:
+        print(f"\n最终LLM流式回复结果:\n{stream_result}")
+    else:
+        print("\n流式测试失败，未获得回复")
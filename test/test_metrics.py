@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import random
+import time
+from yacs.config import CfgNode as CN
+from engine.engineBase import BaseEngine
+from utils.metrics import LatencyHistogram, get_metrics, span, observe
+from utils.protocol import TextMessage
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class SleepEngine(BaseEngine):
+    """按输入文本指定的毫秒数等待的测试引擎"""
+    async def run(self, input: TextMessage, **kwargs):
+        await asyncio.sleep(int(input.data) / 1000)
+        return input
+
+class RetryEngine(SleepEngine):
+    """通过super()调用父类run的测试引擎，只应记录一次"""
+    async def run(self, input: TextMessage, **kwargs):
+        if input.data == "fail":
+            raise RuntimeError("推理失败")
+        return await super().run(input, **kwargs)
+
+def test_histogram_quantiles():
+    """测试分位数的相对误差不超过分桶精度"""
+    histogram = LatencyHistogram()
+    values = [random.uniform(0.001, 2.0) for _ in range(20000)]
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(q * len(values)) - 1]
+        estimate = histogram.quantile(q)
+        assert abs(estimate - exact) / exact < 0.02, (q, exact, estimate)
+    assert histogram.quantile(1.0) == histogram.max
+    # 累计分桶单调不减，最后一个边界包含所有记录
+    cumulative = histogram.cumulative([0.01, 0.1, 1.0, 10.0])
+    assert cumulative == sorted(cumulative) and cumulative[-1] == len(values)
+    return histogram.snapshot([0.5, 0.9, 0.99])
+
+async def test_engine_and_spans():
+    """测试引擎run计时、阶段span和Prometheus导出"""
+    metrics = get_metrics()
+    metrics.configure({"ENABLED": True})
+    metrics.reset()
+
+    engine = RetryEngine(CN({"NAME": "retry"}))
+    await asyncio.gather(*[engine.run(TextMessage(data="20")) for _ in range(3)])
+    try:
+        await engine.run(TextMessage(data="fail"))
+    except RuntimeError:
+        pass
+    with span("tts"):
+        await asyncio.sleep(0.01)
+    observe("video_queue_wait", 1.5)
+
+    snapshot = metrics.snapshot()
+    engine_series = snapshot["engine_run_seconds"]['{engine="RetryEngine"}']
+    # 并发调用各自计时，super()调用不重复记录
+    assert engine_series["count"] == 4
+    assert 0.02 <= engine_series["max"] < 0.2
+    assert snapshot["engine_run_errors_total"]['{engine="RetryEngine"}'] == 1
+    assert snapshot["stage_seconds"]['{stage="tts"}']["count"] == 1
+
+    text = metrics.render_prometheus()
+    assert "# TYPE digital_human_stage_seconds histogram" in text
+    assert 'digital_human_stage_seconds_bucket{stage="video_queue_wait",le="1"} 0' in text
+    assert 'digital_human_stage_seconds_bucket{stage="video_queue_wait",le="2.5"} 1' in text
+    assert 'digital_human_stage_seconds_count{stage="video_queue_wait"} 1' in text
+    assert 'digital_human_engine_run_seconds_quantile{engine="RetryEngine",quantile="0.99"}' in text
+    return text
+
+def test_disabled_overhead():
+    """测试关闭时不记录任何指标，计时代码开销可忽略"""
+    metrics = get_metrics()
+    metrics.reset()
+    n = 100000
+
+    metrics.configure({"ENABLED": False})
+    start = time.perf_counter()
+    for _ in range(n):
+        with span("asr"):
+            pass
+    disabled_ns = (time.perf_counter() - start) / n * 1e9
+    assert metrics.snapshot() == {}
+
+    metrics.configure({"ENABLED": True})
+    start = time.perf_counter()
+    for _ in range(n):
+        with span("asr"):
+            pass
+    enabled_ns = (time.perf_counter() - start) / n * 1e9
+    assert metrics.snapshot()["stage_seconds"]['{stage="asr"}']["count"] == n
+    metrics.reset()
+    return {"disabled_ns": round(disabled_ns), "enabled_ns": round(enabled_ns)}
+
+if __name__ == "__main__":
+    print(f"分位数: {test_histogram_quantiles()}")
+    print(f"Prometheus导出:\n{asyncio.run(test_engine_and_spans())}")
+    print(f"每次span开销: {test_disabled_overhead()}")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试MiniMax流式语音合成：各片段并行合成、按原文顺序输出，提前停止时取消未完成的片段
+（使用随机延迟的模拟text_to_speech，不访问网络）
+"""
+
+import os
+import sys
+import random
+import asyncio
+import logging
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.minimax import MinimaxIntegration
+from utils.audio_utils import split_text_into_sentences
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 每个句子5个字，max_chunk_size=5时每个句子单独成为一个片段
+TEXT = "".join(f"第{i:02d}句。" for i in range(12))
+MAX_CHUNK_SIZE = 5
+
+
+class StubMinimax(MinimaxIntegration):
+    """
+    模拟合成：随机延迟后返回片段文本，记录同时进行的请求数和被取消的片段
+    """
+    def __init__(self, seed: int = 0):
+        super().__init__(group_id="test", api_key="test")
+        self.rng = random.Random(seed)
+        self.active = 0
+        self.max_active = 0
+        self.started = []
+        self.cancelled = []
+
+    async def text_to_speech(self, text: str, **kwargs):
+        self.started.append(text)
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.rng.uniform(0.005, 0.05))
+            return {"success": True, "audio_data": text.encode("utf-8"), "format": "mp3"}
+        except asyncio.CancelledError:
+            self.cancelled.append(text)
+            raise
+        finally:
+            self.active -= 1
+
+
+async def test_streaming_order():
+    """测试片段按原文顺序输出，同时进行的合成请求数不超过max_concurrency"""
+    expected = split_text_into_sentences(TEXT, MAX_CHUNK_SIZE)
+    assert len(expected) == 12
+    for seed in range(5):
+        minimax = StubMinimax(seed)
+        chunks = [chunk async for chunk in minimax.text_to_speech_streaming(
+            TEXT, max_chunk_size=MAX_CHUNK_SIZE, max_concurrency=3, lookahead=4
+        )]
+        assert all(chunk["success"] for chunk in chunks)
+        assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(expected)))
+        assert [chunk["audio_data"].decode("utf-8") for chunk in chunks] == expected
+        assert minimax.max_active == 3, minimax.max_active
+        assert minimax.active == 0 and not minimax.cancelled
+    return {"chunks": len(expected), "max_active": minimax.max_active}
+
+
+async def test_streaming_early_close():
+    """测试调用方提前停止迭代时，已启动但未输出的片段被取消"""
+    minimax = StubMinimax(seed=1)
+    stream = minimax.text_to_speech_streaming(TEXT, max_chunk_size=MAX_CHUNK_SIZE, max_concurrency=3, lookahead=4)
+    received = []
+    async for chunk in stream:
+        received.append(chunk["text"])
+        if len(received) == 2:
+            break
+    await stream.aclose()
+    logger.info(f"已输出: {received}, 已启动: {minimax.started}, 已取消: {minimax.cancelled}")
+    # 只预先启动窗口内的片段，未输出的片段全部取消
+    assert len(minimax.started) <= len(received) + 4
+    assert minimax.cancelled and minimax.active == 0
+    assert set(minimax.cancelled) <= set(minimax.started) - set(received)
+    # 生成器关闭后没有遗留的合成任务
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    assert not pending
+    return {"received": received, "cancelled": minimax.cancelled}
+
+
+if __name__ == "__main__":
+    print(f"按顺序输出: {asyncio.run(test_streaming_order())}")
+    print(f"提前停止: {asyncio.run(test_streaming_early_close())}")
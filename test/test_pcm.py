@@ -0,0 +1,56 @@
+import logging
+import numpy as np
+from utils.pcm import PcmBuffer, PcmRingBuffer
+from utils.protocol import AudioMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def test_pcm_buffer():
+    """测试PcmBuffer的零拷贝构造、切片和与AudioMessage的转换"""
+    pcm = np.arange(1600, dtype='<i2').tobytes()
+    message = AudioMessage(data=pcm_to_wav(pcm, 16000, 2), format=AudioFormatType.WAV,
+                           sampleRate=16000, sampleWidth=2)
+    buffer = PcmBuffer.from_audio_message(message)
+    assert buffer.frames == 1600 and buffer.channels == 1 and abs(buffer.duration - 0.1) < 1e-9
+    # 构造和切片都直接引用原始数据
+    assert np.shares_memory(buffer.samples, np.frombuffer(message.data, dtype=np.uint8))
+    assert np.shares_memory(buffer[100:200].samples, buffer.samples)
+    
+    round_trip = buffer.to_audio_message()
+    assert round_trip.data == message.data
+    
+    joined = PcmBuffer.concat([buffer[:800], buffer[800:].as_float32()])
+    assert joined.dtype == np.dtype('<i2') and joined.tobytes() == pcm
+    logger.info(f"PcmBuffer: {buffer}")
+    return True
+
+def test_pcm_ring_buffer():
+    """测试预分配环形缓冲区的读写、回绕和覆盖"""
+    ring = PcmRingBuffer(8, 16000)
+    ring.write(np.arange(6, dtype='<i2').tobytes())
+    assert ring.read(4).samples.reshape(-1).tolist() == [0, 1, 2, 3]
+    # 写入跨越数组末尾
+    ring.write(PcmBuffer(np.arange(6, 12, dtype='<i2'), 16000))
+    assert len(ring) == 8 and ring.free == 0
+    assert ring.peek().samples.reshape(-1).tolist() == list(range(4, 12))
+    assert ring.peek_last(3).samples.reshape(-1).tolist() == [9, 10, 11]
+    
+    try:
+        ring.write(b"\x00\x00")
+        raise AssertionError("缓冲区已满时应抛出BufferError")
+    except BufferError:
+        pass
+    
+    ring.overwrite = True
+    dropped = ring.write(np.arange(12, 15, dtype='<i2').tobytes())
+    assert dropped == 3
+    assert ring.read().samples.reshape(-1).tolist() == list(range(7, 15))
+    assert len(ring) == 0
+    return True
+
+if __name__ == "__main__":
+    print(f"PcmBuffer: {test_pcm_buffer()}")
+    print(f"PcmRingBuffer: {test_pcm_ring_buffer()}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试EchoMimic姿势资产索引和姿势序列缓存
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.pose_cache import PoseCache, PoseIndex
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def write_frames(pose_dir: Path, count: int, start: int = 0):
+    """写入逐帧数值型姿势文件，第i帧的值为i"""
+    pose_dir.mkdir(parents=True, exist_ok=True)
+    for i in range(start, start + count):
+        np.save(pose_dir / f"{i}.npy", np.full((3, 2), i, dtype=np.float32))
+
+def test_numeric_pack():
+    """测试数值型姿势序列合并为内存映射文件，切片为零拷贝视图，跨越末尾时循环"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pose_dir = Path(tmp) / "pose"
+        write_frames(pose_dir, 12)
+        cache = PoseCache(str(Path(tmp) / "cache"))
+
+        frames = cache.load(str(pose_dir), 2, 5)
+        assert isinstance(frames.base, np.memmap) or isinstance(frames, np.memmap)
+        assert frames.shape == (5, 3, 2)
+        assert [int(frame[0, 0]) for frame in frames] == [2, 3, 4, 5, 6]
+        wrapped = cache.load(str(pose_dir), 10, 4)
+        assert [int(frame[0, 0]) for frame in wrapped] == [10, 11, 0, 1]
+
+        # 第二个缓存实例（另一个渲染进程）直接使用已合并的文件
+        other = PoseCache(str(Path(tmp) / "cache"))
+        assert len(other.load(str(pose_dir))) == 12 and other.packs == 0
+
+        # 增加帧文件后重新合并，旧的合并文件被删除
+        time.sleep(0.01)
+        write_frames(pose_dir, 1, start=12)
+        assert len(cache.load(str(pose_dir))) == 13
+        assert cache.packs == 2
+        assert len(list((Path(tmp) / "cache").glob("*.npy"))) == 1
+        return cache.stats()
+
+def test_object_pack():
+    """测试对象型姿势帧（关键点字典）合并为一个文件"""
+    with tempfile.TemporaryDirectory() as tmp:
+        pose_dir = Path(tmp) / "pose"
+        pose_dir.mkdir()
+        for i in range(3):
+            np.save(pose_dir / f"{i}.npy", {"draw_pose_params": [i, 1, 2, 3], "frame": i}, allow_pickle=True)
+        cache = PoseCache(str(Path(tmp) / "cache"))
+        frames = cache.load(str(pose_dir), 1, 3)
+        assert [frame["frame"] for frame in frames] == [1, 2, 0]
+        assert cache.stats()["mapped_bytes"] == 0
+        return cache.stats()
+
+def test_drawn_pack():
+    """测试关键点字典按尺寸绘制为uint8姿势图后合并为内存映射文件，不同尺寸分别缓存"""
+    drawn = []
+    def draw(pose, width, height):
+        drawn.append((pose["frame"], width, height))
+        return np.full((height, width, 3), pose["frame"], dtype=np.uint8)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pose_dir = Path(tmp) / "pose"
+        pose_dir.mkdir()
+        for i in range(4):
+            np.save(pose_dir / f"{i}.npy", {"draw_pose_params": [i, 1, 2, 3], "frame": i}, allow_pickle=True)
+        cache = PoseCache(str(Path(tmp) / "cache"))
+        frames = cache.load(str(pose_dir), 1, 2, size=(6, 4), draw=draw)
+        assert isinstance(frames.base, np.memmap) or isinstance(frames, np.memmap)
+        assert frames.shape == (2, 4, 6, 3) and frames.dtype == np.uint8
+        assert [int(frame[0, 0, 0]) for frame in frames] == [1, 2]
+        # 每帧只绘制一次，之后的任务直接切片
+        cache.load(str(pose_dir), 3, 3, size=(6, 4), draw=draw)
+        assert len(drawn) == 4
+
+        # 另一种尺寸和原始关键点分别缓存，合并文件互不删除
+        assert cache.load(str(pose_dir), 0, 1, size=(2, 2), draw=draw).shape == (1, 2, 2, 3)
+        assert cache.load(str(pose_dir), 0, 1)[0]["frame"] == 0
+        assert len(list((Path(tmp) / "cache").glob("*.npy"))) == 3
+        stats = cache.stats()
+        assert stats["pose_sets"] == 3 and stats["mapped_bytes"] == 4 * (4 * 6 * 3 + 2 * 2 * 3)
+        return stats
+
+def test_pose_index():
+    """测试assets索引：查找姿势数据集和参考图像，后台线程发现新增的数据集"""
+    with tempfile.TemporaryDirectory() as tmp:
+        assets = Path(tmp) / "assets"
+        write_frames(assets / "halfbody_demo" / "pose" / "01", 2)
+        (assets / "halfbody_demo" / "refimag").mkdir(parents=True)
+        (assets / "halfbody_demo" / "refimag" / "reference_a.PNG").write_bytes(b"")
+        (assets / "halfbody_demo" / "refimag" / "other.jpg").write_bytes(b"")
+
+        index = PoseIndex(str(assets), watch_interval=0.05)
+        try:
+            assert index.pose_dirs() == [str(assets / "halfbody_demo" / "pose" / "01")]
+            assert index.reference_images() == [str(assets / "halfbody_demo" / "refimag" / "reference_a.PNG")]
+
+            write_frames(assets / "halfbody_demo" / "pose" / "02", 2)
+            deadline = time.time() + 2
+            while len(index.pose_dirs()) < 2 and time.time() < deadline:
+                time.sleep(0.02)
+            assert len(index.pose_dirs()) == 2
+            return index.pose_dirs()
+        finally:
+            index.stop()
+
+if __name__ == "__main__":
+    print(f"数值型姿势缓存: {test_numeric_pack()}")
+    print(f"对象型姿势缓存: {test_object_pack()}")
+    print(f"绘制的姿势缓存: {test_drawn_pack()}")
+    print(f"assets索引: {test_pose_index()}")
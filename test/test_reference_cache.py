@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试EchoMimic参考图像编码缓存
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+from pathlib import Path
+import numpy as np
+
+# 添加项目根目录到导入路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.reference_cache import ReferenceCache, reference_key
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+PARAMS = {"width": 64, "height": 64}
+
+def make_encoder(calls: list):
+    """模拟编码器：记录调用次数，返回约16KB的特征"""
+    def encode(image_path: str):
+        calls.append(image_path)
+        value = len(Path(image_path).read_bytes())
+        return {"ref_latents": np.full((4, 8, 8), value, dtype=np.float32),
+                "ref_features": np.full((30, 128), value, dtype=np.float32)}
+    return encode
+
+def test_hit_and_miss():
+    """测试相同内容的图像只编码一次，内容或渲染尺寸变化时重新编码"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        image = root / "avatar.png"
+        image.write_bytes(b"avatar-1")
+        copy = root / "copy.png"
+        copy.write_bytes(b"avatar-1")
+        cache = ReferenceCache(str(root / "cache"))
+        calls = []
+        encode = make_encoder(calls)
+
+        key, features, cached = cache.get_or_encode(str(image), PARAMS, encode)
+        assert not cached and len(calls) == 1
+        # 内容相同的另一个文件命中同一条目，读取结果为内存映射数组
+        key2, features2, cached2 = cache.get_or_encode(str(copy), PARAMS, encode)
+        assert cached2 and key2 == key and len(calls) == 1
+        assert isinstance(features2["ref_latents"], np.memmap)
+        assert np.array_equal(features["ref_features"], features2["ref_features"])
+
+        # 渲染尺寸不同时重新编码
+        assert reference_key(str(image), {"width": 128, "height": 64}) != key
+        # 修改图像内容后重新编码
+        time.sleep(0.01)
+        image.write_bytes(b"avatar-22")
+        _, _, cached3 = cache.get_or_encode(str(image), PARAMS, encode)
+        assert not cached3 and len(calls) == 2
+
+        # 其他进程（新的缓存实例）可直接使用已有条目
+        other = ReferenceCache(str(root / "cache"))
+        assert other.get(key) is not None
+        return cache.stats()
+
+def test_lru_eviction():
+    """测试超出大小上限时淘汰最久未使用的条目"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        # 每个条目约16KB，上限容纳两个条目
+        cache = ReferenceCache(str(root / "cache"), max_bytes=40 * 1024)
+        encode = make_encoder([])
+        keys = []
+        for i in range(3):
+            image = root / f"avatar{i}.png"
+            image.write_bytes(b"x" * (i + 1))
+            keys.append(cache.get_or_encode(str(image), PARAMS, encode)[0])
+            time.sleep(0.02)
+            if i == 1:
+                # 访问第一个条目，使第二个条目成为最久未使用
+                assert cache.get(keys[0]) is not None
+                time.sleep(0.02)
+
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["evictions"] == 1 and stats["bytes"] <= 40 * 1024
+        return stats
+
+if __name__ == "__main__":
+    print(f"命中和重新编码: {test_hit_and_miss()}")
+    print(f"LRU淘汰: {test_lru_eviction()}")
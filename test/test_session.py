@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from pipelines.session import SessionRegistry, TurnCancelled
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def test_barge_in():
+    """测试新的一轮回复和用户插话会取消正在进行的回复，取消传播到上游任务"""
+    registry = SessionRegistry()
+    session = registry.get("ctx-1")
+    upstream_cancelled = []
+    
+    async def slow_reply(name: str) -> str:
+        # 模拟LLM流式请求和TTS合成
+        async def upstream():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                upstream_cancelled.append(name)
+                raise
+        await asyncio.gather(upstream(), upstream())
+        return name
+    
+    # 同一会话的新请求取消旧请求，旧请求收到TurnCancelled
+    first = asyncio.create_task(session.run_turn(slow_reply("first")))
+    await asyncio.sleep(0.05)
+    second = asyncio.create_task(session.run_turn(asyncio.sleep(0.05, result="second")))
+    try:
+        await first
+        raise AssertionError("第一轮回复应被取消")
+    except TurnCancelled as e:
+        assert e.reason == "new_turn"
+    assert await second == "second"
+    assert upstream_cancelled == ["first", "first"]
+    
+    # 用户插话
+    session.start_turn(slow_reply("third"))
+    await asyncio.sleep(0.05)
+    assert registry.cancel("ctx-1", "barge_in")
+    await asyncio.sleep(0.01)
+    assert not session.active
+    assert not registry.cancel("ctx-1", "barge_in")
+    
+    # 调用方自身被取消时本轮回复随之取消
+    caller = asyncio.create_task(session.run_turn(slow_reply("fourth")))
+    await asyncio.sleep(0.05)
+    caller.cancel()
+    try:
+        await caller
+    except asyncio.CancelledError:
+        pass
+    await asyncio.sleep(0.01)
+    assert upstream_cancelled.count("fourth") == 2
+    
+    stats = registry.stats()
+    logger.info(f"会话统计: {stats}")
+    assert stats["cancelled_turns"] == {"new_turn": 1, "barge_in": 1}
+    return stats
+
+if __name__ == "__main__":
+    print(f"插话取消: {asyncio.run(test_barge_in())}")
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+import tempfile
+from utils.tts_cache import TTSCache, cached_tts
+from utils.protocol import TextMessage, AudioMessage, AudioFormatType
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class CountingTTS:
+    """记录合成次数的测试引擎"""
+    cfg = {"NAME": "CountingTTS", "PER": "test-voice"}
+    
+    def __init__(self):
+        self.calls = 0
+    
+    @cached_tts
+    async def run(self, input: TextMessage, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return AudioMessage(data=b"\x00" * 1000, format=AudioFormatType.MP3,
+                            sampleRate=24000, sampleWidth=2, desc=input.data)
+
+async def test_tts_cache():
+    """测试并发去重、大小限制和磁盘索引"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TTSCache()
+        cache.configure({"CACHE_DIR": cache_dir, "MEMORY_MAX_BYTES": 2500, "DISK_MAX_BYTES": 3500})
+        engine = CountingTTS()
+        
+        # 并发的相同请求只合成一次
+        results = await asyncio.gather(*[engine.run(TextMessage(data="你好")) for _ in range(5)])
+        logger.info(f"合成次数: {engine.calls}, 统计: {cache.stats}")
+        assert engine.calls == 1
+        assert all(r.format == AudioFormatType.MP3 and r.sampleRate == 24000 for r in results)
+        
+        # 内存层和磁盘层都不超过容量
+        for i in range(5):
+            await engine.run(TextMessage(data=f"句子{i}"))
+        assert cache._memory_bytes <= 2500 and cache._disk_bytes <= 3500
+        
+        # 丢弃内存层和索引后从磁盘索引恢复
+        await cache.close()
+        assert os.path.exists(os.path.join(cache_dir, "index.json"))
+        cache._memory.clear()
+        cache._index = None
+        calls = engine.calls
+        await engine.run(TextMessage(data="句子4"))
+        assert engine.calls == calls and cache.stats["disk_hits"] == 1
+        
+        # 跳过缓存
+        await engine.run(TextMessage(data="句子4"), use_cache=False)
+        assert engine.calls == calls + 1
+    return True
+
+if __name__ == "__main__":
+    print(f"TTS缓存: {asyncio.run(test_tts_cache())}")
@@ -0,0 +1,56 @@
+import logging
+import numpy as np
+from pipelines.speech import VoiceActivityDetector, SpeechProcessor
+from utils.pcm import PcmBuffer
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+def make_signal() -> np.ndarray:
+    """1秒噪声 + 0.8秒语音 + 0.15秒停顿 + 0.5秒语音 + 1秒噪声"""
+    rng = np.random.default_rng(0)
+    def noise(seconds):
+        return rng.normal(0, 0.002, int(SAMPLE_RATE * seconds)).astype(np.float32)
+    def voice(seconds):
+        t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+        return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32) + noise(seconds)
+    return np.concatenate([noise(1.0), voice(0.8), noise(0.15), voice(0.5), noise(1.0)])
+
+def test_vad_stream():
+    """测试增量VAD：按20ms帧输入，短停顿不切分，说话结束后300ms内给出结束事件"""
+    pcm = PcmBuffer(make_signal(), SAMPLE_RATE).as_int16().tobytes()
+    vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE)
+    events = []
+    for offset in range(0, len(pcm), 640):
+        events.extend(vad.feed(pcm[offset:offset + 640]))
+    events.extend(vad.flush())
+    
+    boundaries = [(event["type"], round(event["timestamp"], 2)) for event in events if event["type"] != "speech"]
+    logger.info(f"VAD事件: {boundaries}")
+    assert [event[0] for event in boundaries] == ["speech_start", "speech_end"]
+    assert 1.0 <= boundaries[0][1] <= 1.1
+    # 语音在2.45秒结束
+    assert 2.45 < boundaries[1][1] <= 2.45 + 0.3 + 0.04
+    
+    # 输出的音频只包含语音段（含预留的起始音频和少量尾部静音）
+    speech = sum(event["audio"].duration for event in events if event.get("audio") is not None)
+    assert speech < 2.0
+    return boundaries
+
+def test_trim_silence():
+    """测试ASR前裁掉静音"""
+    message = PcmBuffer(make_signal(), SAMPLE_RATE).to_audio_message()
+    trimmed = SpeechProcessor().trim_silence(message)
+    logger.info(f"裁剪前: {len(message.data)}字节, 裁剪后: {len(trimmed.data)}字节")
+    assert len(trimmed.data) < len(message.data) * 0.6
+    
+    silence = PcmBuffer(np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE).to_audio_message()
+    assert SpeechProcessor().trim_silence(silence) is None
+    return True
+
+if __name__ == "__main__":
+    print(f"增量VAD: {test_vad_stream()}")
+    print(f"裁剪静音: {test_trim_silence()}")
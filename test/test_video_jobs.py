@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+import tempfile
+from pipelines.video_jobs import VideoJobQueue, VideoJobStore, VideoJobQueueFull
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def fake_render(job, progress):
+    """模拟渲染：分4步上报进度"""
+    for step in range(4):
+        await asyncio.sleep(0.05)
+        progress((step + 1) / 4, "denoising")
+    if job["request"].get("fail"):
+        raise RuntimeError("渲染失败")
+    return f"/tmp/{job['id']}.mp4"
+
+async def test_priority_and_slots():
+    """测试任务按优先级执行，同时运行的任务数不超过槽位数"""
+    order = []
+    running = 0
+    max_running = 0
+
+    async def handler(job, progress):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        order.append(job["request"]["name"])
+        try:
+            return await fake_render(job, progress)
+        finally:
+            running -= 1
+
+    queue = VideoJobQueue(handler, slots=2, max_queue=4)
+    jobs = [queue.submit({"name": "a"}), queue.submit({"name": "b"}),
+            queue.submit({"name": "low"}, priority=-1), queue.submit({"name": "high"}, priority=5)]
+    assert queue.get(jobs[2]["id"])["position"] == 3
+    try:
+        queue.submit({"name": "overflow"})
+        assert False, "排队已满时应拒绝"
+    except VideoJobQueueFull:
+        pass
+
+    results = [await queue.wait(job["id"]) for job in jobs]
+    assert all(job["status"] == "succeeded" and job["progress"] == 1.0 for job in results)
+    assert order == ["high", "a", "b", "low"], order
+    assert max_running == 2
+    stats = queue.stats()
+    await queue.close()
+    return stats
+
+async def test_progress_and_cancel():
+    """测试进度订阅、失败和取消运行中的任务"""
+    queue = VideoJobQueue(fake_render, slots=1)
+    failed = queue.submit({"fail": True})
+    running = queue.submit({})
+    queued = queue.submit({})
+
+    events = queue.subscribe(failed["id"])
+    states = []
+    while True:
+        job = await events.get()
+        states.append((job["status"], job["progress"]))
+        if job["status"] in ("succeeded", "failed"):
+            break
+    assert states[0] == ("running", 0.0) and states[-1][0] == "failed"
+    assert [progress for _, progress in states[1:-1]] == [0.25, 0.5, 0.75, 1.0]
+
+    # 取消排队中的任务和运行中的任务
+    assert queue.cancel(queued["id"])
+    await asyncio.sleep(0.08)
+    assert queue.get(running["id"])["status"] == "running"
+    assert queue.cancel(running["id"])
+    assert (await queue.wait(running["id"]))["status"] == "cancelled"
+    assert queue.get(queued["id"])["status"] == "cancelled"
+    assert not queue.cancel(failed["id"])
+    await queue.close()
+    return states
+
+async def test_persistence():
+    """测试任务元数据持久化：重启后可查询已结束任务，中断的任务标记为失败"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.db")
+        queue = VideoJobQueue(fake_render, store=VideoJobStore(path))
+        done = queue.submit({})
+        await queue.wait(done["id"])
+        interrupted = queue.submit({})
+        await asyncio.sleep(0.02)
+        queue.store.close()
+
+        store = VideoJobStore(path)
+        assert store.get(done["id"])["status"] == "succeeded"
+        assert store.get(interrupted["id"])["status"] == "failed"
+        store.close()
+        # 旧队列的工作协程仍在运行，结束测试前取消
+        for task in queue._workers + list(queue._running.values()):
+            task.cancel()
+        return len(store)
+
+if __name__ == "__main__":
+    print(f"优先级和槽位: {asyncio.run(test_priority_and_slots())}")
+    print(f"进度和取消: {asyncio.run(test_progress_and_cancel())}")
+    print(f"持久化: {asyncio.run(test_persistence())}")
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+from yacs.config import CfgNode as CN
+from engine.asr import ASRFactory
+from engine.worker_pool import ProcessASREngine
+from utils.protocol import AudioMessage, AudioFormatType
+from utils.audio_utils import pcm_to_wav
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+async def test_worker_pool():
+    """测试工作进程池：请求分发到多个进程，进程退出后自动重启"""
+    config = CN({"NAME": "FakeASR", "TEXT": "工作进程识别结果", "LATENCY_MS": 100, "WORKERS": 2})
+    engine = ASRFactory.create(config)
+    assert isinstance(engine, ProcessASREngine)
+
+    try:
+        await engine.warmup()
+        # 44.1kHz双声道输入在API进程中转换为16kHz单声道PCM
+        audio = AudioMessage(data=pcm_to_wav(b"\x01\x00" * 44100, 44100, 2, 2), format=AudioFormatType.WAV,
+                             sampleRate=44100, sampleWidth=2)
+        results = await asyncio.gather(*[engine.run(audio) for _ in range(6)])
+        assert all(result.data == "工作进程识别结果" for result in results)
+        stats = engine.worker_stats()
+        logger.info(f"工作进程状态: {stats}")
+        assert all(worker["completed"] >= 3 for worker in stats["workers"])
+
+        # 工作进程异常退出后，下一次请求自动重启
+        engine.pool.workers[0].process.kill()
+        engine.pool.workers[0].process.join()
+        await asyncio.sleep(0.2)
+        results = await asyncio.gather(*[engine.run(audio) for _ in range(2)])
+        assert all(result.data == "工作进程识别结果" for result in results)
+        stats = engine.worker_stats()
+        assert stats["workers"][0]["restarts"] == 1
+        return stats
+    finally:
+        await engine.close()
+
+if __name__ == "__main__":
+    print(f"工作进程池: {asyncio.run(test_worker_pool())}")
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from starlette.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from utils.config import load_config
+from pipelines.conversation import ConversationPipeline
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 模拟引擎配置（与基准测试共用），不依赖模型和网络
+STUB_CONFIG = Path(__file__).resolve().parent.parent / "bench" / "configs" / "stub.yaml"
+
+def load_app():
+    """导入应用，日志文件写到临时目录"""
+    cwd = os.getcwd()
+    os.chdir(tempfile.mkdtemp())
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+def connect(**llm):
+    """使用模拟引擎的对话流水线创建测试客户端，llm覆盖模拟LLM参数"""
+    from api.routes import api_service
+
+    cfg = load_config(str(STUB_CONFIG))
+    cfg.defrost()
+    cfg.TTS.LATENCY_MS = 0
+    for key, value in llm.items():
+        cfg.LLM[key] = value
+    api_service.set_pipeline(ConversationPipeline(cfg))
+    # 不使用上下文管理器，不触发应用的启动事件（启动事件按命令行参数加载配置）
+    return TestClient(load_app().app)
+
+def receive_until(websocket, event_type: str) -> list:
+    """接收事件直到指定类型，音频事件之后的二进制帧记录为bytes"""
+    events = []
+    while True:
+        message = websocket.receive()
+        if message.get("bytes") is not None:
+            events.append(message["bytes"])
+            continue
+        event = json.loads(message["text"])
+        events.append(event)
+        if event["type"] in (event_type, "error"):
+            return events
+
+def test_invalid_sample_rate():
+    """测试无效的音频参数在连接时被拒绝"""
+    client = connect()
+    with client.websocket_connect("/api/ws/conversation?sample_rate=abc") as websocket:
+        event = websocket.receive_json()
+        assert event["type"] == "error" and "sample_rate" in event["error"]
+        try:
+            websocket.receive_json()
+            raise AssertionError("连接应已关闭")
+        except WebSocketDisconnect:
+            pass
+    return event
+
+def test_audio_turn():
+    """测试完整的一轮语音对话：ready -> 识别结果 -> 音频事件和音频数据 -> done"""
+    client = connect(FIRST_TOKEN_MS=0, TOKENS_PER_SECOND=1000)
+    with client.websocket_connect("/api/ws/conversation?context_id=ws-test&sample_rate=16000") as websocket:
+        ready = websocket.receive_json()
+        assert ready == {"type": "ready", "context_id": "ws-test"}
+        # 1秒的静音PCM音频
+        websocket.send_bytes(bytes(32000))
+        websocket.send_json({"type": "end"})
+        events = receive_until(websocket, "done")
+
+    types = [event if isinstance(event, bytes) else event["type"] for event in events]
+    logger.info(f"事件顺序: {[t if isinstance(t, str) else f'<{len(t)} bytes>' for t in types]}")
+    transcripts = [event for event in events if isinstance(event, dict) and event["type"] == "transcript"]
+    assert transcripts and transcripts[-1]["final"] and transcripts[-1]["text"] == "你好，请介绍一下你自己。"
+    # 每个audio事件之后紧跟着对应长度的音频数据
+    audio_indexes = [i for i, event in enumerate(events) if isinstance(event, dict) and event["type"] == "audio"]
+    assert audio_indexes
+    for i in audio_indexes:
+        assert isinstance(events[i + 1], bytes) and len(events[i + 1]) == events[i]["size"]
+    assert [events[i]["index"] for i in audio_indexes] == list(range(len(audio_indexes)))
+    assert types.index("transcript") < audio_indexes[0]
+    done = events[-1]
+    assert done["type"] == "done" and done["response_text"] == "".join(events[i]["text"] for i in audio_indexes)
+    return {"audio_chunks": len(audio_indexes), "timings": done["timings"]}
+
+def test_cancel():
+    """测试客户端取消正在进行的回复"""
+    # LLM生成很慢，取消时回复仍在进行
+    client = connect(FIRST_TOKEN_MS=0, TOKENS_PER_SECOND=2)
+    with client.websocket_connect("/api/ws/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+        websocket.send_json({"type": "text", "text": "你好"})
+        websocket.send_json({"type": "cancel"})
+        events = receive_until(websocket, "cancelled")
+        assert events[-1] == {"type": "cancelled"}
+        assert not [event for event in events if isinstance(event, dict) and event["type"] == "done"]
+        # 没有进行中的回复时取消不再响应，连接仍可继续使用
+        websocket.send_json({"type": "cancel"})
+        websocket.send_json({"type": "unknown"})
+        assert websocket.receive_json()["type"] == "error"
+    return events
+
+def test_warmup_gate():
+    """测试引擎预热期间HTTP接口返回503，WebSocket连接以1013关闭，健康检查不受限制"""
+    from yacs.config import CfgNode as CN
+    
+    client = connect()
+    app = load_app()
+    warming = type("Pipeline", (), {"engine_pool": type("Pool", (), {"isWarming": lambda self: True})()})()
+    saved = app.config, app.pipeline
+    app.config, app.pipeline = CN({"WARMUP": {"ENABLED": True, "BLOCK_TRAFFIC": True}}), warming
+    try:
+        response = client.post("/api/tts", json={"text": "你好"})
+        assert response.status_code == 503 and response.headers.get("Retry-After") == "5"
+        with client.websocket_connect("/api/ws/conversation") as websocket:
+            message = websocket.receive()
+        logger.info(f"预热期间的WebSocket连接: {message}")
+        assert message["type"] == "websocket.close" and message["code"] == 1013
+        assert client.get("/api/health").status_code != 503
+    finally:
+        app.config, app.pipeline = saved
+    # 预热结束后恢复正常
+    with client.websocket_connect("/api/ws/conversation") as websocket:
+        assert websocket.receive_json()["type"] == "ready"
+    return message
+
+if __name__ == "__main__":
+    print(f"无效音频参数: {test_invalid_sample_rate()}")
+    print(f"语音对话: {test_audio_turn()}")
+    print(f"取消回复: {test_cancel()}")
+    print(f"预热期间拒绝连接: {test_warmup_gate()}")
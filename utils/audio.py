@@ -7,8 +7,10 @@ import io
 import os
 import asyncio
 import logging
+import struct
 import subprocess
 import tempfile
+import numpy as np
 from typing import Optional, Dict, Any, Tuple, List
 from pydub import AudioSegment
 from pydub.silence import split_on_silence, detect_silence
@@ -179,3 +181,360 @@ async def split_audio_by_silence(file_path: str,
     except Exception as e:
         logger.error(f"分割音频失败: {str(e)}")
         return []
+
+# ---------------------------------------------------------------------------
+# 内存音频处理：直接解析WAV/PCM，在numpy数组上完成重采样和格式转换，
+# 仅压缩格式通过ffmpeg的stdin/stdout管道编解码，不产生临时文件
+# ---------------------------------------------------------------------------
+
+# WAV格式标记
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# ffmpeg容器名称
+FFMPEG_FORMATS = {
+    "mp3": "mp3",
+    "ogg": "ogg",
+    "webm": "webm",
+    "wav": "wav",
+}
+
+def parse_wav_header(wav_data: bytes) -> Dict[str, Any]:
+    """
+    直接解析WAV文件头，不解码音频数据
+    
+    参数:
+        wav_data: WAV音频数据
+        
+    返回:
+        包含format_tag、channels、sample_rate、sample_width、data_offset、data_size、frames的字典
+    """
+    if len(wav_data) < 12 or wav_data[0:4] != b'RIFF' or wav_data[8:12] != b'WAVE':
+        raise ValueError("不是有效的WAV数据")
+    
+    info = None
+    offset = 12
+    while offset + 8 <= len(wav_data):
+        chunk_id = wav_data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', wav_data, offset + 4)[0]
+        body = offset + 8
+        
+        if chunk_id == b'fmt ':
+            format_tag, channels, sample_rate, _, _, bits = struct.unpack_from('<HHIIHH', wav_data, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 40:
+                # 扩展格式的真实格式标记在SubFormat GUID的前两个字节
+                format_tag = struct.unpack_from('<H', wav_data, body + 24)[0]
+            info = {
+                "format_tag": format_tag,
+                "channels": channels,
+                "sample_rate": sample_rate,
+                "sample_width": bits // 8,
+            }
+        elif chunk_id == b'data':
+            if info is None:
+                raise ValueError("WAV数据缺少fmt块")
+            # 流式写入的WAV可能data长度为0或超出实际长度
+            data_size = min(chunk_size, len(wav_data) - body) if chunk_size else len(wav_data) - body
+            info["data_offset"] = body
+            info["data_size"] = data_size
+            info["frames"] = data_size // (info["sample_width"] * info["channels"])
+            return info
+        
+        # 块按偶数字节对齐
+        offset = body + chunk_size + (chunk_size & 1)
+    
+    raise ValueError("WAV数据缺少data块")
+
+def pcm_to_array(pcm_data: bytes, sample_width: int = 2, channels: int = 1, is_float: bool = False) -> np.ndarray:
+    """
+    将PCM数据转换为float32数组，取值范围[-1, 1]
+    
+    参数:
+        pcm_data: 小端序PCM数据
+        sample_width: 采样宽度（字节）
+        channels: 通道数
+        is_float: 是否为32位浮点PCM
+        
+    返回:
+        形状为(帧数, 通道数)的float32数组
+    """
+    frame_bytes = sample_width * channels
+    usable = len(pcm_data) - len(pcm_data) % frame_bytes
+    raw = memoryview(pcm_data)[:usable]
+    
+    if is_float and sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<f4').astype(np.float32)
+    elif sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        # 24位：补齐为32位后再转换，保留符号
+        triplets = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = triplets[:, 0] | (triplets[:, 1] << 8) | (triplets[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        samples = values.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        samples = (np.frombuffer(raw, dtype='<i4').astype(np.float64) / 2147483648.0).astype(np.float32)
+    else:
+        raise ValueError(f"不支持的采样宽度: {sample_width}")
+    
+    return samples.reshape(-1, channels)
+
+def array_to_pcm(samples: np.ndarray, sample_width: int = 2) -> bytes:
+    """
+    将float32数组转换为整数PCM数据
+    
+    参数:
+        samples: 形状为(帧数, 通道数)的float32数组，取值范围[-1, 1]
+        sample_width: 目标采样宽度（字节）
+        
+    返回:
+        小端序PCM数据（多通道交错排列）
+    """
+    clipped = np.clip(samples, -1.0, 1.0).reshape(-1)
+    
+    if sample_width == 1:
+        return (clipped * 127.0 + 128.0).astype(np.uint8).tobytes()
+    if sample_width == 2:
+        return (clipped * 32767.0).astype('<i2').tobytes()
+    if sample_width == 3:
+        values = (clipped.astype(np.float64) * 8388607.0).astype(np.int32)
+        out = np.empty((values.size, 3), dtype=np.uint8)
+        out[:, 0] = values & 0xFF
+        out[:, 1] = (values >> 8) & 0xFF
+        out[:, 2] = (values >> 16) & 0xFF
+        return out.tobytes()
+    if sample_width == 4:
+        return (clipped.astype(np.float64) * 2147483647.0).astype('<i4').tobytes()
+    raise ValueError(f"不支持的采样宽度: {sample_width}")
+
+def decode_wav(wav_data: bytes) -> Tuple[np.ndarray, int]:
+    """
+    解码WAV数据
+    
+    参数:
+        wav_data: WAV音频数据
+        
+    返回:
+        (形状为(帧数, 通道数)的float32数组, 采样率)
+    """
+    info = parse_wav_header(wav_data)
+    if info["format_tag"] not in (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT):
+        raise ValueError(f"不支持的WAV编码: {info['format_tag']}")
+    
+    start = info["data_offset"]
+    pcm = memoryview(wav_data)[start:start + info["data_size"]]
+    samples = pcm_to_array(pcm, info["sample_width"], info["channels"],
+                           is_float=info["format_tag"] == WAVE_FORMAT_IEEE_FLOAT)
+    return samples, info["sample_rate"]
+
+def encode_wav(samples: np.ndarray, sample_rate: int, sample_width: int = 2) -> bytes:
+    """
+    将float32数组编码为WAV数据
+    
+    参数:
+        samples: 形状为(帧数, 通道数)的float32数组
+        sample_rate: 采样率
+        sample_width: 采样宽度（字节）
+        
+    返回:
+        WAV音频数据
+    """
+    channels = samples.shape[1] if samples.ndim == 2 else 1
+    pcm = array_to_pcm(samples, sample_width)
+    header = struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + len(pcm), b'WAVE',
+        b'fmt ', 16, WAVE_FORMAT_PCM, channels, sample_rate,
+        sample_rate * channels * sample_width, channels * sample_width, sample_width * 8,
+        b'data', len(pcm)
+    )
+    return header + pcm
+
+def _lowpass_kernel(cutoff: float, taps: int = 63) -> np.ndarray:
+    """
+    生成加窗sinc低通滤波器
+    
+    参数:
+        cutoff: 截止频率，相对于采样率的比例(0, 0.5)
+        taps: 滤波器阶数
+    """
+    n = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+    return (kernel / kernel.sum()).astype(np.float32)
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """
+    在numpy数组上重采样，降采样前先做抗混叠低通滤波
+    
+    参数:
+        samples: 形状为(帧数, 通道数)的float32数组
+        src_rate: 原采样率
+        dst_rate: 目标采样率
+        
+    返回:
+        重采样后的数组
+    """
+    if src_rate == dst_rate or len(samples) == 0:
+        return samples
+    
+    if dst_rate < src_rate:
+        kernel = _lowpass_kernel(0.5 * dst_rate / src_rate)
+        samples = np.stack(
+            [np.convolve(samples[:, ch], kernel, mode='same') for ch in range(samples.shape[1])],
+            axis=1
+        )
+    
+    dst_frames = int(round(len(samples) * dst_rate / src_rate))
+    src_positions = np.arange(dst_frames, dtype=np.float64) * (src_rate / dst_rate)
+    src_index = np.arange(len(samples), dtype=np.float64)
+    return np.stack(
+        [np.interp(src_positions, src_index, samples[:, ch]) for ch in range(samples.shape[1])],
+        axis=1
+    ).astype(np.float32)
+
+def convert_channels(samples: np.ndarray, channels: int) -> np.ndarray:
+    """
+    转换通道数：多声道下混为单声道，或单声道复制为多声道
+    
+    参数:
+        samples: 形状为(帧数, 通道数)的float32数组
+        channels: 目标通道数
+    """
+    if samples.shape[1] == channels:
+        return samples
+    if channels == 1:
+        return samples.mean(axis=1, keepdims=True)
+    if samples.shape[1] == 1:
+        return np.repeat(samples, channels, axis=1)
+    raise ValueError(f"不支持的通道转换: {samples.shape[1]} -> {channels}")
+
+async def _run_ffmpeg(args: List[str], input_data: bytes) -> bytes:
+    """
+    通过stdin/stdout管道运行ffmpeg
+    
+    参数:
+        args: ffmpeg参数（不含程序名）
+        input_data: 写入stdin的数据
+        
+    返回:
+        stdout输出
+    """
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-hide_banner", "-loglevel", "error", *args,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stdout, stderr = await process.communicate(input_data)
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg执行失败: {stderr.decode(errors='ignore').strip()}")
+    return stdout
+
+async def decode_audio(audio_data: bytes, audio_format: str, sample_rate: Optional[int] = None,
+                       channels: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    将任意格式的音频解码为float32数组，WAV直接解析，压缩格式通过ffmpeg管道解码
+    
+    参数:
+        audio_data: 音频数据
+        audio_format: 音频格式 (wav, mp3, ogg, webm)
+        sample_rate: 压缩格式解码时的输出采样率，默认保持原采样率
+        channels: 压缩格式解码时的输出通道数，默认保持原通道数
+        
+    返回:
+        (形状为(帧数, 通道数)的float32数组, 采样率)
+    """
+    if audio_format == "wav" and audio_data[0:4] == b'RIFF':
+        return decode_wav(audio_data)
+    
+    # 先取得原始参数，ffmpeg输出不带文件头的PCM时需要知道采样率和通道数
+    if sample_rate is None or channels is None:
+        wav_data = await _run_ffmpeg(["-i", "pipe:0", "-f", "wav", "-acodec", "pcm_s16le", "pipe:1"], audio_data)
+        samples, rate = decode_wav(wav_data)
+        return samples, rate
+    
+    pcm = await _run_ffmpeg([
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ar", str(sample_rate), "-ac", str(channels),
+        "pipe:1"
+    ], audio_data)
+    return pcm_to_array(pcm, 2, channels), sample_rate
+
+async def encode_audio(samples: np.ndarray, sample_rate: int, audio_format: str, sample_width: int = 2) -> bytes:
+    """
+    将float32数组编码为指定格式，WAV直接写文件头，压缩格式通过ffmpeg管道编码
+    
+    参数:
+        samples: 形状为(帧数, 通道数)的float32数组
+        sample_rate: 采样率
+        audio_format: 目标格式 (wav, mp3, ogg, webm)
+        sample_width: WAV格式的采样宽度（字节）
+        
+    返回:
+        编码后的音频数据
+    """
+    if audio_format == "wav":
+        return encode_wav(samples, sample_rate, sample_width)
+    if audio_format not in FFMPEG_FORMATS:
+        raise ValueError(f"不支持的目标格式: {audio_format}")
+    
+    channels = samples.shape[1]
+    return await _run_ffmpeg([
+        "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+        "-f", FFMPEG_FORMATS[audio_format], "pipe:1"
+    ], array_to_pcm(samples, 2))
+
+async def convert_audio_data(audio_data: bytes,
+                             source_format: str,
+                             target_format: str = "wav",
+                             target_sample_rate: int = 16000,
+                             target_sample_width: int = 2,
+                             target_channels: int = 1) -> bytes:
+    """
+    在内存中转换音频格式，不产生临时文件
+    
+    参数:
+        audio_data: 输入音频数据
+        source_format: 输入格式
+        target_format: 目标格式
+        target_sample_rate: 目标采样率
+        target_sample_width: 目标样本宽度
+        target_channels: 目标声道数
+        
+    返回:
+        转换后的音频数据
+    """
+    if source_format == "wav" and audio_data[0:4] == b'RIFF':
+        samples, rate = decode_wav(audio_data)
+    else:
+        # 压缩格式直接让ffmpeg输出目标采样率和通道数，省去一次重采样
+        samples, rate = await decode_audio(audio_data, source_format, target_sample_rate, target_channels)
+    
+    samples = convert_channels(samples, target_channels)
+    samples = resample(samples, rate, target_sample_rate)
+    return await encode_audio(samples, target_sample_rate, target_format, target_sample_width)
+
+async def get_audio_data_duration(audio_data: bytes, audio_format: str) -> float:
+    """
+    获取内存中音频数据的时长（秒），WAV只解析文件头
+    
+    参数:
+        audio_data: 音频数据
+        audio_format: 音频格式
+        
+    返回:
+        时长（秒）
+    """
+    try:
+        if audio_format == "wav" and audio_data[0:4] == b'RIFF':
+            info = parse_wav_header(audio_data)
+            return info["frames"] / info["sample_rate"]
+        samples, rate = await decode_audio(audio_data, audio_format)
+        return len(samples) / rate
+    except Exception as e:
+        logger.error(f"获取音频时长失败: {str(e)}")
+        return 0.0
@@ -9,11 +9,11 @@ import time
 import hashlib
 import logging
 import asyncio
-import aiofiles
 import wave
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Union, BinaryIO
 from enum import Enum
+from utils.tts_cache import get_tts_cache
 
 logger = logging.getLogger(__name__)
 
@@ -25,13 +25,6 @@ class AudioFormat(Enum):
     WEBM = "webm"
     UNKNOWN = "unknown"
 
-# 音频缓存目录
-CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "audio")
-os.makedirs(CACHE_DIR, exist_ok=True)
-
-# 缓存有效期 (单位: 秒)
-CACHE_TTL = 86400 * 7  # 7天
-
 async def detect_audio_format(audio_data: bytes) -> AudioFormat:
     """
     检测音频数据的格式
@@ -86,6 +79,27 @@ async def get_wav_info(wav_data: bytes) -> Tuple[int, int, int]:
         # 默认返回常见的WAV参数
         return 16000, 1, 2
 
+def pcm_to_wav(pcm_data: bytes, sample_rate: int = 16000, sample_width: int = 2, channels: int = 1) -> bytes:
+    """
+    为原始PCM数据添加WAV文件头
+    
+    参数:
+        pcm_data: 原始PCM音频数据（小端序）
+        sample_rate: 采样率
+        sample_width: 采样宽度（字节）
+        channels: 通道数
+        
+    返回:
+        WAV格式的音频数据
+    """
+    with io.BytesIO() as wav_io:
+        with wave.open(wav_io, 'wb') as wav:
+            wav.setnchannels(channels)
+            wav.setsampwidth(sample_width)
+            wav.setframerate(sample_rate)
+            wav.writeframes(pcm_data)
+        return wav_io.getvalue()
+
 def compute_content_hash(text: str, voice_id: str = "", extra_params: Dict = None) -> str:
     """
     计算内容哈希值，用于缓存键
@@ -118,26 +132,12 @@ async def get_cached_audio(cache_key: str) -> Optional[bytes]:
     返回:
         缓存的音频数据，如果未找到返回None
     """
-    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.bin")
-    
     try:
-        # 检查文件是否存在
-        if not os.path.exists(cache_path):
-            return None
-        
-        # 检查缓存是否过期
-        file_mtime = os.path.getmtime(cache_path)
-        if time.time() - file_mtime > CACHE_TTL:
-            logger.info(f"缓存已过期: {cache_key}")
-            os.remove(cache_path)
+        entry = await get_tts_cache().get(cache_key)
+        if entry is None:
             return None
-        
-        # 读取缓存文件
-        async with aiofiles.open(cache_path, "rb") as f:
-            audio_data = await f.read()
-            logger.info(f"从缓存加载音频: {cache_key}, 大小: {len(audio_data)} 字节")
-            return audio_data
-            
+        logger.info(f"从缓存加载音频: {cache_key}, 大小: {len(entry[0])} 字节")
+        return entry[0]
     except Exception as e:
         logger.error(f"读取缓存出错: {e}")
         return None
@@ -153,44 +153,95 @@ async def save_to_cache(cache_key: str, audio_data: bytes) -> bool:
     返回:
         保存成功返回True
     """
-    cache_path = os.path.join(CACHE_DIR, f"{cache_key}.bin")
-    
     try:
-        async with aiofiles.open(cache_path, "wb") as f:
-            await f.write(audio_data)
-            logger.info(f"音频已缓存: {cache_key}, 大小: {len(audio_data)} 字节")
+        await get_tts_cache().put(cache_key, audio_data)
+        logger.info(f"音频已缓存: {cache_key}, 大小: {len(audio_data)} 字节")
         return True
     except Exception as e:
         logger.error(f"保存缓存出错: {e}")
         return False
 
-def clean_old_cache() -> int:
+async def clean_old_cache() -> int:
     """
     清理过期的缓存文件
     
     返回:
         清理的文件数量
     """
-    count = 0
-    now = time.time()
-    
     try:
-        for filename in os.listdir(CACHE_DIR):
-            file_path = os.path.join(CACHE_DIR, filename)
-            if os.path.isfile(file_path):
-                file_mtime = os.path.getmtime(file_path)
-                if now - file_mtime > CACHE_TTL:
-                    os.remove(file_path)
-                    count += 1
-        
-        if count > 0:
-            logger.info(f"已清理 {count} 个过期缓存文件")
-        
-        return count
+        return await get_tts_cache().expire()
     except Exception as e:
         logger.error(f"清理缓存出错: {e}")
         return 0
 
+# 句子分隔符，用于流式切分文本
+SENTENCE_DELIMITERS = ['。', '！', '？', '；', '.', '!', '?', ';', '\n']
+
+class SentenceSegmenter:
+    """
+    增量句子切分器，逐段接收文本（如LLM的token流），每当凑成完整句子时立即返回
+    """
+    def __init__(self, max_chars: int = 200):
+        """
+        初始化句子切分器
+        
+        参数:
+            max_chars: 每个句子的最大字符数
+        """
+        self.max_chars = max_chars
+        self.current = ""
+    
+    def feed(self, text: str) -> list:
+        """
+        输入一段新文本
+        
+        参数:
+            text: 新到达的文本片段
+            
+        返回:
+            本次凑成的完整句子列表
+        """
+        result = []
+        
+        # 逐字符扫描文本
+        for char in text:
+            self.current += char
+            current = self.current
+            
+            # 如果当前积累的文本以分隔符结尾且不为空
+            if current and any(current.endswith(d) for d in SENTENCE_DELIMITERS):
+                result.append(current)
+                self.current = ""
+            
+            # 如果当前积累的文本超过最大字符数且不为空，强制断句
+            elif len(current) >= self.max_chars:
+                # 尝试在单词边界处断句（针对英文）
+                if ' ' in current:
+                    last_space = current.rstrip().rfind(' ')
+                    if last_space > self.max_chars * 0.7:  # 如果空格位置在后70%位置
+                        result.append(current[:last_space])
+                        self.current = current[last_space+1:]
+                    else:
+                        result.append(current)
+                        self.current = ""
+                else:
+                    # 针对中文等无空格语言，直接按长度断句
+                    result.append(current)
+                    self.current = ""
+        
+        return result
+    
+    def flush(self) -> list:
+        """
+        输出剩余未成句的文本
+        
+        返回:
+            剩余文本组成的列表（可能为空）
+        """
+        result = [self.current] if self.current else []
+        self.current = ""
+        return result
+
 def split_text_into_sentences(text: str, max_chars: int = 200) -> list:
     """
     将文本分割成句子，用于流式处理
@@ -202,39 +253,5 @@ def split_text_into_sentences(text: str, max_chars: int = 200) -> list:
     返回:
         分割后的句子列表
     """
-    # 标点符号列表，用于划分句子
-    delimiters = ['。', '！', '？', '；', '.', '!', '?', ';', '\n']
-    
-    result = []
-    current = ""
-    
-    # 逐字符扫描文本
-    for char in text:
-        current += char
-        
-        # 如果当前积累的文本以分隔符结尾且不为空
-        if current and any(current.endswith(d) for d in delimiters):
-            result.append(current)
-            current = ""
-        
-        # 如果当前积累的文本超过最大字符数且不为空，强制断句
-        elif len(current) >= max_chars:
-            # 尝试在单词边界处断句（针对英文）
-            if ' ' in current:
-                last_space = current.rstrip().rfind(' ')
-                if last_space > max_chars * 0.7:  # 如果空格位置在后70%位置
-                    result.append(current[:last_space])
-                    current = current[last_space+1:]
-                else:
-                    result.append(current)
-                    current = ""
-            else:
-                # 针对中文等无空格语言，直接按长度断句
-                result.append(current)
-                current = ""
-    
-    # 处理剩余的文本
-    if current:
-        result.append(current)
-    
-    return result
+    segmenter = SentenceSegmenter(max_chars)
+    return segmenter.feed(text) + segmenter.flush()
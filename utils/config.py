@@ -32,20 +32,30 @@ def load_config(config_file: str) -> CN:
         cfg.NAME = "DigitalHuman"
         
         # ASR 相关配置
-        cfg.ASR = CN()
+        cfg.ASR = CN(new_allowed=True)
         cfg.ASR.ENABLED = True
         cfg.ASR.NAME = "funasrLocal"
         
         # LLM 相关配置
-        cfg.LLM = CN()
+        cfg.LLM = CN(new_allowed=True)
         cfg.LLM.ENABLED = True
         cfg.LLM.NAME = "openai"
         
         # TTS 相关配置
-        cfg.TTS = CN()
+        cfg.TTS = CN(new_allowed=True)
         cfg.TTS.ENABLED = True
         cfg.TTS.NAME = "edge"
         
+        # 共享HTTP连接池、TTS缓存和对话上下文存储配置，具体参数由各自模块提供默认值
+        cfg.HTTP_POOL = CN(new_allowed=True)
+        cfg.TTS_CACHE = CN(new_allowed=True)
+        cfg.CONTEXT_STORE = CN(new_allowed=True)
+        cfg.WARMUP = CN(new_allowed=True)
+        cfg.INFERENCE_EXECUTORS = CN(new_allowed=True)
+        cfg.VAD = CN(new_allowed=True)
+        cfg.VIDEO_JOBS = CN(new_allowed=True)
+        cfg.METRICS = CN(new_allowed=True)
+        
         # API 相关配置
         cfg.API = CN()
         cfg.API.HOST = "127.0.0.1"
@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+'''
+对话上下文存储：LRU+TTL淘汰、单个上下文的消息/token预算、可插拔后端（内存分片 / SQLite）
+'''
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "ContextBackend",
+    "MemoryContextBackend",
+    "SQLiteContextBackend",
+    "ContextStore",
+    "estimate_tokens",
+    "create_context_store",
+]
+
+# 默认上下文存储参数
+DEFAULT_STORE_OPTIONS = {
+    "backend": "memory",            # 后端类型: memory / sqlite
+    "max_contexts": 10000,          # 最多保留的上下文数量，超出后按LRU淘汰
+    "ttl_seconds": 86400,           # 上下文空闲超时(秒)，超时后淘汰
+    "max_messages": 40,             # 单个上下文最多保留的消息数
+    "max_tokens": 4000,             # 单个上下文最多保留的估算token数
+    "shards": 8,                    # 内存后端分片数
+    "sqlite_path": "cache/contexts.db",  # SQLite后端数据库路径
+}
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本token数：中日韩字符按1个token计，其余字符按4个字符1个token计
+
+    参数:
+        text: 文本
+
+    返回:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if '⺀' <= ch <= '鿿' or '가' <= ch <= '힯')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _message_tokens(message: Dict[str, Any]) -> int:
+    """
+    估算单条消息的token数（含角色等固定开销）
+    """
+    content = message.get("content", "")
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return estimate_tokens(content) + 4
+
+class ContextBackend(ABC):
+    """
+    上下文存储后端接口
+
+    上下文为可JSON序列化的字典，至少包含messages、created_at、last_access
+    """
+    def __init__(self, max_contexts: int, ttl_seconds: float):
+        self.max_contexts = max_contexts
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, context_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取上下文并刷新访问时间，不存在或已过期时返回None
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def put(self, context_id: str, context: Dict[str, Any]):
+        """
+        写入上下文并刷新访问时间，必要时淘汰最久未访问的上下文
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, context_id: str) -> bool:
+        """
+        删除上下文
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def expire(self, max_age: Optional[float] = None) -> int:
+        """
+        淘汰空闲超过max_age秒（默认ttl_seconds）的上下文
+
+        返回:
+            淘汰的上下文数量
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        """
+        释放后端资源
+        """
+        pass
+
+class _MemoryShard:
+    """
+    内存后端分片：OrderedDict按最后访问时间排序，表头即最久未访问的上下文
+
+    由于所有上下文使用相同的空闲超时，按访问顺序排列的表头同时也是最早过期的，
+    因此TTL淘汰只需从表头弹出，每个被淘汰的上下文O(1)
+    """
+    __slots__ = ("items", "lock", "capacity")
+
+    def __init__(self, capacity: int):
+        self.items: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.capacity = capacity
+
+class MemoryContextBackend(ContextBackend):
+    """
+    分片内存后端，按context_id哈希分片以减小锁粒度
+    """
+    def __init__(self, max_contexts: int = 10000, ttl_seconds: float = 86400, shards: int = 8):
+        super().__init__(max_contexts, ttl_seconds)
+        shards = max(1, int(shards))
+        capacity = max(1, -(-max_contexts // shards))
+        self.shards = [_MemoryShard(capacity) for _ in range(shards)]
+
+    def _shard(self, context_id: str) -> _MemoryShard:
+        return self.shards[hash(context_id) % len(self.shards)]
+
+    def _expire_shard(self, shard: _MemoryShard, now: float, max_age: float) -> int:
+        """
+        从表头弹出已过期的上下文，调用方需持有分片锁
+        """
+        removed = 0
+        items = shard.items
+        while items:
+            context_id, context = next(iter(items.items()))
+            if now - context["last_access"] <= max_age:
+                break
+            items.popitem(last=False)
+            removed += 1
+        return removed
+
+    def get(self, context_id: str) -> Optional[Dict[str, Any]]:
+        shard = self._shard(context_id)
+        now = time.time()
+        with shard.lock:
+            self._expire_shard(shard, now, self.ttl_seconds)
+            context = shard.items.get(context_id)
+            if context is None:
+                return None
+            context["last_access"] = now
+            shard.items.move_to_end(context_id)
+            return context
+
+    def put(self, context_id: str, context: Dict[str, Any]):
+        shard = self._shard(context_id)
+        now = time.time()
+        with shard.lock:
+            self._expire_shard(shard, now, self.ttl_seconds)
+            context["last_access"] = now
+            shard.items[context_id] = context
+            shard.items.move_to_end(context_id)
+            while len(shard.items) > shard.capacity:
+                evicted_id, _ = shard.items.popitem(last=False)
+                logger.debug(f"[ContextStore] LRU淘汰上下文: {evicted_id}")
+
+    def delete(self, context_id: str) -> bool:
+        shard = self._shard(context_id)
+        with shard.lock:
+            return shard.items.pop(context_id, None) is not None
+
+    def expire(self, max_age: Optional[float] = None) -> int:
+        max_age = self.ttl_seconds if max_age is None else max_age
+        now = time.time()
+        removed = 0
+        for shard in self.shards:
+            with shard.lock:
+                removed += self._expire_shard(shard, now, max_age)
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(shard.items) for shard in self.shards)
+
+class SQLiteContextBackend(ContextBackend):
+    """
+    SQLite后端，多个工作进程可共享同一数据库文件
+
+    last_access建有索引，TTL淘汰和LRU淘汰都是按索引范围删除
+    """
+    def __init__(self, path: str = "cache/contexts.db", max_contexts: int = 10000, ttl_seconds: float = 86400):
+        super().__init__(max_contexts, ttl_seconds)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS contexts ("
+            "id TEXT PRIMARY KEY, data TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_contexts_last_access ON contexts(last_access)")
+        self._writes = 0
+
+    def get(self, context_id: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, last_access FROM contexts WHERE id = ?", (context_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM contexts WHERE id = ?", (context_id,))
+                return None
+            self._conn.execute("UPDATE contexts SET last_access = ? WHERE id = ?", (now, context_id))
+        context = json.loads(row[0])
+        context["last_access"] = now
+        return context
+
+    def put(self, context_id: str, context: Dict[str, Any]):
+        now = time.time()
+        context["last_access"] = now
+        data = json.dumps(context, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contexts (id, data, last_access) VALUES (?, ?, ?)",
+                (context_id, data, now)
+            )
+            # 淘汰检查按写入次数摊销，避免每次写入都统计总数
+            self._writes += 1
+            if self._writes % 64 == 0:
+                self._evict_locked(now, self.ttl_seconds)
+
+    def _evict_locked(self, now: float, max_age: float) -> int:
+        """
+        删除过期上下文并将数量限制在max_contexts以内，调用方需持有锁
+        """
+        removed = self._conn.execute(
+            "DELETE FROM contexts WHERE last_access < ?", (now - max_age,)
+        ).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0] - self.max_contexts
+        if overflow > 0:
+            removed += self._conn.execute(
+                "DELETE FROM contexts WHERE id IN "
+                "(SELECT id FROM contexts ORDER BY last_access LIMIT ?)", (overflow,)
+            ).rowcount
+        return removed
+
+    def delete(self, context_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM contexts WHERE id = ?", (context_id,)).rowcount > 0
+
+    def expire(self, max_age: Optional[float] = None) -> int:
+        max_age = self.ttl_seconds if max_age is None else max_age
+        with self._lock:
+            return self._evict_locked(time.time(), max_age)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class ContextStore:
+    """
+    对话上下文存储
+
+    在后端之上维护单个上下文的消息预算：超过max_messages或max_tokens时
+    从最早的非system消息开始丢弃
+    """
+    def __init__(self, backend: ContextBackend, max_messages: int = 40, max_tokens: int = 4000):
+        self.backend = backend
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+
+    def get_context(self, context_id: Optional[str]) -> Dict[str, Any]:
+        """
+        获取对话上下文，不存在时创建
+
+        参数:
+            context_id: 上下文ID，为空时生成新的ID
+
+        返回:
+            上下文字典
+        """
+        context_id = context_id or str(uuid.uuid4())
+        context = self.backend.get(context_id)
+        if context is None:
+            now = time.time()
+            context = {"messages": [], "created_at": now, "last_access": now}
+            self.backend.put(context_id, context)
+        return context
+
+    def update_context(self, context_id: str, message: Dict[str, Any]):
+        """
+        向上下文追加一条消息并按预算裁剪
+
+        参数:
+            context_id: 上下文ID
+            message: 消息字典，包含role和content
+        """
+        context = self.get_context(context_id)
+        context["messages"] = self.trim_messages(context["messages"] + [message])
+        self.backend.put(context_id, context)
+
+    def trim_messages(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        按消息数和token预算裁剪消息列表，保留system消息和最新的对话
+
+        参数:
+            messages: 消息列表
+
+        返回:
+            裁剪后的消息列表
+        """
+        system = [m for m in messages if m.get("role") == "system"]
+        dialog = [m for m in messages if m.get("role") != "system"]
+
+        budget = self.max_tokens - sum(_message_tokens(m) for m in system)
+        limit = max(0, self.max_messages - len(system))
+        kept = []
+        for message in reversed(dialog):
+            tokens = _message_tokens(message)
+            if len(kept) >= limit or (kept and tokens > budget):
+                break
+            kept.append(message)
+            budget -= tokens
+        kept.reverse()
+
+        if len(kept) < len(dialog):
+            logger.debug(f"[ContextStore] 上下文超出预算，丢弃 {len(dialog) - len(kept)} 条早期消息")
+        return system + kept
+
+    def delete_context(self, context_id: str) -> bool:
+        """
+        删除对话上下文
+        """
+        return self.backend.delete(context_id)
+
+    def expire(self, max_age: Optional[float] = None) -> int:
+        """
+        淘汰空闲超时的上下文
+
+        返回:
+            淘汰的上下文数量
+        """
+        return self.backend.expire(max_age)
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    def close(self):
+        self.backend.close()
+
+def create_context_store(options: Optional[Dict[str, Any]] = None) -> ContextStore:
+    """
+    根据配置创建上下文存储
+
+    参数:
+        options: 存储参数，键名不区分大小写，未提供的项使用DEFAULT_STORE_OPTIONS
+
+    返回:
+        上下文存储
+    """
+    merged = dict(DEFAULT_STORE_OPTIONS)
+    for key, value in dict(options or {}).items():
+        key = key.lower()
+        if key in DEFAULT_STORE_OPTIONS:
+            merged[key] = value
+        else:
+            logger.warning(f"[ContextStore] 未知的上下文存储参数: {key}")
+
+    backend_name = str(merged["backend"]).lower()
+    if backend_name == "sqlite":
+        backend = SQLiteContextBackend(merged["sqlite_path"], merged["max_contexts"], merged["ttl_seconds"])
+    elif backend_name == "memory":
+        backend = MemoryContextBackend(merged["max_contexts"], merged["ttl_seconds"], merged["shards"])
+    else:
+        raise ValueError(f"不支持的上下文存储后端: {merged['backend']}")
+
+    logger.info(f"[ContextStore] 使用{backend_name}后端: max_contexts={merged['max_contexts']}, "
+                f"ttl={merged['ttl_seconds']}s, max_messages={merged['max_messages']}, "
+                f"max_tokens={merged['max_tokens']}")
+    return ContextStore(backend, merged["max_messages"], merged["max_tokens"])
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+'''
+共享HTTP连接池，为所有云端引擎和第三方集成提供复用的客户端会话
+'''
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+import aiohttp
+import httpx
+from utils.singleton import Singleton
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["HTTPClientPool", "get_http_pool"]
+
+# 默认连接池参数
+DEFAULT_POOL_OPTIONS = {
+    "limit": 100,                # 全局最大连接数
+    "limit_per_host": 20,        # 单个主机最大连接数
+    "keepalive_timeout": 30,     # 空闲连接保活时间(秒)
+    "dns_cache_ttl": 300,        # DNS缓存时间(秒)
+    "connect_timeout": 10,       # 建立连接超时(秒)
+    "read_timeout": 60,          # 两次读取数据之间的最长间隔(秒)，防止上游卡住时请求永久挂起
+    "total_timeout": 300,        # 单个请求的默认总超时(秒)，调用方可按请求覆盖
+    "http2": True,               # 服务端支持时使用HTTP/2（仅httpx客户端）
+}
+
+def _has_h2() -> bool:
+    """
+    检查是否安装了HTTP/2支持库
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class HTTPClientPool(metaclass=Singleton):
+    """
+    进程级HTTP连接池
+
+    - aiohttp会话：按主机限制连接数、保活、DNS缓存，供MiniMax、OpenAI等引擎使用
+    - httpx客户端：在安装h2时启用HTTP/2，供Agent工具等使用
+
+    会话与创建时的事件循环绑定，事件循环变化时自动重建
+    """
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        """
+        初始化连接池
+
+        参数:
+            options: 连接池参数，未提供的项使用DEFAULT_POOL_OPTIONS
+        """
+        self.options = dict(DEFAULT_POOL_OPTIONS)
+        if options:
+            self.configure(options)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._httpx_client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def configure(self, options: Dict[str, Any]):
+        """
+        更新连接池参数，已创建的会话在下次关闭后生效
+
+        参数:
+            options: 连接池参数，键名不区分大小写
+        """
+        for key, value in dict(options).items():
+            key = key.lower()
+            if key in DEFAULT_POOL_OPTIONS:
+                self.options[key] = value
+            else:
+                logger.warning(f"[HTTPClientPool] 未知的连接池参数: {key}")
+
+    def _check_loop(self):
+        """
+        检查当前事件循环，事件循环变化时丢弃旧会话
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._session = None
+            self._httpx_client = None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        获取共享的aiohttp会话
+
+        返回:
+            aiohttp会话
+        """
+        self._check_loop()
+        if self._session is None or self._session.closed:
+            async with self._lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=self.options["limit"],
+                        limit_per_host=self.options["limit_per_host"],
+                        keepalive_timeout=self.options["keepalive_timeout"],
+                        ttl_dns_cache=self.options["dns_cache_ttl"],
+                        use_dns_cache=True,
+                    )
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=aiohttp.ClientTimeout(
+                            total=self.options["total_timeout"],
+                            sock_connect=self.options["connect_timeout"],
+                            sock_read=self.options["read_timeout"],
+                        ),
+                    )
+                    logger.info(f"[HTTPClientPool] 创建aiohttp连接池: limit={self.options['limit']}, "
+                                f"limit_per_host={self.options['limit_per_host']}")
+        return self._session
+
+    async def get_httpx_client(self) -> httpx.AsyncClient:
+        """
+        获取共享的httpx客户端
+
+        返回:
+            httpx异步客户端
+        """
+        self._check_loop()
+        if self._httpx_client is None or self._httpx_client.is_closed:
+            async with self._lock:
+                if self._httpx_client is None or self._httpx_client.is_closed:
+                    http2 = bool(self.options["http2"]) and _has_h2()
+                    if self.options["http2"] and not http2:
+                        logger.info("[HTTPClientPool] 未安装h2，httpx客户端使用HTTP/1.1")
+                    limits = httpx.Limits(
+                        max_connections=self.options["limit"],
+                        max_keepalive_connections=self.options["limit_per_host"],
+                        keepalive_expiry=self.options["keepalive_timeout"],
+                    )
+                    self._httpx_client = httpx.AsyncClient(
+                        http2=http2,
+                        limits=limits,
+                        timeout=httpx.Timeout(
+                            self.options["read_timeout"],
+                            connect=self.options["connect_timeout"],
+                        ),
+                    )
+                    logger.info(f"[HTTPClientPool] 创建httpx连接池: http2={http2}")
+        return self._httpx_client
+
+    async def close(self):
+        """
+        关闭所有共享会话
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("[HTTPClientPool] aiohttp连接池已关闭")
+        if self._httpx_client is not None and not self._httpx_client.is_closed:
+            await self._httpx_client.aclose()
+            logger.info("[HTTPClientPool] httpx连接池已关闭")
+        self._session = None
+        self._httpx_client = None
+
+def get_http_pool() -> HTTPClientPool:
+    """
+    获取全局HTTP连接池实例
+    """
+    return HTTPClientPool()
@@ -0,0 +1,419 @@
+# -*- coding: utf-8 -*-
+'''
+延迟指标：按阶段计时的span和HDR风格的直方图，以Prometheus文本格式导出
+
+- span("asr")作为上下文管理器记录一段代码的耗时，出错时同时累计错误数
+- 直方图按对数-线性分桶（与HdrHistogram相同的分桶方式），相对误差约1.6%，
+  内存占用只与数值的数量级范围有关，可以直接计算任意分位数
+- 关闭时span()返回共享的空上下文管理器，不读取时钟、不加锁
+'''
+
+import time
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+import contextvars
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.singleton import Singleton
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["LatencyHistogram", "Metrics", "get_metrics", "span", "observe", "timed_run"]
+
+# 默认指标参数
+DEFAULT_METRICS_OPTIONS = {
+    "enabled": True,
+    "namespace": "digital_human",                   # 指标名前缀
+    "buckets": [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300],  # 导出的le分桶(秒)
+    "quantiles": [0.5, 0.9, 0.99],                  # 导出的分位数
+}
+
+# 已知指标的说明
+METRIC_HELP = {
+    "stage_seconds": "各处理阶段耗时(秒)",
+    "stage_errors_total": "各处理阶段出错次数",
+    "turn_milestone_seconds": "流式对话从请求开始到各节点（识别完成、首个token、首段音频等）的耗时(秒)",
+    "engine_run_seconds": "引擎run调用耗时(秒)",
+    "engine_run_errors_total": "引擎run调用出错次数",
+    "http_request_seconds": "HTTP请求处理耗时(秒)",
+    "video_jobs": "各状态的视频任务数",
+    "active_turns": "正在进行的对话轮次数",
+}
+
+# 直方图内部以微秒为单位记录整数
+_UNIT = 1e-6
+# 每个数量级内的子桶位数：2^7个子桶，相对误差不超过1/64
+_SUB_BUCKET_BITS = 7
+_SUB_BUCKET_COUNT = 1 << _SUB_BUCKET_BITS
+_SUB_BUCKET_HALF = _SUB_BUCKET_COUNT >> 1
+
+
+def _bucket_index(value: int) -> int:
+    if value < _SUB_BUCKET_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BUCKET_BITS
+    return _SUB_BUCKET_COUNT + (shift - 1) * _SUB_BUCKET_HALF + (value >> shift) - _SUB_BUCKET_HALF
+
+
+def _bucket_upper(index: int) -> int:
+    """
+    分桶内的最大值
+    """
+    if index < _SUB_BUCKET_COUNT:
+        return index
+    shift = (index - _SUB_BUCKET_COUNT) // _SUB_BUCKET_HALF + 1
+    top = (index - _SUB_BUCKET_COUNT) % _SUB_BUCKET_HALF + _SUB_BUCKET_HALF
+    return ((top + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    """
+    对数-线性分桶的延迟直方图（单位：秒）
+    """
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        """
+        记录一个耗时
+        """
+        seconds = max(0.0, float(seconds))
+        index = _bucket_index(int(seconds / _UNIT))
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def _sorted_counts(self) -> List[Tuple[int, int]]:
+        with self._lock:
+            return sorted(self._counts.items())
+
+    def quantile(self, q: float) -> float:
+        """
+        分位数（返回所在分桶的上界，不超过记录到的最大值）
+        """
+        counts = self._sorted_counts()
+        total = sum(count for _, count in counts)
+        if not total:
+            return 0.0
+        rank = max(1, int(round(q * total + 0.5 - 1e-9)))
+        seen = 0
+        for index, count in counts:
+            seen += count
+            if seen >= rank:
+                return min(_bucket_upper(index) * _UNIT, self.max)
+        return self.max
+
+    def cumulative(self, bounds: List[float]) -> List[int]:
+        """
+        小于等于每个边界的累计次数，用于导出Prometheus的le分桶
+        """
+        counts = self._sorted_counts()
+        uppers = [_bucket_upper(index) * _UNIT for index, _ in counts]
+        result = []
+        for bound in bounds:
+            position = bisect.bisect_right(uppers, bound * (1 + 1e-9))
+            result.append(sum(count for _, count in counts[:position]))
+        return result
+
+    def snapshot(self, quantiles: List[float]) -> Dict[str, Any]:
+        result = {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6)}
+        for q in quantiles:
+            result[f"p{q * 100:g}"] = round(self.quantile(q), 6)
+        return result
+
+
+class _NoopSpan:
+    """
+    指标关闭时使用的空span
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    计时上下文管理器，退出时记录耗时，异常退出时累计错误数（不包括取消）
+    """
+    __slots__ = ("_metrics", "_name", "_errors", "_labels", "_start", "elapsed")
+
+    def __init__(self, metrics: "Metrics", name: str, errors: str, labels: Dict[str, str]):
+        self._metrics = metrics
+        self._name = name
+        self._errors = errors
+        self._labels = labels
+        self._start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self._start
+        self._metrics.observe(self._name, self.elapsed, **self._labels)
+        if exc_type is not None and not issubclass(exc_type, asyncio.CancelledError):
+            self._metrics.inc(self._errors, **self._labels)
+        return False
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], **extra: str) -> str:
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    escaped = [
+        (key, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for key, value in items
+    ]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metrics(metaclass=Singleton):
+    """
+    进程级指标注册表
+    """
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        """
+        参数:
+            options: 指标参数，未提供的项使用DEFAULT_METRICS_OPTIONS
+        """
+        self.options = dict(DEFAULT_METRICS_OPTIONS)
+        self.enabled = bool(self.options["enabled"])
+        # 指标名 -> 标签 -> 直方图/数值
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], LatencyHistogram]] = {}
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._gauges: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._collectors: List[Callable[["Metrics"], None]] = []
+        self._lock = threading.Lock()
+        if options:
+            self.configure(options)
+
+    def configure(self, options: Dict[str, Any]):
+        """
+        更新指标参数
+
+        参数:
+            options: 指标参数，键名不区分大小写
+        """
+        for key, value in dict(options).items():
+            key = key.lower()
+            if key in DEFAULT_METRICS_OPTIONS:
+                self.options[key] = list(value) if isinstance(value, (list, tuple)) else value
+            else:
+                logger.warning(f"[Metrics] 未知的指标参数: {key}")
+        self.enabled = bool(self.options["enabled"])
+
+    def span(self, name: str = "stage", **labels: Any):
+        """
+        计时上下文管理器，例如 with metrics.span(stage="asr"): ...
+
+        参数:
+            name: 指标名（不含前缀和_seconds后缀）
+            labels: 标签
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, f"{name}_seconds", f"{name}_errors_total", labels)
+
+    def observe(self, name: str, seconds: float, **labels: Any):
+        """
+        直接记录一个耗时
+        """
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        series = self._histograms.get(name)
+        histogram = series.get(key) if series is not None else None
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, {}).setdefault(key, LatencyHistogram())
+        histogram.record(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        """
+        累加计数
+        """
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any):
+        """
+        设置瞬时值
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_collector(self, collector: Callable[["Metrics"], None]):
+        """
+        注册导出前调用的回调，用于刷新队列长度等瞬时值
+        """
+        self._collectors.append(collector)
+
+    def _collect(self):
+        for collector in list(self._collectors):
+            try:
+                collector(self)
+            except Exception as e:
+                logger.warning(f"[Metrics] 指标回调出错: {str(e)}")
+
+    def reset(self):
+        """
+        清空已记录的指标
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        获取指标快照（JSON格式）
+        """
+        self._collect()
+        quantiles = self.options["quantiles"]
+        result: Dict[str, Any] = {}
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            scalars = [(name, dict(series)) for name, series in list(self._counters.items()) + list(self._gauges.items())]
+        for name, series in histograms.items():
+            result[name] = {_format_labels(key) or "{}": histogram.snapshot(quantiles)
+                            for key, histogram in series.items()}
+        for name, series in scalars:
+            result[name] = {_format_labels(key) or "{}": value for key, value in series.items()}
+        return result
+
+    def render_prometheus(self) -> str:
+        """
+        以Prometheus文本格式(0.0.4)导出所有指标
+        """
+        self._collect()
+        namespace = self.options["namespace"]
+        bounds = sorted(float(bound) for bound in self.options["buckets"])
+        quantiles = self.options["quantiles"]
+        with self._lock:
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            gauges = {name: dict(series) for name, series in self._gauges.items()}
+
+        lines: List[str] = []
+
+        def header(name: str, metric_type: str, help_name: str):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(help_name, help_name)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        for name in sorted(histograms):
+            full_name = f"{namespace}_{name}"
+            header(full_name, "histogram", name)
+            for key, histogram in sorted(histograms[name].items()):
+                cumulative = histogram.cumulative(bounds)
+                for bound, count in zip(bounds, cumulative):
+                    lines.append(f"{full_name}_bucket{_format_labels(key, le=_format_value(bound))} {count}")
+                lines.append(f"{full_name}_bucket{_format_labels(key, le='+Inf')} {histogram.count}")
+                lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                lines.append(f"{full_name}_count{_format_labels(key)} {histogram.count}")
+            # 分位数由直方图直接计算，作为单独的gauge导出
+            quantile_name = f"{full_name}_quantile"
+            lines.append(f"# HELP {quantile_name} {METRIC_HELP.get(name, name)}（分位数）")
+            lines.append(f"# TYPE {quantile_name} gauge")
+            for key, histogram in sorted(histograms[name].items()):
+                for q in quantiles:
+                    lines.append(f"{quantile_name}{_format_labels(key, quantile=_format_value(q))} "
+                                 f"{_format_value(histogram.quantile(q))}")
+        for name in sorted(counters):
+            full_name = f"{namespace}_{name}"
+            header(full_name, "counter", name)
+            for key, value in sorted(counters[name].items()):
+                lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+        for name in sorted(gauges):
+            full_name = f"{namespace}_{name}"
+            header(full_name, "gauge", name)
+            for key, value in sorted(gauges[name].items()):
+                lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[Metrics] = None
+
+# 当前任务中正在计时的引擎，避免子类run调用父类run时重复记录
+_active_engine: contextvars.ContextVar = contextvars.ContextVar("active_engine", default=None)
+
+
+def get_metrics() -> Metrics:
+    """
+    获取全局指标注册表
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def span(stage: str, **labels: Any):
+    """
+    处理阶段计时，例如 with span("asr"): ...，记录到stage_seconds{stage="asr"}
+    """
+    metrics = _metrics or get_metrics()
+    if not metrics.enabled:
+        return _NOOP_SPAN
+    return metrics.span("stage", stage=stage, **labels)
+
+
+def observe(stage: str, seconds: float, **labels: Any):
+    """
+    直接记录处理阶段耗时（首个token、排队等待等不便用span包裹的区间）
+    """
+    metrics = _metrics or get_metrics()
+    if metrics.enabled:
+        metrics.observe("stage_seconds", seconds, stage=stage, **labels)
+
+
+def timed_run(func: Callable[..., Awaitable[Any]]):
+    """
+    引擎run方法的计时装饰器，记录到engine_run_seconds{engine=类名}
+
+    子类的run通过super()调用父类的run时只记录最外层一次
+    """
+    if getattr(func, "__timed_run__", False):
+        return func
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        metrics = _metrics or get_metrics()
+        if not metrics.enabled or _active_engine.get() is self:
+            return await func(self, *args, **kwargs)
+        token = _active_engine.set(self)
+        try:
+            with metrics.span("engine_run", engine=self.__class__.__name__):
+                return await func(self, *args, **kwargs)
+        finally:
+            _active_engine.reset(token)
+
+    wrapper.__timed_run__ = True
+    return wrapper
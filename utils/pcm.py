@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+'''
+轻量PCM帧类型，用于流水线内部传递音频
+
+- PcmBuffer: 基于__slots__的PCM帧，包装形状为(帧数, 通道数)的numpy数组，切片为零拷贝视图
+- PcmRingBuffer: 预分配的环形缓冲区，写入不重新分配内存，读取在不跨越末尾时为零拷贝视图
+- 只在API边界与AudioMessage相互转换，内部各阶段直接传递PcmBuffer，避免bytes拷贝和pydantic校验
+'''
+
+import logging
+from typing import Iterable, Optional, Union
+import numpy as np
+from .protocol import AudioMessage, AudioFormatType
+from .audio import parse_wav_header, decode_wav, WAVE_FORMAT_IEEE_FLOAT
+from .audio_utils import pcm_to_wav
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["PcmBuffer", "PcmRingBuffer"]
+
+# 支持的采样类型
+_DTYPES = {
+    np.dtype(np.int16): np.dtype('<i2'),
+    np.dtype(np.float32): np.dtype('<f4'),
+}
+
+
+def _normalize_dtype(dtype) -> np.dtype:
+    dtype = np.dtype(dtype)
+    if dtype not in _DTYPES:
+        raise ValueError(f"不支持的PCM采样类型: {dtype}，仅支持int16和float32")
+    return _DTYPES[dtype]
+
+
+class PcmBuffer:
+    """
+    PCM音频帧
+
+    samples为形状(帧数, 通道数)的int16或float32数组；由bytes构造时直接引用原缓冲区（只读），不拷贝
+    """
+    __slots__ = ("samples", "sample_rate")
+
+    def __init__(self, samples: np.ndarray, sample_rate: int):
+        """
+        参数:
+            samples: int16或float32数组，一维数组视为单声道
+            sample_rate: 采样率
+        """
+        _normalize_dtype(samples.dtype)
+        if samples.ndim == 1:
+            samples = samples.reshape(-1, 1)
+        self.samples = samples
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_bytes(cls, data: Union[bytes, bytearray, memoryview], sample_rate: int,
+                   channels: int = 1, dtype=np.int16) -> "PcmBuffer":
+        """
+        零拷贝包装原始PCM数据
+
+        参数:
+            data: 小端序PCM数据（多通道交错排列）
+            sample_rate: 采样率
+            channels: 通道数
+            dtype: 采样类型，int16或float32
+        """
+        samples = np.frombuffer(data, dtype=_normalize_dtype(dtype))
+        return cls(samples.reshape(-1, channels), sample_rate)
+
+    @classmethod
+    def empty(cls, sample_rate: int, channels: int = 1, dtype=np.int16) -> "PcmBuffer":
+        return cls(np.empty((0, channels), dtype=_normalize_dtype(dtype)), sample_rate)
+
+    @classmethod
+    def from_audio_message(cls, message: AudioMessage) -> "PcmBuffer":
+        """
+        从WAV格式的AudioMessage转换，16位PCM时直接引用音频数据，不拷贝
+
+        异常:
+            ValueError: 不是WAV格式，压缩格式请先用utils.audio.decode_audio解码
+        """
+        if message.format != AudioFormatType.WAV:
+            raise ValueError(f"仅支持WAV格式的AudioMessage: {message.format}")
+        info = parse_wav_header(message.data)
+        if info["sample_width"] == 2 and info["format_tag"] != WAVE_FORMAT_IEEE_FLOAT:
+            samples = np.frombuffer(message.data, dtype='<i2', count=info["frames"] * info["channels"],
+                                    offset=info["data_offset"])
+            return cls(samples.reshape(-1, info["channels"]), info["sample_rate"])
+        samples, sample_rate = decode_wav(message.data)
+        return cls(samples, sample_rate)
+
+    def to_audio_message(self) -> AudioMessage:
+        """
+        转换为16位WAV格式的AudioMessage
+        """
+        return AudioMessage(
+            data=pcm_to_wav(self.as_int16().tobytes(), self.sample_rate, 2, self.channels),
+            format=AudioFormatType.WAV,
+            sampleRate=self.sample_rate,
+            sampleWidth=2
+        )
+
+    @staticmethod
+    def concat(buffers: Iterable["PcmBuffer"]) -> "PcmBuffer":
+        """
+        拼接多个采样率、通道数相同的PcmBuffer，采样类型以第一个为准
+        """
+        buffers = list(buffers)
+        if not buffers:
+            raise ValueError("没有可拼接的PcmBuffer")
+        first = buffers[0]
+        if len(buffers) == 1:
+            return first
+        for buffer in buffers[1:]:
+            if buffer.sample_rate != first.sample_rate or buffer.channels != first.channels:
+                raise ValueError("拼接的PcmBuffer采样率和通道数必须一致")
+        converted = [buffer.astype(first.dtype).samples for buffer in buffers]
+        return PcmBuffer(np.concatenate(converted), first.sample_rate)
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[1]
+
+    @property
+    def frames(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.samples.dtype
+
+    @property
+    def sample_width(self) -> int:
+        return self.samples.dtype.itemsize
+
+    @property
+    def duration(self) -> float:
+        """
+        时长(秒)
+        """
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+    def __len__(self) -> int:
+        return self.frames
+
+    def __getitem__(self, key: slice) -> "PcmBuffer":
+        """
+        按帧切片，返回零拷贝视图
+        """
+        if not isinstance(key, slice):
+            raise TypeError("PcmBuffer只支持按帧切片")
+        return PcmBuffer(self.samples[key], self.sample_rate)
+
+    def __repr__(self) -> str:
+        return (f"PcmBuffer(frames={self.frames}, sample_rate={self.sample_rate}, "
+                f"channels={self.channels}, dtype={self.dtype.name})")
+
+    def astype(self, dtype) -> "PcmBuffer":
+        """
+        转换采样类型，类型相同时返回自身
+        """
+        dtype = _normalize_dtype(dtype)
+        if dtype == self.dtype:
+            return self
+        if dtype == np.dtype('<f4'):
+            return PcmBuffer(self.samples.astype('<f4') / 32768.0, self.sample_rate)
+        # 与转换为float32时的缩放系数一致，int16往返转换无损
+        scaled = np.clip(np.rint(self.samples * 32768.0), -32768, 32767)
+        return PcmBuffer(scaled.astype('<i2'), self.sample_rate)
+
+    def as_float32(self) -> "PcmBuffer":
+        return self.astype(np.float32)
+
+    def as_int16(self) -> "PcmBuffer":
+        return self.astype(np.int16)
+
+    def tobytes(self) -> bytes:
+        """
+        导出为小端序PCM数据（会拷贝）
+        """
+        return self.samples.tobytes()
+
+    def memoryview(self) -> memoryview:
+        """
+        导出PCM数据的内存视图，连续存储时不拷贝
+        """
+        return memoryview(np.ascontiguousarray(self.samples)).cast('B')
+
+
+class PcmRingBuffer:
+    """
+    预分配的PCM环形缓冲区
+
+    容量固定，写入时拷贝到预分配数组中；读取不跨越数组末尾时返回零拷贝视图，
+    视图在下一次写入前有效，需要长期持有时调用方应自行拷贝
+    """
+    __slots__ = ("_data", "_start", "_size", "sample_rate", "overwrite")
+
+    def __init__(self, capacity: int, sample_rate: int = 16000, channels: int = 1,
+                 dtype=np.int16, overwrite: bool = False):
+        """
+        参数:
+            capacity: 容量(帧数)
+            sample_rate: 采样率
+            channels: 通道数
+            dtype: 采样类型，int16或float32
+            overwrite: 写满时是否丢弃最早的数据，False时抛出BufferError
+        """
+        self._data = np.zeros((max(1, int(capacity)), channels), dtype=_normalize_dtype(dtype))
+        self._start = 0
+        self._size = 0
+        self.sample_rate = sample_rate
+        self.overwrite = overwrite
+
+    @property
+    def capacity(self) -> int:
+        return self._data.shape[0]
+
+    @property
+    def channels(self) -> int:
+        return self._data.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._data.dtype
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self._size
+
+    @property
+    def duration(self) -> float:
+        """
+        缓冲的音频时长(秒)
+        """
+        return self._size / self.sample_rate
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _as_samples(self, frames: Union[PcmBuffer, bytes, bytearray, memoryview, np.ndarray]) -> np.ndarray:
+        """
+        将写入数据转换为与缓冲区相同类型的(帧数, 通道数)数组
+        """
+        if isinstance(frames, PcmBuffer):
+            return frames.astype(self.dtype).samples
+        if isinstance(frames, np.ndarray):
+            return PcmBuffer(frames, self.sample_rate).astype(self.dtype).samples
+        return np.frombuffer(frames, dtype=self.dtype).reshape(-1, self.channels)
+
+    def write(self, frames: Union[PcmBuffer, bytes, bytearray, memoryview, np.ndarray]) -> int:
+        """
+        写入PCM数据
+
+        参数:
+            frames: PcmBuffer、numpy数组或与缓冲区类型一致的原始PCM数据
+
+        返回:
+            因缓冲区已满而丢弃的最早帧数
+
+        异常:
+            BufferError: 空间不足且overwrite为False
+        """
+        samples = self._as_samples(frames)
+        count = samples.shape[0]
+        if count == 0:
+            return 0
+        if samples.shape[1] != self.channels:
+            raise ValueError(f"通道数不一致: {samples.shape[1]} != {self.channels}")
+
+        capacity = self.capacity
+        dropped = 0
+        if count > self.free:
+            if not self.overwrite:
+                raise BufferError(f"PCM缓冲区空间不足: 需要{count}帧, 剩余{self.free}帧")
+            if count > capacity:
+                dropped += count - capacity
+                samples = samples[-capacity:]
+                count = capacity
+            overflow = count - self.free
+            if overflow > 0:
+                self.consume(overflow)
+                dropped += overflow
+
+        end = (self._start + self._size) % capacity
+        first = min(count, capacity - end)
+        self._data[end:end + first] = samples[:first]
+        if first < count:
+            self._data[:count - first] = samples[first:]
+        self._size += count
+        return dropped
+
+    def peek(self, frames: Optional[int] = None) -> PcmBuffer:
+        """
+        查看最早的若干帧，不移出缓冲区
+
+        参数:
+            frames: 帧数，None表示全部
+        """
+        count = self._size if frames is None else max(0, min(frames, self._size))
+        end = self._start + count
+        if end <= self.capacity:
+            samples = self._data[self._start:end]
+        else:
+            # 跨越数组末尾，需要拷贝拼接
+            samples = np.concatenate((self._data[self._start:], self._data[:end - self.capacity]))
+        return PcmBuffer(samples, self.sample_rate)
+
+    def peek_last(self, frames: int) -> PcmBuffer:
+        """
+        查看最近写入的若干帧，不移出缓冲区
+        """
+        count = max(0, min(frames, self._size))
+        skip = self._size - count
+        start = (self._start + skip) % self.capacity
+        end = start + count
+        if end <= self.capacity:
+            return PcmBuffer(self._data[start:end], self.sample_rate)
+        return PcmBuffer(np.concatenate((self._data[start:], self._data[:end - self.capacity])), self.sample_rate)
+
+    def consume(self, frames: int):
+        """
+        丢弃最早的若干帧
+        """
+        count = max(0, min(frames, self._size))
+        self._size -= count
+        if self._size == 0:
+            # 缓冲区为空时回到数组开头，使后续读取尽量不跨越末尾
+            self._start = 0
+        else:
+            self._start = (self._start + count) % self.capacity
+
+    def read(self, frames: Optional[int] = None) -> PcmBuffer:
+        """
+        读取并移出最早的若干帧
+
+        参数:
+            frames: 帧数，None表示全部
+        """
+        buffer = self.peek(frames)
+        self.consume(buffer.frames)
+        return buffer
+
+    def clear(self):
+        """
+        清空缓冲区
+        """
+        self._start = 0
+        self._size = 0
@@ -0,0 +1,451 @@
+# -*- coding: utf-8 -*-
+'''
+TTS音频缓存：按内容寻址的两级缓存
+
+- 内存层：按字节数限制大小的LRU
+- 磁盘层：按总大小限制的LRU，索引文件记录元数据，原子写入
+- 并发未命中时只执行一次合成（single-flight）
+'''
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import functools
+import aiofiles
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.singleton import Singleton
+from utils.protocol import TextMessage, AudioMessage, AudioFormatType
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+__all__ = ["TTSCache", "get_tts_cache", "cached_tts"]
+
+# 默认缓存参数
+DEFAULT_CACHE_OPTIONS = {
+    "enabled": True,
+    "cache_dir": os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "audio"),
+    "memory_max_bytes": 64 * 1024 * 1024,     # 内存层容量(字节)
+    "disk_max_bytes": 1024 * 1024 * 1024,     # 磁盘层容量(字节)
+    "ttl_seconds": 86400 * 7,                 # 缓存有效期(秒)，按写入时间计算
+    "index_flush_interval": 32,               # 索引累计修改多少次后写回磁盘
+}
+
+INDEX_FILE = "index.json"
+
+class TTSCache(metaclass=Singleton):
+    """
+    进程级TTS音频缓存
+
+    条目以缓存键寻址，值为音频数据和元数据（格式、采样率等）。
+    磁盘层的索引常驻内存，命中时只需一次文件读取，不再逐次检查文件是否存在和修改时间
+    """
+    def __init__(self, options: Optional[Dict[str, Any]] = None):
+        """
+        初始化缓存
+
+        参数:
+            options: 缓存参数，未提供的项使用DEFAULT_CACHE_OPTIONS
+        """
+        self.options = dict(DEFAULT_CACHE_OPTIONS)
+        if options:
+            self.configure(options)
+        self._memory: "OrderedDict[str, Tuple[bytes, Dict[str, Any]]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._index: Optional["OrderedDict[str, Dict[str, Any]]"] = None
+        self._disk_bytes = 0
+        self._dirty = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "shared": 0}
+
+    def configure(self, options: Dict[str, Any]):
+        """
+        更新缓存参数，缓存目录变化时重新加载索引
+
+        参数:
+            options: 缓存参数，键名不区分大小写
+        """
+        for key, value in dict(options).items():
+            key = key.lower()
+            if key in DEFAULT_CACHE_OPTIONS:
+                if key == "cache_dir" and value != self.options["cache_dir"]:
+                    self._index = None
+                self.options[key] = value
+            else:
+                logger.warning(f"[TTSCache] 未知的缓存参数: {key}")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.options["enabled"])
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.options["cache_dir"], f"{key}.bin")
+
+    # ------------------------------------------------------------------
+    # 磁盘索引
+    # ------------------------------------------------------------------
+
+    def _load_index(self):
+        """
+        加载磁盘索引；索引不存在时扫描缓存目录，兼容旧版本遗留的.bin缓存文件
+        """
+        cache_dir = self.options["cache_dir"]
+        os.makedirs(cache_dir, exist_ok=True)
+        index: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        index_path = os.path.join(cache_dir, INDEX_FILE)
+
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            for key, entry in entries.items():
+                index[key] = entry
+        except FileNotFoundError:
+            for filename in os.listdir(cache_dir):
+                if not filename.endswith(".bin"):
+                    continue
+                stat = os.stat(os.path.join(cache_dir, filename))
+                index[filename[:-4]] = {"size": stat.st_size, "created": stat.st_mtime,
+                                        "last_access": stat.st_mtime, "meta": {}}
+            index = OrderedDict(sorted(index.items(), key=lambda item: item[1]["last_access"]))
+            self._dirty += 1
+        except Exception as e:
+            logger.warning(f"[TTSCache] 索引文件损坏，重建空索引: {e}")
+
+        self._index = index
+        self._disk_bytes = sum(entry["size"] for entry in index.values())
+        logger.info(f"[TTSCache] 加载磁盘缓存索引: {len(index)} 条, {self._disk_bytes} 字节")
+
+    def _write_index(self, snapshot: Dict[str, Dict[str, Any]]):
+        """
+        原子写入索引文件
+        """
+        index_path = os.path.join(self.options["cache_dir"], INDEX_FILE)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, index_path)
+
+    async def _mark_dirty(self, force: bool = False):
+        """
+        记录索引修改，累计到一定次数后写回磁盘
+        """
+        self._dirty += 1
+        if force or self._dirty >= self.options["index_flush_interval"]:
+            await self.flush()
+
+    async def flush(self):
+        """
+        将索引写回磁盘
+        """
+        if self._index is None or not self._dirty:
+            return
+        self._dirty = 0
+        snapshot = dict(self._index)
+        try:
+            await asyncio.to_thread(self._write_index, snapshot)
+        except Exception as e:
+            logger.error(f"[TTSCache] 写入索引失败: {e}")
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._load_index()
+
+    # ------------------------------------------------------------------
+    # 内存层
+    # ------------------------------------------------------------------
+
+    def _memory_put(self, key: str, data: bytes, meta: Dict[str, Any]):
+        limit = self.options["memory_max_bytes"]
+        if len(data) > limit:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old[0])
+        self._memory[key] = (data, meta)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > limit:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ------------------------------------------------------------------
+    # 读写接口
+    # ------------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """
+        查询缓存
+
+        参数:
+            key: 缓存键
+
+        返回:
+            (音频数据, 元数据)，未命中返回None
+        """
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return entry
+
+        self._ensure_index()
+        info = self._index.get(key)
+        if info is None:
+            return None
+
+        now = time.time()
+        if now - info["created"] > self.options["ttl_seconds"]:
+            await self.delete(key)
+            return None
+
+        try:
+            async with aiofiles.open(self._path(key), "rb") as f:
+                data = await f.read()
+        except FileNotFoundError:
+            # 文件被外部删除，同步索引
+            self._index.pop(key, None)
+            self._disk_bytes -= info["size"]
+            await self._mark_dirty()
+            return None
+
+        # 读取期间条目可能已被并发淘汰
+        if key in self._index:
+            info["last_access"] = now
+            self._index.move_to_end(key)
+            await self._mark_dirty()
+
+        meta = info.get("meta", {})
+        self._memory_put(key, data, meta)
+        self.stats["disk_hits"] += 1
+        return data, meta
+
+    async def put(self, key: str, data: bytes, meta: Optional[Dict[str, Any]] = None):
+        """
+        写入缓存（内存层和磁盘层）
+
+        参数:
+            key: 缓存键
+            data: 音频数据
+            meta: 元数据
+        """
+        meta = meta or {}
+        self._memory_put(key, data, meta)
+        self._ensure_index()
+
+        # 先写临时文件再原子替换，避免读到写了一半的文件
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{id(data)}.tmp"
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                await f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"[TTSCache] 写入磁盘缓存失败: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        now = time.time()
+        old = self._index.pop(key, None)
+        if old is not None:
+            self._disk_bytes -= old["size"]
+        self._index[key] = {"size": len(data), "created": now, "last_access": now, "meta": meta}
+        self._disk_bytes += len(data)
+        await self._evict_disk()
+        await self._mark_dirty()
+
+    async def _evict_disk(self):
+        """
+        按LRU淘汰磁盘条目，直到总大小不超过上限
+        """
+        limit = self.options["disk_max_bytes"]
+        while self._disk_bytes > limit and self._index:
+            key, info = self._index.popitem(last=False)
+            self._disk_bytes -= info["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"[TTSCache] 淘汰磁盘缓存: {key}")
+
+    async def delete(self, key: str):
+        """
+        删除缓存条目
+        """
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[0])
+        self._ensure_index()
+        info = self._index.pop(key, None)
+        if info is not None:
+            self._disk_bytes -= info["size"]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            await self._mark_dirty()
+
+    async def expire(self) -> int:
+        """
+        清理过期的磁盘条目
+
+        返回:
+            清理的条目数量
+        """
+        self._ensure_index()
+        deadline = time.time() - self.options["ttl_seconds"]
+        expired = [key for key, info in self._index.items() if info["created"] < deadline]
+        for key in expired:
+            await self.delete(key)
+        if expired:
+            logger.info(f"[TTSCache] 已清理 {len(expired)} 个过期缓存条目")
+        return len(expired)
+
+    async def get_or_create(self, key: str,
+                            factory: Callable[[], Awaitable[Optional[Tuple[bytes, Dict[str, Any]]]]]
+                            ) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """
+        查询缓存，未命中时调用factory生成并写入缓存
+
+        同一个键的并发未命中只会调用一次factory，其余调用等待同一结果
+
+        参数:
+            key: 缓存键
+            factory: 异步生成函数，返回(音频数据, 元数据)，失败返回None（不缓存）
+
+        返回:
+            (音频数据, 元数据)，生成失败返回None
+        """
+        entry = await self.get(key)
+        if entry is not None:
+            return entry
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._inflight = {}
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["shared"] += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # 发起合成的调用方被取消，由当前调用方重新生成
+                return await self.get_or_create(key, factory)
+
+        self.stats["misses"] += 1
+        future = loop.create_future()
+        self._inflight[key] = future
+        try:
+            entry = await factory()
+            if entry is not None:
+                await self.put(key, entry[0], entry[1])
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免"exception was never retrieved"警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def close(self):
+        """
+        写回索引
+        """
+        await self.flush()
+
+def get_tts_cache() -> TTSCache:
+    """
+    获取全局TTS缓存实例
+    """
+    return TTSCache()
+
+def make_cache_key(engine: str, text: str, params: Dict[str, Any]) -> str:
+    """
+    计算缓存键：引擎名、文本和所有影响合成结果的参数
+
+    参数:
+        engine: 引擎名称
+        text: 合成文本
+        params: 合成参数
+
+    返回:
+        缓存键
+    """
+    payload = json.dumps({"engine": engine, "text": text, "params": params},
+                         ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _engine_config(engine: Any) -> Dict[str, Any]:
+    """
+    获取引擎配置，用于区分不同声音、语速等设置下的合成结果
+    """
+    config = getattr(engine, "cfg", None)
+    if config is None:
+        config = getattr(engine, "config", None)
+    return dict(config) if config else {}
+
+def cached_tts(func: Callable[..., Awaitable[Optional[AudioMessage]]]):
+    """
+    TTS引擎合成方法的缓存装饰器
+
+    被装饰的方法签名为 async def method(self, input, *args, **kwargs) -> Optional[AudioMessage]，
+    input为TextMessage或TextMessage列表。缓存键由引擎类名、文本、引擎配置和调用参数组成。
+    调用时传入use_cache=False或引擎配置CACHE为False时跳过缓存
+    """
+    @functools.wraps(func)
+    async def wrapper(self, input, *args, use_cache: bool = True, **kwargs):
+        cache = get_tts_cache()
+        config = _engine_config(self)
+        if not (use_cache and cache.enabled and config.get("CACHE", True)):
+            return await func(self, input, *args, **kwargs)
+
+        if isinstance(input, list):
+            text = " ".join(msg.data for msg in input if isinstance(msg, TextMessage))
+        elif isinstance(input, TextMessage):
+            text = input.data
+        else:
+            return await func(self, input, *args, **kwargs)
+        if not text:
+            return await func(self, input, *args, **kwargs)
+
+        key = make_cache_key(self.__class__.__name__, text,
+                             {"config": config, "args": list(args), "kwargs": kwargs})
+
+        async def synthesize():
+            message = await func(self, input, *args, **kwargs)
+            if message is None or not message.data:
+                return None
+            meta = {
+                "format": message.format.value,
+                "sample_rate": message.sampleRate,
+                "sample_width": message.sampleWidth,
+            }
+            return message.data, meta
+
+        entry = await cache.get_or_create(key, synthesize)
+        if entry is None:
+            return None
+
+        data, meta = entry
+        return AudioMessage(
+            data=data,
+            desc=text,
+            format=AudioFormatType(meta.get("format", AudioFormatType.WAV.value)),
+            sampleRate=meta.get("sample_rate", 16000),
+            sampleWidth=meta.get("sample_width", 2),
+        )
+
+    return wrapper